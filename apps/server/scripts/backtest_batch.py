@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+backtest_batch.py - Many strategies x many datasets in one invocation
+
+Driven by `run_backtest.py --batch <manifest.json>`:
+
+    {
+        "config": {"initialCapital": 10000, "commission": 0.002,
+                   "startDate": "...", "endDate": "..."},   # defaults for every job
+        "strategies": {"rev-3": "strategies/rev-3.py", ...},  # id -> strategy file
+        "datasets": {"bitcoin": "data/bitcoin", ...},         # id -> dir with ohlcv.bin/ohlcv.json
+        "jobs": [                                             # optional, default: every
+            {"strategy": "rev-3", "dataset": "bitcoin",       #   strategy x dataset pair
+             "config": {"commission": 0.001}}                 # optional per-job overrides
+        ],
+        "workers": 4                                          # optional, default: CPU count
+    }
+
+Relative paths are resolved against the manifest's directory. Each dataset
+is loaded and each strategy compiled once in the parent process; jobs then
+run on a fork pool that inherits both copy-on-write; jobs with a
+`timeframe` resample a dataset once per worker process, not once per job.
+Results are streamed to stdout as JSON lines as jobs finish:
+
+    {"event": "job", "index", "strategy", "dataset", "metrics" | "error"}
+    ...
+    {"event": "summary", "jobs", "failed", "table", "by_strategy"}
+
+Batch jobs only produce metrics (report is forced to "none"); configs with
+walkForward, series, robustness, limits, portfolio or candleStore are
+rejected. With BACKTEST_MAX_CONCURRENT set, a batch takes one admission
+slot for all of its jobs (see backtest_limits.py).
+"""
+
+import json
+import logging
+import math
+import multiprocessing
+import os
+import statistics
+
+from backtest_indicators import reset_cache as reset_indicator_cache
+from backtest_limits import acquire_slot, max_concurrent_runs, release_slot
+from backtest_timeframes import resample_to_timeframe
+from run_backtest import (
+    execute_user_code,
+    extract_metrics,
+    load_ohlcv_dataframe,
+    simulate,
+    validate_config,
+)
+
+logger = logging.getLogger(__name__)
+
+# Metrics copied into each row of the comparison table
+TABLE_METRICS = ('total_return', 'sharpe_ratio', 'max_drawdown', 'win_rate', 'total_trades')
+
+# Single-run config fields a batch job does not run
+UNSUPPORTED_JOB_FIELDS = ('walkForward', 'series', 'robustness', 'limits', 'portfolio', 'candleStore')
+
+
+def load_manifest(manifest_path):
+    """Load and validate a batch manifest; returns (manifest, base_dir)"""
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Batch manifest not found at {manifest_path}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in batch manifest: {e}")
+
+    for field in ('strategies', 'datasets'):
+        if not isinstance(manifest.get(field), dict) or not manifest[field]:
+            raise ValueError(f"Batch manifest requires a non-empty '{field}' object")
+
+    return manifest, os.path.dirname(os.path.abspath(manifest_path))
+
+
+def build_jobs(manifest):
+    """Explicit `jobs`, or the full strategy x dataset cross product, with merged configs"""
+    base_config = manifest.get('config', {})
+    specs = manifest.get('jobs') or [
+        {"strategy": strategy_id, "dataset": dataset_id}
+        for strategy_id in manifest['strategies']
+        for dataset_id in manifest['datasets']
+    ]
+
+    jobs = []
+    for index, spec in enumerate(specs):
+        if spec.get('strategy') not in manifest['strategies']:
+            raise ValueError(f"jobs[{index}] references unknown strategy '{spec.get('strategy')}'")
+        if spec.get('dataset') not in manifest['datasets']:
+            raise ValueError(f"jobs[{index}] references unknown dataset '{spec.get('dataset')}'")
+
+        config = {**base_config, **spec.get('config', {}), 'report': 'none'}
+        config.pop('reportPath', None)
+        for field in UNSUPPORTED_JOB_FIELDS:
+            if config.get(field) is not None:
+                raise ValueError(f"jobs[{index}]: {field} is not supported in batch runs")
+        jobs.append({
+            "strategy": spec['strategy'],
+            "dataset": spec['dataset'],
+            "config": validate_config(config),
+        })
+    return jobs
+
+
+def _resolve(base_dir, path):
+    return path if os.path.isabs(path) else os.path.join(base_dir, path)
+
+
+def prepare(manifest, base_dir, jobs):
+    """
+    Load every dataset and compile every strategy that a job uses, once
+
+    Failures are recorded per dataset/strategy so only the affected jobs fail.
+    Returns (datasets, strategies) as {id: (value, error)}.
+    """
+    datasets = {}
+    for dataset_id in {job['dataset'] for job in jobs}:
+        try:
+            datasets[dataset_id] = (load_ohlcv_dataframe(_resolve(base_dir, manifest['datasets'][dataset_id])), None)
+        except Exception as e:
+            datasets[dataset_id] = (None, f"Failed to load dataset '{dataset_id}': {e}")
+
+    strategies = {}
+    for strategy_id in {job['strategy'] for job in jobs}:
+        try:
+            with open(_resolve(base_dir, manifest['strategies'][strategy_id]), 'r') as f:
+                code = f.read()
+            strategies[strategy_id] = ((code, execute_user_code(code)), None)
+        except Exception as e:
+            strategies[strategy_id] = (None, f"Failed to load strategy '{strategy_id}': {e}")
+
+    return datasets, strategies
+
+
+# ============ Pool Worker ============
+
+# Set in the parent before the pool forks, so children inherit the loaded data
+_batch_state = {}
+
+
+def _run_job(index):
+    """Run one job against the pre-loaded datasets and strategies"""
+    job = _batch_state['jobs'][index]
+    outcome = {"event": "job", "index": index, "strategy": job['strategy'], "dataset": job['dataset']}
+
+    df, dataset_error = _batch_state['datasets'][job['dataset']]
+    strategy, strategy_error = _batch_state['strategies'][job['strategy']]
+    if dataset_error or strategy_error:
+        outcome["error"] = dataset_error or strategy_error
+        return outcome
+
+    try:
+        strategy_code, strategy_class = strategy
+        df = resample_to_timeframe(df, job['config'])
+        _, stats, optimization = simulate(df, strategy_code, strategy_class, job['config'])
+        outcome["metrics"] = extract_metrics(stats)
+        if optimization is not None:
+            outcome["best_params"] = optimization['best_params']
+    except Exception as e:
+        outcome["error"] = str(e)
+    return outcome
+
+
+def _quiet_worker():
+    logging.getLogger().setLevel(logging.WARNING)
+
+
+# ============ Aggregation ============
+
+def _mean(values):
+    return statistics.fmean(values) if values else None
+
+
+def build_summary(outcomes):
+    """Comparison table (one row per job) plus per-strategy aggregates across datasets"""
+    outcomes = sorted(outcomes, key=lambda o: o['index'])
+    table = []
+    for outcome in outcomes:
+        row = {"strategy": outcome['strategy'], "dataset": outcome['dataset']}
+        if 'metrics' in outcome:
+            row.update({metric: outcome['metrics'].get(metric) for metric in TABLE_METRICS})
+        else:
+            row["error"] = outcome['error']
+        table.append(row)
+
+    by_strategy = []
+    for strategy_id in dict.fromkeys(o['strategy'] for o in outcomes):
+        rows = [r for r in table if r['strategy'] == strategy_id and 'error' not in r]
+        returns = [r['total_return'] for r in rows if r['total_return'] is not None]
+        sharpes = [r['sharpe_ratio'] for r in rows if r['sharpe_ratio'] is not None]
+        drawdowns = [r['max_drawdown'] for r in rows if r['max_drawdown'] is not None]
+        by_strategy.append({
+            "strategy": strategy_id,
+            "datasets": len(rows),
+            "mean_return": _mean(returns),
+            "median_return": statistics.median(returns) if returns else None,
+            "mean_sharpe": _mean(sharpes),
+            "worst_drawdown": min(drawdowns) if drawdowns else None,
+            "profitable": sum(1 for r in returns if r > 0),
+        })
+    by_strategy.sort(key=lambda s: -math.inf if s['mean_return'] is None else s['mean_return'], reverse=True)
+
+    return {
+        "event": "summary",
+        "jobs": len(outcomes),
+        "failed": sum(1 for o in outcomes if 'error' in o),
+        "table": table,
+        "by_strategy": by_strategy,
+    }
+
+
+def run_batch(manifest_path, emit):
+    """
+    Run every job in the manifest, calling emit(line_dict) per finished job
+    and once with the summary, which is also returned
+    """
+    manifest, base_dir = load_manifest(manifest_path)
+    jobs = build_jobs(manifest)
+    reset_indicator_cache()  # Shared by every job of the batch, which run on the same datasets
+    datasets, strategies = prepare(manifest, base_dir, jobs)
+    _batch_state.update(jobs=jobs, datasets=datasets, strategies=strategies)
+
+    workers = min(int(manifest.get('workers') or os.cpu_count() or 1), len(jobs))
+    logger.info(f"Running {len(jobs)} batch jobs on {workers} workers")
+
+    outcomes = []
+    try:
+        # One slot for the whole batch, whose pool keeps `workers` processes busy
+        if max_concurrent_runs():
+            acquire_slot()
+        if workers <= 1 or multiprocessing.current_process().daemon:
+            for index in range(len(jobs)):
+                outcomes.append(_run_job(index))
+                emit(outcomes[-1])
+        else:
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(processes=workers, initializer=_quiet_worker) as pool:
+                for outcome in pool.imap_unordered(_run_job, range(len(jobs))):
+                    outcomes.append(outcome)
+                    emit(outcome)
+    finally:
+        release_slot()
+        _batch_state.clear()
+
+    summary = build_summary(outcomes)
+    emit(summary)
+    return summary
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+backtest_cache.py - Content-addressed on-disk caches for run_backtest.py
+
+Used for backtest results (result_cache_key) and RestrictedPython-compiled
+strategy bytecode (bytecode_cache_key). cached_run_result() looks up a
+one-shot run before run_backtest.py imports pandas, talib and the sandbox,
+so a cache hit does not pay for them.
+
+Entries are blobs stored under a hex key in a cache directory. Reads
+refresh the entry's mtime and writes evict least-recently-used entries
+once the directory exceeds its size budget. Writes are atomic
+(temp file + rename), so concurrent runs and worker processes can share
+a cache directory. Cached bytecode is unmarshalled and cached results are
+served as-is, so a cache directory is only used when it is private: created
+0700, and refused when another user owns it or can write to it.
+
+Configuration (environment):
+- BACKTEST_CACHE_DIR        cache root (default: <tmpdir>/agentix-backtest-cache)
+- BACKTEST_CACHE_MAX_BYTES  size budget per cache (default: 512 MiB)
+"""
+
+import ast
+import glob
+import hashlib
+import json
+import logging
+import os
+import stat
+import sys
+import tempfile
+from importlib import metadata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'agentix-backtest-cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Bump to invalidate every cached result when the result format changes
+RESULT_CACHE_VERSION = 1
+
+# Bump to invalidate every cached compiled strategy
+BYTECODE_CACHE_VERSION = 1
+
+# Config fields that do not change the simulated result
+NON_RESULT_CONFIG_FIELDS = ('reportPath', 'cache', 'limits', 'profile')
+
+VERSIONED_PACKAGES = ('backtesting', 'pandas', 'numpy', 'TA-Lib', 'RestrictedPython', 'bokeh')
+
+# Runner source that can change a result (tests and benchmarks cannot)
+RUNTIME_SOURCES = ('run_backtest.py', 'backtest_*.py', 'indicator_engine.py', 'ohlcv_store.py')
+
+# Binary columnar OHLCV handoff, preferred over ohlcv.json (see run_backtest.load_ohlcv_binary)
+OHLCV_BINARY_FILE = 'ohlcv.bin'
+
+# Cache key suffix for the deferred report data of a cached result
+REPORT_CACHE_SUFFIX = '.report'
+
+# Config fields a cached result cannot stand in for: their keys need the heavy
+# imports (lookback, candleStore, portfolio) or their results are completed
+# by the run itself (profile, memory)
+FULL_PIPELINE_CONFIG_FIELDS = ('lookback', 'candleStore', 'portfolio', 'profile', 'memory')
+
+
+def private_directory(path):
+    """Create path as a 0700 directory, or check that an existing one is only ours; returns False if not"""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError as e:
+        logger.warning(f"Not using cache directory {path}: {e}")
+        return False
+
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        logger.warning(f"Not using cache directory {path}: it must be a directory owned by "
+                       f"uid {os.getuid()} that no other user can write to")
+        return False
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return True
+
+
+class DiskCache:
+    """Size-bounded LRU blob cache in a private directory (disabled when the directory is not private)"""
+
+    def __init__(self, name, root=None, max_bytes=None):
+        root = root or os.environ.get('BACKTEST_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.directory = os.path.join(root, name)
+        self.max_bytes = int(max_bytes or os.environ.get('BACKTEST_CACHE_MAX_BYTES') or DEFAULT_MAX_BYTES)
+        self.enabled = private_directory(root) and private_directory(self.directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        """Store bytes under key, then evict to stay within the size budget"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.partial-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(partial_path, path)
+        except BaseException:
+            try:
+                os.unlink(partial_path)
+            except OSError:
+                pass
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete least-recently-used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for path in glob.glob(os.path.join(self.directory, '*', '*')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Evicted concurrently
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+
+
+def digest_bytes(*parts):
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def digest_file(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def normalize_strategy_code(strategy_code):
+    """Canonical form of the strategy so formatting and comment changes share a key"""
+    try:
+        return ast.dump(ast.parse(strategy_code))
+    except SyntaxError:
+        return strategy_code
+
+
+_environment_digest = None
+
+
+def environment_digest():
+    """Python + library versions + runner source, computed once per process"""
+    global _environment_digest
+    if _environment_digest is None:
+        versions = [sys.version]
+        for package in VERSIONED_PACKAGES:
+            try:
+                versions.append(f"{package}=={metadata.version(package)}")
+            except metadata.PackageNotFoundError:
+                versions.append(f"{package}==missing")
+
+        scripts_dir = os.path.dirname(os.path.abspath(__file__))
+        paths = {path for pattern in RUNTIME_SOURCES for path in glob.glob(os.path.join(scripts_dir, pattern))}
+        sources = [digest_file(path) for path in sorted(paths)]
+        _environment_digest = digest_bytes(*versions, *sources)
+    return _environment_digest
+
+
+def result_cache_key(strategy_code, config, ohlcv_digest):
+    """Key for a backtest result: strategy, result-relevant config, input data and environment"""
+    relevant_config = {k: v for k, v in config.items() if k not in NON_RESULT_CONFIG_FIELDS}
+    return digest_bytes(
+        RESULT_CACHE_VERSION,
+        normalize_strategy_code(strategy_code),
+        json.dumps(relevant_config, sort_keys=True),
+        ohlcv_digest,
+        environment_digest(),
+    )
+
+
+def bytecode_cache_key(strategy_code):
+    """Key for RestrictedPython-compiled bytecode: exact source, compiler and interpreter versions"""
+    try:
+        restricted_version = metadata.version('RestrictedPython')
+    except metadata.PackageNotFoundError:
+        restricted_version = 'missing'
+    return digest_bytes(BYTECODE_CACHE_VERSION, sys.version, restricted_version, strategy_code)
+
+
+# ============ Result Cache ============
+
+def ohlcv_input_path(tmp_dir):
+    """The OHLCV file run_backtest.load_ohlcv_dataframe() will read"""
+    binary_path = os.path.join(tmp_dir, OHLCV_BINARY_FILE)
+    return binary_path if os.path.exists(binary_path) else os.path.join(tmp_dir, 'ohlcv.json')
+
+
+def unseeded_robustness(config):
+    """True when config asks for robustness simulations that differ on every run (no seed to cache them by)"""
+    spec = config.get('robustness')
+    return bool(spec) and (not isinstance(spec, dict) or spec.get('seed') is None)
+
+
+def save_report_bytes(data, report_path):
+    """Atomically write serialized report data to report_path"""
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    partial_path = f"{report_path}.partial"
+    with open(partial_path, 'wb') as f:
+        f.write(data)
+    os.replace(partial_path, report_path)
+    return report_path
+
+
+def load_cached_result(cache, cache_key, config):
+    """Return a cached result for this run, restoring deferred report data to reportPath"""
+    data = cache.get(cache_key)
+    if data is None:
+        return None
+
+    result = json.loads(data)
+    if config.get('report') == 'deferred' and not config.get('walkForward'):
+        report_data = cache.get(cache_key + REPORT_CACHE_SUFFIX)
+        if report_data is None:
+            return None  # Report data was evicted; recompute
+        result["report_path"] = save_report_bytes(report_data, config['reportPath'])
+    return result
+
+
+def store_cached_result(cache, cache_key, result, config):
+    """Cache a fresh result (and its deferred report data)"""
+    try:
+        if result.get("report_path"):
+            with open(result["report_path"], 'rb') as f:
+                cache.put(cache_key + REPORT_CACHE_SUFFIX, f.read())
+        entry = {k: v for k, v in result.items() if k != "report_path"}
+        cache.put(cache_key, json.dumps(entry).encode('utf-8'))
+    except OSError as e:
+        # The cache is an optimization; never fail a finished backtest over it
+        logger.warning(f"Failed to write result cache entry: {e}")
+
+
+def cached_run_result(tmp_dir):
+    """
+    Serve a one-shot run of tmp_dir from the result cache with the standard library only
+
+    Returns the cached result, or None to run the full pipeline: on a miss,
+    for anything it cannot read or check cheaply (the full pipeline reports
+    those errors), and for FULL_PIPELINE_CONFIG_FIELDS runs. Config validation
+    is skipped: a hit was stored by a run that passed it, since the key covers
+    the config and the runner source. Fields outside the key are checked here.
+    """
+    try:
+        with open(os.path.join(tmp_dir, 'config.json')) as f:
+            config = json.load(f)
+        with open(os.path.join(tmp_dir, 'strategy.py')) as f:
+            strategy_code = f.read()
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(config, dict) or not config.get('cache', True) or unseeded_robustness(config):
+        return None
+    if any(config.get(field) for field in FULL_PIPELINE_CONFIG_FIELDS):
+        return None
+    if config.get('report') == 'deferred' and not config.get('reportPath'):
+        return None
+
+    from backtest_limits import parse_limits
+    try:
+        parse_limits(config.get('limits'))
+        ohlcv_digest = digest_file(ohlcv_input_path(tmp_dir))
+    except (OSError, ValueError):
+        return None
+
+    cache = DiskCache('results')
+    cache_key = result_cache_key(strategy_code, config, ohlcv_digest)
+    result = load_cached_result(cache, cache_key, config)
+    if result is not None:
+        result["cache"] = {"status": "hit", "key": cache_key}
+    return result
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+backtest_indicators.py - Vectorized indicators for user strategies
+
+Exposed to strategy code as the `indicators` global (no import needed):
+
+    class Breakout(Strategy):
+        def init(self):
+            close = self.data.Close
+            self.fast = self.I(indicators.ema, close, 12)
+            self.slow = self.I(indicators.sma, close, 50)
+            self.atr = self.I(indicators.atr, self.data.High, self.data.Low, close, 14)
+            self.top = self.I(indicators.rolling_max, self.data.High, 20)
+
+        def signals(self):
+            return indicators.cross_up(self.fast, self.slow), indicators.cross_down(self.fast, self.slow)
+
+Every indicator returns a float64 array as long as its input, NaN until
+its first value, with the same values as the talib function it is named
+after (sma: SMA, stddev: STDDEV, ema: EMA, rsi: RSI, atr: ATR,
+rolling_max/rolling_min: MAX/MIN; wilder is the smoothing RSI and ATR
+use). Leading NaNs are skipped, so indicators of indicators line up as in
+talib. cross_up/cross_down are backtesting.lib.crossover() for every bar.
+
+Rolling sums come from cumulative sums over chunks re-anchored at their
+first value (keeping the rounding error of long series to that of a
+chunk), recursive smoothing from pandas' ewm, and rolling extremes from
+van Herk/Gil-Werman block prefix/suffix maxima, all O(n) in NumPy.
+
+Results are memoized for the run (reset_cache() starts a new one), keyed
+by function, parameters and input buffer, so an indicator a strategy
+computes again, or every candidate of an optimization sweep asks for,
+is computed once per process. Inputs are treated as immutable: an array
+changed in place after an indicator was computed from it gets the earlier
+result. Results are read-only (.copy() one to change it); the cache is
+bounded to CACHE_BYTES of results and the temporary inputs it keeps alive.
+"""
+
+import functools
+import inspect
+import numbers
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+# Rows per cumulative-sum chunk of rolling sums
+SUM_CHUNK = 4096
+
+# Memory the per-run memo may hold (results plus the inputs they are keyed by)
+CACHE_BYTES = 256 * 2 ** 20
+
+# Bars each indicator consumes before its first value, from its numeric arguments (see backtest_lookback.py)
+WARMUP = {
+    'sma': lambda period: period - 1,
+    'stddev': lambda period: period - 1,
+    'ema': lambda period: period - 1,
+    'wilder': lambda period: period - 1,
+    'rsi': lambda period=14: period,
+    'atr': lambda period=14: period,
+    'rolling_max': lambda period: period - 1,
+    'rolling_min': lambda period: period - 1,
+    'cross_up': lambda *levels: 1,
+    'cross_down': lambda *levels: 1,
+}
+
+# Recursively smoothed: every earlier value keeps a fading influence on the result
+SMOOTHED = frozenset({'ema', 'wilder', 'rsi', 'atr'})
+
+
+# ============ Memo ============
+
+class _Memo:
+    """LRU of indicator results keyed by call, keeping their input buffers alive"""
+
+    def __init__(self, budget=CACHE_BYTES):
+        self.budget = budget
+        self.entries = OrderedDict()   # key -> (result, owner ids)
+        self.owners = {}               # id -> [buffer, entry count]
+        self.size = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, result, buffers):
+        if result.nbytes > self.budget:
+            return
+        owner_ids = tuple({id(buffer): buffer for buffer in buffers})
+        for buffer in buffers:
+            owner = self.owners.setdefault(id(buffer), [buffer, 0])
+            if owner[1] == 0:
+                self.size += buffer.nbytes
+            owner[1] += 1
+        self.entries[key] = (result, owner_ids)
+        self.size += result.nbytes
+        while self.size > self.budget and len(self.entries) > 1:
+            self._evict()
+
+    def _evict(self):
+        _, (result, owner_ids) = self.entries.popitem(last=False)
+        self.size -= result.nbytes
+        for owner_id in owner_ids:
+            owner = self.owners[owner_id]
+            owner[1] -= 1
+            if owner[1] == 0:
+                self.size -= owner[0].nbytes
+                del self.owners[owner_id]
+
+
+_memo = _Memo()
+
+
+def reset_cache():
+    """Start a new run: drop every memoized result"""
+    global _memo
+    _memo = _Memo()
+
+
+def _buffer_owner(array):
+    """The array that owns array's memory (array itself when it does)"""
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
+def _as_input(value):
+    """Plain ndarray view of a Series / backtesting _Array / list argument; other values unchanged"""
+    if isinstance(value, (pd.Series, np.ndarray, list, tuple)):
+        return np.asarray(value).view(np.ndarray)
+    return value
+
+
+def _argument_key(value, buffers):
+    """Hashable key of one argument, collecting the buffers of array arguments"""
+    if isinstance(value, np.ndarray):
+        owner = _buffer_owner(value)
+        buffers.append(owner)
+        return ('array', id(owner), value.__array_interface__['data'][0], value.shape, value.strides,
+                value.dtype.str)
+    if value is None or isinstance(value, (numbers.Number, str)):
+        return value
+    raise TypeError(f"Unsupported indicator argument of type {type(value).__name__}")
+
+
+def _memoized(function):
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        # Bound by name with defaults, so rsi(close), rsi(close, 14) and rsi(close, period=14) share an entry
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = {name: _as_input(value) for name, value in bound.arguments.items()}
+        buffers = []
+        try:
+            key = (function.__name__,
+                   tuple((name, _argument_key(value, buffers)) for name, value in arguments.items()))
+        except TypeError:
+            return function(**arguments)
+
+        result = _memo.get(key)
+        if result is None:
+            result = function(**arguments)
+            result.flags.writeable = False
+            _memo.put(key, result, buffers)
+        return result
+    return wrapper
+
+
+# ============ Helpers ============
+
+def _series(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim != 1:
+        raise ValueError(f"Indicators take one-dimensional series, got shape {values.shape}")
+    return values
+
+
+def _period(period):
+    if isinstance(period, bool) or int(period) != period or period < 1:
+        raise ValueError(f"Indicator period must be a positive integer, got {period!r}")
+    return int(period)
+
+
+def _first_valid(values):
+    """Index of the first non-NaN value (len(values) when there is none)"""
+    valid = ~np.isnan(values)
+    return int(valid.argmax()) if valid.any() else len(values)
+
+
+def _window_sums(values, period, squares=False):
+    """
+    Mean (and population variance) of every full window of values
+
+    Returns arrays of len(values) - period + 1 entries, from cumulative sums
+    over SUM_CHUNK rows centred on each chunk's first value.
+    """
+    count = len(values) - period + 1
+    means = np.empty(count)
+    variances = np.empty(count) if squares else None
+    for start in range(0, count, SUM_CHUNK):
+        stop = min(start + SUM_CHUNK, count)
+        chunk = values[start:stop + period - 1]
+        anchor = chunk[0]
+        centred = chunk - anchor
+        sums = np.concatenate(([0.0], np.cumsum(centred)))
+        window_means = (sums[period:] - sums[:-period]) / period
+        means[start:stop] = window_means + anchor
+        if squares:
+            sums = np.concatenate(([0.0], np.cumsum(centred * centred)))
+            window_variances = (sums[period:] - sums[:-period]) / period - window_means ** 2
+            variances[start:stop] = np.maximum(window_variances, 0.0)
+    return means, variances
+
+
+def _smoothed(values, period, alpha):
+    """Exponential smoothing seeded with the mean of the first period values (talib's EMA/Wilder seed)"""
+    out = np.full(len(values), np.nan)
+    first = _first_valid(values)
+    if len(values) - first < period:
+        return out
+    seeded = values[first + period - 1:].copy()
+    seeded[0] = values[first:first + period].mean()
+    out[first + period - 1:] = pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out
+
+
+def _rolling_extreme(values, period, reduce):
+    """Max/min of every full window with block prefix/suffix extremes (van Herk/Gil-Werman)"""
+    out = np.full(len(values), np.nan)
+    first = _first_valid(values)
+    length = len(values) - first
+    if length < period:
+        return out
+    fill = -np.inf if reduce is np.maximum else np.inf
+    blocks = -(-length // period)
+    padded = np.full(blocks * period, fill)
+    padded[:length] = values[first:]
+    padded = padded.reshape(blocks, period)
+    prefix = reduce.accumulate(padded, axis=1).ravel()
+    suffix = reduce.accumulate(padded[:, ::-1], axis=1)[:, ::-1].ravel()
+    # The window ending at i is the suffix of its first block joined with the prefix of its last
+    out[first + period - 1:] = reduce(suffix[:length - period + 1], prefix[period - 1:length])
+    return out
+
+
+# ============ Indicators ============
+
+@_memoized
+def sma(values, period):
+    """Simple moving average (talib.SMA)"""
+    values, period = _series(values), _period(period)
+    out = np.full(len(values), np.nan)
+    first = _first_valid(values)
+    if len(values) - first >= period:
+        out[first + period - 1:] = _window_sums(values[first:], period)[0]
+    return out
+
+
+@_memoized
+def stddev(values, period):
+    """Rolling population standard deviation (talib.STDDEV with nbdev=1)"""
+    values, period = _series(values), _period(period)
+    out = np.full(len(values), np.nan)
+    first = _first_valid(values)
+    if len(values) - first >= period:
+        out[first + period - 1:] = np.sqrt(_window_sums(values[first:], period, squares=True)[1])
+    return out
+
+
+@_memoized
+def ema(values, period):
+    """Exponential moving average with alpha 2 / (period + 1), seeded with an SMA (talib.EMA)"""
+    period = _period(period)
+    return _smoothed(_series(values), period, 2.0 / (period + 1))
+
+
+@_memoized
+def wilder(values, period):
+    """Wilder's smoothing (alpha 1 / period, SMA seed), the average RSI and ATR use"""
+    period = _period(period)
+    return _smoothed(_series(values), period, 1.0 / period)
+
+
+@_memoized
+def rsi(values, period=14):
+    """Relative strength index with Wilder smoothing (talib.RSI)"""
+    values, period = _series(values), _period(period)
+    out = np.full(len(values), np.nan)
+    first = _first_valid(values)
+    if len(values) - first <= period:
+        return out
+    changes = np.diff(values[first:])
+    gains = _smoothed(np.maximum(changes, 0.0), period, 1.0 / period)[period - 1:]
+    losses = _smoothed(np.maximum(-changes, 0.0), period, 1.0 / period)[period - 1:]
+    total = gains + losses
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out[first + period:] = np.where(total > 0, 100.0 * gains / total, 0.0)
+    return out
+
+
+@_memoized
+def atr(high, low, close, period=14):
+    """Average true range with Wilder smoothing (talib.ATR)"""
+    high, low, close, period = _series(high), _series(low), _series(close), _period(period)
+    if not len(high) == len(low) == len(close):
+        raise ValueError("atr() needs high, low and close series of the same length")
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+    previous = close[:-1]
+    true_range = np.maximum.reduce([high[1:] - low[1:], np.abs(high[1:] - previous), np.abs(low[1:] - previous)])
+    out[1:] = _smoothed(true_range, period, 1.0 / period)
+    return out
+
+
+@_memoized
+def rolling_max(values, period):
+    """Highest value of each window (talib.MAX)"""
+    return _rolling_extreme(_series(values), _period(period), np.maximum)
+
+
+@_memoized
+def rolling_min(values, period):
+    """Lowest value of each window (talib.MIN)"""
+    return _rolling_extreme(_series(values), _period(period), np.minimum)
+
+
+@_memoized
+def cross_up(series, other):
+    """True on the bars where series crosses above other (a series or a level), as crossover(series, other)"""
+    series = _series(series)
+    other = _series(other) if np.ndim(other) else float(other)
+    out = np.zeros(len(series), dtype=bool)
+    previous = other[:-1] if np.ndim(other) else other
+    current = other[1:] if np.ndim(other) else other
+    out[1:] = (series[:-1] < previous) & (series[1:] > current)
+    return out
+
+
+@_memoized
+def cross_down(series, other):
+    """True on the bars where series crosses below other (a series or a level), as crossover(other, series)"""
+    series = _series(series)
+    other = _series(other) if np.ndim(other) else float(other)
+    out = np.zeros(len(series), dtype=bool)
+    previous = other[:-1] if np.ndim(other) else other
+    current = other[1:] if np.ndim(other) else other
+    out[1:] = (series[:-1] > previous) & (series[1:] < current)
+    return out
+
+
+def namespace():
+    """A fresh `indicators` object for one sandbox (so a strategy cannot change another's)"""
+    return SimpleNamespace(**{name: globals()[name] for name in WARMUP})
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+backtest_limits.py - Per-run resource budgets and admission control for run_backtest.py
+
+Budgets come from the optional `limits` block in config.json:
+
+    "limits": {
+        "memoryMb": 1024,      # address space the run may add to the loaded interpreter
+        "cpuSeconds": 120,     # CPU time of each process of the run (incl. sweep/fold workers)
+        "barMs": 50            # wall-clock budget of a single Strategy.next() call
+    }
+
+Memory and CPU are RLIMIT_AS / RLIMIT_CPU soft limits, so pool workers forked
+by a sweep or walk-forward inherit them; they are restored when the run ends
+(worker mode children serve many runs). barMs arms an ITIMER_REAL timer
+around each next() call whose SIGALRM interrupts the call once it runs over.
+The interrupt only lands between Python bytecodes, and a strategy with a bare
+`except:` can swallow it; a call that overran is still failed when it
+returns, and cpuSeconds stays the hard bound on a run. Exceeding a budget raises
+ResourceLimitExceeded, which the runner reports as
+
+    {"error": "...", "limit": {"name": "memory" | "cpu" | "bar" | "admission", "budget": ...}}
+
+ADMISSION: with BACKTEST_MAX_CONCURRENT=N (env, unset means unlimited) at
+most N runs simulate at once across every runner process on the machine.
+After its result cache lookup a run claims one of N flock()ed slot files in
+BACKTEST_ADMISSION_DIR (default <tmpdir>/agentix-backtest-slots) and waits
+for a free one for up to BACKTEST_ADMISSION_TIMEOUT seconds (default 300).
+A crashed run's slot is freed by the kernel with its file lock.
+"""
+
+import fcntl
+import math
+import os
+import resource
+import signal
+import tempfile
+import time
+from contextlib import contextmanager
+
+# config.limits field -> limit name
+LIMIT_FIELDS = {'memoryMb': 'memory', 'cpuSeconds': 'cpu', 'barMs': 'bar'}
+
+DEFAULT_ADMISSION_TIMEOUT = 300
+ADMISSION_POLL_INTERVAL = 0.1
+
+
+class ResourceLimitExceeded(Exception):
+    """A run went over one of its budgets, or waited too long for admission"""
+
+    def __init__(self, limit, budget, message):
+        super().__init__(message)
+        self.limit = limit
+        self.budget = budget
+
+    def __reduce__(self):
+        # Raised in sweep pool workers and re-raised in the parent
+        return (ResourceLimitExceeded, (self.limit, self.budget, str(self)))
+
+    def details(self):
+        return {"name": self.limit, "budget": self.budget}
+
+
+def parse_limits(spec):
+    """Validate the `limits` block; returns {limit name: budget}"""
+    if spec is None:
+        return {}
+    if not isinstance(spec, dict):
+        raise ValueError("limits must be an object of memoryMb, cpuSeconds and barMs budgets")
+
+    limits = {}
+    for field, value in spec.items():
+        if field not in LIMIT_FIELDS:
+            raise ValueError(f"Unknown limits.{field}. Expected one of: {', '.join(LIMIT_FIELDS)}")
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ValueError(f"limits.{field} must be a positive number")
+        limits[LIMIT_FIELDS[field]] = value
+    return limits
+
+
+# Budgets of the current run; forked pool workers inherit them
+_active = {}
+
+
+def _address_space():
+    """Current virtual memory size in bytes (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _lower_soft_limit(which, value):
+    """Set the soft limit to at most value (never above the current limits); returns the old soft limit"""
+    soft, hard = resource.getrlimit(which)
+    if hard != resource.RLIM_INFINITY:
+        value = min(value, hard)
+    if soft != resource.RLIM_INFINITY:
+        value = min(value, soft)
+    resource.setrlimit(which, (value, hard))
+    return soft
+
+
+def _cpu_exceeded(signum, frame):
+    budget = _active.get('cpu')
+    raise ResourceLimitExceeded('cpu', budget, f"CPU budget of {budget} s exceeded")
+
+
+class _BarTimeout(BaseException):
+    """Raised into a next() call over its barMs budget; a BaseException so `except Exception` in user code misses it"""
+
+
+def _bar_timeout(signum, frame):
+    raise _BarTimeout()
+
+
+@contextmanager
+def run_limits(spec):
+    """Apply the memory/CPU/bar budgets of config.limits for the duration of a run"""
+    limits = parse_limits(spec)
+    if not limits:
+        yield
+        return
+
+    previous = {}
+    previous_handler = None
+    previous_alarm_handler = None
+    try:
+        if 'memory' in limits:
+            previous[resource.RLIMIT_AS] = _lower_soft_limit(
+                resource.RLIMIT_AS, _address_space() + int(limits['memory'] * 2 ** 20))
+        if 'cpu' in limits:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            previous_handler = signal.signal(signal.SIGXCPU, _cpu_exceeded)
+            previous[resource.RLIMIT_CPU] = _lower_soft_limit(
+                resource.RLIMIT_CPU, math.ceil(usage.ru_utime + usage.ru_stime + limits['cpu']))
+        if 'bar' in limits:
+            previous_alarm_handler = signal.signal(signal.SIGALRM, _bar_timeout)
+        _active.update(limits)
+        yield
+    except MemoryError as e:
+        if 'memory' not in limits:
+            raise
+        raise ResourceLimitExceeded('memory', limits['memory'],
+                                    f"Memory budget of {limits['memory']} MB exceeded") from e
+    finally:
+        _active.clear()
+        for which, soft in previous.items():
+            resource.setrlimit(which, (soft, resource.getrlimit(which)[1]))
+        if previous_handler is not None:
+            signal.signal(signal.SIGXCPU, previous_handler)
+        if previous_alarm_handler is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_alarm_handler)
+
+
+def enforce_bar_budget(strategy_class):
+    """
+    Subclass strategy_class so a next() call over the barMs budget fails the run
+
+    Each call runs under a one-shot ITIMER_REAL timer (SIGALRM is handled by
+    run_limits()), so a runaway call is interrupted instead of only being
+    measured once it returns. Returns strategy_class unchanged when the run
+    has no bar budget.
+    """
+    budget_ms = _active.get('bar')
+    if not budget_ms:
+        return strategy_class
+
+    budget = budget_ms / 1000
+    user_next = strategy_class.next
+
+    def next(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            signal.setitimer(signal.ITIMER_REAL, budget)
+            try:
+                user_next(self)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except _BarTimeout:
+            timed_out = True  # Reported below with the time it took
+        elapsed = time.perf_counter() - started
+        if timed_out or elapsed > budget:
+            raise ResourceLimitExceeded(
+                'bar', budget_ms,
+                f"Strategy.next() took {elapsed * 1000:.1f} ms on bar {len(self.data)}, "
+                f"over the {budget_ms} ms per-bar budget")
+
+    return type(strategy_class.__name__, (strategy_class,), {
+        'next': next,
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
+
+
+# ============ Admission ============
+
+_slot = {}
+
+
+def max_concurrent_runs():
+    """BACKTEST_MAX_CONCURRENT, or 0 for unlimited"""
+    try:
+        return max(int(os.environ.get('BACKTEST_MAX_CONCURRENT') or 0), 0)
+    except ValueError:
+        raise ValueError("BACKTEST_MAX_CONCURRENT must be an integer")
+
+
+def acquire_slot():
+    """Block until this process holds one of the BACKTEST_MAX_CONCURRENT run slots"""
+    max_concurrent = max_concurrent_runs()
+    if not max_concurrent or 'file' in _slot:
+        return
+
+    timeout = float(os.environ.get('BACKTEST_ADMISSION_TIMEOUT') or DEFAULT_ADMISSION_TIMEOUT)
+    directory = (os.environ.get('BACKTEST_ADMISSION_DIR')
+                 or os.path.join(tempfile.gettempdir(), 'agentix-backtest-slots'))
+    os.makedirs(directory, exist_ok=True)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        for index in range(max_concurrent):
+            slot_file = open(os.path.join(directory, f'slot-{index}.lock'), 'a')
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot_file.close()
+                continue
+            _slot['file'] = slot_file
+            return
+
+        if time.monotonic() >= deadline:
+            raise ResourceLimitExceeded(
+                'admission', max_concurrent,
+                f"No backtest slot became free within {timeout:g} s "
+                f"({max_concurrent} concurrent runs allowed)")
+        time.sleep(ADMISSION_POLL_INTERVAL)
+
+
+def release_slot():
+    """Free this process's run slot, if it holds one"""
+    slot_file = _slot.pop('file', None)
+    if slot_file is not None:
+        fcntl.flock(slot_file, fcntl.LOCK_UN)
+        slot_file.close()
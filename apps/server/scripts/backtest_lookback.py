@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+backtest_lookback.py - Warm-up inference for run_backtest.py
+
+Reads a strategy's source (without running it) and infers how many bars of
+history its indicators need before they produce their first settled value:
+
+    class RsiStrategy(Strategy):
+        rsi_period = 14
+
+        def init(self):
+            self.rsi = self.I(talib.RSI, self.data.Close, self.rsi_period)
+
+    -> {"class": "RsiStrategy", "bars": 154, "duration_ms": 0, "exact": true,
+        "indicators": [{"function": "RSI", "bars": 154}]}
+
+Indicators are the functions passed to self.I() and self.resample_apply()
+plus direct talib and `indicators` calls. Arguments are resolved from
+literals and class attributes (the largest value of each swept parameter in
+config.optimize). talib functions use talib's own lookback and `indicators`
+functions their WARMUP (see backtest_indicators.py), plus
+CONVERGENCE_PERIODS periods for the ones with an unstable (recursively
+smoothed) period such as RSI and EMA, so values at startDate match a run
+over a long history. pandas
+rolling()/ewm()/shift()/diff()/pct_change() are recognized too; any other
+function counts its largest numeric argument and makes the result
+inexact, in which case period-like class attributes (n1, rsi_period,
+slow, window, ...) are a lower bound as well.
+
+`bars` are bars of the timeframe the strategy runs on. Higher timeframes
+(resample_apply) and config.timeframe are expressed as `duration_ms`, so
+the warm-up in bars of the loaded data is max(bars, duration_ms / bar).
+
+With `"lookback": "auto"` (or an explicit number of bars) in config.json,
+run_backtest.py loads only that warm-up before startDate plus
+startDate..endDate, so the DataFrame is built for the minimal window. The
+warm-up bars only feed the indicators: the strategy cannot trade before the
+first startDate bar (trade_start_bar()) and the statistics cover
+startDate..endDate. The server also runs the inference before fetching
+candles to size the request:
+
+    python scripts/backtest_lookback.py <tmp_dir>    # strategy.py (+ config.json) -> JSON
+"""
+
+import ast
+import json
+import math
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+import talib
+from talib import abstract
+
+from backtest_indicators import SMOOTHED, WARMUP
+from backtest_timeframes import timeframe_ns
+from indicator_engine import CONVERGENCE_PERIODS
+from ohlcv_store import date_range_ms
+
+UNSTABLE_FLAG = 'Function has an unstable period'
+
+# Class attributes that look like indicator windows, the lower bound of an inexact inference
+PERIOD_NAME_PATTERN = re.compile(r'^(n\d*|.*(period|window|length|lookback|span)\w*|fast|slow|signal)$')
+
+# pandas methods whose first argument is a window of bars (ewm gets the convergence margin)
+PANDAS_WINDOWS = {'rolling': -1, 'shift': 0, 'diff': 0, 'pct_change': 0}
+EWM_SPANS = ('span', 'com', 'halflife')
+
+BINARY_OPERATORS = {
+    ast.Add: lambda a, b: a + b,
+    ast.Sub: lambda a, b: a - b,
+    ast.Mult: lambda a, b: a * b,
+    ast.FloorDiv: lambda a, b: a // b,
+    ast.Div: lambda a, b: a / b,
+}
+TALIB_FUNCTIONS = frozenset(talib.get_functions())
+
+
+# ============ Analysis ============
+
+def strategy_class_node(tree):
+    """The last class defined at module level with a base class, as execute_user_code() picks"""
+    classes = [node for node in tree.body if isinstance(node, ast.ClassDef) and node.bases]
+    if not classes:
+        raise ValueError("User code must define a class that inherits from backtesting.Strategy")
+    return classes[-1]
+
+
+def class_parameters(node):
+    """Numeric class attributes of a class definition"""
+    parameters = {}
+    for statement in node.body:
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], statement.value
+        elif isinstance(statement, ast.AnnAssign) and statement.value is not None:
+            target, value = statement.target, statement.value
+        else:
+            continue
+        if isinstance(target, ast.Name):
+            number = _evaluate(value, parameters)
+            if number is not None:
+                parameters[target.id] = number
+    return parameters
+
+
+def optimize_maxima(config):
+    """Largest value of each numeric parameter swept by config.optimize"""
+    from backtest_optimizer import expand_param_grid
+
+    if not (config or {}).get('optimize'):
+        return {}
+    grid = expand_param_grid(config['optimize'].get('params'))
+    return {name: max(v for v in values if _is_number(v))
+            for name, values in grid.items() if any(_is_number(v) for v in values)}
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _evaluate(node, parameters):
+    """Value of a numeric expression over literals and self.<param>/<param> names, or None"""
+    if isinstance(node, ast.Constant):
+        return node.value if _is_number(node.value) else None
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        value = _evaluate(node.operand, parameters)
+        return None if value is None else (-value if isinstance(node.op, ast.USub) else value)
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'self':
+        return parameters.get(node.attr)
+    if isinstance(node, ast.Name):
+        return parameters.get(node.id)
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left, parameters), _evaluate(node.right, parameters)
+        if left is None or right is None or (isinstance(node.op, (ast.Div, ast.FloorDiv)) and right == 0):
+            return None
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('int', 'max', 'min'):
+        values = [_evaluate(arg, parameters) for arg in node.args]
+        if not values or None in values:
+            return None
+        return {'int': lambda *v: int(v[0]), 'max': max, 'min': min}[node.func.id](*values)
+    return None
+
+
+def _library_function(node):
+    """'sma' for indicators.sma, None for anything else"""
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'indicators' \
+            and node.attr in WARMUP:
+        return node.attr
+    return None
+
+
+def _function_name(node):
+    """'RSI' for talib.RSI / RSI / ta.RSI, the attribute or name otherwise (None for lambdas etc.)"""
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    if isinstance(node, ast.Name):
+        return node.id
+    return None
+
+
+def talib_lookback(name, args, kwargs):
+    """Warm-up bars of a talib function called with numeric args (in parameter order) and kwargs"""
+    function = abstract.Function(name)
+    names = list(function.parameters)
+    settings = {key: value for key, value in zip(names, args)}
+    settings.update({key: value for key, value in kwargs.items() if key in names})
+    function.set_parameters({key: int(value) if 'period' in key or 'matype' in key else value
+                             for key, value in settings.items()})
+    bars = function.lookback
+    if UNSTABLE_FLAG in function.function_flags:
+        periods = [value for key, value in function.parameters.items() if 'period' in key]
+        bars += CONVERGENCE_PERIODS * int(max(periods, default=0))
+    return int(bars)
+
+
+def library_lookback(name, args, kwargs):
+    """Warm-up bars of an `indicators` function called with numeric args and kwargs"""
+    bars = WARMUP[name](*args, **{key: value for key, value in kwargs.items() if key == 'period'})
+    if name in SMOOTHED:
+        # The smoothed indicators take one period, 14 by default for rsi and atr
+        bars += CONVERGENCE_PERIODS * int(kwargs.get('period', args[-1] if args else 14))
+    return int(bars)
+
+
+def indicator_lookback(name, args, kwargs, library=False):
+    """(bars, exact) of an indicator function called with the numeric args/kwargs"""
+    if library:
+        try:
+            return library_lookback(name, args, kwargs), True
+        except (TypeError, ValueError):  # Arguments the indicator rejects
+            pass
+    elif name in TALIB_FUNCTIONS:
+        try:
+            return talib_lookback(name, args, kwargs), True
+        except Exception:  # Arguments talib rejects; counted like an unknown function
+            pass
+    numbers = [value for value in list(args) + list(kwargs.values()) if value is not None]
+    return int(math.ceil(max(numbers, default=0))), False
+
+
+def infer_lookback(strategy_code, config=None):
+    """
+    Warm-up of a strategy in bars of its own timeframe plus higher-timeframe duration
+
+    Returns {"class", "bars", "duration_ms", "exact", "indicators"}.
+    """
+    tree = ast.parse(strategy_code)
+    node = strategy_class_node(tree)
+    parameters = class_parameters(node)
+    parameters.update(optimize_maxima(config))
+
+    indicators = []
+    exact = True
+
+    def add(function, bars, timeframe=None):
+        entry = {"function": function, "bars": int(bars)}
+        if timeframe:
+            entry["timeframe"] = timeframe
+        indicators.append(entry)
+
+    for call in ast.walk(node):
+        if not isinstance(call, ast.Call):
+            continue
+        method = call.func
+        kwargs = {kw.arg: _evaluate(kw.value, parameters) for kw in call.keywords if kw.arg}
+        kwargs = {key: value for key, value in kwargs.items() if value is not None}
+
+        # self.I(func, series, *args) / self.resample_apply(rule, func, series, *args)
+        if isinstance(method, ast.Attribute) and isinstance(method.value, ast.Name) and method.value.id == 'self' \
+                and method.attr in ('I', 'resample_apply'):
+            timeframe = None
+            if method.attr == 'resample_apply':
+                if len(call.args) < 2 or not isinstance(call.args[0], ast.Constant):
+                    exact = False
+                    continue
+                timeframe, call_args = call.args[0].value, call.args[1:]
+            else:
+                call_args = call.args
+            if not call_args:
+                continue
+            name = _function_name(call_args[0])
+            args = [_evaluate(arg, parameters) for arg in call_args[1:]]
+            bars, known = indicator_lookback(name, [a for a in args if a is not None], kwargs,
+                                             library=_library_function(call_args[0]) is not None)
+            exact &= known
+            add(name or '<function>', bars, timeframe)
+            continue
+
+        name = _function_name(method)
+        # Direct talib calls, e.g. talib.SMA(close, 20) in signals()
+        if isinstance(method, ast.Attribute) and isinstance(method.value, ast.Name) and method.value.id in ('talib', 'ta') \
+                and name in TALIB_FUNCTIONS:
+            args = [_evaluate(arg, parameters) for arg in call.args]
+            add(name, talib_lookback(name, [a for a in args if a is not None], kwargs))
+        elif _library_function(method):
+            # Direct indicators calls, e.g. indicators.ema(close, 12) in signals()
+            args = [_evaluate(arg, parameters) for arg in call.args]
+            bars, known = indicator_lookback(name, [a for a in args if a is not None], kwargs, library=True)
+            exact &= known
+            add(name, bars)
+        elif isinstance(method, ast.Attribute) and name in PANDAS_WINDOWS:
+            window = _evaluate(call.args[0], parameters) if call.args else kwargs.get('window', kwargs.get('periods'))
+            if window is not None:
+                add(name, max(window + PANDAS_WINDOWS[name], 0))
+        elif isinstance(method, ast.Attribute) and name == 'ewm':
+            span = next((kwargs[key] for key in EWM_SPANS if key in kwargs), None)
+            if span is not None:
+                add(name, (CONVERGENCE_PERIODS + 1) * span)
+
+    timeframe_bars = [entry['bars'] for entry in indicators if 'timeframe' not in entry]
+    bars = max(timeframe_bars, default=0)
+    if not exact:
+        periods = [value for key, value in parameters.items() if PERIOD_NAME_PATTERN.match(key)]
+        bars = max([bars] + [int(math.ceil(value)) for value in periods])
+
+    # A higher-timeframe value only shows after its bar closes: one more bar of that timeframe
+    duration_ms = max([(entry['bars'] + 1) * timeframe_ns(entry['timeframe']) // 10 ** 6
+                       for entry in indicators if 'timeframe' in entry], default=0)
+    if (config or {}).get('timeframe'):
+        duration_ms = max(duration_ms, (bars + 1) * timeframe_ns(config['timeframe']) // 10 ** 6)
+        bars = 0
+
+    return {"class": node.name, "bars": int(bars), "duration_ms": int(duration_ms), "exact": bool(exact),
+            "indicators": indicators}
+
+
+# ============ Data Window ============
+
+def resolve_lookback(strategy_code, config):
+    """The warm-up config.lookback asks for ("auto" infers it; a number is bars), or None to keep all data"""
+    setting = config.get('lookback')
+    if setting is None:
+        return None
+    if setting == 'auto':
+        return infer_lookback(strategy_code, config)
+    return {"bars": int(setting), "duration_ms": 0}
+
+
+def parse_lookback(setting):
+    """Validate config.lookback"""
+    if setting == 'auto':
+        return setting
+    if isinstance(setting, bool) or not isinstance(setting, int) or setting < 0:
+        raise ValueError("lookback must be \"auto\" or a non-negative number of bars")
+    return setting
+
+
+def warmup_bars(lookback, bar_ms):
+    """Bars of bar_ms data that cover a lookback"""
+    return max(lookback['bars'], int(math.ceil(lookback['duration_ms'] / bar_ms)) if bar_ms else 0)
+
+
+def window_bounds(timestamps, unit, config, lookback):
+    """
+    [first, last) positions of the warm-up bars before startDate plus startDate..endDate
+
+    timestamps are sorted integers in unit; the bar size is the smallest
+    step around startDate.
+    """
+    start_ms, end_ms = date_range_ms(config)
+    to_unit = lambda ms: np.datetime64(ms, 'ms').astype(f'datetime64[{unit}]').astype(np.int64)  # noqa: E731
+    first = int(np.searchsorted(timestamps, to_unit(start_ms)))
+    last = int(np.searchsorted(timestamps, to_unit(end_ms)))
+
+    steps = np.diff(timestamps[max(first - 512, 0):first + 512])
+    steps = steps[steps > 0]
+    bar_ms = float(np.timedelta64(int(steps.min()), unit) / np.timedelta64(1, 'ms')) if len(steps) else 0
+    first = max(first - warmup_bars(lookback, bar_ms), 0)
+    if last <= first:
+        raise ValueError(f"No OHLCV data between startDate {config['startDate']} and endDate {config['endDate']}")
+    return first, last
+
+
+def trade_start_bar(df, config):
+    """
+    Position of the first startDate bar in a frame loaded with a lookback's warm-up
+
+    0 when config has no lookback (all loaded bars are traded); at most the
+    last bar, so a run over a frame that ends before startDate still has one.
+    """
+    if config.get('lookback') is None or not len(df):
+        return 0
+    start_ms, _ = date_range_ms(config)
+    start_ts = pd.Timestamp(start_ms, unit='ms')
+    if getattr(df.index, 'tz', None) is not None:
+        start_ts = start_ts.tz_localize('UTC')
+    start = int(df.index.searchsorted(start_ts))
+    return min(start, len(df) - 1)
+
+
+def store_range_ms(config, lookback, resolution):
+    """[start, end) ms of a candle store read covering the warm-up before startDate"""
+    from ohlcv_store import resolution_ms
+
+    start_ms, end_ms = date_range_ms(config)
+    bar_ms = resolution_ms(resolution)
+    return start_ms - warmup_bars(lookback, bar_ms) * bar_ms, end_ms
+
+
+# ============ CLI ============
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: backtest_lookback.py <tmp_dir>", file=sys.stderr)
+        sys.exit(1)
+    tmp_dir = sys.argv[1]
+
+    try:
+        with open(os.path.join(tmp_dir, 'strategy.py')) as f:
+            strategy_code = f.read()
+        config = None
+        config_path = os.path.join(tmp_dir, 'config.json')
+        if os.path.exists(config_path):
+            with open(config_path) as f:
+                config = json.load(f)
+        result = infer_lookback(strategy_code, config)
+    except (OSError, SyntaxError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
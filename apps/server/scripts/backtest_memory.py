@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+backtest_memory.py - Low-memory OHLCV loading for run_backtest.py
+
+Enabled with the optional `memory` field in config.json:
+
+    "memory": "low"       # frame built straight from typed arrays, only the columns the data has
+    "memory": "float32"   # "low" plus float32 price columns where precision allows
+
+The default ohlcv.json loader keeps the parsed list of candle dicts, a
+records DataFrame and the float64 frame (with a zero-filled Volume when the
+candles have none) alive together, several times the size of the data. In
+low mode each candle is appended to typed column buffers as the JSON is
+decoded and dropped right away; the frame is one contiguous price block
+filled column by column while the buffers are released. ohlcv.bin is
+memory-mapped in every mode.
+
+float32 halves the price block. It is used only when the cast keeps every
+distinct value of each price column distinct and in the same order, so
+comparisons, crossovers and stop/limit triggers on a series behave as they
+do with float64 (fills are at the float32-rounded prices). talib needs
+float64 input, so float32 columns passed to self.I() are upcast for the
+call; talib called directly on self.data columns needs .astype(float).
+Optimization sweeps and higher timeframes work on float64 copies.
+
+The result then carries
+
+    "memory": {"mode": "float32", "rows": 5256000, "columns": ["Open", "High", "Low", "Close"],
+               "price_dtype": "float32", "data_mb": 100.3, "peak_rss_mb": 412.0}
+
+where peak_rss_mb is the run's resident-set high-water mark.
+"""
+
+import json
+from array import array
+
+import numpy as np
+import pandas as pd
+
+MEMORY_MODES = ('default', 'low', 'float32')
+
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+
+# ohlcv.json candle keys -> DataFrame columns (volume is optional)
+JSON_FIELDS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close'}
+
+
+def parse_memory(mode):
+    """Validate config.memory; returns the mode"""
+    if mode not in MEMORY_MODES:
+        raise ValueError(f"Invalid memory mode '{mode}'. Expected one of: {', '.join(MEMORY_MODES)}")
+    return mode
+
+
+def memory_mode(config):
+    return (config or {}).get('memory', 'default')
+
+
+# ============ Loading ============
+
+def read_ohlcv_json(path):
+    """
+    Decode ohlcv.json straight into typed columns
+
+    Returns (int64 timestamps, {column: float64 values}); Volume is present
+    only when some candle has one (missing or null volumes are 0).
+    """
+    timestamps = array('q')
+    buffers = {column: array('d') for column in JSON_FIELDS.values()}
+    volume = array('d')
+    has_volume = False
+
+    def append_candle(candle):
+        nonlocal has_volume
+        if 'volume' in candle and not has_volume:
+            has_volume = True
+            volume.frombytes(bytes(8 * len(timestamps)))  # 0.0 for the candles before the first volume
+        if has_volume:
+            volume.append(float(candle.get('volume') or 0))
+        timestamps.append(int(candle['timestamp']))
+        for key, buffer in zip(JSON_FIELDS, buffers.values()):
+            buffer.append(float(candle[key]))
+        # The decoded list holds None instead of the candle
+
+    try:
+        with open(path, 'r') as f:
+            candles = json.load(f, object_hook=append_candle)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in ohlcv.json: {e}")
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Failed to convert OHLCV data to DataFrame: {e}")
+
+    if not isinstance(candles, list) or len(timestamps) == 0 or len(candles) != len(timestamps):
+        raise ValueError("ohlcv.json must contain a non-empty array of OHLCV candles")
+    del candles
+
+    columns = dict(buffers)
+    if has_volume:
+        columns['Volume'] = volume
+    # frombuffer views share the array buffers until ohlcv_frame() copies them out
+    return (np.frombuffer(timestamps, dtype=np.int64),
+            {name: np.frombuffer(buffer, dtype=np.float64) for name, buffer in columns.items()})
+
+
+def float32_keeps_order(values):
+    """True when casting values to float32 keeps every distinct value distinct and in order"""
+    ordered = np.sort(values)
+    with np.errstate(over='ignore'):
+        narrowed = ordered.astype(np.float32)
+    if (np.isinf(narrowed) & np.isfinite(ordered)).any():
+        return False
+    # Rounding is monotonic, so order survives exactly when no distinct neighbours merge
+    merged = (narrowed[1:] == narrowed[:-1]) & (ordered[1:] != ordered[:-1])
+    return not merged.any()
+
+
+def price_dtype(columns, mode):
+    """float32 for mode "float32" when every price column keeps its order, else float64"""
+    if mode == 'float32' and all(float32_keeps_order(columns[name]) for name in PRICE_COLUMNS):
+        return np.float32
+    return np.float64
+
+
+def ohlcv_frame(index, columns, dtype=np.float64):
+    """
+    DataFrame of {column: values} with the price columns in one dtype block
+
+    Entries are removed from columns as they are copied, so their buffers
+    can be freed one by one while the block is filled.
+    """
+    names = [name for name in PRICE_COLUMNS if name in columns]
+    block = np.empty((len(names), len(index)), dtype=dtype)
+    for row, name in enumerate(names):
+        block[row] = columns.pop(name)
+
+    df = pd.DataFrame(block.T, columns=names, index=index, copy=False)
+    for name in list(columns):
+        df[name] = np.asarray(columns.pop(name), dtype=np.float64)
+    return df
+
+
+def narrow_prices(df, mode):
+    """df with float32 price columns when mode "float32" allows it (df itself otherwise)"""
+    columns = {name: df[name].to_numpy() for name in df.columns}
+    if has_float32_prices(df) or price_dtype(columns, mode) is np.float64:
+        return df
+    return ohlcv_frame(df.index, columns, np.float32)
+
+
+def has_float32_prices(df):
+    return bool((df.dtypes == np.float32).any())
+
+
+def data_footprint(df, mode):
+    """Shape, dtype and size of the loaded OHLCV frame for the result's memory block"""
+    return {
+        "mode": mode,
+        "rows": len(df),
+        "columns": list(df.columns),
+        "price_dtype": str(df['Close'].dtype),
+        "data_mb": round(df.memory_usage(index=True, deep=False).sum() / 2 ** 20, 1),
+    }
+
+
+# ============ Strategy Methods ============
+
+def _as_float64(value):
+    if getattr(value, 'dtype', None) == np.float32:
+        return value.astype(np.float64)
+    return value
+
+
+def with_float64_indicators(strategy_class):
+    """strategy_class whose self.I() passes float32 arrays to func as float64 (talib requires double)"""
+
+    def I(self, func, *args, **kwargs):  # noqa: E743 - backtesting.py's name
+        args = [_as_float64(arg) for arg in args]
+        kwargs = {key: _as_float64(value) for key, value in kwargs.items()}
+        return strategy_class.I(self, func, *args, **kwargs)
+
+    return type(strategy_class.__name__, (strategy_class,), {
+        'I': I,
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+backtest_optimizer.py - Parallel parameter sweeps for run_backtest.py
+
+Driven by the optional `optimize` block in config.json:
+
+    "optimize": {
+        "params": {
+            "n1": {"min": 5, "max": 30, "step": 5},   # inclusive range
+            "n2": [20, 40, 60, 80]                    # explicit values
+        },
+        "constraint": "n1 < n2",        # optional expression over param names
+        "maximize": "sharpe_ratio",     # any extract_metrics() key
+        "maxTries": 500,                # optional, random subset of the grid
+        "topK": 10,                     # optional, results to return
+        "randomState": 42,              # optional, seed for maxTries sampling
+        "workers": 4                    # optional, defaults to CPU count
+    }
+
+With "search": "adaptive" the grid is searched by successive halving on
+data prefixes instead of run exhaustively (see backtest_search.py).
+
+The OHLCV columns and index are copied once into a multiprocessing
+shared_memory block; pool workers attach to it and build a zero-copy
+DataFrame instead of receiving a pickled copy per task. Each worker also
+compiles the user strategy once in its initializer. Results are collected as
+they finish, reporting `sweep` progress with the best combination so far.
+The summary's `workers` is the number of processes the sweep actually used:
+a worker mode pool process cannot fork and runs it serially (see
+pool_workers() in backtest_progress.py).
+"""
+
+import itertools
+import logging
+import math
+import multiprocessing
+import random
+from decimal import Decimal
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest_limits import ResourceLimitExceeded, enforce_bar_budget
+from backtest_progress import detach_worker, pool_workers, reporter
+from backtest_vectorized import create_backtest, select_engine
+from run_backtest import execute_user_code, extract_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OBJECTIVE = 'sharpe_ratio'
+DEFAULT_TOP_K = 10
+
+# Upper bound on combinations per pool task, so results (and progress) arrive while the sweep runs
+MAX_CHUNKSIZE = 4
+
+
+class SharedOHLCV:
+    """OHLCV float64 columns plus the int64 datetime index in one shared memory block"""
+
+    def __init__(self, shm, length, columns):
+        self.shm = shm
+        self.length = length
+        self.columns = list(columns)
+
+    @classmethod
+    def create(cls, df):
+        """Copy a DataFrame into a new shared memory block"""
+        length, width = len(df), len(df.columns)
+        shm = shared_memory.SharedMemory(create=True, size=max(8 * length * (width + 1), 1))
+        shared = cls(shm, length, df.columns)
+        values, index = shared._views()
+        values[:] = df.to_numpy(dtype=np.float64).T
+        index[:] = df.index.values.astype('datetime64[ns]').view(np.int64)  # asi8 is in the index's unit
+        return shared
+
+    @classmethod
+    def attach(cls, name, length, columns):
+        """Attach to a block created by another process"""
+        return cls(shared_memory.SharedMemory(name=name), length, columns)
+
+    def _views(self):
+        width = len(self.columns)
+        values = np.ndarray((width, self.length), dtype=np.float64, buffer=self.shm.buf)
+        index = np.ndarray((self.length,), dtype=np.int64, buffer=self.shm.buf,
+                           offset=8 * self.length * width)
+        return values, index
+
+    def descriptor(self):
+        """Picklable arguments for attach()"""
+        return self.shm.name, self.length, self.columns
+
+    def to_dataframe(self):
+        """Build a DataFrame backed by the shared buffer (no copy of the price data)"""
+        values, index = self._views()
+        return pd.DataFrame(values.T, columns=self.columns, index=pd.DatetimeIndex(index.view('datetime64[ns]')),
+                            copy=False)
+
+    def close(self):
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+def _decimals(number):
+    """Digits after the decimal point of number as written (0.25 -> 2)"""
+    return max(-Decimal(str(number)).as_tuple().exponent, 0)
+
+
+def _range_values(start, stop, step):
+    """
+    Inclusive {min, max, step} range
+
+    Each value is start + i * step rounded to the decimals of start and step,
+    so 0.1 steps give 0.3 rather than the 0.30000000000000004 accumulated
+    float error; integer ranges stay integers.
+    """
+    # Values are never above stop; the epsilon absorbs float error in (stop - start) / step
+    count = math.floor((stop - start) / step + 1e-9) + 1
+    if all(isinstance(v, int) for v in (start, stop, step)):
+        return [start + i * step for i in range(count)]
+    decimals = max(_decimals(start), _decimals(step))
+    return [round(start + i * step, decimals) for i in range(count)]
+
+
+def expand_param_grid(param_specs):
+    """
+    Expand the `params` block into {name: [values]}
+
+    Each spec is either an explicit list of values or an inclusive
+    {"min", "max", "step"} range.
+    """
+    if not isinstance(param_specs, dict) or not param_specs:
+        raise ValueError("optimize.params must be a non-empty object of parameter ranges")
+
+    grid = {}
+    for name, spec in param_specs.items():
+        if isinstance(spec, list):
+            values = spec
+        elif isinstance(spec, dict) and {'min', 'max'} <= spec.keys():
+            step = spec.get('step', 1)
+            if step <= 0:
+                raise ValueError(f"optimize.params.{name}.step must be positive")
+            values = _range_values(spec['min'], spec['max'], step)
+        else:
+            raise ValueError(
+                f"optimize.params.{name} must be a list of values or a {{min, max, step}} range"
+            )
+
+        if not values:
+            raise ValueError(f"optimize.params.{name} has no values")
+        grid[name] = values
+
+    return grid
+
+
+def compile_constraint(expression):
+    """Compile the constraint expression with RestrictedPython; returns a predicate over param dicts"""
+    if not expression:
+        return lambda params: True
+
+    from RestrictedPython import compile_restricted_eval
+
+    compiled = compile_restricted_eval(expression)
+    if compiled.errors:
+        raise ValueError("Invalid optimize.constraint: " + "; ".join(compiled.errors))
+
+    def predicate(params):
+        return bool(eval(compiled.code, {"__builtins__": {}}, dict(params)))
+
+    return predicate
+
+
+def build_candidates(grid, constraint=None, max_tries=None, random_state=None):
+    """Cartesian product of the grid filtered by the constraint, optionally randomly subsampled"""
+    predicate = compile_constraint(constraint)
+    names = list(grid)
+    candidates = [
+        params for params in (dict(zip(names, combo)) for combo in itertools.product(*grid.values()))
+        if predicate(params)
+    ]
+
+    if not candidates:
+        raise ValueError("optimize.constraint rejects every parameter combination")
+
+    if max_tries and len(candidates) > max_tries:
+        candidates = random.Random(random_state).sample(candidates, int(max_tries))
+
+    return candidates
+
+
+def objective_value(metrics, objective):
+    """Objective for ranking; missing/non-finite values rank last"""
+    value = metrics.get(objective)
+    return value if value is not None and math.isfinite(value) else -math.inf
+
+
+# ============ Pool Worker ============
+
+_worker_state = {}
+
+
+class PrefixBacktests:
+    """One Backtest per length of data prefix (the first `bars` rows of df), created on first use"""
+
+    def __init__(self, df, strategy_class, config, engine):
+        self.df = df
+        self.strategy_class = strategy_class
+        self.config = config
+        self.engine = engine
+        self.backtests = {}
+
+    def evaluate(self, task):
+        """Run one (params, bars) task"""
+        params, bars = task
+        if bars not in self.backtests:
+            df = self.df if bars >= len(self.df) else self.df.iloc[:bars]
+            self.backtests[bars] = create_backtest(df, self.strategy_class, self.config, self.engine)
+        return dict(_evaluate(params, self.backtests[bars]), bars=bars)
+
+
+def _init_worker(descriptor, strategy_code, config, engine):
+    """Pool initializer: attach the shared OHLCV block and compile the strategy once"""
+    logging.getLogger().setLevel(logging.WARNING)
+    detach_worker()
+    shared = SharedOHLCV.attach(*descriptor)
+    df = shared.to_dataframe()
+    strategy_class = enforce_bar_budget(execute_user_code(strategy_code))
+    _worker_state['shared'] = shared
+    _worker_state['bt'] = create_backtest(df, strategy_class, config, engine)
+    _worker_state['prefixes'] = PrefixBacktests(df, strategy_class, config, engine)
+
+
+def _evaluate(params, bt=None):
+    """Run one parameter combination (in a pool worker unless bt is given)"""
+    try:
+        stats = (bt or _worker_state['bt']).run(**params)
+        return {"params": params, "metrics": extract_metrics(stats)}
+    except (ResourceLimitExceeded, MemoryError):
+        raise  # Fails the whole run, not just this combination
+    except Exception as e:
+        return {"params": params, "error": str(e)}
+
+
+def _evaluate_prefix(task):
+    """Run one (params, bars) task in a pool worker"""
+    return _worker_state['prefixes'].evaluate(task)
+
+
+def _collect(outcomes, total, objective):
+    """Gather sweep results in candidate order, reporting progress and the best so far"""
+    counter = reporter.counter('sweep', total)
+    results = []
+    failed = 0
+    best, best_value = None, -math.inf
+    for result in outcomes:
+        results.append(result)
+        if 'metrics' not in result:
+            failed += 1
+        elif best is None or objective_value(result['metrics'], objective) > best_value:
+            best_value = objective_value(result['metrics'], objective)
+            best = {"params": result['params'], "value": result['metrics'].get(objective)}
+        counter.update(len(results), failed=failed, best=best)
+    return results
+
+
+# ============ Sweep ============
+
+def build_heatmap(results, names, objective):
+    """
+    Compact heatmap of the objective over the first two parameters.
+
+    Remaining parameters are aggregated with max, so every cell is the best
+    objective reachable at that (x, y) pair. With a single parameter the
+    matrix has one row.
+    """
+    x_name = names[0]
+    y_name = names[1] if len(names) > 1 else None
+
+    x_values = sorted({r['params'][x_name] for r in results})
+    y_values = sorted({r['params'][y_name] for r in results}) if y_name else [None]
+    x_pos = {v: i for i, v in enumerate(x_values)}
+    y_pos = {v: i for i, v in enumerate(y_values)}
+
+    matrix = [[None] * len(x_values) for _ in y_values]
+    for r in results:
+        value = objective_value(r.get('metrics', {}), objective)
+        if value == -math.inf:
+            continue
+        row = y_pos[r['params'][y_name]] if y_name else 0
+        col = x_pos[r['params'][x_name]]
+        if matrix[row][col] is None or value > matrix[row][col]:
+            matrix[row][col] = value
+
+    return {
+        "x_param": x_name,
+        "y_param": y_name,
+        "x_values": x_values,
+        "y_values": y_values if y_name else [],
+        "values": matrix,
+    }
+
+
+def succeeded_results(results, objective):
+    """Results that have metrics; raises when there are none or they lack the objective"""
+    succeeded = [r for r in results if 'metrics' in r]
+    if not succeeded:
+        raise ValueError(f"All {len(results)} optimization runs failed: {results[0]['error']}")
+
+    if objective not in succeeded[0]['metrics']:
+        raise ValueError(
+            f"Unknown optimize.maximize metric '{objective}'. "
+            f"Available: {', '.join(succeeded[0]['metrics'])}"
+        )
+    return succeeded
+
+
+def run_optimization(df, strategy_code, strategy_class, config):
+    """
+    Fan the optimize grid out over a process pool
+
+    Returns (best_params, optimization_summary).
+    """
+    spec = config['optimize']
+    objective = spec.get('maximize', DEFAULT_OBJECTIVE)
+    top_k = int(spec.get('topK', DEFAULT_TOP_K))
+
+    grid = expand_param_grid(spec.get('params'))
+    for name in grid:
+        if not hasattr(strategy_class, name):
+            raise ValueError(f"optimize.params.{name} is not an attribute of {strategy_class.__name__}")
+
+    if spec.get('search', 'grid') == 'adaptive':
+        from backtest_search import run_adaptive_search
+        return run_adaptive_search(df, strategy_code, strategy_class, config, grid)
+
+    candidates = build_candidates(
+        grid,
+        constraint=spec.get('constraint'),
+        max_tries=spec.get('maxTries'),
+        random_state=spec.get('randomState'),
+    )
+    workers = pool_workers(spec.get('workers'), len(candidates), 'Optimization')
+    engine = select_engine(strategy_class, config)
+    logger.info(f"Optimizing {len(candidates)} parameter combinations on {workers} workers ({engine} engine)")
+
+    if workers <= 1:
+        bt = create_backtest(df, strategy_class, config, engine)
+        results = _collect((_evaluate(params, bt) for params in candidates), len(candidates), objective)
+    else:
+        shared = SharedOHLCV.create(df)
+        try:
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(
+                processes=workers,
+                initializer=_init_worker,
+                initargs=(shared.descriptor(), strategy_code, config, engine),
+            ) as pool:
+                chunksize = max(1, min(len(candidates) // (workers * 8), MAX_CHUNKSIZE))
+                results = _collect(pool.imap(_evaluate, candidates, chunksize=chunksize),
+                                   len(candidates), objective)
+        finally:
+            shared.close()
+            shared.unlink()
+
+    succeeded = succeeded_results(results, objective)
+    ranked = sorted(succeeded, key=lambda r: objective_value(r['metrics'], objective), reverse=True)
+    best = ranked[0]
+
+    summary = {
+        "objective": objective,
+        "best_params": best['params'],
+        "best_value": best['metrics'].get(objective),
+        "evaluated": len(results),
+        "failed": len(results) - len(succeeded),
+        "workers": workers,
+        "top_results": ranked[:top_k],
+        "heatmap": build_heatmap(succeeded, list(grid), objective),
+    }
+    return best['params'], summary
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+backtest_portfolio.py - Multi-asset backtests with shared capital for run_backtest.py
+
+Enabled with the optional `portfolio` block in config.json:
+
+    "portfolio": {"assets": ["bitcoin", "ethereum", "solana"]}
+
+Each asset's candles are read from <tmp_dir>/assets/<asset>/ohlcv.bin, or
+from the candle store at its resolution when config.candleStore is set
+(its coinId is not used). They are aligned onto the union of the assets'
+timestamps as one (assets, bars) float64 array per column: a bar an asset
+is missing is flat at its previous close, and its prices are NaN before its
+first candle. The memory-mapped columns are copied straight into these
+arrays, so no per-asset DataFrame is built (50 assets x 100k bars is 40 MB
+per column).
+
+The strategy subclasses PortfolioStrategy and returns target weights for
+every bar at once:
+
+    class TopMomentum(PortfolioStrategy):
+        lookback = 30
+
+        def init(self):
+            close = self.data.Close                  # (assets, bars), rows in self.assets order
+            self.momentum = np.full(close.shape, np.nan)
+            self.momentum[:, self.lookback:] = close[:, self.lookback:] / close[:, :-self.lookback] - 1
+
+        def weights(self):
+            best = self.momentum == np.nanmax(self.momentum, axis=0)
+            return best / np.maximum(best.sum(axis=0), 1)
+
+weights()[:, i] is the fraction of equity to hold in each asset after bar
+i and may only use data up to bar i. Weights are long-only (>= 0) and sum
+to at most 1 per bar, the rest is held as cash; NaN counts as 0 and assets
+without a price yet are never bought. self.data holds read-only Open, High,
+Low, Close and Volume arrays plus the DatetimeIndex `index`.
+
+Whenever a bar's weights differ from the previous bar's, the portfolio is
+rebalanced to them at the next bar's open: equity is valued at that open,
+the estimated commission of the rebalance is set aside, and each asset is
+bought or sold in fractional units to its weight of the rest. Commission
+is config.commission of each trade's value, paid from the one cash
+balance. Between rebalances holdings drift with prices; equity is marked
+to the close.
+
+Metrics are computed from the portfolio equity like a single-asset run.
+Trades are per-asset holding periods, from the fill that opens a position
+to the fill that closes it (positions still open at the end are marked at
+the last close). The result has no HTML report and adds:
+
+    "portfolio": {
+        "assets": ["bitcoin", ...], "bars": 100000, "rebalances": 812,
+        "allocation": [{"asset": "bitcoin", "weight": 0.25, "pnl": 1250.5, "trades": 14}, ...]
+    }
+
+with each asset's weight of the final equity and its realized plus open PnL.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from backtest_cache import digest_file
+from backtest_progress import reporter
+from backtest_vectorized import summary_stats
+from ohlcv_store import COIN_ID_PATTERN, CandleStore, date_range_ms, map_ohlcv_file
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = 'assets'
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+COLUMNS = PRICE_COLUMNS + ('Volume',)
+
+# Slack for weights that sum to 1 up to floating point error
+WEIGHT_TOLERANCE = 1e-9
+
+# Bars per block when marking holdings to the close (bounds the temporary (bars, assets) array)
+EQUITY_CHUNK = 16_384
+
+
+def parse_portfolio(spec):
+    """Validate config.portfolio; returns the asset IDs"""
+    if not isinstance(spec, dict):
+        raise ValueError("portfolio must be an object with an assets list")
+    assets = spec.get('assets')
+    if not isinstance(assets, list) or not assets:
+        raise ValueError("portfolio.assets must be a non-empty list of asset IDs")
+    for asset in assets:
+        if not isinstance(asset, str) or not COIN_ID_PATTERN.match(asset):
+            raise ValueError(f"Invalid portfolio asset '{asset}'")
+    if len(set(assets)) != len(assets):
+        raise ValueError("portfolio.assets must not repeat an asset")
+    return assets
+
+
+class PortfolioStrategy:
+    """
+    Base class of portfolio strategies
+
+    init() prepares indicators from self.data; weights() returns the
+    (assets, bars) target weights. Class attributes are the parameters.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.assets = data.assets
+
+    def init(self):
+        pass
+
+    def weights(self):
+        raise NotImplementedError(f"{type(self).__name__} must define weights()")
+
+
+class PortfolioData:
+    """Aligned (assets, bars) OHLCV arrays of a portfolio"""
+
+    def __init__(self, assets, index, columns):
+        self.assets = list(assets)
+        self.index = index
+        for name, values in columns.items():
+            values.flags.writeable = False
+            setattr(self, name, values)
+
+    def __len__(self):
+        return len(self.index)
+
+
+# ============ Data ============
+
+def asset_path(tmp_dir, asset):
+    """<tmp_dir>/assets/<asset>/ohlcv.bin, which must exist"""
+    path = os.path.join(tmp_dir, ASSETS_DIR, asset, 'ohlcv.bin')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No candles for portfolio asset '{asset}' at {path}")
+    return path
+
+
+def load_asset(tmp_dir, config, asset):
+    """(int64 ns timestamps, {column: values}) of one asset, without building a DataFrame"""
+    source = config.get('candleStore')
+    if source:
+        df = CandleStore(source['path']).read(asset, source['resolution'], *date_range_ms(config))
+        return (df.index.values.astype('datetime64[ns]').view(np.int64),
+                {name: df[name].to_numpy() for name in df.columns})
+
+    timestamps, values, columns, unit = map_ohlcv_file(asset_path(tmp_dir, asset))
+    timestamps = timestamps.astype(f'datetime64[{unit}]').astype('datetime64[ns]').view(np.int64)
+    return timestamps, dict(zip(columns, values))
+
+
+def asset_input_digest(tmp_dir, config):
+    """Content digest of every asset's candles, for the result cache key"""
+    source = config.get('candleStore')
+    digests = []
+    for asset in parse_portfolio(config['portfolio']):
+        if source:
+            digests.append(CandleStore(source['path']).range_digest(asset, source['resolution'],
+                                                                    *date_range_ms(config)))
+        else:
+            digests.append(digest_file(asset_path(tmp_dir, asset)))
+    return hashlib.blake2b(json.dumps(digests).encode(), digest_size=20).hexdigest()
+
+
+def align_assets(assets, series):
+    """
+    Align per-asset (timestamps, columns) onto the union of their timestamps
+
+    Returns PortfolioData. Bars an asset is missing repeat its previous close
+    (with zero volume); before its first candle its prices are NaN.
+    """
+    stamps = [timestamps for timestamps, _ in series]
+    if all(np.array_equal(timestamps, stamps[0]) for timestamps in stamps[1:]):
+        index = np.asarray(stamps[0], dtype=np.int64)
+    else:
+        index = np.unique(np.concatenate(stamps))
+    length = len(index)
+    if length == 0:
+        raise ValueError("Portfolio assets have no candles")
+
+    arrays = {name: np.full((len(assets), length), np.nan) for name in PRICE_COLUMNS}
+    arrays['Volume'] = np.zeros((len(assets), length))
+    for row, (asset, (timestamps, columns)) in enumerate(zip(assets, series)):
+        missing = set(PRICE_COLUMNS) - set(columns)
+        if missing:
+            raise ValueError(f"Portfolio asset '{asset}' is missing columns: {', '.join(sorted(missing))}")
+        if len(timestamps) == 0:
+            raise ValueError(f"Portfolio asset '{asset}' has no candles")
+
+        positions = np.searchsorted(index, timestamps)
+        for name in COLUMNS:
+            if name in columns:
+                arrays[name][row, positions] = columns[name]
+        if len(positions) < length:
+            present = np.zeros(length, dtype=bool)
+            present[positions] = True
+            last = np.maximum.accumulate(np.where(present, np.arange(length), -1))
+            gaps = ~present & (last >= 0)
+            previous_close = arrays['Close'][row, last[gaps]]
+            for name in PRICE_COLUMNS:
+                arrays[name][row, gaps] = previous_close
+
+    return PortfolioData(assets, pd.DatetimeIndex(index.view('datetime64[ns]')), arrays)
+
+
+def load_portfolio_data(tmp_dir, config):
+    """PortfolioData of config.portfolio's assets"""
+    assets = parse_portfolio(config['portfolio'])
+    data = align_assets(assets, [load_asset(tmp_dir, config, asset) for asset in assets])
+    logger.info(f"Aligned {len(assets)} assets onto {len(data)} bars")
+    return data
+
+
+# ============ Simulation ============
+
+def weight_matrix(strategy):
+    """Call strategy.weights() and validate it as (assets, bars) long-only allocations"""
+    close = strategy.data.Close
+    weights = np.array(strategy.weights(), dtype=np.float64)
+    if weights.shape != close.shape:
+        raise ValueError(f"weights() must return one row per asset and one column per bar {close.shape}, "
+                         f"got shape {weights.shape}")
+    weights = np.nan_to_num(weights, nan=0.0, posinf=np.inf, neginf=-np.inf)
+    if (weights < -WEIGHT_TOLERANCE).any():
+        raise ValueError("weights() must not be negative: portfolios are long-only")
+    if (weights.sum(axis=0) > 1 + WEIGHT_TOLERANCE).any():
+        raise ValueError("weights() of each bar must sum to at most 1")
+    weights[np.isnan(close)] = 0.0
+    return np.maximum(weights, 0.0)
+
+
+def simulate_portfolio(open_, close, weights, cash, commission):
+    """
+    Rebalance to changed target weights at the next bar's open
+
+    The loop runs once per rebalance over asset vectors and only records
+    the holdings; equity and holding periods are computed from that history
+    afterwards. Returns (equity, trades, rebalances, units) with trades as
+    per-asset holding period arrays and units the holdings at the end.
+    """
+    assets, length = close.shape
+    changed = np.concatenate(([weights[:, 0].any()], np.any(weights[:, 1:] != weights[:, :-1], axis=0)))
+    signals = np.flatnonzero(changed[:-1])  # Weights of the last bar have no next open to fill at
+    fills = signals + 1
+
+    # Contiguous rows per rebalance; prices are NaN only where nothing is held or bought
+    targets = np.ascontiguousarray(weights[:, signals].T)
+    prices = np.nan_to_num(open_[:, fills].T)
+    holdings = np.zeros((len(signals) + 1, assets))  # Row 0: before the first fill
+    balances = np.full(len(signals) + 1, float(cash))
+
+    counter = reporter.counter('rebalances', len(signals))
+    units = holdings[0]
+    cash = float(cash)
+    for k in range(len(signals)):
+        price = prices[k]
+        value = cash + units @ price
+        # Weights apply to equity net of the rebalance's estimated commission
+        target = targets[k] * value
+        if value > 0:
+            target *= max(1 - commission * np.abs(target - units * price).sum() / value, 0.0)
+        new_units = np.divide(target, price, out=holdings[k + 1], where=target > 0)
+        traded = (new_units - units) * price
+        cash -= traded.sum() + commission * np.abs(traded).sum()
+        balances[k + 1] = cash
+        units = new_units
+        if k % 1024 == 0:
+            counter.update(k)
+    counter.update(len(signals))
+
+    equity = _equity_curve(close, fills, holdings, balances)
+    trades = _holding_periods(close, fills, holdings, prices, commission)
+    return equity, trades, len(signals), units
+
+
+def _equity_curve(close, fills, holdings, balances):
+    """Cash plus holdings marked to the close at every bar, in chunks of EQUITY_CHUNK bars"""
+    length = close.shape[1]
+    segment = np.searchsorted(fills, np.arange(length), side='right')  # Row of holdings at each bar
+    equity = balances[segment]
+    held = np.flatnonzero(holdings.any(axis=0))
+    for start in range(0, length, EQUITY_CHUNK):
+        stop = min(start + EQUITY_CHUNK, length)
+        units = holdings[segment[start:stop]][:, held]
+        equity[start:stop] += np.einsum('at,ta->t', np.nan_to_num(close[held, start:stop]), units)
+    return equity
+
+
+def _holding_periods(close, fills, holdings, prices, commission):
+    """
+    Per-asset holding periods from the holdings history, as trade arrays
+
+    Each period runs from the fill that opens a position to the one that
+    closes it; cost includes buy commission and proceeds are net of sell
+    commission. Periods still open are closed at the last close.
+    """
+    before, after = holdings[:-1], holdings[1:]
+    delta = after - before
+    traded = delta * prices
+    opened = (before == 0) & (after > 0)
+    exited = (before > 0) & (after == 0)
+
+    # Number every period: per asset in fill order, assets one after another
+    counts = opened.sum(axis=0)
+    period = np.cumsum(opened, axis=0) - 1 + np.concatenate(([0], np.cumsum(counts)[:-1]))
+    active = (delta != 0) & (period >= 0)
+    total = int(counts.sum())
+
+    def per_period(values):
+        return np.bincount(period[active], weights=values[active], minlength=total)
+
+    rows, columns = np.nonzero(opened)
+    entry_bar = np.empty(total, dtype=np.int64)
+    entry_bar[period[rows, columns]] = fills[rows]
+    exit_bar = np.full(total, close.shape[1] - 1, dtype=np.int64)
+    rows, columns = np.nonzero(exited)
+    exit_bar[period[rows, columns]] = fills[rows]
+
+    trades = {
+        'asset': np.repeat(np.arange(holdings.shape[1]), counts),
+        'entry_bar': entry_bar,
+        'exit_bar': exit_bar,
+        'bought': per_period(np.maximum(delta, 0.0)),
+        'sold': per_period(np.maximum(-delta, 0.0)),
+        'cost': per_period(np.maximum(traded, 0.0) * (1 + commission)),
+        'proceeds': per_period(np.maximum(-traded, 0.0) * (1 - commission)),
+    }
+
+    # Positions still open are marked at the last close
+    still_open = np.flatnonzero(holdings[-1])
+    last_period = period[-1, still_open]
+    trades['sold'][last_period] += holdings[-1, still_open]
+    trades['proceeds'][last_period] += holdings[-1, still_open] * close[still_open, -1]
+    return trades
+
+
+def portfolio_stats(data, trades, equity):
+    """summary_stats() of the portfolio plus _trades (one row per holding period, in exit order)"""
+    order = np.lexsort((trades['entry_bar'], trades['exit_bar']))
+    trades = {name: values[order] for name, values in trades.items()}
+    pl = trades['proceeds'] - trades['cost']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = pl / trades['cost']
+        entry_prices = trades['cost'] / trades['bought']
+        exit_prices = trades['proceeds'] / trades['sold']
+
+    # Equal-weight basket held from each asset's first candle
+    close = data.Close
+    first = close[np.arange(len(close)), np.argmax(~np.isnan(close), axis=1)]
+    buy_and_hold = np.nanmean(close[:, -1] / first - 1) * 100
+
+    stats = summary_stats(data.index, equity, pl, returns, buy_and_hold)
+    index = data.index
+    stats.loc['_trades'] = pd.DataFrame({
+        'Asset': np.asarray(data.assets, dtype=object)[trades['asset']],
+        'Size': trades['bought'],
+        'EntryBar': trades['entry_bar'],
+        'ExitBar': trades['exit_bar'],
+        'EntryPrice': entry_prices,
+        'ExitPrice': exit_prices,
+        'PnL': pl,
+        'ReturnPct': returns,
+        'EntryTime': index[trades['entry_bar']],
+        'ExitTime': index[trades['exit_bar']],
+        'Duration': index[trades['exit_bar']] - index[trades['entry_bar']],
+    })
+    return stats
+
+
+def allocation(data, trades, units, equity):
+    """Final weight, PnL and holding periods per asset"""
+    values = units * np.nan_to_num(data.Close[:, -1])
+    pnl = np.bincount(trades['asset'], weights=trades['proceeds'] - trades['cost'], minlength=len(data.assets))
+    counts = np.bincount(trades['asset'], minlength=len(data.assets))
+    return [
+        {"asset": asset, "weight": float(values[row] / equity[-1]) if equity[-1] else 0.0,
+         "pnl": float(pnl[row]), "trades": int(counts[row])}
+        for row, asset in enumerate(data.assets)
+    ]
+
+
+def run_portfolio(data, strategy_class, config):
+    """
+    Run a PortfolioStrategy over aligned portfolio data
+
+    Returns (stats, portfolio_summary); stats is shaped like a Backtest.run()
+    result, so extract_metrics(), series and robustness work on it.
+    """
+    strategy = strategy_class(data)
+    with reporter.stage('init'):
+        strategy.init()
+        weights = weight_matrix(strategy)
+
+    with reporter.stage('simulate'):
+        equity, trades, rebalances, units = simulate_portfolio(
+            data.Open, data.Close, weights, config['initialCapital'], config['commission'])
+    logger.info(f"Simulated {len(data.assets)} assets over {len(data)} bars with {rebalances} rebalances")
+
+    stats = portfolio_stats(data, trades, equity)
+    summary = {
+        "assets": data.assets,
+        "bars": len(data),
+        "rebalances": rebalances,
+        "allocation": allocation(data, trades, units, equity),
+    }
+    return stats, summary
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+backtest_profile.py - Stage timing and strategy hotspot sampling for run_backtest.py
+
+Enabled with the optional `profile` field in config.json:
+
+    "profile": true      # wall/CPU time and peak memory per pipeline stage
+    "profile": "deep"    # plus a sampling profile of the strategy's init()/next()
+
+The result then carries
+
+    "profile": {
+        "stages": [{"stage": "simulate", "wall": 1.92, "cpu": 1.9, "peak_rss_mb": 212.4}, ...],
+        "total": {"wall": 2.61, "cpu": 2.55, "max_rss_mb": 231.0},
+        "hotspots": {                                              # deep only
+            "interval_ms": 1.0, "samples": 1890, "strategy_samples": 1210,
+            "lines": [{"line": 14, "function": "next", "code": "if crossover(self.a, self.b):",
+                       "samples": 610, "percent": 32.3}, ...]
+        }
+    }
+
+Stages are the ones reported as progress events (backtest_progress.py).
+Stage CPU time includes sweep/fold pool workers, which have exited by the
+end of their stage. peak_rss_mb is the resident-set high-water mark within
+the stage where Linux allows resetting it, otherwise the process peak so far.
+
+Deep mode samples the main process with a SIGPROF CPU timer and charges each
+sample to the innermost frame of the user strategy, so time spent inside a
+talib or numpy call counts against the strategy.py line that made it.
+Sweep and fold pool workers are not sampled.
+"""
+
+import resource
+import signal
+import time
+from collections import Counter
+
+PROFILE_MODES = (False, True, 'deep')
+
+# SIGPROF interval (seconds of process CPU time) for deep mode
+SAMPLE_INTERVAL = 0.001
+TOP_HOTSPOTS = 10
+
+# Filename compile_strategy() gives the user code
+STRATEGY_FILENAME = '<strategy>'
+
+
+def _cpu_time():
+    """CPU seconds of this process plus its exited children"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def _reset_peak_rss():
+    """Reset the kernel's resident-set high-water mark (Linux only)"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Resident-set high-water mark in MB (since the last reset where Linux allows it)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class HotspotSampler:
+    """Statistical profiler counting samples per user strategy line"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.lines = Counter()
+        self._previous_handler = None
+
+    def _sample(self, signum, frame):
+        self.samples += 1
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == STRATEGY_FILENAME:
+                self.lines[(frame.f_lineno, code.co_name)] += 1
+                return
+            frame = frame.f_back
+
+    def start(self):
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        if self._previous_handler is not None:
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._previous_handler = None
+
+    def summary(self, strategy_code, top=TOP_HOTSPOTS):
+        source = strategy_code.splitlines()
+        strategy_samples = sum(self.lines.values())
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "strategy_samples": strategy_samples,
+            "lines": [
+                {
+                    "line": line,
+                    "function": function,
+                    "code": source[line - 1].strip() if 0 < line <= len(source) else None,
+                    "samples": samples,
+                    "percent": round(samples / self.samples * 100, 1),
+                }
+                for (line, function), samples in self.lines.most_common(top)
+            ],
+        }
+
+
+class StageProfile:
+    """Wall/CPU time and peak memory per stage, recorded through reporter.stage()"""
+
+    def __init__(self, deep=False):
+        self.stages = []
+        self.started = (time.perf_counter(), _cpu_time())
+        self.sampler = HotspotSampler() if deep else None
+        if self.sampler is not None:
+            self.sampler.start()
+
+    @classmethod
+    def for_mode(cls, mode):
+        """A running profile for a (validated) config.profile, or None when profiling is off"""
+        return cls(deep=mode == 'deep') if mode else None
+
+    def begin(self):
+        _reset_peak_rss()
+        return time.perf_counter(), _cpu_time()
+
+    def end(self, name, mark):
+        wall, cpu = mark
+        self.stages.append({
+            "stage": name,
+            "wall": round(time.perf_counter() - wall, 4),
+            "cpu": round(_cpu_time() - cpu, 4),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        })
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+
+    def summary(self, strategy_code):
+        self.stop()
+        wall, cpu = self.started
+        summary = {
+            "stages": self.stages,
+            "total": {
+                "wall": round(time.perf_counter() - wall, 4),
+                "cpu": round(_cpu_time() - cpu, 4),
+                "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            },
+        }
+        if self.sampler is not None:
+            summary["hotspots"] = self.sampler.summary(strategy_code)
+        return summary
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+backtest_progress.py - Streaming progress events and cancellation for run_backtest.py
+
+Enabled with `run_backtest.py <tmp_dir> --progress` (or "progress": true in a
+worker job). Events are JSON lines written to stdout ahead of the final
+result line:
+
+    {"event": "stage", "stage": "simulate", "status": "started"}
+    {"event": "bars", "completed": 4200, "total": 8760, "equity": 10450.2, "elapsed": 0.9, "eta": 1.0}
+    {"event": "sweep", "completed": 120, "total": 500, "failed": 0,
+     "best": {"params": {...}, "value": 1.4}, "elapsed": 3.1, "eta": 9.8}
+    {"event": "folds", "completed": 3, "total": 8, "failed": 0, "elapsed": 12.0, "eta": 20.0}
+    {"event": "simulations", "completed": 2000, "total": 5000, "elapsed": 0.2, "eta": 0.3}
+    {"event": "stage", "stage": "simulate", "status": "finished", "elapsed": 1.93}
+
+Counter events (bars, sweep, folds, simulations) are throttled to one per
+PROGRESS_INTERVAL seconds; the last update of a loop is always written.
+
+SIGTERM/SIGINT raise BacktestCancelled in the running pipeline. Instead of
+the result, the run then returns
+
+    {"cancelled": true, "reason": "SIGTERM", "stage": "optimize", "partial": {"sweep": {...}}}
+
+where `partial` holds the latest state of every counter, e.g. the best
+sweep combination found so far.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two events of the same counter
+PROGRESS_INTERVAL = 0.5
+
+CANCEL_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class BacktestCancelled(BaseException):
+    """
+    Raised from the signal handler when a run is cancelled
+
+    A BaseException (like KeyboardInterrupt) so the per-combination and
+    per-fold `except Exception` handlers do not swallow it.
+    """
+
+
+class ProgressCounter:
+    """Completed/total counter with elapsed time and ETA, throttled when emitted"""
+
+    def __init__(self, reporter, event, total):
+        self.reporter = reporter
+        self.event = event
+        self.total = total
+        self.completed = 0
+        self.fields = {}
+        self._origin = None
+        self._last_emit = -float('inf')
+
+    @property
+    def started(self):
+        return self._origin is not None
+
+    def update(self, completed, **fields):
+        now = time.perf_counter()
+        if self._origin is None:
+            self._origin = (now, completed)
+        self.completed = completed
+        self.fields = fields
+        if completed >= self.total or now - self._last_emit >= self.reporter.interval:
+            self._last_emit = now
+            self.reporter.emit(self.snapshot(now))
+
+    def snapshot(self, now=None):
+        now = time.perf_counter() if now is None else now
+        started, first = self._origin or (now, 0)
+        elapsed = now - started
+        # Rate over the counts seen since the first update (bars start after the warmup)
+        done = self.completed - first
+        eta = (self.total - self.completed) * elapsed / done if done > 0 else None
+        return {
+            "event": self.event,
+            "completed": self.completed,
+            "total": self.total,
+            **self.fields,
+            "elapsed": round(elapsed, 3),
+            "eta": None if eta is None else round(eta, 3),
+        }
+
+
+class ProgressReporter:
+    """
+    Per-process progress state
+
+    Counters are tracked even when no writer is configured so a cancelled
+    run can still report its partial state.
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.profile = None  # StageProfile of the current run (backtest_profile.py)
+        self.configure(None)
+
+    def configure(self, write):
+        """Start a run; write(message_dict) receives events, None disables them"""
+        self.write = write
+        self.stage_name = None
+        self.counters = {}
+
+    @property
+    def enabled(self):
+        return self.write is not None
+
+    def emit(self, message):
+        if self.write is not None:
+            self.write(message)
+
+    @contextmanager
+    def stage(self, name):
+        """Emit stage started/finished events around a pipeline step (and profile it)"""
+        outer = self.stage_name
+        self.stage_name = name
+        started = time.perf_counter()
+        self.emit({"event": "stage", "stage": name, "status": "started"})
+        mark = self.profile.begin() if self.profile is not None else None
+        yield
+        if mark is not None:
+            self.profile.end(name, mark)
+        # Left unset on errors and cancellation so the failing stage is reported
+        self.emit({"event": "stage", "stage": name, "status": "finished",
+                   "elapsed": round(time.perf_counter() - started, 3)})
+        self.stage_name = outer
+
+    def counter(self, event, total):
+        """A fresh counter for one loop; replaces the previous counter of that event"""
+        counter = ProgressCounter(self, event, total)
+        self.counters[event] = counter
+        return counter
+
+    def cancelled_result(self, reason):
+        """Result returned instead of the backtest result when the run is cancelled"""
+        return {
+            "cancelled": True,
+            "reason": reason,
+            "stage": self.stage_name,
+            "partial": {event: counter.snapshot() for event, counter in self.counters.items() if counter.started},
+        }
+
+
+reporter = ProgressReporter()
+
+
+def track_bars(strategy_class, total):
+    """
+    Subclass strategy_class so every next() reports bar progress and equity
+
+    Returns strategy_class unchanged when events are disabled, so runs
+    without --progress pay nothing per bar.
+    """
+    if not reporter.enabled:
+        return strategy_class
+
+    counter = reporter.counter('bars', total)
+    user_next = strategy_class.next
+
+    def next(self):
+        user_next(self)
+        counter.update(len(self.data), equity=self.equity)
+
+    return type(strategy_class.__name__, (strategy_class,), {
+        'next': next,
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
+
+
+# ============ Cancellation ============
+
+def _raise_cancelled(signum, frame):
+    raise BacktestCancelled(signal.Signals(signum).name)
+
+
+@contextmanager
+def cancellable():
+    """Turn SIGTERM/SIGINT into BacktestCancelled for the duration of the block"""
+    previous = {signum: signal.signal(signum, _raise_cancelled) for signum in CANCEL_SIGNALS}
+    try:
+        yield
+    finally:
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+
+
+def pool_workers(requested, tasks, name):
+    """
+    Processes a sweep (optimize, walk-forward folds, simulations) fans out to
+
+    `requested` (default: CPU count), at most one per task. A daemonic pool
+    process (a worker mode child) cannot fork a pool of its own, so there the
+    sweep runs serially and says so; callers report the returned count.
+    """
+    workers = min(int(requested or os.cpu_count() or 1), tasks)
+    if workers > 1 and multiprocessing.current_process().daemon:
+        logger.warning(f"{name} runs serially in a worker pool process instead of on {workers} workers; "
+                       f"run it as a one-shot process to fan out")
+        return 1
+    return workers
+
+
+def detach_worker():
+    """
+    Pool initializer hook: forked children neither write events nor handle
+    cancellation; the parent reports progress and terminates the pool
+    """
+    reporter.configure(None)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
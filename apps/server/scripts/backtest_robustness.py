@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+backtest_robustness.py - Monte Carlo robustness analysis for run_backtest.py
+
+Driven by the optional `robustness` block in config.json:
+
+    "robustness": {
+        "simulations": 5000,      # optional, resampled trade sequences (default 2000)
+        "method": "bootstrap",    # optional, "bootstrap" (with replacement) or "shuffle" (reorder)
+        "confidence": 0.95,       # optional, width of the reported intervals
+        "ruin": 50,               # optional, drawdown [%] that counts as ruin
+        "seed": 42,               # optional, makes the simulations reproducible (and cacheable)
+        "timeBudget": 10,         # optional, seconds; stops early and reports what ran
+        "workers": 4              # optional, defaults to CPU count
+    }
+
+Each closed trade of the final run becomes a return on the equity it was
+opened with (PnL / equity before its entry bar). A simulation compounds a
+resampled sequence of those returns from the initial capital: "bootstrap"
+draws len(trades) returns with replacement, "shuffle" only reorders them (so
+every path ends at the same return and only the drawdown varies). The
+result carries
+
+    "robustness": {
+        "method": "bootstrap", "simulations": 5000, "requested": 5000, "trades": 59,
+        "confidence": 0.95, "seed": 42, "workers": 4, "truncated": false, "elapsed": 0.41,
+        "total_return": {"observed": 12.4, "median": 11.9, "lower": -18.2, "upper": 48.0},
+        "max_drawdown": {"observed": -21.5, "median": -24.8, "lower": -41.7, "upper": -13.0},
+        "probability_of_loss": 23.1, "ruin_threshold": 50, "risk_of_ruin": 1.4
+    }
+
+with returns and drawdowns in percent like the metrics. Drawdowns are
+measured between trades, so they do not include the swings while a trade is
+open and can be shallower than metrics.max_drawdown.
+
+Simulations run in fixed-size batches of whole paths as NumPy matrices,
+spread over a fork pool. Batch k always draws from the k-th child of the
+seed's SeedSequence, so a seeded run gives the same result on any number of
+workers as long as it finishes within its time budget. An unseeded run draws
+fresh paths every time, so run_backtest.py does not serve or store it in the
+result cache. Completed batches are reported as `simulations` progress events.
+"""
+
+import logging
+import multiprocessing
+import time
+
+import numpy as np
+
+from backtest_progress import detach_worker, pool_workers, reporter
+from run_backtest import _finite_or_none
+
+logger = logging.getLogger(__name__)
+
+METHODS = ('bootstrap', 'shuffle')
+
+DEFAULT_SIMULATIONS = 2000
+MAX_SIMULATIONS = 1_000_000
+DEFAULT_CONFIDENCE = 0.95
+DEFAULT_RUIN = 50
+DEFAULT_TIME_BUDGET = 10
+
+# Matrix elements (simulations x trades) per batch, bounding the memory of one batch
+BATCH_ELEMENTS = 1_000_000
+
+# Fewer trades than this have nothing to resample
+MIN_TRADES = 2
+
+
+def parse_robustness(spec):
+    """Validate the `robustness` block; returns it with defaults filled in"""
+    if spec is True:
+        spec = {}
+    if not isinstance(spec, dict):
+        raise ValueError("robustness must be true or an object")
+
+    simulations = spec.get('simulations', DEFAULT_SIMULATIONS)
+    if not isinstance(simulations, int) or not 0 < simulations <= MAX_SIMULATIONS:
+        raise ValueError(f"robustness.simulations must be an integer between 1 and {MAX_SIMULATIONS}")
+
+    method = spec.get('method', 'bootstrap')
+    if method not in METHODS:
+        raise ValueError(f"Invalid robustness.method '{method}'. Expected one of: {', '.join(METHODS)}")
+
+    confidence = spec.get('confidence', DEFAULT_CONFIDENCE)
+    if not isinstance(confidence, (int, float)) or not 0 < confidence < 1:
+        raise ValueError("robustness.confidence must be between 0 and 1")
+
+    ruin = spec.get('ruin', DEFAULT_RUIN)
+    if not isinstance(ruin, (int, float)) or not 0 < ruin <= 100:
+        raise ValueError("robustness.ruin must be a drawdown percentage between 0 and 100")
+
+    time_budget = spec.get('timeBudget', DEFAULT_TIME_BUDGET)
+    if not isinstance(time_budget, (int, float)) or time_budget <= 0:
+        raise ValueError("robustness.timeBudget must be a positive number of seconds")
+
+    seed = spec.get('seed')
+    if seed is not None and (not isinstance(seed, int) or seed < 0):
+        raise ValueError("robustness.seed must be a non-negative integer")
+
+    workers = spec.get('workers')
+    if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+        raise ValueError("robustness.workers must be a positive integer")
+
+    return {
+        "simulations": simulations,
+        "method": method,
+        "confidence": confidence,
+        "ruin": ruin,
+        "timeBudget": time_budget,
+        "seed": seed,
+        "workers": workers,
+    }
+
+
+def trade_returns(stats):
+    """Closed trade returns on equity in exit order: PnL / equity before the entry bar"""
+    trades = stats['_trades']
+    if trades.empty:
+        return np.empty(0)
+    trades = trades.sort_values('ExitBar', kind='stable')
+    equity = stats['_equity_curve']['Equity'].to_numpy(dtype=np.float64)
+    entry_equity = equity[np.maximum(trades['EntryBar'].to_numpy(dtype=np.int64) - 1, 0)]
+    # A trade cannot take the account below zero; deeper losses (leverage) count as ruin
+    return np.maximum(trades['PnL'].to_numpy(dtype=np.float64) / entry_equity, -1.0)
+
+
+def simulate_paths(returns, method, size, rng):
+    """Resample `size` trade sequences at once; returns path_statistics() of them"""
+    n = len(returns)
+    if method == 'bootstrap':
+        paths = returns[rng.integers(0, n, (size, n))]
+    else:
+        paths = rng.permuted(np.tile(returns, (size, 1)), axis=1)
+    return path_statistics(paths)
+
+
+def path_statistics(paths):
+    """
+    Compound each row of trade returns from an equity of 1
+
+    Returns (total_returns, max_drawdowns) as fractions, one per path;
+    drawdowns are negative like Max. Drawdown [%].
+    """
+    with np.errstate(divide='ignore'):
+        log_equity = np.cumsum(np.log1p(paths), axis=1)
+    # Peaks include the starting equity (log 1 = 0)
+    peaks = np.maximum(np.maximum.accumulate(log_equity, axis=1), 0.0)
+    with np.errstate(invalid='ignore'):
+        max_drawdowns = np.expm1((log_equity - peaks).min(axis=1))
+    return np.expm1(log_equity[:, -1]), max_drawdowns
+
+
+def batch_sizes(simulations, trades):
+    """Split the simulations into batches of at most BATCH_ELEMENTS matrix elements"""
+    batch = max(1, min(simulations, BATCH_ELEMENTS // trades))
+    sizes = [batch] * (simulations // batch)
+    if simulations % batch:
+        sizes.append(simulations % batch)
+    return sizes
+
+
+def _interval(values, observed, confidence):
+    """Observed value, median and central confidence interval of a simulated fraction, in percent"""
+    tail = (1 - confidence) / 2
+    lower, median, upper = np.quantile(values, [tail, 0.5, 1 - tail]) * 100
+    return {
+        "observed": _finite_or_none(observed * 100),
+        "median": _finite_or_none(median),
+        "lower": _finite_or_none(lower),
+        "upper": _finite_or_none(upper),
+    }
+
+
+# ============ Pool Worker ============
+
+_robustness_state = {}
+
+
+def _quiet_worker():
+    logging.getLogger().setLevel(logging.WARNING)
+    detach_worker()
+
+
+def _run_batch(index):
+    """Simulate batch `index` from its own seed; None once the time budget is spent"""
+    state = _robustness_state
+    # The first batch always runs so every analysis has a result
+    if index and time.monotonic() > state['deadline']:
+        return None
+    # The index-th child of the run's SeedSequence, without spawning all of them up front
+    rng = np.random.default_rng(np.random.SeedSequence(state['entropy'], spawn_key=(index,)))
+    return simulate_paths(state['returns'], state['method'], state['sizes'][index], rng)
+
+
+def _collect(outcomes, total):
+    """Gather batches in order until the first one skipped for time, reporting progress"""
+    counter = reporter.counter('simulations', total)
+    batches = []
+    done = 0
+    for batch in outcomes:
+        if batch is None:
+            break
+        batches.append(batch)
+        done += len(batch[0])
+        counter.update(done)
+    return batches
+
+
+# ============ Analysis ============
+
+def run_robustness(stats, config):
+    """Monte Carlo confidence intervals for the trades of a finished run"""
+    spec = parse_robustness(config['robustness'])
+    returns = trade_returns(stats)
+    summary = {
+        "method": spec['method'],
+        "simulations": 0,
+        "requested": spec['simulations'],
+        "trades": len(returns),
+        "confidence": spec['confidence'],
+        "seed": spec['seed'],
+        "workers": 0,
+        "truncated": False,
+        "elapsed": 0.0,
+        "total_return": None,
+        "max_drawdown": None,
+        "probability_of_loss": None,
+        "ruin_threshold": spec['ruin'],
+        "risk_of_ruin": None,
+    }
+    if len(returns) < MIN_TRADES:
+        logger.info(f"Skipping robustness analysis: {len(returns)} closed trades")
+        return summary
+
+    started = time.monotonic()
+    sizes = batch_sizes(spec['simulations'], len(returns))
+    _robustness_state.update(
+        returns=returns, method=spec['method'], sizes=sizes,
+        entropy=np.random.SeedSequence(spec['seed']).entropy,
+        deadline=started + spec['timeBudget'],
+    )
+    workers = pool_workers(spec['workers'], len(sizes), 'Robustness analysis')
+    logger.info(f"Running {spec['simulations']} {spec['method']} simulations of {len(returns)} trades "
+                f"in {len(sizes)} batches on {workers} workers")
+
+    try:
+        if workers <= 1:
+            batches = _collect((_run_batch(i) for i in range(len(sizes))), spec['simulations'])
+        else:
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(processes=workers, initializer=_quiet_worker) as pool:
+                batches = _collect(pool.imap(_run_batch, range(len(sizes))), spec['simulations'])
+    finally:
+        _robustness_state.clear()
+
+    total_returns = np.concatenate([batch[0] for batch in batches])
+    max_drawdowns = np.concatenate([batch[1] for batch in batches])
+    observed_returns, observed_drawdowns = path_statistics(returns[None, :])
+
+    summary.update(
+        simulations=len(total_returns),
+        workers=workers,
+        truncated=len(total_returns) < spec['simulations'],
+        elapsed=round(time.monotonic() - started, 3),
+        total_return=_interval(total_returns, observed_returns[0], spec['confidence']),
+        max_drawdown=_interval(max_drawdowns, observed_drawdowns[0], spec['confidence']),
+        probability_of_loss=_finite_or_none(np.mean(total_returns < 0) * 100),
+        risk_of_ruin=_finite_or_none(np.mean(max_drawdowns <= -spec['ruin'] / 100) * 100),
+    )
+    if summary['truncated']:
+        logger.warning(f"Robustness time budget of {spec['timeBudget']}s reached after "
+                       f"{summary['simulations']} of {spec['simulations']} simulations")
+    return summary
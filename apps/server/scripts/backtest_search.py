@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+backtest_search.py - Adaptive parameter search for backtest_optimizer.py
+
+Selected with "search": "adaptive" in the `optimize` block:
+
+    "optimize": {
+        "params": {
+            "rsi_period": {"min": 5, "max": 30},
+            "rsi_lower": {"min": 10, "max": 40, "step": 5},
+            "rsi_upper": {"min": 60, "max": 90, "step": 5}
+        },
+        "constraint": "rsi_lower < rsi_upper",
+        "maximize": "sharpe_ratio",
+        "search": "adaptive",
+        "proposal": "tpe",       # optional, "tpe" (default) or "random"
+        "budget": 40,            # optional, in full-length backtests (default 10% of the grid)
+        "timeBudget": 120,       # optional, seconds; stops early and returns the best so far
+        "eta": 3,                # optional, 1 in eta candidates of a rung is promoted
+        "minFraction": 0.1,      # optional, shortest data prefix as a share of the bars
+        "randomState": 42,       # optional, makes the search reproducible
+        "workers": 4             # optional, defaults to CPU count
+    }
+
+The search runs in rounds of successive halving. A round proposes eta^k
+untried grid combinations (k + 1 rungs, k from minFraction), runs them on
+the first eta^-k of the bars and promotes the best 1/eta to a prefix eta
+times longer, up to the full data. Candidates that fail, stop trading or
+score poorly early are dropped without paying for the longer runs, so a
+round of eta^k candidates costs about k + 1 full-length backtests. Rungs
+compare candidates on the same bars only.
+
+"random" draws untried combinations the constraint accepts uniformly.
+"tpe" (tree-structured Parzen estimator) does so for the first TPE_STARTUP
+candidates, then draws each parameter from the values the best quarter of
+the tried candidates used (ranked by the longest prefix they reached, then
+their score on it) and keeps the draw most likely under them relative to
+the rest.
+
+Rounds run until the budget is spent (counted in full-length backtests, so
+a run on a third of the bars costs 1/3), the time budget runs out, or every
+combination has been tried. Rungs run on the optimizer's fork pool, in
+candidate order; with a randomState a search that is not cut short by
+timeBudget gives the same result on any number of workers.
+
+The optimization summary is the grid one, with best_params and top_results
+ranked by longest prefix reached and then score (each result has its
+"bars") and the heatmap over the full-length runs, plus
+
+    "search": {"method": "adaptive", "proposal": "tpe", "rungs": [0.1111, 0.3333, 1.0], "rounds": 13,
+               "candidates": 117, "grid_size": 2548, "budget": 40, "cost": 39.2, "stopped": "budget",
+               "elapsed": 6.1},
+    "trace": [{"round": 0, "rung": 0, "bars": 972, "params": {...}, "value": 0.42}, ...]
+
+where "stopped" is "budget", "time" or "exhausted", and the trace lists
+every run in order with its objective value (or "error").
+"""
+
+import contextlib
+import itertools
+import logging
+import math
+import multiprocessing
+import numbers
+import random
+import time
+
+from backtest_optimizer import (
+    DEFAULT_OBJECTIVE,
+    DEFAULT_TOP_K,
+    PrefixBacktests,
+    SharedOHLCV,
+    _evaluate_prefix,
+    _init_worker,
+    build_heatmap,
+    compile_constraint,
+    objective_value,
+    succeeded_results,
+)
+from backtest_progress import pool_workers, reporter
+from backtest_vectorized import select_engine
+
+logger = logging.getLogger(__name__)
+
+SEARCH_METHODS = ('grid', 'adaptive')
+PROPOSALS = ('tpe', 'random')
+
+DEFAULT_ETA = 3
+DEFAULT_MIN_FRACTION = 0.1
+
+# Default budget as a share of the grid size (in full-length backtests)
+DEFAULT_BUDGET_SHARE = 0.1
+
+# Shortest prefix (or all the bars when there are fewer), so early rungs get past indicator warm-up
+MIN_PREFIX_BARS = 200
+
+# TPE: random candidates before the model is used, share of candidates that count as good,
+# draws scored per proposal
+TPE_STARTUP = 8
+TPE_GAMMA = 0.25
+TPE_DRAWS = 24
+
+# Draws tried before falling back to listing the untried combinations the constraint accepts
+MAX_PROPOSAL_DRAWS = 1000
+
+
+def _positive_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool) and value > 0
+
+
+def parse_search(spec):
+    """Validate the search fields of the `optimize` block; returns them with defaults filled in"""
+    if not isinstance(spec, dict):
+        raise ValueError("optimize must be an object")
+
+    method = spec.get('search', 'grid')
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Invalid optimize.search '{method}'. Expected one of: {', '.join(SEARCH_METHODS)}")
+
+    proposal = spec.get('proposal', 'tpe')
+    if proposal not in PROPOSALS:
+        raise ValueError(f"Invalid optimize.proposal '{proposal}'. Expected one of: {', '.join(PROPOSALS)}")
+
+    budget = spec.get('budget')
+    if budget is not None and not _positive_number(budget):
+        raise ValueError("optimize.budget must be a positive number of full-length backtests")
+
+    time_budget = spec.get('timeBudget')
+    if time_budget is not None and not _positive_number(time_budget):
+        raise ValueError("optimize.timeBudget must be a positive number of seconds")
+
+    eta = spec.get('eta', DEFAULT_ETA)
+    if not isinstance(eta, int) or isinstance(eta, bool) or eta < 2:
+        raise ValueError("optimize.eta must be an integer of at least 2")
+
+    min_fraction = spec.get('minFraction', DEFAULT_MIN_FRACTION)
+    if not _positive_number(min_fraction) or min_fraction > 1:
+        raise ValueError("optimize.minFraction must be between 0 and 1")
+
+    return {
+        "method": method,
+        "proposal": proposal,
+        "budget": budget,
+        "timeBudget": time_budget,
+        "eta": eta,
+        "minFraction": min_fraction,
+    }
+
+
+def prefix_lengths(length, eta, min_fraction):
+    """Bars of each rung: eta^-k .. eta^-1, 1 of length (k from min_fraction), without repeats"""
+    rungs = math.floor(math.log(1 / min_fraction, eta) + 1e-9)
+    lengths = [min(length, max(MIN_PREFIX_BARS, round(length * eta ** (rung - rungs)))) for rung in range(rungs)]
+    return sorted(set(lengths) | {length})
+
+
+# ============ Proposals ============
+
+def _is_ordered(values):
+    """True for numeric values in increasing or decreasing order, whose neighbours are similar"""
+    if not all(isinstance(v, numbers.Real) for v in values):
+        return False
+    pairs = list(zip(values, values[1:]))
+    return all(a < b for a, b in pairs) or all(a > b for a, b in pairs)
+
+
+class _Proposer:
+    """Untried grid combinations the constraint accepts, drawn uniformly or by TPE"""
+
+    def __init__(self, grid, constraint, method, rng):
+        self.names = list(grid)
+        self.values = list(grid.values())
+        self.ordered = [_is_ordered(values) for values in self.values]
+        self.predicate = compile_constraint(constraint)
+        self.method = method
+        self.rng = rng
+        self.size = math.prod(len(values) for values in self.values)
+        self.tried = set()
+        self._accepted = {}
+
+    def params(self, indices):
+        return {name: values[i] for name, values, i in zip(self.names, self.values, indices)}
+
+    def _available(self, indices):
+        if indices in self.tried:
+            return False
+        if indices not in self._accepted:
+            self._accepted[indices] = self.predicate(self.params(indices))
+        return self._accepted[indices]
+
+    def propose(self, count, history):
+        """
+        Up to count untried combinations (fewer once the grid runs out)
+
+        history is [(indices, (rung reached, value))] of the tried candidates.
+        """
+        model = self._model(history) if self.method == 'tpe' else None
+        proposals = []
+        for _ in range(count):
+            indices = self._draw_model(model) if model else None
+            if indices is None:
+                indices = self._draw_uniform()
+            if indices is None:
+                break
+            self.tried.add(indices)
+            proposals.append(indices)
+        return proposals
+
+    def _draw_uniform(self):
+        for _ in range(MAX_PROPOSAL_DRAWS):
+            indices = tuple(self.rng.randrange(len(values)) for values in self.values)
+            if self._available(indices):
+                return indices
+        # Mostly tried or rejected: pick among what is left
+        remaining = [indices for indices in itertools.product(*(range(len(values)) for values in self.values))
+                     if self._available(indices)]
+        return self.rng.choice(remaining) if remaining else None
+
+    # ---- TPE ----
+
+    def _model(self, history):
+        """Per parameter (good, bad) value densities, None before TPE_STARTUP candidates were tried"""
+        if len(history) < TPE_STARTUP:
+            return None
+        ranked = sorted(history, key=lambda item: item[1], reverse=True)
+        split = math.ceil(TPE_GAMMA * len(ranked))
+        good, bad = ranked[:split], ranked[split:]
+        return [(self._density(p, good), self._density(p, bad)) for p in range(len(self.names))]
+
+    def _density(self, p, candidates):
+        """Smoothed frequency of each value of parameter p among candidates (neighbours share for ordered values)"""
+        size = len(self.values[p])
+        weights = [1.0 / size] * size
+        for indices, _ in candidates:
+            i = indices[p]
+            weights[i] += 1.0
+            if self.ordered[p]:
+                for j in (i - 1, i + 1):
+                    if 0 <= j < size:
+                        weights[j] += 0.5
+        total = sum(weights)
+        return [w / total for w in weights]
+
+    def _draw_model(self, model):
+        """The untried draw from the good densities with the best good/bad ratio, None if no draw is untried"""
+        best, best_score = None, -math.inf
+        for _ in range(TPE_DRAWS):
+            indices = tuple(self.rng.choices(range(len(good)), weights=good)[0] for good, _ in model)
+            if not self._available(indices):
+                continue
+            score = sum(math.log(good[i] / bad[i]) for i, (good, bad) in zip(indices, model))
+            if score > best_score:
+                best, best_score = indices, score
+        return best
+
+
+# ============ Search ============
+
+@contextlib.contextmanager
+def _evaluation_pool(df, strategy_code, strategy_class, config, engine, workers):
+    """Yields evaluate(tasks), the results of (params, bars) tasks in order, run on a fork pool when workers > 1"""
+    if workers <= 1:
+        prefixes = PrefixBacktests(df, strategy_class, config, engine)
+        yield lambda tasks: map(prefixes.evaluate, tasks)
+        return
+
+    shared = SharedOHLCV.create(df)
+    try:
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(shared.descriptor(), strategy_code, config, engine),
+        ) as pool:
+            yield lambda tasks: pool.imap(_evaluate_prefix, tasks)
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def run_adaptive_search(df, strategy_code, strategy_class, config, grid):
+    """
+    Successive halving over the optimize grid on growing data prefixes
+
+    Returns (best_params, optimization_summary) like run_optimization().
+    """
+    spec = config['optimize']
+    options = parse_search(spec)
+    objective = spec.get('maximize', DEFAULT_OBJECTIVE)
+    top_k = int(spec.get('topK', DEFAULT_TOP_K))
+    eta = options['eta']
+
+    proposer = _Proposer(grid, spec.get('constraint'), options['proposal'], random.Random(spec.get('randomState')))
+    lengths = prefix_lengths(len(df), eta, options['minFraction'])
+    round_size = eta ** (len(lengths) - 1)
+    round_cost = sum(math.ceil(round_size / eta ** rung) * bars for rung, bars in enumerate(lengths)) / len(df)
+    budget = options['budget'] or max(round_cost, DEFAULT_BUDGET_SHARE * proposer.size)
+    workers = pool_workers(spec.get('workers'), round_size, 'Adaptive search')
+    engine = select_engine(strategy_class, config)
+    logger.info(f"Adaptive search over {proposer.size} parameter combinations: rungs of {lengths} bars, "
+                f"budget {budget:g} backtests, {workers} workers ({engine} engine)")
+
+    started = time.monotonic()
+    deadline = started + options['timeBudget'] if options['timeBudget'] else math.inf
+    counter = reporter.counter('sweep', budget)
+    latest = {}    # indices -> result on the longest prefix the candidate reached
+    reached = {}   # indices -> (rung, objective value there)
+    trace = []
+    spent, failed, rounds = 0.0, 0, 0
+    best = None
+    stopped = None
+
+    with _evaluation_pool(df, strategy_code, strategy_class, config, engine, workers) as evaluate:
+        while stopped is None:
+            if rounds and spent + round_cost > budget + 1e-9:
+                stopped = 'budget'
+                break
+            candidates = proposer.propose(round_size, list(reached.items()))
+            if not candidates:
+                stopped = 'exhausted'
+                break
+
+            for rung, bars in enumerate(lengths):
+                scored = []
+                for indices, result in zip(candidates, evaluate([(proposer.params(c), bars) for c in candidates])):
+                    value = objective_value(result.get('metrics', {}), objective)
+                    latest[indices], reached[indices] = result, (rung, value)
+                    spent += bars / len(df)
+                    scored.append((value, indices))
+
+                    entry = {"round": rounds, "rung": rung, "bars": bars, "params": result['params']}
+                    if 'metrics' in result:
+                        entry["value"] = result['metrics'].get(objective)
+                    else:
+                        entry["error"] = result['error']
+                        failed += 1
+                    trace.append(entry)
+
+                    if 'metrics' in result and (best is None or (rung, value) > best[0]):
+                        best = ((rung, value), {"params": result['params'], "value": entry["value"], "bars": bars})
+                    counter.update(round(spent, 3), evaluated=len(trace), failed=failed, best=best and best[1])
+
+                    if time.monotonic() > deadline:
+                        stopped = 'time'
+                        break
+                if stopped:
+                    break
+
+                # Scores are compared within the rung only; -inf (failed or undefined) never advances
+                scored.sort(key=lambda item: item[0], reverse=True)
+                candidates = [indices for value, indices in scored[:math.ceil(len(scored) / eta)]
+                              if value > -math.inf]
+                if not candidates:
+                    break
+            rounds += 1
+
+    elapsed = time.monotonic() - started
+    if stopped == 'time':
+        logger.warning(f"Optimization time budget of {options['timeBudget']}s reached after {len(trace)} runs")
+
+    succeeded = succeeded_results(list(latest.values()), objective)
+    ranked = sorted(succeeded, key=lambda r: (r['bars'], objective_value(r['metrics'], objective)), reverse=True)
+    best_result = ranked[0]
+    complete = [r for r in succeeded if r['bars'] == len(df)] or ranked[:1]
+
+    summary = {
+        "objective": objective,
+        "best_params": best_result['params'],
+        "best_value": best_result['metrics'].get(objective),
+        "evaluated": len(trace),
+        "failed": failed,
+        "workers": workers,
+        "top_results": ranked[:top_k],
+        "heatmap": build_heatmap(complete, list(grid), objective),
+        "search": {
+            "method": "adaptive",
+            "proposal": options['proposal'],
+            "rungs": [round(bars / len(df), 4) for bars in lengths],
+            "rounds": rounds,
+            "candidates": len(latest),
+            "grid_size": proposer.size,
+            "budget": round(budget, 3),
+            "cost": round(spent, 3),
+            "stopped": stopped,
+            "elapsed": round(elapsed, 3),
+        },
+        "trace": trace,
+    }
+    return best_result['params'], summary
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+backtest_series.py - Compact chart series for run_backtest.py
+
+Enabled with the optional `series` field in config.json:
+
+    "series": true               # default point budget
+    "series": {"points": 2000}   # at most this many points per series
+
+The result then carries numeric series the frontend can chart natively,
+whose size depends on the point budget instead of the bar count:
+
+    "series": {
+        "bars": 1000000, "points": 1498,
+        "timestamp": "<base64 float64>",     # ms since epoch of every kept bar
+        "equity": "<base64 float32>",
+        "drawdown": "<base64 float32>",      # percent, negative like max_drawdown
+        "trades": {
+            "count": 500, "total": 1203,
+            "entry_time": "<base64 float64>", "exit_time": "<base64 float64>",
+            "entry_price": "<base64 float32>", "exit_price": "<base64 float32>",
+            "size": "<base64 float32>",      # negative for shorts
+            "return_pct": "<base64 float32>"
+        }
+    }
+
+Arrays are little-endian and base64 encoded. Bars are downsampled by
+min/max bucketing: the bars are split into equal buckets and each keeps the
+bars of its lowest and highest equity and of its deepest drawdown, plus the
+first and last bar, so peaks, troughs and the max drawdown survive at any
+budget. Closed trades are kept up to the same budget, largest returns
+first, in entry order.
+"""
+
+import base64
+
+import numpy as np
+
+DEFAULT_POINTS = 1000
+MIN_POINTS = 10
+MAX_POINTS = 100_000
+
+# Bars kept per bucket: lowest equity, highest equity, deepest drawdown
+PER_BUCKET = 3
+
+
+def parse_series(spec):
+    """Validate config.series; returns the point budget"""
+    if spec is True:
+        spec = {}
+    if not isinstance(spec, dict):
+        raise ValueError("series must be true or an object")
+    points = spec.get('points', DEFAULT_POINTS)
+    if not isinstance(points, int) or not MIN_POINTS <= points <= MAX_POINTS:
+        raise ValueError(f"series.points must be an integer between {MIN_POINTS} and {MAX_POINTS}")
+    return points
+
+
+def encode(values, dtype):
+    """Base64 of values as an array of dtype ('<f4' or '<f8': little-endian)"""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def epoch_ms(index):
+    """Milliseconds since the epoch of a DatetimeIndex, as float64 (exact up to year 287396)"""
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+
+
+def _bucket_argmin(values, edges):
+    """Index of the first minimum of values within each [edges[i], edges[i + 1]) bucket"""
+    minima = np.minimum.reduceat(values, edges[:-1])
+    hits = np.flatnonzero(values == np.repeat(minima, np.diff(edges)))
+    buckets = np.searchsorted(edges, hits, side='right') - 1
+    return hits[np.flatnonzero(np.diff(buckets, prepend=-1))]
+
+
+def downsample_indices(equity, drawdown, points):
+    """Sorted bar indices to keep: at most `points`, always including the first and last bar"""
+    length = len(equity)
+    if length <= points:
+        return np.arange(length)
+    buckets = (points - 2) // PER_BUCKET
+    edges = np.linspace(0, length, buckets + 1).astype(np.int64)
+    return np.unique(np.concatenate((
+        [0, length - 1],
+        _bucket_argmin(equity, edges),
+        _bucket_argmin(-equity, edges),
+        _bucket_argmin(-drawdown, edges),
+    )))
+
+
+def trade_markers(trades, timestamps, points):
+    """Encoded entry/exit markers of up to `points` closed trades"""
+    total = len(trades)
+    returns = trades['ReturnPct'].to_numpy(dtype=np.float64)
+    keep = np.arange(total)
+    if total > points:
+        keep = np.sort(np.argsort(-np.abs(np.nan_to_num(returns)), kind='stable')[:points])
+    entry_bars = trades['EntryBar'].to_numpy(dtype=np.int64)[keep]
+    exit_bars = trades['ExitBar'].to_numpy(dtype=np.int64)[keep]
+    order = np.argsort(entry_bars, kind='stable')
+    keep, entry_bars, exit_bars = keep[order], entry_bars[order], exit_bars[order]
+    return {
+        "count": len(keep),
+        "total": total,
+        "entry_time": encode(timestamps[entry_bars], '<f8'),
+        "exit_time": encode(timestamps[exit_bars], '<f8'),
+        "entry_price": encode(trades['EntryPrice'].to_numpy(dtype=np.float64)[keep], '<f4'),
+        "exit_price": encode(trades['ExitPrice'].to_numpy(dtype=np.float64)[keep], '<f4'),
+        "size": encode(trades['Size'].to_numpy(dtype=np.float64)[keep], '<f4'),
+        "return_pct": encode(returns[keep] * 100, '<f4'),
+    }
+
+
+def build_series(stats, config):
+    """Downsampled equity, drawdown and trade markers of a run"""
+    points = parse_series(config['series'])
+    curve = stats['_equity_curve']
+    equity = curve['Equity'].to_numpy(dtype=np.float64)
+    drawdown = np.nan_to_num(curve['DrawdownPct'].to_numpy(dtype=np.float64))
+    timestamps = epoch_ms(curve.index)
+
+    keep = downsample_indices(equity, drawdown, points)
+    return {
+        "bars": len(equity),
+        "points": len(keep),
+        "timestamp": encode(timestamps[keep], '<f8'),
+        "equity": encode(equity[keep], '<f4'),
+        "drawdown": encode(drawdown[keep] * -100, '<f4'),
+        "trades": trade_markers(stats['_trades'], timestamps, points),
+    }
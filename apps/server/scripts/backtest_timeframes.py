@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+backtest_timeframes.py - Multi-timeframe OHLCV for run_backtest.py
+
+The optional `timeframe` field in config.json runs the backtest on coarser
+bars than the loaded candles (it must be a multiple of their bar size):
+
+    "timeframe": "1h"
+
+Strategies read higher timeframes from init():
+
+    class DailyTrend(Strategy):
+        def init(self):
+            daily = self.timeframe('1d')    # 1d OHLCV DataFrame, indexed by bar start
+            self.trend = self.resample_apply('1d', talib.SMA, self.data.Close, 20)
+            self.h4_rsi = self.resample_apply('4h', talib.RSI, 'Close', 14)
+
+resample_apply() is backtesting.lib.resample_apply() for the data columns:
+func runs on the higher-timeframe bars of the column, and each result is
+shown from the first bar at or after that higher bar's close (never while
+it is still forming), wrapped in self.I().
+
+Timeframes are "<n>m", "<n>h" or "<n>d" that divide a day or are whole
+days; buckets start at midnight UTC of the first bar's day, like pandas
+resampling. Aggregates are computed once per dataset and cached in a
+resample pyramid: each timeframe is grouped from the coarsest cached one
+that divides it (1m -> 5m -> 1h -> 4h -> 1d) with NumPy reduceat over
+sorted bucket ids, so optimization sweeps and batch jobs on the same data
+never resample the full series again.
+"""
+
+import re
+import weakref
+
+import numpy as np
+import pandas as pd
+
+TIMEFRAME_PATTERN = re.compile(r'^([1-9]\d*)([mhd])$')
+TIMEFRAME_UNIT_NS = {'m': 60 * 10 ** 9, 'h': 3600 * 10 ** 9, 'd': 86_400 * 10 ** 9}
+DAY_NS = TIMEFRAME_UNIT_NS['d']
+
+# How each column is aggregated into coarser bars (others keep their last value), as backtesting.lib.OHLCV_AGG
+AGGREGATIONS = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+REDUCERS = {'max': np.maximum, 'min': np.minimum, 'sum': np.add}
+
+# Resample pyramid of each live dataset, by id() of its DataFrame
+_pyramids = {}
+
+
+def timeframe_ns(rule):
+    """Bar length of a timeframe such as "5m", "4h" or "1d" in nanoseconds"""
+    match = TIMEFRAME_PATTERN.match(str(rule))
+    if not match:
+        raise ValueError(f"Invalid timeframe '{rule}'. Expected e.g. 5m, 1h, 4h, 1d")
+    period = int(match.group(1)) * TIMEFRAME_UNIT_NS[match.group(2)]
+    if DAY_NS % period and period % DAY_NS:
+        raise ValueError(f"Timeframe '{rule}' must divide a day or be a whole number of days")
+    return period
+
+
+def _epoch_ns(index):
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.values.astype('datetime64[ns]').view(np.int64)
+
+
+def aggregate(starts, columns, origin, period):
+    """
+    Group bars (sorted int64 ns starts, {column: values}) into period buckets from origin
+
+    Returns the bucket starts and the aggregated columns.
+    """
+    buckets = (starts - origin) // period
+    first = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    last = np.append(first[1:], len(starts)) - 1
+
+    aggregated = {}
+    for name, values in columns.items():
+        how = AGGREGATIONS.get(name, 'last')
+        if how == 'first':
+            aggregated[name] = values[first]
+        elif how == 'last':
+            aggregated[name] = values[last]
+        else:
+            aggregated[name] = REDUCERS[how].reduceat(values, first)
+    return origin + buckets[first] * period, aggregated
+
+
+class ResamplePyramid:
+    """OHLCV aggregates of one dataset, each timeframe computed once on first use"""
+
+    def __init__(self, df):
+        self.columns = list(df.columns)
+        self.timestamps = _epoch_ns(df.index)
+        self.tz = df.index.tz
+        self.unit = df.index.unit
+        steps = np.diff(self.timestamps)
+        steps = steps[steps > 0]
+        # Bar size of the data (1ns when unknown, which every timeframe is a multiple of)
+        self.base = int(steps.min()) if len(steps) else 1
+        self.origin = (int(self.timestamps[0]) // DAY_NS * DAY_NS) if len(self.timestamps) else 0
+        self.levels = {self.base: (self.timestamps, {name: df[name].to_numpy(dtype=np.float64)
+                                                     for name in self.columns})}
+        self.frames = {}
+
+    def level(self, rule):
+        """(bucket starts, {column: values}) of a timeframe"""
+        period = timeframe_ns(rule)
+        if period % self.base:
+            raise ValueError(f"Timeframe '{rule}' is not a multiple of the data's "
+                             f"{pd.Timedelta(self.base, unit='ns')} bars")
+        if period not in self.levels:
+            source = max(p for p in self.levels if period % p == 0)
+            self.levels[period] = aggregate(*self.levels[source], self.origin, period)
+        return self.levels[period]
+
+    def frame(self, rule):
+        """OHLCV DataFrame of a timeframe, indexed by bar start"""
+        if rule not in self.frames:
+            starts, columns = self.level(rule)
+            index = pd.DatetimeIndex(starts.view('datetime64[ns]')).as_unit(self.unit)
+            if self.tz is not None:
+                index = index.tz_localize('UTC').tz_convert(self.tz)
+            self.frames[rule] = pd.DataFrame(columns, index=index, columns=self.columns, copy=False)
+        return self.frames[rule]
+
+    def align(self, rule, values):
+        """
+        Spread one value per higher-timeframe bar over the dataset's bars
+
+        Each bar gets the value of the last higher bar that closed at or
+        before its start (NaN before the first one closes).
+        """
+        starts, _ = self.level(rule)
+        if isinstance(values, pd.DataFrame):
+            values = values.to_numpy(dtype=np.float64).T
+        values = np.asarray(values, dtype=np.float64)
+        if values.shape[-1:] != starts.shape:
+            raise ValueError(f"Expected one value per {rule} bar ({len(starts)}), got shape {values.shape}")
+
+        positions = np.searchsorted(starts + timeframe_ns(rule), self.timestamps, side='right') - 1
+        aligned = values[..., np.maximum(positions, 0)]
+        aligned[..., positions < 0] = np.nan
+        return aligned
+
+
+def pyramid_for(df):
+    """The dataset's ResamplePyramid, shared by every backtest on the same DataFrame"""
+    key = id(df)
+    pyramid = _pyramids.get(key)
+    if pyramid is None:
+        pyramid = _pyramids[key] = ResamplePyramid(df)
+        weakref.finalize(df, _pyramids.pop, key, None)
+    return pyramid
+
+
+def resample_to_timeframe(df, config):
+    """df as config.timeframe bars (df itself when unset or already that timeframe)"""
+    rule = config.get('timeframe')
+    if not rule:
+        return df
+    pyramid = pyramid_for(df)
+    if timeframe_ns(rule) == pyramid.base:
+        return df
+    return pyramid.frame(rule)
+
+
+# ============ Strategy Methods ============
+
+def _identity(values, *args, **kwargs):
+    return values
+
+
+class TimeframeMethods:
+    """timeframe() and resample_apply() for strategies, over the _pyramid of their data"""
+
+    _pyramid = None
+
+    def timeframe(self, rule):
+        """OHLCV DataFrame of the data at a coarser timeframe (call from init())"""
+        return self._pyramid.frame(rule)
+
+    def resample_apply(self, rule, func, series, *args, **kwargs):
+        """
+        backtesting.lib.resample_apply() for a data column (self.data.Close or
+        its name), served from the resample pyramid instead of resampling
+        """
+        column = series if isinstance(series, str) else getattr(series, 'name', None)
+        if column not in self._pyramid.columns or (not isinstance(series, str)
+                                                   and series is not getattr(self.data, column)):
+            raise ValueError("resample_apply() takes a data column such as self.data.Close or 'Close'")
+
+        func = func or _identity
+        pyramid = self._pyramid
+        bars = pyramid.frame(rule)[column].rename(f'{column}[{rule}]')
+
+        def aligned(values, *args, **kwargs):
+            return pyramid.align(rule, func(values, *args, **kwargs))
+
+        aligned.__name__ = func.__name__
+        return self.I(aligned, bars, *args, **kwargs)
+
+
+def with_timeframes(strategy_class, df):
+    """
+    strategy_class with timeframe() and resample_apply() over df's pyramid
+
+    Attributes the strategy defines itself take precedence.
+    """
+    return type(strategy_class.__name__, (strategy_class, TimeframeMethods), {
+        '_pyramid': pyramid_for(df),
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
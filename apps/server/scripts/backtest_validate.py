@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+backtest_validate.py - Static validation of strategy code
+
+Checks a strategy without running it and without importing numpy, pandas,
+backtesting or talib, so the server can validate code in milliseconds
+instead of paying run_backtest.py's start-up:
+
+    python scripts/backtest_validate.py <strategy.py> [--portfolio]   # "-" reads stdin
+
+    -> {"valid": false, "class": "RsiStrategy", "errors": [
+           {"line": 2, "column": 0, "type": "import",
+            "message": "Import of 'os' is not allowed. Allowed modules: backtesting, ..."}]}
+
+Each error has the 1-based line and 0-based column it was found at (null
+when it is not tied to one) and one of these types:
+
+    syntax      the code does not parse
+    restricted  RestrictedPython refuses to compile it (names starting with
+                "_", exec/eval, ...)
+    import      an import execute_user_code() would reject (ALLOWED_IMPORTS)
+    name        a builtin the sandbox does not provide (open, getattr,
+                super, ...) and the code does not define
+    strategy    no Strategy subclass (PortfolioStrategy with --portfolio), or
+                one without init() and next()/signals() (weights())
+
+These are the problems execute_user_code() in run_backtest.py stops at;
+the checks read the syntax tree, so what only fails at run time (calling
+an unknown method, bad arguments) is left to the run. "class" is the
+strategy class a run would use (the last one defined). The exit status is
+0 whenever a result is printed, valid or not.
+"""
+
+import argparse
+import ast
+import builtins
+import json
+import re
+import sys
+
+# Modules user strategy code is allowed to import
+ALLOWED_IMPORTS = ('backtesting', 'backtesting.lib', 'numpy', 'pandas', 'talib')
+
+# Builtins strategy code gets on top of RestrictedPython's safe_builtins
+EXTRA_BUILTINS = {
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "any": any,
+    "all": all,
+    "list": list,
+    "dict": dict,
+    "set": set,
+    "enumerate": enumerate,
+    "reversed": reversed,
+    "staticmethod": staticmethod,  # Used by the SMA crossover template
+}
+
+# Other globals of the sandbox (print is compiled into a call of its _print_ collector)
+SANDBOX_GLOBALS = ('__name__', 'print', 'Strategy', 'PortfolioStrategy', 'crossover',
+                   'numpy', 'np', 'pandas', 'pd', 'talib', 'indicators')
+
+# RestrictedPython reports errors as "Line <n>: <message>"
+_RESTRICTED_ERROR = re.compile(r'^Line (\d+): (.*)$', re.DOTALL)
+
+
+def _error(kind, message, node=None, line=None, column=None):
+    if node is not None:
+        line, column = node.lineno, node.col_offset
+    return {"line": line, "column": column, "type": kind, "message": message}
+
+
+def _restricted_errors(strategy_code):
+    from RestrictedPython import compile_restricted_exec
+
+    errors = []
+    for message in compile_restricted_exec(strategy_code, filename='<strategy>').errors:
+        match = _RESTRICTED_ERROR.match(message)
+        if match:
+            errors.append(_error('restricted', match.group(2), line=int(match.group(1))))
+        else:
+            errors.append(_error('restricted', message))
+    return errors
+
+
+def _import_errors(tree):
+    allowed = ', '.join(ALLOWED_IMPORTS)
+    errors = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            names = ['.' * node.level + (node.module or '')]
+        else:
+            continue
+        for name in names:
+            if name not in ALLOWED_IMPORTS:
+                errors.append(_error('import', f"Import of '{name}' is not allowed. Allowed modules: {allowed}", node))
+    return errors
+
+
+def _bound_names(tree):
+    """Every name the code binds anywhere (assignments, defs, imports, arguments, ...)"""
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+    return names
+
+
+def _name_errors(tree):
+    """Builtins used but missing from the sandbox (names the code defines itself are fine)"""
+    from RestrictedPython.Guards import safe_builtins
+
+    available = set(safe_builtins) | set(EXTRA_BUILTINS) | set(SANDBOX_GLOBALS) | _bound_names(tree)
+    available |= {'exec', 'eval'}  # Reported by RestrictedPython
+    errors = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in available
+                and hasattr(builtins, node.id)):
+            errors.append(_error('name', f"'{node.id}' is not available in strategy code", node))
+    return errors
+
+
+def _base_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _strategy_class(tree, portfolio):
+    """(ClassDef of the strategy a run would use or None, {class name: method names} of its lineage)"""
+    base = 'PortfolioStrategy' if portfolio else 'Strategy'
+    # Names the base class is known by, including `from backtesting import Strategy as Base`
+    strategy_names = {base}
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom):
+            strategy_names.update(alias.asname for alias in node.names if alias.name == base and alias.asname)
+
+    methods = {}
+    strategy = None
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [_base_name(b) for b in node.bases]
+        if not any(name in strategy_names for name in bases):
+            continue
+        own = {item.name for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+        # Methods inherited from strategy classes defined earlier in the code
+        methods[node.name] = own.union(*(methods[name] for name in bases if name in methods))
+        strategy_names.add(node.name)
+        strategy = node
+    return strategy, methods
+
+
+def _strategy_errors(tree, portfolio):
+    strategy, methods = _strategy_class(tree, portfolio)
+    if strategy is None:
+        if portfolio:
+            return None, [_error('strategy', "Portfolio runs need a class that inherits from PortfolioStrategy")]
+        return None, [_error('strategy', "Strategy code must define a class that inherits from Strategy")]
+
+    defined = methods[strategy.name]
+    if portfolio:
+        required = [('weights',)]
+    else:
+        required = [('init',), ('next', 'signals')]
+    errors = [
+        _error('strategy', f"{strategy.name} must define {' or '.join(f'{name}()' for name in names)}", strategy)
+        for names in required if not defined.intersection(names)
+    ]
+    return strategy.name, errors
+
+
+def validate_strategy(strategy_code, portfolio=False):
+    """Static checks of strategy code; returns {"valid", "class", "errors"}"""
+    try:
+        tree = ast.parse(strategy_code, filename='<strategy>')
+    except SyntaxError as e:
+        # offset is 1-based
+        column = e.offset - 1 if e.offset else None
+        return {"valid": False, "class": None, "errors": [_error('syntax', e.msg, line=e.lineno, column=column)]}
+
+    strategy_name, errors = _strategy_errors(tree, portfolio)
+    errors = _restricted_errors(strategy_code) + _import_errors(tree) + _name_errors(tree) + errors
+    errors.sort(key=lambda error: (error['line'] is None, error['line'] or 0, error['column'] or 0))
+    return {"valid": not errors, "class": strategy_name, "errors": errors}
+
+
+# ============ CLI ============
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate strategy code without running it")
+    parser.add_argument("path", help="strategy.py to check, or - for stdin")
+    parser.add_argument("--portfolio", action="store_true", help="Expect a PortfolioStrategy")
+    args = parser.parse_args()
+
+    try:
+        if args.path == '-':
+            strategy_code = sys.stdin.read()
+        else:
+            with open(args.path) as f:
+                strategy_code = f.read()
+    except OSError as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(validate_strategy(strategy_code, args.portfolio)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+backtest_vectorized.py - NumPy fast path for signal strategies in run_backtest.py
+
+A signal strategy computes its entry and exit conditions for every bar at
+once instead of deciding bar by bar in next():
+
+    class SmaCross(Strategy):
+        n1 = 10
+        n2 = 30
+
+        def init(self):
+            self.fast = self.I(talib.SMA, self.data.Close, self.n1)
+            self.slow = self.I(talib.SMA, self.data.Close, self.n2)
+
+        def signals(self):
+            above = self.fast > self.slow
+            entries = np.concatenate(([False], ~above[:-1] & above[1:]))
+            exits = np.concatenate(([False], above[:-1] & ~above[1:]))
+            return entries, exits
+
+signals() runs after init() on the full data and returns two boolean arrays
+with one value per bar (NaN counts as False). Each value may only depend on
+data up to its own bar. They mean exactly this next():
+
+    if not self.position:
+        if entries[i]: self.buy()
+    elif exits[i]: self.position.close()
+
+Strategies that define signals() but no next() get that next(), so they also
+run on backtesting.py (needed for the HTML report). VectorizedBacktest
+reproduces backtesting 0.3.3's broker for it without a per-bar callback:
+orders fill at the next bar's open, buys use all available cash in whole
+units at open * (1 + commission), exits are filled at the open without
+commission, indicator warmup bars are skipped and a position still open at
+the end is closed at the last bar's open. Being long-only on positive prices,
+such a run never runs out of money.
+
+Engines are picked with config.engine:
+- "auto" (default): vectorized for strategies with signals() and no next()
+  of their own, backtesting.py otherwise
+- "vectorized": vectorized; fails for strategies without signals()
+- "event": always backtesting.py
+The final run of a report=inline/deferred backtest always uses
+backtesting.py, since the report is built from its Backtest.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from backtest_memory import has_float32_prices, with_float64_indicators
+from backtest_timeframes import with_timeframes
+
+ENGINES = ('auto', 'event', 'vectorized')
+
+# Size of Strategy.buy() without an explicit size: all available equity
+FULL_EQUITY = 1 - sys.float_info.epsilon
+
+# Instance attribute holding the (entries, exits) computed by a synthesized init()
+SIGNALS_ATTR = '_vectorized_signals'
+
+
+def defines_signals(strategy_class):
+    return callable(getattr(strategy_class, 'signals', None))
+
+
+def is_signal_strategy(strategy_class):
+    """True for strategies whose trading logic is only their signals()"""
+    return defines_signals(strategy_class) and getattr(strategy_class, '_signal_next', False)
+
+
+def with_signal_next(strategy_class):
+    """
+    Give a signals()-only strategy the next() its signals stand for
+
+    Returns strategy_class unchanged when it defines its own next() or no
+    signals().
+    """
+    if not defines_signals(strategy_class) or 'next' not in getattr(strategy_class, '__abstractmethods__', ()):
+        return strategy_class
+
+    user_init = strategy_class.init
+
+    def init(self):
+        user_init(self)
+        setattr(self, SIGNALS_ATTR, signal_arrays(self))
+
+    def next(self):
+        entries, exits = getattr(self, SIGNALS_ATTR)
+        bar = len(self.data) - 1
+        if not self.position:
+            if entries[bar]:
+                self.buy()
+        elif exits[bar]:
+            self.position.close()
+
+    return type(strategy_class.__name__, (strategy_class,), {
+        'init': init,
+        'next': next,
+        '_signal_next': True,
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
+
+
+def trading_from(strategy_class, start):
+    """
+    Subclass strategy_class so next() does nothing before bar `start`
+
+    The bars before it are warm-up for the indicators (see
+    trade_start_bar()); returns strategy_class unchanged for start 0.
+    """
+    if not start:
+        return strategy_class
+
+    user_next = strategy_class.next
+
+    def next(self):
+        if len(self.data) > start:
+            user_next(self)
+
+    return type(strategy_class.__name__, (strategy_class,), {
+        'next': next,
+        '__module__': strategy_class.__module__,
+        '__qualname__': strategy_class.__qualname__,
+    })
+
+
+def signal_arrays(strategy):
+    """Call strategy.signals() and validate its result as two boolean arrays"""
+    result = strategy.signals()
+    if not isinstance(result, (tuple, list)) or len(result) != 2:
+        raise ValueError("signals() must return a tuple of (entries, exits) arrays")
+
+    length = len(strategy.data)
+    arrays = []
+    for name, values in zip(('entries', 'exits'), result):
+        values = np.asarray(values, dtype=float)
+        if values.shape != (length,):
+            raise ValueError(f"signals() {name} must have one value per bar ({length}), got shape {values.shape}")
+        arrays.append(np.nan_to_num(values) != 0)
+    return tuple(arrays)
+
+
+def select_engine(strategy_class, config, report=False):
+    """'event' or 'vectorized' for a run; report=True when it must produce a Backtest for the report"""
+    engine = config.get('engine', 'auto')
+    if engine == 'event':
+        return 'event'
+    if engine == 'vectorized' and not defines_signals(strategy_class):
+        raise ValueError(f"engine 'vectorized' requires {strategy_class.__name__} to define signals()")
+    if report:
+        return 'event'
+    return 'vectorized' if engine == 'vectorized' or is_signal_strategy(strategy_class) else 'event'
+
+
+def create_backtest(df, strategy_class, config, engine='event', trade_start=None):
+    """
+    A Backtest (or VectorizedBacktest) with the UI-controlled cash and commission
+
+    The strategy gets timeframe() and resample_apply() over df's resample
+    pyramid (see backtest_timeframes.py), and float64 indicator inputs when
+    df has float32 prices (see backtest_memory.py).
+
+    The bars before trade_start (default: the lookback warm-up before
+    startDate, see trade_start_bar()) only feed the indicators: the strategy
+    cannot trade on them and run() returns statistics of df[trade_start:].
+    """
+    from backtest_lookback import trade_start_bar
+
+    if trade_start is None:
+        trade_start = trade_start_bar(df, config)
+    if has_float32_prices(df):
+        strategy_class = with_float64_indicators(strategy_class)
+    strategy_class = with_timeframes(trading_from(strategy_class, trade_start), df)
+    kwargs = {'cash': config['initialCapital'], 'commission': config['commission']}
+    if engine == 'vectorized':
+        return VectorizedBacktest(df, strategy_class, trade_start=trade_start, **kwargs)
+    if trade_start:
+        return windowed_backtest(df, strategy_class, trade_start, **kwargs)
+
+    from backtesting import Backtest
+    return Backtest(df, strategy_class, **kwargs)
+
+
+def windowed_backtest(df, strategy_class, start, **kwargs):
+    """A backtesting.Backtest whose run() returns the statistics of df[start:] (see windowed_stats())"""
+    from backtesting import Backtest
+
+    def run(self, **params):
+        return windowed_stats(Backtest.run(self, **params), self._data, start)
+
+    return type('Backtest', (Backtest,), {'run': run})(df, strategy_class, **kwargs)
+
+
+def windowed_stats(stats, data, start):
+    """
+    Recompute Backtest.run() statistics over data[start:]
+
+    The run must not have traded before start; its trades are re-indexed
+    and the equity curve, buy & hold and per-day statistics cut to the window.
+    """
+    from backtesting._stats import compute_stats
+
+    trades = stats['_trades'].copy()
+    trades['EntryBar'] -= start
+    trades['ExitBar'] -= start
+    equity = stats['_equity_curve']['Equity'].to_numpy()[start:]
+    return compute_stats(trades, equity, data.iloc[start:], stats['_strategy'])
+
+
+# ============ Simulation ============
+
+def warmup_start(strategy):
+    """First bar backtesting.py calls next() on: after every indicator's leading NaNs, and at least 1"""
+    from backtesting._util import _Indicator
+
+    indicators = [value for value in strategy.__dict__.values() if isinstance(value, _Indicator)]
+    return 1 + max((np.isnan(indicator.astype(float)).argmin(axis=-1).max() for indicator in indicators),
+                   default=0)
+
+
+def simulate_signals(open_, close, entries, exits, start, cash, commission):
+    """
+    Fill long-only entry/exit signals the way backtesting.py's broker does
+
+    Which exit closes the trade opened by each entry signal is resolved for
+    all signals at once; the remaining loop runs once per order to size it
+    from the cash left by the previous trade. Returns (trades, equity) where
+    trades holds per-trade arrays (an entry on the last bar leaves one open
+    trade, flagged in trades['closed']) and equity the account value at
+    every bar.
+    """
+    length = len(close)
+    last = length - 1
+    initial_cash = cash
+    signals = np.flatnonzero(entries[start:]) + start
+    exit_signals = np.flatnonzero(exits)
+
+    # Orders fill at the next open; an order from the last bar fills in the broker's final pass at its open
+    fills = np.minimum(signals + 1, last)
+    entry_prices = open_[fills] * (1 + abs(commission))  # _Broker._adjusted_price() for a long order
+    # The first exit signal the position sees; none before the last bar means it is closed at the end
+    next_exit = np.searchsorted(exit_signals, fills)
+    exit_signal = np.append(exit_signals, length)[next_exit]
+    finalized = exit_signal >= last
+    exit_bars = np.where(finalized, last, exit_signal + 1)
+    # The next entry signal once flat again: from the exit bar, or from the fill bar if the order was dropped
+    after_exit = np.searchsorted(signals, exit_bars)
+    after_drop = np.searchsorted(signals, signals + 1)
+
+    # Python scalars from here: this loop is the only per-order work
+    entry_price_list = entry_prices.tolist()
+    exit_price_list = open_[exit_bars].tolist()
+    after_exit, after_drop, finalized = after_exit.tolist(), after_drop.tolist(), finalized.tolist()
+    entry_on_last_bar = len(signals) and signals[-1] == last
+
+    taken, sizes = [], []
+    count = len(signals)
+    k = 0
+    while k < count:
+        entry_price = entry_price_list[k]
+        size = int((cash * FULL_EQUITY) // entry_price)
+        if not size:
+            k = after_drop[k]  # Not enough cash for one unit: the order is dropped
+            continue
+        taken.append(k)
+        sizes.append(size)
+        if entry_on_last_bar and k == count - 1:
+            break  # Opened in the final pass and still open when the run ends
+        cash += size * (exit_price_list[k] - entry_price)
+        if finalized[k]:
+            break
+        k = after_exit[k]
+
+    taken = np.array(taken, dtype=np.int64)
+    closed = np.ones(len(taken), dtype=bool)
+    trade_exit_bars = exit_bars[taken]
+    trade_exit_prices = open_[trade_exit_bars].astype(np.float64)
+    if entry_on_last_bar and len(taken) and taken[-1] == count - 1:
+        closed[-1] = False
+        trade_exit_bars[-1] = length
+        trade_exit_prices[-1] = np.nan
+
+    trades = {
+        'entry_bar': fills[taken],
+        'exit_bar': trade_exit_bars,
+        'size': np.array(sizes, dtype=np.int64),
+        'entry_price': entry_prices[taken],
+        'exit_price': trade_exit_prices,
+        'closed': closed,
+    }
+    return trades, _equity_curve(close, trades, start, initial_cash)
+
+
+def _closed_pnl(trades):
+    closed = trades['closed']
+    return trades['size'][closed] * (trades['exit_price'][closed] - trades['entry_price'][closed])
+
+
+def _equity_curve(close, trades, start, initial_cash):
+    """Account value at every bar, built from runs of bars between fills"""
+    length = len(close)
+    if start >= length:
+        return np.full(length, float(initial_cash))
+
+    # Cash after each closed trade, summed in trade order like the broker does
+    cash_after = np.cumsum(np.concatenate(([initial_cash], _closed_pnl(trades))))
+    cash = np.repeat(cash_after, np.diff(np.concatenate(([0], trades['exit_bar'][trades['closed']], [length]))))
+
+    # Alternating flat / holding runs: [0, entry 1), [entry 1, exit 1), [exit 1, entry 2), ...
+    count = len(trades['entry_bar'])
+    bounds = np.empty(2 * count + 2, dtype=np.int64)
+    bounds[0], bounds[-1] = 0, length
+    bounds[1:-1:2] = trades['entry_bar']
+    bounds[2:-1:2] = trades['exit_bar']
+    runs = np.diff(np.minimum(bounds, length))
+    size = np.zeros(2 * count + 1)
+    size[1::2] = trades['size']
+    entry_price = np.zeros(2 * count + 1)
+    entry_price[1::2] = trades['entry_price']
+
+    # Held trades are marked to the close
+    equity = cash + np.repeat(size, runs) * (close - np.repeat(entry_price, runs))
+    equity[:start] = equity[start]  # Warmup bars take the first simulated value
+    return equity
+
+
+# ============ Statistics ============
+
+def _geometric_mean(returns):
+    """backtesting._stats.geometric_mean() on an array (NaN counts as 0)"""
+    growth = np.nan_to_num(returns, nan=0.0) + 1
+    if np.any(growth <= 0):
+        return 0
+    return np.exp(np.log(growth).sum() / (len(growth) or np.nan)) - 1
+
+
+def _daily_returns(index, equity):
+    """Returns of the last equity value of each calendar day, like equity.resample('D').last().pct_change()"""
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    days = index.values.astype('datetime64[D]').astype(np.int64)
+    day_ends = np.flatnonzero(np.diff(days, append=days[-1] + 1))
+    day_equity = equity[day_ends]
+    returns = np.empty(len(day_equity))
+    returns[0] = np.nan
+    returns[1:] = day_equity[1:] / day_equity[:-1] - 1
+    weekdays = np.bincount((days + 3) % 7, minlength=7)  # 1970-01-01 was a Thursday
+    weekend_share = weekdays[5:].sum() / len(days)
+    return returns, weekend_share
+
+
+def compute_signal_stats(index, close, trades, equity):
+    """
+    The backtesting.py statistics extract_metrics() reads, computed with NumPy
+
+    Formulas follow backtesting._stats.compute_stats(); drawdown durations
+    and the other per-period statistics it adds are not computed. Like
+    Backtest.run(), returns a pd.Series with _equity_curve and _trades.
+    """
+    closed = trades['closed']
+    sizes = trades['size'][closed]
+    entry_prices = trades['entry_price'][closed]
+    exit_prices = trades['exit_price'][closed]
+    pl = sizes * (exit_prices - entry_prices)
+    returns = exit_prices / entry_prices - 1
+
+    stats = summary_stats(index, equity, pl, returns, (close[-1] - close[0]) / close[0] * 100)
+    entry_bars = trades['entry_bar'][closed]
+    exit_bars = trades['exit_bar'][closed]
+    stats.loc['_trades'] = pd.DataFrame({
+        'Size': sizes,
+        'EntryBar': entry_bars,
+        'ExitBar': exit_bars,
+        'EntryPrice': entry_prices,
+        'ExitPrice': exit_prices,
+        'PnL': pl,
+        'ReturnPct': returns,
+        'EntryTime': index[entry_bars],
+        'ExitTime': index[exit_bars],
+        'Duration': index[exit_bars] - index[entry_bars],
+    })
+    return stats
+
+
+def summary_stats(index, equity, pl, returns, buy_and_hold_return):
+    """
+    Equity and trade statistics of compute_signal_stats() for any equity
+    curve and closed trade PnL/returns; adds _equity_curve but not _trades
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gmean_day_return = 0
+        day_returns = np.array([np.nan])
+        annual_trading_days = np.nan
+        if isinstance(index, pd.DatetimeIndex):
+            day_returns, weekend_share = _daily_returns(index, equity)
+            gmean_day_return = _geometric_mean(day_returns)
+            annual_trading_days = 365. if weekend_share > 2 / 7 * .6 else 252.
+        annualized_return = (1 + gmean_day_return) ** annual_trading_days - 1
+        valid_day_returns = day_returns[~np.isnan(day_returns)]
+        day_variance = valid_day_returns.var(ddof=1) if len(valid_day_returns) > 1 else np.nan
+        volatility = np.sqrt((day_variance + (1 + gmean_day_return) ** 2) ** annual_trading_days
+                             - (1 + gmean_day_return) ** (2 * annual_trading_days)) * 100
+        drawdown = 1 - equity / np.maximum.accumulate(equity)
+        n_trades = len(pl)
+
+        stats = pd.Series(dtype=object)
+        stats.loc['Start'] = index[0]
+        stats.loc['End'] = index[-1]
+        stats.loc['Equity Final [$]'] = equity[-1]
+        stats.loc['Equity Peak [$]'] = equity.max()
+        stats.loc['Return [%]'] = (equity[-1] - equity[0]) / equity[0] * 100
+        stats.loc['Buy & Hold Return [%]'] = buy_and_hold_return
+        stats.loc['Return (Ann.) [%]'] = annualized_return * 100
+        stats.loc['Volatility (Ann.) [%]'] = volatility
+        stats.loc['Sharpe Ratio'] = np.clip(annualized_return * 100 / (volatility or np.nan), 0, np.inf)
+        stats.loc['Max. Drawdown [%]'] = -np.nan_to_num(drawdown.max()) * 100
+        stats.loc['# Trades'] = n_trades
+        stats.loc['Win Rate [%]'] = np.nan if not n_trades else (pl > 0).sum() / n_trades * 100
+        stats.loc['Best Trade [%]'] = returns.max() * 100 if n_trades else np.nan
+        stats.loc['Worst Trade [%]'] = returns.min() * 100 if n_trades else np.nan
+        stats.loc['Avg. Trade [%]'] = _geometric_mean(returns) * 100
+        stats.loc['Profit Factor'] = returns[returns > 0].sum() / (abs(returns[returns < 0].sum()) or np.nan)
+        stats.loc['Expectancy [%]'] = returns.mean() * 100 if n_trades else np.nan
+
+    stats.loc['_equity_curve'] = pd.DataFrame({'Equity': equity, 'DrawdownPct': drawdown}, index=index)
+    return stats
+
+
+class VectorizedBacktest:
+    """
+    backtesting.Backtest for signals() strategies, without per-bar callbacks
+
+    Only run() is provided. The data and arguments go through
+    Backtest.__init__, so both engines validate them the same way.
+    """
+
+    def __init__(self, data, strategy, *, cash=10_000, commission=.0, trade_start=0):
+        from backtesting import Backtest
+
+        if not defines_signals(strategy):
+            raise ValueError(f"{strategy.__name__} has no signals() for the vectorized engine")
+        self._backtest = Backtest(data, strategy, cash=cash, commission=commission)
+        self._cash = cash
+        self._commission = commission
+        self._trade_start = trade_start
+
+    def run(self, **kwargs):
+        from backtesting._util import _Data
+
+        backtest = self._backtest
+        data = _Data(backtest._data.copy(deep=False))
+        strategy = backtest._strategy(backtest._broker(data=data), data, kwargs)
+        strategy.init()
+        data._update()
+
+        entries, exits = strategy.__dict__.get(SIGNALS_ATTR) or signal_arrays(strategy)
+        df = backtest._data
+        close = df['Close'].to_numpy(dtype=np.float64)
+        start = self._trade_start
+        trades, equity = simulate_signals(
+            df['Open'].to_numpy(dtype=np.float64), close, entries, exits,
+            max(warmup_start(strategy), start), float(self._cash), self._commission,
+        )
+        if start:
+            # Statistics of the traded window, like windowed_stats() for backtesting.py
+            trades = dict(trades, entry_bar=trades['entry_bar'] - start, exit_bar=trades['exit_bar'] - start)
+            return compute_signal_stats(df.index[start:], close[start:], trades, equity[start:])
+        return compute_signal_stats(df.index, close, trades, equity)
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+backtest_walkforward.py - Walk-forward (out-of-sample) evaluation for run_backtest.py
+
+Driven by the optional `walkForward` block in config.json:
+
+    "walkForward": {
+        "train": 180,          # train window: bars, or a duration such as "180D"
+        "test": 30,            # test window, same unit as train
+        "step": 30,            # optional, distance between folds (default: test)
+        "anchored": false,     # optional, true grows every train window from the first bar
+        "workers": 4           # optional, defaults to CPU count
+    }
+
+Folds are laid out over startDate..endDate. Each fold optimizes on its
+train slice (using the `optimize` block when present, otherwise the
+strategy's default parameters) and evaluates the chosen parameters on the
+following test slice with fresh capital. Test runs start with the
+strategy's inferred warm-up (see backtest_lookback.py) from the bars before
+the slice, during which they do not trade, so indicators are settled when
+the test window opens. Folds run on a fork pool that inherits the loaded
+DataFrame; every train/test slice is an iloc view of it, so no OHLCV data
+is copied or pickled per fold. Completed folds are reported as `folds`
+progress events.
+
+Test equity curves and trades are chained into one stitched out-of-sample
+run whose statistics are computed like a single run's (summary_stats() and
+extract_metrics()) and become the run's `metrics`; per-fold results are
+returned under `walk_forward`.
+"""
+
+import logging
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from backtest_limits import ResourceLimitExceeded
+from backtest_lookback import infer_lookback, resolve_lookback, warmup_bars
+from backtest_progress import detach_worker, pool_workers, reporter
+from backtest_vectorized import create_backtest, select_engine, summary_stats
+from run_backtest import extract_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def parse_window(spec, name):
+    """A window is a positive bar count or a pandas duration string ("90D", "12h")"""
+    if isinstance(spec, bool):
+        raise ValueError(f"walkForward.{name} must be a bar count or a duration like '90D'")
+    if isinstance(spec, int):
+        if spec <= 0:
+            raise ValueError(f"walkForward.{name} must be positive")
+        return spec
+    if isinstance(spec, str):
+        try:
+            window = pd.Timedelta(spec)
+        except ValueError:
+            raise ValueError(f"walkForward.{name} is not a valid duration: '{spec}'")
+        if window <= pd.Timedelta(0):
+            raise ValueError(f"walkForward.{name} must be positive")
+        return window
+    raise ValueError(f"walkForward.{name} must be a bar count or a duration like '90D'")
+
+
+def parse_walk_forward(spec):
+    """Validate the `walkForward` block; returns (train, test, step) windows with step defaulting to test"""
+    if not isinstance(spec, dict):
+        raise ValueError("walkForward must be an object with train and test windows")
+    for field in ('train', 'test'):
+        if field not in spec:
+            raise ValueError(f"walkForward.{field} is required")
+
+    train = parse_window(spec['train'], 'train')
+    test = parse_window(spec['test'], 'test')
+    step = parse_window(spec['step'], 'step') if spec.get('step') is not None else test
+    if len({type(window) for window in (train, test, step)}) > 1:
+        raise ValueError("walkForward.train, test and step must all be bar counts or all be durations")
+    if step < test:
+        raise ValueError("walkForward.step must be at least test so out-of-sample windows do not overlap")
+
+    workers = spec.get('workers')
+    if workers is not None and (isinstance(workers, bool) or not isinstance(workers, int) or workers < 1):
+        raise ValueError("walkForward.workers must be a positive integer")
+    return train, test, step
+
+
+def build_folds(index, train, test, step=None, anchored=False):
+    """
+    Split a DatetimeIndex into (train_start, train_end, test_end) positions
+
+    Windows are all bar counts or all durations. Each test slice starts where
+    its train slice ends; only folds with a complete test window are kept.
+    """
+    step = test if step is None else step
+    windows = (train, test, step)
+    if all(isinstance(w, int) for w in windows):
+        bounds = _bar_folds(len(index), train, test, step, anchored)
+    elif all(isinstance(w, pd.Timedelta) for w in windows):
+        bounds = _time_folds(index, train, test, step, anchored)
+    else:
+        raise ValueError("walkForward.train, test and step must all be bar counts or all be durations")
+
+    folds = [(a, b, c) for a, b, c in bounds if b - a >= 2 and c - b >= 2]
+    if not folds:
+        raise ValueError(
+            f"walkForward windows do not fit in the {len(index)} bars between startDate and endDate"
+        )
+    return folds
+
+
+def _bar_folds(length, train, test, step, anchored):
+    test_start = train
+    while test_start + test <= length:
+        yield (0 if anchored else test_start - train), test_start, test_start + test
+        test_start += step
+
+
+def _time_folds(index, train, test, step, anchored):
+    if len(index) < 2:
+        return
+    # The last bar covers one bar interval past its timestamp
+    data_end = index[-1] + (index[-1] - index[-2])
+    test_start = index[0] + train
+    while test_start + test <= data_end:
+        train_start = index[0] if anchored else test_start - train
+        yield (
+            int(index.searchsorted(train_start)),
+            int(index.searchsorted(test_start)),
+            int(index.searchsorted(test_start + test)),
+        )
+        test_start += step
+
+
+def date_range_bounds(df, config):
+    """[lo, hi) positions of config startDate..endDate in df (endDate inclusive)"""
+    start = pd.Timestamp(config['startDate'])
+    end = pd.Timestamp(config['endDate'])
+    if end.normalize() == end:
+        end += pd.Timedelta(days=1)  # A bare date covers the whole day
+    lo, hi = int(df.index.searchsorted(start)), int(df.index.searchsorted(end))
+    if hi <= lo:
+        raise ValueError(f"No OHLCV data between startDate {config['startDate']} and endDate {config['endDate']}")
+    return lo, hi
+
+
+def fold_warmup(df, strategy_code, config):
+    """Bars a test run needs before its window: config.lookback, or the inferred warm-up"""
+    lookback = resolve_lookback(strategy_code, config) or infer_lookback(strategy_code, config)
+    steps = np.diff(df.index.values[:1024]).astype('timedelta64[ms]').astype(np.int64)
+    steps = steps[steps > 0]
+    # backtesting first calls next() on the bar after the indicators' first value
+    return warmup_bars(lookback, float(steps.min()) if len(steps) else 0) + 1
+
+
+# ============ Pool Worker ============
+
+# Set in the parent before the pool forks, so children inherit the loaded DataFrame
+_walk_forward_state = {}
+
+
+def _window(df, start, end):
+    return {
+        "start": df.index[start].isoformat(),
+        "end": df.index[end - 1].isoformat(),
+        "bars": end - start,
+    }
+
+
+def _run_fold(fold_index):
+    """Optimize on one train slice and evaluate on its test slice (after its warm-up bars)"""
+    state = _walk_forward_state
+    df, config = state['df'], state['config']
+    train_start, test_start, test_end = state['folds'][fold_index]
+    train_df = df.iloc[train_start:test_start]
+    warmup_start = max(test_start - state['warmup'], 0)
+    test_df = df.iloc[warmup_start:test_end]
+
+    outcome = {
+        "index": fold_index,
+        "train": _window(df, train_start, test_start),
+        "test": _window(df, test_start, test_end),
+    }
+    try:
+        if config.get('optimize'):
+            from backtest_optimizer import run_optimization
+            params, optimization = run_optimization(train_df, state['strategy_code'], state['strategy_class'], config)
+            train_metrics = optimization['top_results'][0]['metrics']
+        else:
+            params = {}
+            train_bt = create_backtest(train_df, state['strategy_class'], config, state['engine'])
+            train_metrics = extract_metrics(train_bt.run())
+
+        test_bt = create_backtest(test_df, state['strategy_class'], config, state['engine'],
+                                  trade_start=test_start - warmup_start)
+        stats = test_bt.run(**params)
+    except (ResourceLimitExceeded, MemoryError):
+        raise  # Fails the whole run, not just this fold
+    except Exception as e:
+        outcome["error"] = str(e)
+        return outcome, None
+
+    outcome.update(params=params, train_metrics=train_metrics, test_metrics=extract_metrics(stats))
+    equity = stats._equity_curve['Equity']
+    close = df['Close'].to_numpy()
+    segment = {
+        "index": equity.index.to_numpy(),
+        "growth": equity.to_numpy(dtype=np.float64) / config['initialCapital'],
+        "trade_pnl": stats._trades['PnL'].to_numpy(dtype=np.float64) / config['initialCapital'],
+        "trade_returns": stats._trades['ReturnPct'].to_numpy(dtype=np.float64),
+        "close": (float(close[test_start]), float(close[test_end - 1])),
+    }
+    return outcome, segment
+
+
+def _quiet_worker():
+    logging.getLogger().setLevel(logging.WARNING)
+    detach_worker()
+
+
+def _collect(outcomes, total):
+    """Gather fold results in order, reporting progress"""
+    counter = reporter.counter('folds', total)
+    results = []
+    failed = 0
+    for outcome, segment in outcomes:
+        results.append((outcome, segment))
+        failed += segment is None
+        counter.update(len(results), failed=failed)
+    return results
+
+
+# ============ Stitching ============
+
+def stitch_segments(segments, initial_capital):
+    """
+    Chain the per-fold test equity curves and trades into one out-of-sample
+    run and score it like a single run (summary_stats() + extract_metrics())
+    """
+    growth = []
+    trade_pnl = []
+    factor = 1.0
+    for segment in segments:
+        growth.append(segment['growth'] * factor)
+        # Each fold starts with the capital the previous ones left
+        trade_pnl.append(segment['trade_pnl'] * factor * initial_capital)
+        factor *= segment['growth'][-1]
+
+    index = pd.DatetimeIndex(np.concatenate([s['index'] for s in segments]))
+    equity = np.concatenate(growth) * initial_capital
+    first_close, last_close = segments[0]['close'][0], segments[-1]['close'][1]
+    stats = summary_stats(index, equity, np.concatenate(trade_pnl),
+                          np.concatenate([s['trade_returns'] for s in segments]),
+                          (last_close - first_close) / first_close * 100)
+    return extract_metrics(stats)
+
+
+def run_walk_forward(df, strategy_code, strategy_class, config):
+    """
+    Run every walk-forward fold, in parallel when possible
+
+    Returns (stitched_out_of_sample_metrics, walk_forward_summary).
+    """
+    spec = config['walkForward']
+    train, test, step = parse_walk_forward(spec)
+
+    # Folds cover startDate..endDate; the bars before it (e.g. a lookback's warm-up) only warm up the first test
+    lo, hi = date_range_bounds(df, config)
+    folds = [(train_start + lo, test_start + lo, test_end + lo) for train_start, test_start, test_end in build_folds(
+        df.index[lo:hi], train, test, step, anchored=bool(spec.get('anchored', False)),
+    )]
+    warmup = fold_warmup(df, strategy_code, config)
+    logger.info(f"Test folds start with {warmup} warm-up bars")
+
+    _walk_forward_state.update(
+        df=df, folds=folds, config=config, warmup=warmup,
+        strategy_code=strategy_code, strategy_class=strategy_class,
+        engine=select_engine(strategy_class, config),
+    )
+    workers = pool_workers(spec.get('workers'), len(folds), 'Walk-forward')
+    logger.info(f"Running {len(folds)} walk-forward folds on {workers} workers")
+
+    try:
+        if workers <= 1:
+            results = _collect((_run_fold(i) for i in range(len(folds))), len(folds))
+        else:
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(processes=workers, initializer=_quiet_worker) as pool:
+                results = _collect(pool.imap(_run_fold, range(len(folds))), len(folds))
+    finally:
+        _walk_forward_state.clear()
+
+    fold_results = [outcome for outcome, _ in results]
+    segments = [segment for _, segment in results if segment is not None]
+    if not segments:
+        raise ValueError(f"All {len(folds)} walk-forward folds failed: {fold_results[0]['error']}")
+
+    stitched = stitch_segments(segments, config['initialCapital'])
+    summary = {
+        "anchored": bool(spec.get('anchored', False)),
+        "folds": fold_results,
+        "failed": len(folds) - len(segments),
+        "workers": workers,
+        "stitched": stitched,
+    }
+    return stitched, summary
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the run_backtest.py pipeline
+
+Runs the full pipeline (a fresh run_backtest.py process per run, as the
+server does) for the two strategy templates and a heavy synthetic strategy
+on generated OHLCV data of 1k, 10k, 100k and 1M hourly bars. Everything is
+offline: the data is a seeded random walk written as ohlcv.bin.
+
+Each case records, as the median over --repeat runs:
+- per-stage wall/CPU seconds from the result's profile (config.profile)
+- startup: process wall time not covered by a stage (interpreter and imports)
+- peak RSS of the run in MB
+- result JSON size and deferred report data size in bytes
+
+Run this from apps/server/ directory:
+python scripts/benchmark_backtest.py                          # run and compare to the baseline
+python scripts/benchmark_backtest.py --save-baseline          # record a new baseline
+python scripts/benchmark_backtest.py --sizes 1000,10000 --cases rsi,sma_crossover
+
+Timings are machine specific, so record the baseline on the machine that
+runs the comparison. A stage regresses when it is more than --threshold
+(default 25%) slower than its baseline and at least --min-delta seconds
+slower; peak RSS and output size are compared with the same threshold.
+The exit status is 1 when anything regressed.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ohlcv_store import write_ohlcv_file
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_BACKTEST = os.path.join(SCRIPTS_DIR, 'run_backtest.py')
+TEMPLATES_DIR = os.path.join(os.path.dirname(SCRIPTS_DIR), 'templates')
+
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, 'benchmark_baseline.json')
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.25
+DEFAULT_MIN_DELTA = 0.05  # seconds; shorter stages are mostly timer noise
+MIN_RSS_DELTA = 20  # MB
+MIN_BYTES_DELTA = 4096
+
+HOUR_MS = 3600 * 1000
+START_MS = 1_577_836_800_000  # 2020-01-01
+
+HEAVY_STRATEGY = """
+from backtesting import Strategy
+import numpy as np
+import talib
+
+
+class HeavyStrategy(Strategy):
+    \"\"\"Several indicators and per-bar numpy work: a worst case for next()\"\"\"
+
+    window = 50
+
+    def init(self):
+        close = self.data.Close
+        self.ema_fast = self.I(talib.EMA, close, 12)
+        self.ema_slow = self.I(talib.EMA, close, 48)
+        self.rsi = self.I(talib.RSI, close, 14)
+        self.atr = self.I(talib.ATR, self.data.High, self.data.Low, close, 14)
+        self.bands = self.I(talib.BBANDS, close, 20)
+
+    def next(self):
+        closes = self.data.Close[-self.window:]
+        volatility = np.std(closes) / np.mean(closes)
+        price = self.data.Close[-1]
+        if not self.position:
+            if self.ema_fast[-1] > self.ema_slow[-1] and self.rsi[-1] < 60 and price < self.bands[0][-1]:
+                self.buy()
+        elif self.rsi[-1] > 70 or volatility > 0.05 or price < self.ema_slow[-1] - 2 * self.atr[-1]:
+            self.position.close()
+"""
+
+
+def load_template(name):
+    with open(os.path.join(TEMPLATES_DIR, name)) as f:
+        return f.read()
+
+
+# Case name -> strategy code
+CASES = {
+    'rsi': lambda: load_template('strategy_rsi.py'),
+    'sma_crossover': lambda: load_template('strategy_sma_crossover.py'),
+    'heavy': lambda: HEAVY_STRATEGY,
+}
+
+
+# ============ Data ============
+
+def write_ohlcv_binary(path, bars, seed=42):
+    """Write a seeded random walk of hourly candles in the ohlcv.bin layout"""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.005, bars)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.003, bars))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    timestamps = START_MS + np.arange(bars, dtype=np.int64) * HOUR_MS
+    write_ohlcv_file(path, timestamps, np.stack([open_, high, low, close]), ['Open', 'High', 'Low', 'Close'])
+
+
+def write_case(tmp_dir, strategy_code, bars):
+    with open(os.path.join(tmp_dir, 'strategy.py'), 'w') as f:
+        f.write(strategy_code)
+    end_ms = START_MS + (bars - 1) * HOUR_MS
+    config = {
+        "startDate": time.strftime('%Y-%m-%d', time.gmtime(START_MS / 1000)),
+        "endDate": time.strftime('%Y-%m-%d', time.gmtime(end_ms / 1000)),
+        "initialCapital": 100000,
+        "commission": 0.002,
+        "report": "deferred",
+        "reportPath": os.path.join(tmp_dir, 'report.data'),
+        "cache": False,
+        "profile": True,
+    }
+    with open(os.path.join(tmp_dir, 'config.json'), 'w') as f:
+        json.dump(config, f)
+    return config
+
+
+# ============ Measurement ============
+
+def run_once(tmp_dir, config, timeout):
+    """One run_backtest.py process; returns {stages: {name: {wall, cpu}}, peak_rss_mb, ...}"""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, RUN_BACKTEST, tmp_dir],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout,
+    )
+    process_wall = time.perf_counter() - started
+
+    lines = completed.stdout.decode().strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        detail = (lines or completed.stderr.decode().strip().splitlines() or [''])[-1]
+        raise RuntimeError(f"run_backtest.py failed (exit {completed.returncode}): {detail[:500]}")
+    output = lines[-1]
+    result = json.loads(output)
+
+    profile = result["profile"]
+    stages = {stage["stage"]: {"wall": stage["wall"], "cpu": stage["cpu"]} for stage in profile["stages"]}
+    stages["startup"] = {"wall": round(max(process_wall - profile["total"]["wall"], 0), 4), "cpu": None}
+
+    report_path = config.get("reportPath")
+    report_bytes = os.path.getsize(report_path) if report_path and os.path.exists(report_path) else 0
+    if report_bytes:
+        os.remove(report_path)
+
+    return {
+        "stages": stages,
+        "wall": round(process_wall, 4),
+        "peak_rss_mb": max([profile["total"]["max_rss_mb"]] + [s["peak_rss_mb"] for s in profile["stages"]]),
+        "result_bytes": len(output.encode()),
+        "report_bytes": report_bytes,
+        "total_trades": result["metrics"].get("total_trades"),
+    }
+
+
+def median_run(runs):
+    """Combine repeated runs of a case into their per-field medians"""
+    def median(values):
+        values = [v for v in values if v is not None]
+        return round(statistics.median(values), 4) if values else None
+
+    names = [name for name in runs[0]["stages"] if all(name in run["stages"] for run in runs)]
+    return {
+        "stages": {
+            name: {key: median([run["stages"][name][key] for run in runs]) for key in ("wall", "cpu")}
+            for name in names
+        },
+        "wall": median([run["wall"] for run in runs]),
+        "peak_rss_mb": median([run["peak_rss_mb"] for run in runs]),
+        "result_bytes": runs[-1]["result_bytes"],
+        "report_bytes": runs[-1]["report_bytes"],
+        "total_trades": runs[-1]["total_trades"],
+    }
+
+
+def run_suite(cases, sizes, repeat, timeout, log):
+    """Benchmark every case at every size; returns {"<case>/<bars>": measurement}"""
+    results = {}
+    for bars in sizes:
+        tmp_dir = tempfile.mkdtemp(prefix=f'backtest-bench-{bars}-')
+        try:
+            write_ohlcv_binary(os.path.join(tmp_dir, 'ohlcv.bin'), bars)
+            for case in cases:
+                config = write_case(tmp_dir, CASES[case](), bars)
+                runs = [run_once(tmp_dir, config, timeout) for _ in range(repeat)]
+                key = f"{case}/{bars}"
+                results[key] = median_run(runs)
+                log(format_measurement(key, results[key]))
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def format_measurement(key, measurement):
+    stages = ", ".join(f"{name} {stage['wall']:.3f}s" for name, stage in measurement["stages"].items())
+    return (f"{key:<24} {measurement['wall']:8.3f}s  {measurement['peak_rss_mb']:7.1f} MB  "
+            f"{measurement['result_bytes'] + measurement['report_bytes']:>10} B  [{stages}]")
+
+
+# ============ Baseline ============
+
+def _regressed(current, baseline, threshold, min_delta):
+    return (current is not None and baseline is not None
+            and current > baseline * (1 + threshold) and current - baseline >= min_delta)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, min_delta=DEFAULT_MIN_DELTA):
+    """Regressions of results against baseline, as human-readable strings"""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+
+        for name, stage in current["stages"].items():
+            before = previous["stages"].get(name, {}).get("wall")
+            if _regressed(stage["wall"], before, threshold, min_delta):
+                regressions.append(f"{key} {name}: {stage['wall']:.3f}s vs {before:.3f}s baseline")
+
+        if _regressed(current["peak_rss_mb"], previous.get("peak_rss_mb"), threshold, MIN_RSS_DELTA):
+            regressions.append(f"{key} peak RSS: {current['peak_rss_mb']:.1f} MB vs "
+                               f"{previous['peak_rss_mb']:.1f} MB baseline")
+
+        for field in ("result_bytes", "report_bytes"):
+            if _regressed(current[field], previous.get(field), threshold, MIN_BYTES_DELTA):
+                regressions.append(f"{key} {field}: {current[field]} vs {previous[field]} baseline")
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def save_baseline(path, results):
+    """Merge results into the baseline file (cases not run keep their old baseline)"""
+    merged = load_baseline(path) or {}
+    merged.update(results)
+    with open(path, 'w') as f:
+        json.dump({
+            "python": sys.version.split()[0],
+            "machine": os.uname().machine,
+            "cpus": os.cpu_count(),
+            "recorded": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "results": dict(sorted(merged.items())),
+        }, f, indent=2)
+
+
+def parse_list(value, convert=str):
+    return [convert(item) for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the run_backtest.py pipeline on synthetic data")
+    parser.add_argument("--cases", type=parse_list, default=list(CASES),
+                        help=f"Comma-separated strategies to run (default: {','.join(CASES)})")
+    parser.add_argument("--sizes", type=lambda value: parse_list(value, int), default=list(DEFAULT_SIZES),
+                        help="Comma-separated bar counts (default: 1000,10000,100000,1000000)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Runs per case; medians are reported")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a single run is aborted")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown as a fraction of the baseline (default: 0.25)")
+    parser.add_argument("--min-delta", type=float, default=DEFAULT_MIN_DELTA,
+                        help="Ignore stage slowdowns under this many seconds (default: 0.05)")
+    parser.add_argument("--output", help="Also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown case(s): {', '.join(sorted(unknown))}. Expected: {', '.join(CASES)}")
+    if args.repeat < 1 or any(bars < 2 for bars in args.sizes):
+        parser.error("--repeat must be at least 1 and every size at least 2 bars")
+
+    log = lambda message: print(message, file=sys.stderr, flush=True)  # noqa: E731
+    results = run_suite(args.cases, args.sizes, args.repeat, args.timeout, log)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        log(f"Baseline saved to {args.baseline}")
+        return
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        log(f"No baseline at {args.baseline}; run with --save-baseline to record one")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    for regression in regressions:
+        log(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    log(f"No regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+indicator_engine.py - Incremental rolling indicators for live strategy monitoring
+
+Loaded in-process by the Node server through pythonia (see
+src/services/trading/indicator-service.ts). Module-level state keeps one
+rolling indicator state per asset and indicator, so a monitor tick only
+feeds the points that arrived since the previous tick instead of
+recomputing talib over the full price history.
+
+Each evaluate() call receives the asset's price history as JSON
+[[timestamp_ms, price], ...] and a list of indicator specs:
+
+    {"type": "rsi", "period": 14}                              # Wilder RSI
+    {"type": "sma", "period": 20}
+    {"type": "ema", "period": 20}
+    {"type": "cross", "fast": 10, "slow": 30, "ma": "sma"}     # ma: sma (default) or ema
+
+and returns one JSON result per spec:
+
+    rsi/sma/ema: {"value", "previous"}
+    cross:       {"fast", "slow", "previous_fast", "previous_slow", "cross_up", "cross_down"}
+
+evaluate_monitors() evaluates every active strategy monitor in one call
+(see its docstring). history_points() tells the server how many price
+points a set of monitors needs, so it only fetches that much history.
+
+Values are null until enough points have been seen. The newest point is
+treated as provisional (CoinGecko's last market_chart point is the live
+price and is replaced by the next fetch): indicators are evaluated on it
+without committing it, and "previous" is the value at the last committed
+point. Values match talib's RSI/SMA/EMA over the same series.
+"""
+
+import json
+import math
+from collections import deque
+
+import numpy as np
+
+# Committed points kept per asset to seed indicators requested later
+HISTORY_LIMIT = 10000
+
+# Extra periods of history for recursive indicators (RSI, EMA), after which their seed no longer matters
+CONVERGENCE_PERIODS = 10
+
+MOVING_AVERAGES = ('sma', 'ema')
+
+# Numeric params each monitor type needs (smaCross also needs signal_type)
+MONITOR_PARAMS = {
+    'positionMonitor': ('stopLoss', 'takeProfit'),
+    'rsi': ('period', 'overbought', 'oversold'),
+    'smaCross': ('fast_period', 'slow_period'),
+    'timeLimit': ('duration_seconds',),
+}
+MONITOR_TYPES = tuple(MONITOR_PARAMS)
+PERIOD_PARAMS = ('period', 'fast_period', 'slow_period')
+SIGNAL_TYPES = ('cross_up', 'cross_down', 'both')
+
+
+class SMA:
+    """Simple moving average over a rolling window"""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque()
+        self.total = 0.0
+
+    def update(self, price):
+        self.window.append(price)
+        self.total += price
+        if len(self.window) > self.period:
+            self.total -= self.window.popleft()
+
+    def value(self):
+        return self.total / self.period if len(self.window) == self.period else None
+
+    def peek(self, price):
+        """Value if price were the next point, without committing it"""
+        if len(self.window) == self.period:
+            return (self.total - self.window[0] + price) / self.period
+        if len(self.window) == self.period - 1:
+            return (self.total + price) / self.period
+        return None
+
+
+class EMA:
+    """Exponential moving average seeded with the SMA of the first period points (as talib)"""
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.count = 0
+        self.current = 0.0  # Running sum until seeded, then the EMA
+
+    def _next(self, price):
+        if self.count + 1 < self.period:
+            return None
+        if self.count + 1 == self.period:
+            return (self.current + price) / self.period
+        return self.current + self.alpha * (price - self.current)
+
+    def update(self, price):
+        if self.count + 1 < self.period:
+            self.current += price
+        else:
+            self.current = self._next(price)
+        self.count += 1
+
+    def value(self):
+        return self.current if self.count >= self.period else None
+
+    def peek(self, price):
+        return self._next(price)
+
+
+class WilderRSI:
+    """RSI with Wilder smoothing; the first averages are plain means of period changes (as talib)"""
+
+    def __init__(self, period):
+        self.period = period
+        self.last_price = None
+        self.changes = 0
+        self.avg_gain = 0.0  # Running sums until seeded, then the smoothed averages
+        self.avg_loss = 0.0
+
+    def _next(self, price):
+        """(avg_gain, avg_loss) after price, or None while unseeded"""
+        if self.last_price is None:
+            return None
+        change = price - self.last_price
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.changes + 1 < self.period:
+            return None
+        if self.changes + 1 == self.period:
+            return (self.avg_gain + gain) / self.period, (self.avg_loss + loss) / self.period
+        return (
+            (self.avg_gain * (self.period - 1) + gain) / self.period,
+            (self.avg_loss * (self.period - 1) + loss) / self.period,
+        )
+
+    @staticmethod
+    def _rsi(averages):
+        if averages is None:
+            return None
+        avg_gain, avg_loss = averages
+        total = avg_gain + avg_loss
+        return 100.0 * avg_gain / total if total != 0 else 0.0
+
+    def update(self, price):
+        if self.last_price is not None:
+            averages = self._next(price)
+            if averages is None:
+                change = price - self.last_price
+                self.avg_gain += max(change, 0.0)
+                self.avg_loss += max(-change, 0.0)
+            else:
+                self.avg_gain, self.avg_loss = averages
+            self.changes += 1
+        self.last_price = price
+
+    def value(self):
+        if self.changes < self.period:
+            return None
+        return self._rsi((self.avg_gain, self.avg_loss))
+
+    def peek(self, price):
+        return self._rsi(self._next(price))
+
+
+INDICATORS = {'rsi': WilderRSI, 'sma': SMA, 'ema': EMA}
+
+
+class AssetState:
+    """Committed price history and live indicator states for one asset"""
+
+    def __init__(self):
+        self.last_timestamp = None
+        self.history = deque(maxlen=HISTORY_LIMIT)
+        self.indicators = {}
+
+    def indicator(self, kind, period):
+        """Get the rolling state for (kind, period), seeding it from history on first use"""
+        key = (kind, period)
+        if key not in self.indicators:
+            state = INDICATORS[kind](period)
+            for price in self.history:
+                state.update(price)
+            self.indicators[key] = state
+        return self.indicators[key]
+
+    def commit(self, timestamp, price):
+        self.last_timestamp = timestamp
+        self.history.append(price)
+        for state in self.indicators.values():
+            state.update(price)
+
+
+class IndicatorEngine:
+    """Rolling indicator states keyed by asset"""
+
+    def __init__(self):
+        self.assets = {}
+
+    def reset(self, asset_id=None):
+        """Drop the state of one asset, or of every asset"""
+        if asset_id is None:
+            self.assets.clear()
+        else:
+            self.assets.pop(asset_id, None)
+
+    def ingest(self, asset_id, points):
+        """
+        Commit every point newer than the last committed one except the newest,
+        which is returned as the provisional tip price (or None)
+        """
+        if not points:
+            return None
+        points = sorted(points, key=lambda point: point[0])
+
+        asset = self.assets.get(asset_id)
+        # The history no longer overlaps what we have seen (e.g. a long idle gap): start over
+        if asset is None or (asset.last_timestamp is not None and points[0][0] > asset.last_timestamp):
+            asset = self.assets[asset_id] = AssetState()
+
+        *committed, (tip_timestamp, tip_price) = points
+        for timestamp, price in committed:
+            if asset.last_timestamp is None or timestamp > asset.last_timestamp:
+                asset.commit(timestamp, float(price))
+
+        if asset.last_timestamp is not None and tip_timestamp <= asset.last_timestamp:
+            return None  # Nothing new since the last committed point
+        return float(tip_price)
+
+    def evaluate(self, asset_id, points, specs):
+        """Ingest points and return one result dict per indicator spec"""
+        tip = self.ingest(asset_id, points)
+        asset = self.assets.get(asset_id) or AssetState()
+        return [self._evaluate_spec(asset, spec, tip) for spec in specs]
+
+    def _evaluate_spec(self, asset, spec, tip):
+        kind = spec.get('type')
+        if kind in INDICATORS:
+            state = asset.indicator(kind, _period(spec, 'period'))
+            previous = state.value()
+            current = state.peek(tip) if tip is not None else previous
+            return {"value": _finite_or_none(current), "previous": _finite_or_none(previous)}
+
+        if kind == 'cross':
+            ma = spec.get('ma', 'sma')
+            if ma not in MOVING_AVERAGES:
+                raise ValueError(f"Unknown moving average '{ma}' for cross. Expected one of: {', '.join(MOVING_AVERAGES)}")
+            fast_state = asset.indicator(ma, _period(spec, 'fast'))
+            slow_state = asset.indicator(ma, _period(spec, 'slow'))
+            previous_fast, previous_slow = fast_state.value(), slow_state.value()
+            if tip is None:
+                # Nothing newer than the committed points, so there is no fresh cross to report
+                return _cross(previous_fast, previous_slow, None, None)
+            return _cross(fast_state.peek(tip), slow_state.peek(tip), previous_fast, previous_slow)
+
+        raise ValueError(f"Unknown indicator type '{kind}'")
+
+    def evaluate_monitors(self, assets, monitors, now_ms):
+        """
+        Evaluate many trades' strategy monitors in one pass
+
+        assets:   {asset_id: {"points": [[timestamp_ms, price], ...], "current_price": float | None}}
+        monitors: [{"trade_action_id", "strategy_type", "params", "asset_id", "created_at" (ms)}]
+
+        Each distinct (asset, indicator, period) is evaluated once on the rolling
+        engine, then every monitor's condition is checked with vectorized
+        comparisons per strategy type. Returns {"triggered": [...], "skipped": [...]}
+        where entries are {"index", "trade_action_id", "strategy_type"} (+ "reason").
+        """
+        tips = {asset_id: self.ingest(asset_id, asset.get('points') or []) for asset_id, asset in assets.items()}
+        indicator_cache = {}
+
+        def indicator(asset_id, spec):
+            key = (asset_id, json.dumps(spec, sort_keys=True))
+            if key not in indicator_cache:
+                asset = self.assets.get(asset_id) or AssetState()
+                indicator_cache[key] = self._evaluate_spec(asset, spec, tips.get(asset_id))
+            return indicator_cache[key]
+
+        by_type = {kind: [] for kind in MONITOR_TYPES}
+        skipped = []
+        for index, monitor in enumerate(monitors):
+            kind = monitor.get('strategy_type')
+            if kind not in by_type:
+                skipped.append(_monitor_ref(index, monitor, f"Unknown strategy type '{kind}'"))
+            elif kind != 'timeLimit' and monitor.get('asset_id') not in assets:
+                skipped.append(_monitor_ref(index, monitor, f"No market data for asset '{monitor.get('asset_id')}'"))
+            elif reason := _invalid_monitor_params(monitor):
+                skipped.append(_monitor_ref(index, monitor, reason))
+            else:
+                by_type[kind].append(index)
+
+        triggered = np.zeros(len(monitors), dtype=bool)
+
+        def params(indices, field):
+            return np.array([monitors[i]['params'][field] for i in indices], dtype=np.float64)
+
+        def fill(indices, values):
+            triggered[np.asarray(indices, dtype=np.int64)] = values
+
+        indices = by_type['positionMonitor']
+        if indices:
+            prices = np.array([_current_price(assets[monitors[i]['asset_id']], tips[monitors[i]['asset_id']])
+                               for i in indices], dtype=np.float64)
+            with np.errstate(invalid='ignore'):
+                fill(indices, (prices <= params(indices, 'stopLoss')) | (prices >= params(indices, 'takeProfit')))
+
+        indices = by_type['rsi']
+        if indices:
+            rsi = np.array([
+                _nan_if_none(indicator(monitors[i]['asset_id'], monitor_indicator(monitors[i]))['value'])
+                for i in indices
+            ], dtype=np.float64)
+            with np.errstate(invalid='ignore'):
+                fill(indices, (rsi >= params(indices, 'overbought')) | (rsi <= params(indices, 'oversold')))
+
+        indices = by_type['smaCross']
+        if indices:
+            crosses = [indicator(monitors[i]['asset_id'], monitor_indicator(monitors[i])) for i in indices]
+            cross_up = np.array([c['cross_up'] for c in crosses], dtype=bool)
+            cross_down = np.array([c['cross_down'] for c in crosses], dtype=bool)
+            signal = np.array([monitors[i]['params']['signal_type'] for i in indices])
+            fill(indices, (np.isin(signal, ('cross_up', 'both')) & cross_up)
+                 | (np.isin(signal, ('cross_down', 'both')) & cross_down))
+
+        indices = by_type['timeLimit']
+        if indices:
+            created_at = np.array([monitors[i]['created_at'] for i in indices], dtype=np.float64)
+            fill(indices, (now_ms - created_at) / 1000 >= params(indices, 'duration_seconds'))
+
+        return {
+            "triggered": [_monitor_ref(i, monitors[i]) for i in np.flatnonzero(triggered).tolist()],
+            "skipped": skipped,
+        }
+
+
+# ============ History ============
+
+def monitor_indicator(monitor):
+    """The indicator spec a monitor's condition is evaluated on (None for price/time monitors)"""
+    params = monitor['params']
+    if monitor['strategy_type'] == 'rsi':
+        return {"type": "rsi", "period": params['period']}
+    if monitor['strategy_type'] == 'smaCross':
+        return {"type": "cross", "fast": params['fast_period'], "slow": params['slow_period']}
+    return None
+
+
+def warmup_points(spec):
+    """
+    Points an indicator needs for its current (provisional) and previous value
+
+    Recursive indicators get CONVERGENCE_PERIODS more periods, so a value
+    seeded from this history matches one seeded from a much longer one.
+    """
+    kind = spec['type']
+    if kind == 'cross':
+        ma = spec.get('ma', 'sma')
+        return max(warmup_points({"type": ma, "period": spec['fast']}),
+                   warmup_points({"type": ma, "period": spec['slow']}))
+    period = spec['period']
+    committed = period + 1 if kind == 'rsi' else period  # RSI needs period changes
+    if kind in ('rsi', 'ema'):
+        committed += CONVERGENCE_PERIODS * period
+    return committed + 1  # Plus the provisional tip
+
+
+def monitor_history_points(monitors):
+    """Price points the indicator monitors need (0 when none of them uses history)"""
+    points = 0
+    for monitor in monitors:
+        if monitor.get('strategy_type') not in MONITOR_TYPES or _invalid_monitor_params(monitor):
+            continue
+        spec = monitor_indicator(monitor)
+        if spec is not None:
+            points = max(points, warmup_points(spec))
+    return points
+
+
+# ============ Helpers ============
+
+def _monitor_ref(index, monitor, reason=None):
+    ref = {"index": index, "trade_action_id": monitor.get('trade_action_id'), "strategy_type": monitor.get('strategy_type')}
+    if reason is not None:
+        ref["reason"] = reason
+    return ref
+
+
+def _invalid_monitor_params(monitor):
+    """Why a monitor's params cannot be evaluated, or None"""
+    params = monitor.get('params')
+    if not isinstance(params, dict):
+        return "Missing params"
+    for field in MONITOR_PARAMS[monitor['strategy_type']]:
+        value = params.get(field)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"params.{field} must be a number"
+        if field in PERIOD_PARAMS and (not isinstance(value, int) or value < 1):
+            return f"params.{field} must be a positive integer"
+    if monitor['strategy_type'] == 'smaCross' and params.get('signal_type') not in SIGNAL_TYPES:
+        return f"params.signal_type must be one of: {', '.join(SIGNAL_TYPES)}"
+    if monitor['strategy_type'] == 'timeLimit' and not isinstance(monitor.get('created_at'), (int, float)):
+        return "created_at must be epoch milliseconds"
+    return None
+
+
+def _current_price(asset, tip):
+    price = asset.get('current_price')
+    return price if price is not None else (tip if tip is not None else math.nan)
+
+
+def _nan_if_none(value):
+    return math.nan if value is None else value
+
+
+def _period(spec, field):
+    period = spec.get(field)
+    if not isinstance(period, int) or isinstance(period, bool) or period < 1:
+        raise ValueError(f"Indicator {spec.get('type')}.{field} must be a positive integer")
+    return period
+
+
+def _cross(fast, slow, previous_fast, previous_slow):
+    result = {
+        "fast": _finite_or_none(fast),
+        "slow": _finite_or_none(slow),
+        "previous_fast": _finite_or_none(previous_fast),
+        "previous_slow": _finite_or_none(previous_slow),
+        "cross_up": False,
+        "cross_down": False,
+    }
+    if None not in (result["fast"], result["slow"], result["previous_fast"], result["previous_slow"]):
+        result["cross_up"] = previous_fast <= previous_slow and fast > slow
+        result["cross_down"] = previous_fast >= previous_slow and fast < slow
+    return result
+
+
+def _finite_or_none(value):
+    return value if value is not None and math.isfinite(value) else None
+
+
+_engine = IndicatorEngine()
+
+
+def evaluate(asset_id, points_json, specs_json):
+    """
+    pythonia entry point: one bridge call per monitor tick
+
+    Takes and returns JSON strings so nothing crosses the bridge as proxies.
+    """
+    return json.dumps(_engine.evaluate(asset_id, json.loads(points_json), json.loads(specs_json)))
+
+
+def evaluate_monitors(assets_json, monitors_json, now_ms):
+    """pythonia entry point: evaluate every active monitor in one call (see IndicatorEngine.evaluate_monitors)"""
+    return json.dumps(_engine.evaluate_monitors(json.loads(assets_json), json.loads(monitors_json), now_ms))
+
+
+def reset(asset_id=None):
+    """pythonia entry point: forget the rolling state of an asset (or all assets)"""
+    _engine.reset(asset_id)
+
+
+def history_points(monitors_json):
+    """pythonia entry point: price points of history the monitors need (see warmup_points)"""
+    return monitor_history_points(json.loads(monitors_json))
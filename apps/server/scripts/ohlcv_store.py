@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+ohlcv_store.py - Local partitioned candle store for run_backtest.py
+
+Candles are kept per coin and resolution, split into time chunks in the
+ohlcv.bin layout (see load_ohlcv_binary in run_backtest.py):
+
+    <store>/<coinId>/<resolution>/index.json
+    <store>/<coinId>/<resolution>/2024-03.bin     # monthly chunks below 1h bars
+    <store>/<coinId>/<resolution>/2024.bin        # yearly chunks otherwise
+
+index.json lists every chunk with its first/last timestamp, row count and
+content digest, so a range read opens (memory-maps) only the chunks that
+overlap the range. A read within one chunk is a zero-copy view of it.
+
+Backtests read from the store with the optional `candleStore` block in
+config.json instead of a job's ohlcv.bin; startDate..endDate select the
+bars (a bare endDate includes that whole day):
+
+    "candleStore": {"path": "/var/lib/agentix/candles", "coinId": "bitcoin", "resolution": "4h"}
+
+The market-data-sync cron appends fetched candles incrementally:
+
+    python scripts/ohlcv_store.py append <store> <coinId> <resolution> <ohlcv.bin>
+    python scripts/ohlcv_store.py info <store> <coinId> <resolution>
+
+Appends rewrite only the chunks they touch; a candle with an existing
+timestamp replaces the stored one (the latest candle of a sync is usually
+still forming). Writers hold an exclusive lock per coin and resolution,
+and chunk files and the index are replaced atomically, so readers never see
+a partial write.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+OHLCV_BINARY_MAGIC = b'AGXOHLC1'
+
+INDEX_FILE = 'index.json'
+INDEX_VERSION = 1
+
+RESOLUTION_PATTERN = re.compile(r'^(\d+)([mhdw])$')
+RESOLUTION_UNIT_MS = {'m': 60_000, 'h': 3_600_000, 'd': 86_400_000, 'w': 604_800_000}
+
+# Resolutions below this are chunked by month, the rest by year
+MONTHLY_CHUNKS_BELOW_MS = 3_600_000
+
+# Safe path component for coin IDs (CoinGecko IDs are lowercase slugs)
+COIN_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9._-]*$')
+
+
+def resolution_ms(resolution):
+    """Bar length of a resolution such as "30m", "4h" or "1d" in milliseconds"""
+    match = RESOLUTION_PATTERN.match(str(resolution))
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid resolution '{resolution}'. Expected e.g. 1m, 30m, 4h, 1d")
+    return int(match.group(1)) * RESOLUTION_UNIT_MS[match.group(2)]
+
+
+# ============ Chunk Files ============
+
+def write_ohlcv_file(path, timestamps, values, columns):
+    """Write int64 ms timestamps and a (columns, rows) float64 block in the ohlcv.bin layout"""
+    rows = len(timestamps)
+    prefix_length = len(OHLCV_BINARY_MAGIC) + 4
+    header_for = lambda offset: json.dumps({  # noqa: E731
+        "version": 1, "rows": rows, "columns": list(columns), "timestamp_unit": "ms", "data_offset": offset,
+    }).encode()
+    # The offset is part of the header, so size the header with a padded placeholder first
+    header_length = len(header_for(0)) + 16
+    data_offset = -(-(prefix_length + header_length) // 8) * 8
+
+    with open(path, 'wb') as f:
+        f.write(OHLCV_BINARY_MAGIC)
+        f.write(struct.pack('<I', header_length))
+        f.write(header_for(data_offset).ljust(header_length))
+        f.write(b'\0' * (data_offset - prefix_length - header_length))
+        f.write(np.ascontiguousarray(timestamps, dtype='<i8').tobytes())
+        f.write(np.ascontiguousarray(values, dtype='<f8').tobytes())
+
+
+def map_ohlcv_file(path):
+    """
+    Memory-map a file in the ohlcv.bin layout (copy-on-write)
+
+    Returns (timestamps, values, columns, timestamp_unit) with values shaped
+    (columns, rows).
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(8) != OHLCV_BINARY_MAGIC:
+                raise ValueError("not an OHLCV binary file (bad magic)")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            header = json.loads(f.read(header_length))
+
+        rows = int(header['rows'])
+        columns = list(header['columns'])
+        offset = int(header['data_offset'])
+    except (OSError, KeyError, TypeError, struct.error, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid {os.path.basename(path)}: {e}")
+
+    if rows == 0:
+        return np.empty(0, dtype='<i8'), np.empty((len(columns), 0)), columns, header.get('timestamp_unit', 'ms')
+    timestamps = np.memmap(path, dtype='<i8', mode='c', offset=offset, shape=(rows,))
+    values = np.memmap(path, dtype='<f8', mode='c', offset=offset + 8 * rows, shape=(len(columns), rows))
+    return timestamps, values, columns, header.get('timestamp_unit', 'ms')
+
+
+def _file_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _replace_atomically(path, write):
+    """write(tmp_path), then rename over path so readers see the old or the new file"""
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+# ============ Store ============
+
+class CandleStore:
+    """Chunked, indexed candles under one root directory"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def series_dir(self, coin_id, resolution):
+        if not COIN_ID_PATTERN.match(str(coin_id)):
+            raise ValueError(f"Invalid coinId '{coin_id}'")
+        resolution_ms(resolution)
+        return os.path.join(self.root, coin_id, resolution)
+
+    def load_index(self, coin_id, resolution):
+        """The series' index, or None when nothing has been stored yet"""
+        try:
+            with open(os.path.join(self.series_dir(coin_id, resolution), INDEX_FILE)) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        if index.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported candle store index version {index.get('version')}")
+        return index
+
+    @contextmanager
+    def _locked(self, coin_id, resolution):
+        directory = self.series_dir(coin_id, resolution)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield directory
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    @staticmethod
+    def chunk_names(timestamps, resolution):
+        """Chunk of each timestamp: "YYYY-MM" below MONTHLY_CHUNKS_BELOW_MS bars, "YYYY" otherwise"""
+        unit = 'M' if resolution_ms(resolution) < MONTHLY_CHUNKS_BELOW_MS else 'Y'
+        return np.datetime_as_string(np.asarray(timestamps, dtype='datetime64[ms]').astype(f'datetime64[{unit}]'))
+
+    def append(self, coin_id, resolution, timestamps, values, columns):
+        """
+        Merge candles (ms timestamps, (columns, rows) values) into the store
+
+        Returns {"rows", "added", "updated"}: stored rows afterwards, rows that
+        were new, and the names of the chunks rewritten.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64).reshape(len(columns), len(timestamps))
+        if len(timestamps) == 0:
+            raise ValueError("No candles to append")
+
+        with self._locked(coin_id, resolution) as directory:
+            index = self.load_index(coin_id, resolution) or {
+                "version": INDEX_VERSION, "coinId": coin_id, "resolution": resolution,
+                "columns": list(columns), "chunks": [],
+            }
+            if list(columns) != index['columns']:
+                raise ValueError(f"Columns {list(columns)} do not match the stored {index['columns']}")
+
+            chunks = {chunk['name']: chunk for chunk in index['chunks']}
+            names = self.chunk_names(timestamps, resolution)
+            added = 0
+            for name in np.unique(names):
+                selected = names == name
+                new_timestamps, new_values = timestamps[selected], values[:, selected]
+                path = os.path.join(directory, f"{name}.bin")
+                old_rows = 0
+                if name in chunks:
+                    old_timestamps, old_values, _, _ = map_ohlcv_file(path)
+                    old_rows = len(old_timestamps)
+                    new_timestamps = np.concatenate((old_timestamps, new_timestamps))
+                    new_values = np.concatenate((old_values, new_values), axis=1)
+
+                # Stable sort keeps stored rows before appended ones; the last of equal timestamps wins
+                order = np.argsort(new_timestamps, kind='stable')
+                new_timestamps, new_values = new_timestamps[order], new_values[:, order]
+                last = np.append(new_timestamps[1:] != new_timestamps[:-1], True)
+                new_timestamps, new_values = new_timestamps[last], new_values[:, last]
+
+                _replace_atomically(path, lambda tmp: write_ohlcv_file(tmp, new_timestamps, new_values, columns))
+                added += len(new_timestamps) - old_rows
+                chunks[name] = {
+                    "name": name,
+                    "file": f"{name}.bin",
+                    "start": int(new_timestamps[0]),
+                    "end": int(new_timestamps[-1]),
+                    "rows": int(len(new_timestamps)),
+                    "digest": _file_digest(path),
+                }
+
+            index['chunks'] = sorted(chunks.values(), key=lambda chunk: chunk['start'])
+            index_path = os.path.join(directory, INDEX_FILE)
+
+            def write_index(tmp):
+                with open(tmp, 'w') as f:
+                    json.dump(index, f, indent=1)
+
+            _replace_atomically(index_path, write_index)
+
+        return {
+            "rows": sum(chunk['rows'] for chunk in index['chunks']),
+            "added": added,
+            "updated": [str(name) for name in np.unique(names)],
+        }
+
+    def chunks_between(self, coin_id, resolution, start_ms=None, end_ms=None):
+        """Index entries of the chunks holding bars in [start_ms, end_ms)"""
+        index = self.load_index(coin_id, resolution)
+        if index is None:
+            raise FileNotFoundError(f"No {resolution} candles stored for {coin_id} in {self.root}")
+        return index, [
+            chunk for chunk in index['chunks']
+            if (start_ms is None or chunk['end'] >= start_ms) and (end_ms is None or chunk['start'] < end_ms)
+        ]
+
+    def range_digest(self, coin_id, resolution, start_ms=None, end_ms=None):
+        """Content digest of the chunks a read of the range touches (for result cache keys)"""
+        _, chunks = self.chunks_between(coin_id, resolution, start_ms, end_ms)
+        return hashlib.blake2b(json.dumps([chunk['digest'] for chunk in chunks]).encode(),
+                               digest_size=20).hexdigest()
+
+    def read(self, coin_id, resolution, start_ms=None, end_ms=None):
+        """DataFrame of the bars in [start_ms, end_ms), reading only the overlapping chunks"""
+        index, chunks = self.chunks_between(coin_id, resolution, start_ms, end_ms)
+        directory = self.series_dir(coin_id, resolution)
+
+        parts = []
+        for chunk in chunks:
+            timestamps, values, _, _ = map_ohlcv_file(os.path.join(directory, chunk['file']))
+            lo = 0 if start_ms is None else np.searchsorted(timestamps, start_ms)
+            hi = len(timestamps) if end_ms is None else np.searchsorted(timestamps, end_ms)
+            if hi > lo:
+                parts.append((timestamps[lo:hi], values[:, lo:hi]))
+        if not parts:
+            raise ValueError(f"No {resolution} candles stored for {coin_id} in the requested date range")
+
+        if len(parts) == 1:
+            timestamps, values = parts[0]
+        else:
+            timestamps = np.concatenate([timestamps for timestamps, _ in parts])
+            values = np.concatenate([values for _, values in parts], axis=1)
+        return pd.DataFrame(values.T, columns=index['columns'],
+                            index=pd.DatetimeIndex(pd.to_datetime(timestamps, unit='ms')), copy=False)
+
+    def info(self, coin_id, resolution):
+        """Row count and covered range of a series ({"rows": 0} when empty)"""
+        index = self.load_index(coin_id, resolution)
+        if not index or not index['chunks']:
+            return {"coinId": coin_id, "resolution": resolution, "rows": 0, "chunks": 0}
+        return {
+            "coinId": coin_id,
+            "resolution": resolution,
+            "rows": sum(chunk['rows'] for chunk in index['chunks']),
+            "chunks": len(index['chunks']),
+            "start": index['chunks'][0]['start'],
+            "end": index['chunks'][-1]['end'],
+        }
+
+
+def date_range_ms(config):
+    """[start, end) in epoch ms for config startDate..endDate (a bare endDate covers the whole day)"""
+    start = pd.Timestamp(config['startDate'])
+    end = pd.Timestamp(config['endDate'])
+    if end.normalize() == end:
+        end += pd.Timedelta(days=1)
+    to_ms = lambda ts: int((ts.tz_convert('UTC').tz_localize(None) if ts.tz else ts).value // 10 ** 6)  # noqa: E731
+    return to_ms(start), to_ms(end)
+
+
+# ============ CLI ============
+
+def main():
+    parser = argparse.ArgumentParser(description='Local partitioned OHLCV candle store')
+    commands = parser.add_subparsers(dest='command', required=True)
+    append = commands.add_parser('append', help='Merge an ohlcv.bin file into the store')
+    info = commands.add_parser('info', help='Rows and covered range of a series')
+    for command in (append, info):
+        command.add_argument('store')
+        command.add_argument('coin_id')
+        command.add_argument('resolution')
+    append.add_argument('input', help='Candles in the ohlcv.bin layout')
+    args = parser.parse_args()
+
+    try:
+        store = CandleStore(args.store)
+        if args.command == 'append':
+            timestamps, values, columns, unit = map_ohlcv_file(args.input)
+            if unit != 'ms':
+                raise ValueError(f"Expected millisecond timestamps, got '{unit}'")
+            result = store.append(args.coin_id, args.resolution, timestamps, values, columns)
+            result.update(store.info(args.coin_id, args.resolution))
+        else:
+            result = store.info(args.coin_id, args.resolution)
+    except (OSError, ValueError) as e:
+        print(json.dumps({"error": str(e)}), file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
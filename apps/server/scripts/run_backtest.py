@@ -7,10 +7,100 @@ This script implements Option 2: Wrap User Strategy Class + UI Controls Backtest
 ARCHITECTURE:
 1. Receives user strategy class definition (NOT full backtesting code)
 2. Reads config.json with UI-controlled parameters
-3. Loads OHLCV data
+3. Loads OHLCV data (memory-mapped ohlcv.bin, or ohlcv.json fallback)
 4. Wraps strategy with backtesting.py Backtest instance
 5. Executes and extracts results
-6. Outputs JSON with html_report + metrics
+6. Outputs JSON with html_report + metrics (report: inline|deferred|none)
+
+Identical re-runs (same normalized strategy, config, OHLCV input and library
+versions) are served from an on-disk LRU result cache (config.cache=false
+bypasses it, as does an unseeded robustness block). One-shot runs look the
+result up before importing pandas and the sandbox (see
+backtest_cache.cached_run_result). RestrictedPython bytecode (and compile errors) are cached the
+same way, keyed by the exact source and compiler versions.
+
+RENDER REPORT (--render-report <report_path>):
+Builds the HTML for a run made with report=deferred, only when it is opened.
+
+CANDLE STORE (config.candleStore):
+Reads startDate..endDate of a coin and resolution from the local chunked
+candle store (filled by the market-data-sync cron) instead of the job's
+OHLCV file, touching only the chunks in range (see ohlcv_store.py).
+
+TIMEFRAMES (config.timeframe):
+Runs on coarser bars than the loaded candles, and gives strategies
+timeframe() and resample_apply() for higher timeframes, all served from a
+resample pyramid computed once per dataset (see backtest_timeframes.py).
+
+LOOKBACK (config.lookback = "auto" | <bars>):
+Loads only the strategy's warm-up bars before startDate plus
+startDate..endDate; "auto" infers the warm-up from the strategy's source
+(see backtest_lookback.py).
+
+MEMORY (config.memory = "low" | "float32"):
+Builds the OHLCV frame straight from typed column buffers with only the
+columns the data has, optionally with float32 prices where precision
+allows, and reports the run's peak RSS (see backtest_memory.py).
+
+PORTFOLIO (config.portfolio):
+Runs a PortfolioStrategy that allocates one cash balance across several
+assets, aligned onto one timestamp index as (assets, bars) arrays, with
+portfolio-level equity and metrics (see backtest_portfolio.py).
+
+OPTIMIZE (config.optimize):
+Sweeps a parameter grid on a process pool sharing the OHLCV data, or with
+search="adaptive" searches it by successive halving on growing data
+prefixes within an evaluation/time budget (see backtest_optimizer.py and
+backtest_search.py).
+
+WALK-FORWARD (config.walkForward):
+Optimizes on rolling or anchored train windows and evaluates on the following
+test windows in parallel, returning per-fold and stitched out-of-sample
+metrics (see backtest_walkforward.py).
+
+BATCH MODE (--batch <manifest.json>):
+Runs a strategies x datasets manifest with each dataset loaded and each
+strategy compiled once, streaming per-job metrics and a comparison table
+(see backtest_batch.py).
+
+SERIES (config.series):
+Adds equity, drawdown and trade marker arrays downsampled to a point budget
+(base64 float32), for charting without the HTML report
+(see backtest_series.py).
+
+ROBUSTNESS (config.robustness):
+Resamples the closed trades of the final run thousands of times and returns
+confidence intervals for its return and drawdown plus the risk of ruin
+(see backtest_robustness.py).
+
+PROGRESS (--progress):
+Streams stage, bar, sweep and fold progress as JSON lines ahead of the
+result line. SIGTERM/SIGINT cancel the run cleanly with a partial result
+(see backtest_progress.py).
+
+INDICATORS (the `indicators` global of strategy code):
+Vectorized talib-compatible indicators (sma, ema, rsi, atr, rolling_max,
+cross_up, ...) memoized for the run, so repeated calls and optimization
+candidates share one computation (see backtest_indicators.py).
+
+VECTORIZED ENGINE (config.engine = "auto" | "event" | "vectorized"):
+Strategies that define signals() (entry/exit arrays) instead of next() are
+simulated with NumPy instead of a per-bar callback, with the same fills and
+metrics as backtesting.py (see backtest_vectorized.py).
+
+PROFILE (config.profile = true | "deep"):
+Adds wall/CPU time and peak memory per stage to the result, and with "deep"
+the strategy.py lines where init()/next() spend their time
+(see backtest_profile.py).
+
+LIMITS (config.limits, BACKTEST_MAX_CONCURRENT):
+Per-run memory, CPU and per-bar budgets fail the run with a structured
+error; a machine-wide cap on concurrent runs makes the rest wait for a slot
+(see backtest_limits.py).
+
+WORKER MODE (--worker):
+Preloads pandas, backtesting, RestrictedPython and talib once, then serves
+JSON-lines jobs from stdin on a pool of forked (copy-on-write) processes.
 
 SECURITY:
 - Uses RestrictedPython to sandbox user code
@@ -21,81 +111,626 @@ SECURITY:
 import sys
 import json
 import os
+import argparse
+import builtins
+import operator
+import marshal
+import math
+import tempfile
+import threading
+import weakref
 from pathlib import Path
 import traceback
-import pandas as pd
-from io import StringIO
+from io import BytesIO, StringIO
 import logging
 
+from backtest_cache import (
+    OHLCV_BINARY_FILE,
+    DiskCache,
+    bytecode_cache_key,
+    cached_run_result,
+    digest_file,
+    load_cached_result,
+    ohlcv_input_path,
+    result_cache_key,
+    save_report_bytes,
+    store_cached_result,
+    unseeded_robustness,
+)
+
+# A one-shot run served by the result cache exits here, before the heavy imports below
+if __name__ == '__main__' and len(sys.argv) > 1 and not sys.argv[1].startswith('-') \
+        and set(sys.argv[2:]) <= {'--progress'}:
+    _cached_result = cached_run_result(sys.argv[1])
+    if _cached_result is not None:
+        print(json.dumps(_cached_result))
+        sys.exit(0)
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from backtest_indicators import reset_cache as reset_indicator_cache  # noqa: E402
+from backtest_lookback import parse_lookback, resolve_lookback, store_range_ms, window_bounds  # noqa: E402
+from backtest_memory import (  # noqa: E402
+    data_footprint,
+    memory_mode,
+    narrow_prices,
+    ohlcv_frame,
+    parse_memory,
+    price_dtype,
+    read_ohlcv_json,
+)
+from backtest_limits import (  # noqa: E402
+    ResourceLimitExceeded,
+    acquire_slot,
+    enforce_bar_budget,
+    max_concurrent_runs,
+    parse_limits,
+    release_slot,
+    run_limits,
+)
+from backtest_profile import PROFILE_MODES, StageProfile, peak_rss_mb  # noqa: E402
+from backtest_progress import BacktestCancelled, cancellable, reporter, track_bars  # noqa: E402
+from backtest_timeframes import resample_to_timeframe, timeframe_ns  # noqa: E402
+from backtest_validate import ALLOWED_IMPORTS, EXTRA_BUILTINS, validate_strategy  # noqa: E402
+from backtest_vectorized import ENGINES, create_backtest, select_engine, with_signal_next  # noqa: E402
+from ohlcv_store import CandleStore, date_range_ms, map_ohlcv_file  # noqa: E402
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Let sibling modules `import run_backtest` without re-executing this script
+sys.modules.setdefault('run_backtest', sys.modules[__name__])
+
+# Worker processes are recycled after this many jobs to bound memory growth
+DEFAULT_MAX_JOBS_PER_CHILD = 50
+
+# Timestamps below this are epoch seconds, above are epoch milliseconds
+EPOCH_MS_THRESHOLD = 10 ** 11
+
+# inline: HTML in the result, deferred: persist report data for --render-report, none: skip
+REPORT_MODES = ('inline', 'deferred', 'none')
+
+# Bytecode cache entry tags: marshalled code object or JSON list of compile errors
+BYTECODE_ENTRY_CODE = b'C'
+BYTECODE_ENTRY_ERRORS = b'E'
+
 def main():
     """Main entry point"""
-    if len(sys.argv) < 2:
+    parser = argparse.ArgumentParser(description="Run a user strategy backtest")
+    parser.add_argument("tmp_dir", nargs="?", help="Directory containing strategy.py, config.json and ohlcv.bin (or ohlcv.json)")
+    parser.add_argument("--worker", action="store_true",
+                        help="Run as a long-lived worker reading JSON-lines jobs from stdin")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Number of forked worker processes (default: CPU count)")
+    parser.add_argument("--max-jobs-per-child", type=int, default=DEFAULT_MAX_JOBS_PER_CHILD,
+                        help="Recycle a worker process after this many jobs")
+    parser.add_argument("--render-report", metavar="REPORT_PATH",
+                        help="Render the HTML for report data saved by a report=deferred run")
+    parser.add_argument("--batch", metavar="MANIFEST_PATH",
+                        help="Run every job in a batch manifest, streaming JSON lines")
+    parser.add_argument("--progress", action="store_true",
+                        help="Stream progress events as JSON lines before the result")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.pool_size, args.max_jobs_per_child)
+        return
+
+    if args.render_report:
+        try:
+            print(json.dumps(render_report(args.render_report)))
+        except Exception as e:
+            output_error(str(e))
+            sys.exit(1)
+        return
+
+    if args.batch:
+        from backtest_batch import run_batch
+
+        def emit_line(message):
+            print(json.dumps(message), flush=True)
+
+        try:
+            run_batch(args.batch, emit_line)
+        except ResourceLimitExceeded as e:
+            output_error(str(e), limit=e.details())
+            sys.exit(1)
+        except Exception as e:
+            output_error(str(e))
+            sys.exit(1)
+        return
+
+    if not args.tmp_dir:
         output_error("Usage: python run_backtest.py <tmp_dir>")
         sys.exit(1)
 
-    tmp_dir = sys.argv[1]
+    if args.progress:
+        reporter.configure(lambda message: print(json.dumps(message), flush=True))
 
     try:
-        # Step 1: Load configuration
-        logger.info(f"Loading configuration from {tmp_dir}")
-        config = load_config(tmp_dir)
-
-        # Step 2: Load OHLCV data
-        logger.info("Loading OHLCV data")
-        ohlcv_data = load_ohlcv_data(tmp_dir)
-
-        # Step 3: Convert to pandas DataFrame (backtesting.py format)
-        logger.info("Converting OHLCV data to DataFrame")
-        df = convert_to_dataframe(ohlcv_data)
-
-        # Step 4: Load and validate user strategy code
-        logger.info("Loading user strategy code")
-        strategy_code = load_strategy_code(tmp_dir)
-
-        # Step 5: Execute strategy in sandbox and get Strategy class
-        logger.info("Executing user strategy code in sandbox")
-        strategy_class = execute_user_code(strategy_code)
-
-        # Step 6: Create Backtest instance with UI-controlled config
-        logger.info("Creating Backtest instance with UI config")
-        from backtesting import Backtest
-
-        bt = Backtest(
-            df,
-            strategy_class,
-            cash=config['initialCapital'],
-            commission=config['commission']
-        )
+        with cancellable():
+            result = run_backtest(args.tmp_dir)
+        print(json.dumps(result))
+        logger.info("Backtest completed successfully")
 
-        # Step 7: Run backtest
-        logger.info("Running backtest")
-        stats = bt.run()
+    except BacktestCancelled as e:
+        print(json.dumps(reporter.cancelled_result(str(e))))
+        logger.info(f"Backtest cancelled by {e} during {reporter.stage_name}")
 
-        # Step 8: Generate HTML report
-        logger.info("Generating HTML report")
-        html_report = bt.plot(_return_fig=True, show_legend=True, agg_func='D')
-        # Convert plotly figure to HTML string
-        html_str = html_report.to_html(include_plotlyjs='cdn', config={'responsive': True})
+    except ResourceLimitExceeded as e:
+        output_error(str(e), limit=e.details())
+        sys.exit(1)
+
+    except Exception as e:
+        output_error(str(e))
+        sys.exit(1)
+
+
+def run_backtest(tmp_dir):
+    """Run the full backtest pipeline for a job directory and return the result dict"""
+    # Step 1: Load configuration
+    logger.info(f"Loading configuration from {tmp_dir}")
+    config = load_config(tmp_dir)
 
-        # Step 9: Extract metrics
-        logger.info("Extracting metrics")
+    profile = StageProfile.for_mode(config.get('profile', False))
+    reporter.profile = profile
+    reset_indicator_cache()
+    try:
+        with run_limits(config.get('limits')):
+            result = run_pipeline(tmp_dir, config)
+    finally:
+        release_slot()
+        reporter.profile = None
+        if profile is not None:
+            profile.stop()
+
+    # Attached after caching: a profile describes this run, not the cached result
+    if profile is not None:
+        result["profile"] = profile.summary(load_strategy_code(tmp_dir))
+    if "memory" in result:
+        # Profiled runs reset the high-water mark per stage, so take their highest stage
+        stages = [stage["peak_rss_mb"] for stage in result.get("profile", {}).get("stages", [])]
+        result["memory"]["peak_rss_mb"] = round(max([peak_rss_mb(), *stages]), 1)
+    return result
+
+
+def run_pipeline(tmp_dir, config):
+    """Steps 2-10 of run_backtest(), within the run's resource limits"""
+    # Step 2: Load and validate user strategy code
+    logger.info("Loading user strategy code")
+    strategy_code = load_strategy_code(tmp_dir)
+    # Warm-up bars to load before startDate when config.lookback trims the data (None keeps it all)
+    lookback = resolve_lookback(strategy_code, config)
+    if lookback is not None:
+        logger.info(f"Strategy lookback: {lookback['bars']} bars, {lookback['duration_ms']} ms")
+
+    # Step 3: Serve identical re-runs from the content-addressed result cache
+    cache = None
+    cache_key = None
+    if config.get('cache', True) and not unseeded_robustness(config):
+        with reporter.stage('cache_lookup'):
+            cache = DiskCache('results')
+            cache_key = result_cache_key(strategy_code, config, ohlcv_input_digest(tmp_dir, config, lookback))
+            cached = load_cached_result(cache, cache_key, config)
+        if cached is not None:
+            logger.info(f"Result cache hit ({cache_key})")
+            cached["cache"] = {"status": "hit", "key": cache_key}
+            return cached
+
+    # Cache misses wait here for one of the BACKTEST_MAX_CONCURRENT run slots
+    if max_concurrent_runs():
+        with reporter.stage('admission'):
+            acquire_slot()
+
+    # Portfolio runs allocate one cash balance across several assets and have no report
+    if config.get('portfolio'):
+        return finish_result(cache, cache_key, run_portfolio_pipeline(tmp_dir, strategy_code, config), config)
+
+    # Step 4: Load OHLCV data as a DataFrame (backtesting.py format), at config.timeframe
+    footprint = None
+    with reporter.stage('load_data'):
+        df = load_ohlcv_dataframe(tmp_dir, config, lookback)
+        if memory_mode(config) != 'default':
+            footprint = data_footprint(df, memory_mode(config))
+            logger.info(f"OHLCV data: {footprint['data_mb']} MB of {footprint['price_dtype']} prices")
+        df = resample_to_timeframe(df, config)
+
+    # Step 5: Execute strategy in sandbox and get Strategy class
+    logger.info("Executing user strategy code in sandbox")
+    with reporter.stage('compile'):
+        strategy_class = enforce_bar_budget(execute_user_code(strategy_code))
+
+    # Walk-forward runs are scored on their stitched out-of-sample folds and have no report
+    if config.get('walkForward'):
+        logger.info("Running walk-forward evaluation")
+        from backtest_walkforward import run_walk_forward
+        with reporter.stage('walk_forward'):
+            metrics, walk_forward = run_walk_forward(df, strategy_code, strategy_class, config)
+        result = {"html_report": None, "metrics": metrics, "walk_forward": walk_forward}
+        if footprint is not None:
+            result["memory"] = footprint
+        return finish_result(cache, cache_key, result, config)
+
+    # Step 6-7: Create the Backtest instance with UI-controlled config and run it
+    bt, stats, optimization = simulate(df, strategy_code, strategy_class, config)
+
+    # Step 8: Generate HTML report (inline), persist report data (deferred) or skip (none)
+    report_mode = config.get('report', 'inline')
+    html_str = None
+    report_path = None
+    if report_mode == 'inline':
+        logger.info("Generating HTML report")
+        with reporter.stage('report'):
+            html_str = render_html_report(build_report_data(bt, stats), tmp_dir)
+    elif report_mode == 'deferred':
+        logger.info("Persisting report data for deferred rendering")
+        with reporter.stage('report'):
+            report_path = save_report_data(build_report_data(bt, stats), config['reportPath'])
+    else:
+        logger.info("Skipping HTML report")
+
+    # Step 9: Extract metrics
+    logger.info("Extracting metrics")
+    with reporter.stage('metrics'):
         metrics = extract_metrics(stats)
 
-        # Step 10: Output successful result
-        result = {
-            "html_report": html_str,
-            "metrics": metrics
-        }
-        print(json.dumps(result))
-        logger.info("Backtest completed successfully")
+    series = None
+    if config.get('series'):
+        from backtest_series import build_series
+        with reporter.stage('series'):
+            series = build_series(stats, config)
+
+    robustness = None
+    if config.get('robustness'):
+        logger.info("Running robustness analysis")
+        from backtest_robustness import run_robustness
+        with reporter.stage('robustness'):
+            robustness = run_robustness(stats, config)
+
+    # Step 10: Return successful result
+    result = {
+        "html_report": html_str,
+        "metrics": metrics
+    }
+    if report_path is not None:
+        result["report_path"] = report_path
+    if optimization is not None:
+        result["optimization"] = optimization
+    if series is not None:
+        result["series"] = series
+    if robustness is not None:
+        result["robustness"] = robustness
+    if footprint is not None:
+        result["memory"] = footprint
+
+    return finish_result(cache, cache_key, result, config)
+
+
+def run_portfolio_pipeline(tmp_dir, strategy_code, config):
+    """Steps 4-10 of run_pipeline() for a config.portfolio run; returns the result dict"""
+    from backtest_portfolio import load_portfolio_data, run_portfolio
+
+    logger.info("Running portfolio backtest")
+    with reporter.stage('load_data'):
+        data = load_portfolio_data(tmp_dir, config)
+    with reporter.stage('compile'):
+        strategy_class = execute_user_code(strategy_code, portfolio=True)
+
+    stats, portfolio = run_portfolio(data, strategy_class, config)
+    with reporter.stage('metrics'):
+        result = {"html_report": None, "metrics": extract_metrics(stats), "portfolio": portfolio}
+
+    if config.get('series'):
+        from backtest_series import build_series
+        with reporter.stage('series'):
+            result["series"] = build_series(stats, config)
+    if config.get('robustness'):
+        from backtest_robustness import run_robustness
+        with reporter.stage('robustness'):
+            result["robustness"] = run_robustness(stats, config)
+    return result
+
+
+def simulate(df, strategy_code, strategy_class, config):
+    """
+    Run the strategy over df with the UI-controlled config
+
+    Sweeps the `optimize` grid first when configured and runs with the best
+    parameters. Returns (bt, stats, optimization_summary_or_None).
+    """
+    # The report is built from a backtesting.py run, so only metrics-only runs can be vectorized
+    engine = select_engine(strategy_class, config, report=config.get('report', 'inline') != 'none')
+    logger.info(f"Creating Backtest instance with UI config ({engine} engine)")
+    tracked_class = track_bars(strategy_class, len(df)) if engine == 'event' else strategy_class
+    bt = create_backtest(df, tracked_class, config, engine)
+
+    optimization = None
+    params = {}
+    if config.get('optimize'):
+        logger.info("Running parameter optimization")
+        from backtest_optimizer import run_optimization
+        with reporter.stage('optimize'):
+            params, optimization = run_optimization(df, strategy_code, strategy_class, config)
+        logger.info(f"Running backtest with best parameters {params}")
+    else:
+        logger.info("Running backtest")
+
+    with reporter.stage('simulate'):
+        stats = bt.run(**params)
+
+    return bt, stats, optimization
+
 
+# ============ Result Cache ============
+
+def ohlcv_input_digest(tmp_dir, config, lookback=None):
+    """Content digest of the OHLCV data load_ohlcv_dataframe() will read"""
+    source = config.get('candleStore')
+    if config.get('portfolio'):
+        from backtest_portfolio import asset_input_digest
+        return asset_input_digest(tmp_dir, config)
+    if source:
+        return CandleStore(source['path']).range_digest(source['coinId'], source['resolution'],
+                                                        *store_range(config, lookback))
+    return digest_file(ohlcv_input_path(tmp_dir))
+
+
+def finish_result(cache, cache_key, result, config):
+    """Store a fresh result in the result cache (when enabled) and tag its cache status"""
+    if cache is not None:
+        store_cached_result(cache, cache_key, result, config)
+        result["cache"] = {"status": "miss", "key": cache_key}
+    else:
+        result["cache"] = {"status": "disabled"}
+    return result
+
+
+# ============ Reports ============
+
+def build_report_data(bt, stats):
+    """
+    Collect what backtesting.py's plot needs: stats (equity curve + trades),
+    the OHLCV frame and the strategy's indicator arrays
+    """
+    results = stats.copy()
+    # The Strategy instance is only used for its name and references sandboxed classes
+    results['_strategy'] = str(stats._strategy)
+    # Statistics of a run with lookback warm-up start at startDate (see windowed_stats())
+    start = len(bt._data) - len(stats._equity_curve)
+    return {
+        "results": results,
+        "df": bt._data.iloc[start:],
+        "indicators": [indicator[..., start:] for indicator in stats._strategy._indicators],
+    }
+
+
+# Indicator options backtesting.py's plot reads
+REPORT_INDICATOR_OPTIONS = ('plot', 'overlay', 'color', 'scatter')
+
+
+def save_report_data(report_data, report_path):
+    """
+    Persist report data so render-report can build the HTML later
+
+    Written as an .npz of plain arrays (frame columns and indices, indicator
+    values) plus a JSON description, so reading it back never unpickles or
+    runs anything, whoever wrote the file.
+    """
+    results = report_data['results']
+    arrays = {}
+    meta = {"strategy": str(results['_strategy']), "frames": {}, "indicators": []}
+    for name, frame in (('df', report_data['df']), ('equity', results['_equity_curve']),
+                        ('trades', results['_trades'])):
+        meta["frames"][name] = [str(column) for column in frame.columns]
+        arrays[f'{name}_index'] = frame.index.to_numpy()
+        for i, column in enumerate(frame.columns):
+            values = frame[column].to_numpy()
+            arrays[f'{name}_{i}'] = values.astype(str) if values.dtype == object else values
+    for i, indicator in enumerate(report_data['indicators']):
+        arrays[f'indicator_{i}'] = np.asarray(indicator)
+        # Options may be NumPy scalars (e.g. the inferred overlay flag)
+        options = {key: np.asarray(indicator._opts.get(key)).tolist() for key in REPORT_INDICATOR_OPTIONS}
+        meta["indicators"].append({"name": indicator.name if isinstance(indicator.name, str) else str(indicator.name),
+                                   **options})
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+
+    buffer = BytesIO()
+    np.savez(buffer, **arrays)
+    return save_report_bytes(buffer.getvalue(), report_path)
+
+
+def load_report_data(report_path):
+    """Report data written by save_report_data(), read without unpickling"""
+    from backtesting._util import _Indicator
+
+    try:
+        with np.load(report_path, allow_pickle=False) as arrays:
+            meta = json.loads(arrays['meta'].tobytes())
+            frames = {
+                name: pd.DataFrame({column: arrays[f'{name}_{i}'] for i, column in enumerate(columns)},
+                                   index=arrays[f'{name}_index'], columns=columns)
+                for name, columns in meta['frames'].items()
+            }
+            index = frames['df'].index
+            indicators = [_Indicator(arrays[f'indicator_{i}'], name=options.pop('name'), index=index, **options)
+                          for i, options in enumerate(meta['indicators'])]
+    except (OSError, KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid report data at {report_path}: {e}")
+
+    results = pd.Series({'_strategy': meta['strategy'], '_equity_curve': frames['equity'],
+                         '_trades': frames['trades']}, dtype=object)
+    return {"results": results, "df": frames['df'], "indicators": indicators}
+
+
+def render_html_report(report_data, work_dir):
+    """Render the backtesting.py Bokeh plot to a standalone HTML string"""
+    from backtesting._plotting import plot
+
+    html_path = os.path.join(work_dir, 'report.html')
+    plot(
+        results=report_data['results'],
+        df=report_data['df'],
+        indicators=report_data['indicators'],
+        filename=html_path,
+        open_browser=False,
+        show_legend=True,
+    )
+    with open(html_path, 'r') as f:
+        return f.read()
+
+
+def render_report(report_path):
+    """render-report entry point: build the HTML for a deferred report"""
+    if not os.path.exists(report_path):
+        raise FileNotFoundError(f"Report data not found at {report_path}")
+
+    report_data = load_report_data(report_path)
+    with tempfile.TemporaryDirectory(prefix='backtest-report-') as work_dir:
+        return {"html_report": render_html_report(report_data, work_dir)}
+
+
+# ============ Worker Mode ============
+
+def preload_modules():
+    """
+    Import the heavy dependencies once in the worker parent process.
+
+    Forked children inherit these modules copy-on-write, so each job starts
+    with pandas, backtesting, RestrictedPython, talib and the plotting stack
+    already imported.
+    """
+    import numpy  # noqa: F401
+    import talib  # noqa: F401
+    import RestrictedPython  # noqa: F401
+    import backtesting  # noqa: F401
+    import backtesting.lib  # noqa: F401
+    import backtesting._plotting  # noqa: F401
+
+
+def _run_worker_job(job_id, tmp_dir, progress=False):
+    """
+    Execute one job inside a pool process, never raising across the process boundary
+
+    Every job starts with a {"event": "started", "pid"} line written straight
+    to stdout, so the caller can SIGTERM this process to cancel the job (or
+    SIGKILL it once the job has timed out). With progress, the job's events
+    follow, tagged with its id the same way.
+    """
+    def write_event(message):
+        # One write() per line keeps lines from concurrent pool processes whole
+        os.write(sys.stdout.fileno(), (json.dumps({"id": job_id, **message}) + "\n").encode('utf-8'))
+
+    if progress:
+        reporter.configure(write_event)
+    write_event({"event": "started", "pid": os.getpid()})
+    try:
+        with cancellable():
+            return {"result": run_backtest(tmp_dir)}
+    except BacktestCancelled as e:
+        return {"result": reporter.cancelled_result(str(e))}
+    except ResourceLimitExceeded as e:
+        return {"error": str(e), "traceback": "", "limit": e.details()}
     except Exception as e:
-        output_error(str(e))
-        sys.exit(1)
+        return {"error": str(e), "traceback": traceback.format_exc()}
+    finally:
+        reporter.configure(None)
+
+
+def _validate_worker_job(job):
+    """Static checks of a {"validate": <strategy code>, "portfolio"} message (see backtest_validate.py)"""
+    try:
+        return {"result": validate_strategy(job["validate"], bool(job.get("portfolio")))}
+    except Exception as e:
+        return {"error": str(e), "traceback": traceback.format_exc()}
+
+
+def run_worker(pool_size=None, max_jobs_per_child=DEFAULT_MAX_JOBS_PER_CHILD):
+    """
+    Long-lived worker mode.
+
+    Protocol (JSON lines):
+    - stdin:  {"id": "<job id>", "tmp_dir": "<job directory>", "progress": false}
+    - stdin:  {"abandon": "<job id>"} once the caller has SIGKILLed the pool process
+              running a job; the job is not waited for at shutdown
+    - stdin:  {"id": "<job id>", "validate": "<strategy code>", "portfolio": false} runs the static
+              checks of backtest_validate.py right away in this process (they take milliseconds)
+              and answers with {"id": "<job id>", "result": {"valid", "class", "errors"}}
+    - stdout: {"id": "<job id>", "result": {...}} or {"id": "<job id>", "error": "...", "traceback": "..."}
+              (plus "limit": {"name", "budget"} when a resource budget was exceeded)
+    - stdout: {"id": "<job id>", "event": "started", "pid": <pool process>} when a job starts, and
+              with progress its {"id": "<job id>", "event": "...", ...} lines (see backtest_progress.py)
+
+    A {"event": "ready", ...} line is written once the modules are preloaded
+    and the pool is up. The worker exits after stdin is closed and all
+    in-flight jobs have finished.
+    """
+    import multiprocessing
+
+    pool_size = pool_size or os.cpu_count() or 1
+    logger.info(f"Preloading modules for worker pool (size={pool_size}, max_jobs_per_child={max_jobs_per_child})")
+    preload_modules()
+
+    write_lock = threading.Lock()
+
+    def emit(message):
+        with write_lock:
+            sys.stdout.write(json.dumps(message) + "\n")
+            sys.stdout.flush()
+
+    # Read jobs from a private handle and detach sys.stdin: forked children close
+    # sys.stdin on startup, which deadlocks if the main thread holds its lock mid-read
+    job_stream = os.fdopen(os.dup(sys.stdin.fileno()), "r")
+    sys.stdin = open(os.devnull, "r")
+
+    ctx = multiprocessing.get_context("fork")
+    pool = ctx.Pool(processes=pool_size, maxtasksperchild=max_jobs_per_child)
+    emit({"event": "ready", "pool_size": pool_size, "pid": os.getpid()})
+
+    # In-flight jobs: a job whose pool process was killed never completes, and
+    # the pool replaces the process but would wait for the lost job forever
+    in_flight = {}
+
+    def finish(job_id, message):
+        in_flight.pop(job_id, None)
+        emit({"id": job_id, **message})
+
+    try:
+        for line in job_stream:
+            line = line.strip()
+            if not line:
+                continue
+
+            try:
+                job = json.loads(line)
+                if "abandon" in job:
+                    in_flight.pop(job["abandon"], None)
+                    continue
+                job_id = job["id"]
+                tmp_dir = None if "validate" in job else job["tmp_dir"]
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                emit({"id": None, "error": f"Invalid job message: {e}", "traceback": ""})
+                continue
+
+            if tmp_dir is None:
+                emit({"id": job_id, **_validate_worker_job(job)})
+                continue
+
+            in_flight[job_id] = pool.apply_async(
+                _run_worker_job,
+                (job_id, tmp_dir, bool(job.get("progress"))),
+                callback=lambda outcome, job_id=job_id: finish(job_id, outcome),
+                error_callback=lambda e, job_id=job_id: finish(job_id, {"error": str(e), "traceback": ""}),
+            )
+    finally:
+        pool.close()
+        for result in list(in_flight.values()):
+            result.wait()
+        # Every job still wanted has finished; abandoned ones are dropped with the pool
+        pool.terminate()
+        pool.join()
+        logger.info("Worker pool shut down")
 
 
 def load_config(tmp_dir):
@@ -111,21 +746,205 @@ def load_config(tmp_dir):
     except json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in config.json: {e}")
 
-    # Validate required fields
+    return validate_config(config)
+
+
+def validate_config(config):
+    """Check required fields and the report mode; returns config"""
     required_fields = ['initialCapital', 'commission', 'startDate', 'endDate']
     for field in required_fields:
         if field not in config:
             raise ValueError(f"Missing required config field: {field}")
 
+    report_mode = config.get('report', 'inline')
+    if report_mode not in REPORT_MODES:
+        raise ValueError(f"Invalid report mode '{report_mode}'. Expected one of: {', '.join(REPORT_MODES)}")
+    if report_mode == 'deferred' and not config.get('reportPath'):
+        raise ValueError("report=deferred requires a reportPath in config.json")
+
+    parse_limits(config.get('limits'))
+
+    if config.get('profile', False) not in PROFILE_MODES:
+        raise ValueError(f"Invalid profile '{config['profile']}'. Expected true, false or \"deep\"")
+
+    engine = config.get('engine', 'auto')
+    if engine not in ENGINES:
+        raise ValueError(f"Invalid engine '{engine}'. Expected one of: {', '.join(ENGINES)}")
+
+    if config.get('timeframe') is not None:
+        timeframe_ns(config['timeframe'])
+
+    if config.get('lookback') is not None:
+        parse_lookback(config['lookback'])
+        date_range_ms(config)
+
+    parse_memory(memory_mode(config))
+
+    if config.get('portfolio') is not None:
+        for field in ('optimize', 'walkForward', 'timeframe', 'lookback'):
+            if config.get(field):
+                raise ValueError(f"{field} is not supported for portfolio runs")
+        if memory_mode(config) != 'default':
+            raise ValueError("memory is not supported for portfolio runs")
+        from backtest_portfolio import parse_portfolio
+        parse_portfolio(config['portfolio'])
+
+    source = config.get('candleStore')
+    if source is not None:
+        # Portfolio runs read each of their assets instead of one coinId
+        fields = ('path', 'resolution') if config.get('portfolio') else ('path', 'coinId', 'resolution')
+        if not isinstance(source, dict) or not all(source.get(k) for k in fields):
+            raise ValueError(f"candleStore must be an object with {', '.join(fields[:-1])} and {fields[-1]}")
+        coin_ids = config['portfolio']['assets'] if config.get('portfolio') else [source['coinId']]
+        for coin_id in coin_ids:
+            CandleStore(source['path']).series_dir(coin_id, source['resolution'])
+        date_range_ms(config)
+
+    if config.get('optimize'):
+        from backtest_search import parse_search
+        parse_search(config['optimize'])
+
+    if config.get('walkForward'):
+        from backtest_walkforward import parse_walk_forward
+        parse_walk_forward(config['walkForward'])
+
+    if config.get('series'):
+        if config.get('walkForward'):
+            raise ValueError("series is not supported for walkForward runs")
+        from backtest_series import parse_series
+        parse_series(config['series'])
+
+    if config.get('robustness'):
+        if config.get('walkForward'):
+            raise ValueError("robustness is not supported for walkForward runs")
+        from backtest_robustness import parse_robustness
+        parse_robustness(config['robustness'])
+
     return config
 
 
+def load_ohlcv_dataframe(tmp_dir, config=None, lookback=None):
+    """
+    Load OHLCV data for a job directory
+
+    Reads startDate..endDate from the local candle store when the config has
+    a candleStore block. Otherwise prefers the binary columnar ohlcv.bin
+    (memory-mapped, no per-candle work) and falls back to ohlcv.json.
+
+    With a lookback (see backtest_lookback.py) only its warm-up bars before
+    startDate plus startDate..endDate are loaded; ohlcv.bin is cut before
+    the DataFrame is built. config.memory selects the low-memory ohlcv.json
+    loader and float32 prices (see backtest_memory.py).
+    """
+    mode = memory_mode(config)
+    if config is not None and config.get('candleStore'):
+        source = config['candleStore']
+        logger.info(f"Reading {source['coinId']} {source['resolution']} candles from {source['path']}")
+        df = CandleStore(source['path']).read(source['coinId'], source['resolution'], *store_range(config, lookback))
+        logger.info(f"DataFrame created with {len(df)} rows")
+        return narrow_prices(df, mode)
+
+    window = (config, lookback) if lookback is not None else None
+    binary_path = os.path.join(tmp_dir, OHLCV_BINARY_FILE)
+    if os.path.exists(binary_path):
+        logger.info(f"Memory-mapping binary OHLCV data from {binary_path}")
+        return load_ohlcv_binary(binary_path, window, mode)
+
+    if mode != 'default':
+        logger.info("Decoding OHLCV data into typed columns")
+        return load_ohlcv_columns(tmp_dir, window, mode)
+
+    logger.info("Loading OHLCV data")
+    ohlcv_data = load_ohlcv_data(tmp_dir)
+
+    logger.info("Converting OHLCV data to DataFrame")
+    df = convert_to_dataframe(ohlcv_data)
+    if window is not None:
+        first, last = window_bounds(df.index.values.view(np.int64), df.index.unit, *window)
+        df = df.iloc[first:last]
+        logger.info(f"Kept {len(df)} rows of warm-up and startDate..endDate")
+    return df
+
+
+def store_range(config, lookback):
+    """[start, end) ms of the candle store read: startDate..endDate plus the lookback's warm-up"""
+    if lookback is None:
+        return date_range_ms(config)
+    return store_range_ms(config, lookback, config['candleStore']['resolution'])
+
+
+def load_ohlcv_binary(path, window=None, mode='default'):
+    """
+    Load a binary columnar OHLCV file written by python-executor-service
+
+    Layout (all little-endian):
+    - 8 bytes   magic b"AGXOHLC1"
+    - 4 bytes   uint32 header length
+    - header    JSON {"rows", "columns", "timestamp_unit", "data_offset"}
+    - at data_offset: int64 timestamps[rows], then float64 values[len(columns)][rows]
+
+    The price columns are one contiguous block, so the DataFrame is built as a
+    copy-on-write view of the memory-mapped file; only the index is converted.
+    window=(config, lookback) keeps the rows window_bounds() selects. Memory
+    mode "float32" copies the prices into a float32 block where precision allows.
+    """
+    timestamps, values, columns, timestamp_unit = map_ohlcv_file(path)
+    if window is not None:
+        first, last = window_bounds(timestamps, timestamp_unit, *window)
+        timestamps, values = timestamps[first:last], values[:, first:last]
+
+    if len(timestamps) == 0:
+        raise ValueError(f"{OHLCV_BINARY_FILE} must contain a non-empty array of OHLCV candles")
+    missing = {'Open', 'High', 'Low', 'Close'} - set(columns)
+    if missing:
+        raise ValueError(f"{OHLCV_BINARY_FILE} is missing columns: {', '.join(sorted(missing))}")
+
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit=timestamp_unit))
+    arrays = dict(zip(columns, values))
+    if price_dtype(arrays, mode) is np.float32:
+        df = ohlcv_frame(index, arrays, np.float32)
+    else:
+        df = pd.DataFrame(values.T, columns=columns, index=index, copy=False)
+
+    logger.info(f"DataFrame created with {len(df)} rows")
+    logger.info(f"Date range: {df.index[0]} to {df.index[-1]}")
+    return df
+
+
+def load_ohlcv_columns(tmp_dir, window=None, mode='low'):
+    """
+    Low-memory ohlcv.json loading for config.memory (see backtest_memory.py)
+
+    Candles are decoded into typed columns, cut to the window and copied
+    into the frame one column at a time; Volume is kept only when present.
+    """
+    ohlcv_path = os.path.join(tmp_dir, 'ohlcv.json')
+    if not os.path.exists(ohlcv_path):
+        raise FileNotFoundError(f"Neither {OHLCV_BINARY_FILE} nor ohlcv.json found in {tmp_dir}")
+
+    timestamps, columns = read_ohlcv_json(ohlcv_path)
+    unit = 's' if timestamps.max() < EPOCH_MS_THRESHOLD else 'ms'
+    if window is not None:
+        first, last = window_bounds(timestamps, unit, *window)
+        timestamps = timestamps[first:last]
+        columns = {name: values[first:last] for name, values in columns.items()}
+        logger.info(f"Kept {len(timestamps)} rows of warm-up and startDate..endDate")
+
+    index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit=unit))
+    del timestamps
+    df = ohlcv_frame(index, columns, price_dtype(columns, mode))
+
+    logger.info(f"DataFrame created with {len(df)} rows")
+    logger.info(f"Date range: {df.index[0]} to {df.index[-1]}")
+    return df
+
+
 def load_ohlcv_data(tmp_dir):
     """Load OHLCV data from ohlcv.json"""
     ohlcv_path = os.path.join(tmp_dir, 'ohlcv.json')
 
     if not os.path.exists(ohlcv_path):
-        raise FileNotFoundError(f"ohlcv.json not found at {ohlcv_path}")
+        raise FileNotFoundError(f"Neither {OHLCV_BINARY_FILE} nor ohlcv.json found in {tmp_dir}")
 
     try:
         with open(ohlcv_path, 'r') as f:
@@ -144,22 +963,22 @@ def convert_to_dataframe(ohlcv_data):
     try:
         # backtesting.py expects columns: Open, High, Low, Close, Volume (optional)
         # Our OHLCV format has: timestamp, open, high, low, close
-        data = []
-        for candle in ohlcv_data:
-            data.append({
-                'Open': candle['open'],
-                'High': candle['high'],
-                'Low': candle['low'],
-                'Close': candle['close'],
-                'Volume': candle.get('volume', 0)  # Optional
-            })
+        records = pd.DataFrame.from_records(ohlcv_data)
 
-        df = pd.DataFrame(data)
+        df = pd.DataFrame({
+            'Open': records['open'].to_numpy(dtype=np.float64),
+            'High': records['high'].to_numpy(dtype=np.float64),
+            'Low': records['low'].to_numpy(dtype=np.float64),
+            'Close': records['close'].to_numpy(dtype=np.float64),
+            'Volume': (records['volume'].fillna(0).to_numpy(dtype=np.float64)
+                       if 'volume' in records else np.zeros(len(records))),  # Optional
+        })
 
         # backtesting.py requires a datetime index
-        # Since OHLCV data has timestamps, create index from them
-        timestamps = [pd.Timestamp(c['timestamp'] * 1000, unit='ms') for c in ohlcv_data]
-        df.index = pd.DatetimeIndex(timestamps)
+        # Timestamps are epoch seconds or milliseconds (CoinGecko uses ms)
+        timestamps = records['timestamp'].to_numpy(dtype=np.int64)
+        unit = 's' if timestamps.max() < EPOCH_MS_THRESHOLD else 'ms'
+        df.index = pd.DatetimeIndex(pd.to_datetime(timestamps, unit=unit))
 
         logger.info(f"DataFrame created with {len(df)} rows")
         logger.info(f"Date range: {df.index[0]} to {df.index[-1]}")
@@ -189,7 +1008,100 @@ def load_strategy_code(tmp_dir):
     return strategy_code
 
 
-def execute_user_code(strategy_code):
+def _guarded_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """__import__ replacement that only allows whitelisted modules"""
+    if level != 0 or name not in ALLOWED_IMPORTS:
+        raise ImportError(
+            f"Import of '{name}' is not allowed. Allowed modules: {', '.join(ALLOWED_IMPORTS)}"
+        )
+    return __import__(name, globals, locals, fromlist, level)
+
+
+_INPLACE_OPERATORS = {
+    '+=': operator.iadd, '-=': operator.isub, '*=': operator.imul,
+    '/=': operator.itruediv, '//=': operator.ifloordiv, '%=': operator.imod,
+    '**=': operator.ipow, '<<=': operator.ilshift, '>>=': operator.irshift,
+    '&=': operator.iand, '|=': operator.ior, '^=': operator.ixor,
+}
+
+
+def _inplacevar(op, x, y):
+    """Guard for augmented assignment (x += y) in restricted code"""
+    if op not in _INPLACE_OPERATORS:
+        raise SyntaxError(f"Unsupported in-place operator: {op}")
+    return _INPLACE_OPERATORS[op](x, y)
+
+
+def _sandbox_write_guard():
+    """
+    (_write_, __build_class__) for one execute_user_code() sandbox
+
+    Attribute and item writes are only allowed on classes the strategy code
+    defines and their instances, on the trades and orders of the run
+    (trade.sl = ...), on arrays that own their memory (np.full(...)[i] = ...)
+    and on the dicts and lists full_write_guard lets through. Modules, types
+    and every other imported object are shared with later runs in the same
+    process (worker pool, batches), so writes to them raise TypeError.
+    """
+    from RestrictedPython.Guards import full_write_guard
+    from backtesting.backtesting import Order, Trade
+
+    user_classes = weakref.WeakSet()
+
+    def build_class(func, name, *bases, **kwargs):
+        cls = builtins.__build_class__(func, name, *bases, **kwargs)
+        user_classes.add(cls)
+        return cls
+
+    def write_guard(ob):
+        cls = ob if isinstance(ob, type) else type(ob)
+        if any(klass in user_classes for klass in cls.__mro__):
+            return ob
+        if isinstance(ob, (Trade, Order)) or (isinstance(ob, np.ndarray) and ob.base is None):
+            return ob
+        return full_write_guard(ob)
+
+    return write_guard, build_class
+
+
+def compile_strategy(strategy_code):
+    """
+    Compile user code with RestrictedPython, reusing cached bytecode
+
+    Returns (code, errors). Compiled code objects are marshalled into the
+    'bytecode' DiskCache; compile errors are cached too so known-bad code
+    fails without re-running the AST transformation.
+    """
+    from RestrictedPython import compile_restricted_exec
+
+    cache = DiskCache('bytecode')
+    key = bytecode_cache_key(strategy_code)
+    entry = cache.get(key)
+    if entry is not None:
+        try:
+            if entry[:1] == BYTECODE_ENTRY_CODE:
+                return marshal.loads(entry[1:]), []
+            if entry[:1] == BYTECODE_ENTRY_ERRORS:
+                return None, json.loads(entry[1:])
+        except (ValueError, EOFError, TypeError):
+            pass  # Corrupt entry; recompile and overwrite
+        logger.warning(f"Discarding unreadable bytecode cache entry {key}")
+
+    compiled = compile_restricted_exec(strategy_code, filename='<strategy>')
+    errors = [str(e) for e in compiled.errors]
+    if errors:
+        entry = BYTECODE_ENTRY_ERRORS + json.dumps(errors).encode('utf-8')
+    else:
+        entry = BYTECODE_ENTRY_CODE + marshal.dumps(compiled.code)
+
+    try:
+        cache.put(key, entry)
+    except OSError as e:
+        logger.warning(f"Failed to write bytecode cache entry: {e}")
+    return compiled.code, errors
+
+
+def execute_user_code(strategy_code, portfolio=False):
     """
     Execute user strategy code in a sandboxed environment
 
@@ -198,32 +1110,47 @@ def execute_user_code(strategy_code):
     2. Only allowing specific imports
     3. Removing dangerous builtins
 
-    Returns the Strategy class
+    Returns the Strategy class (the PortfolioStrategy class with portfolio=True)
     """
     try:
-        from RestrictedPython import compile_restricted_exec
-        from RestrictedPython.Guards import safe_builtins, guarded_inplacebinary_op
+        from RestrictedPython import PrintCollector
+        from RestrictedPython.Guards import (
+            safe_builtins,
+            safer_getattr,
+            guarded_iter_unpack_sequence,
+            guarded_unpack_sequence,
+        )
     except ImportError:
         raise ImportError("RestrictedPython not installed. Run: pip install RestrictedPython")
 
     try:
-        # Compile user code with RestrictedPython
-        byte_code = compile_restricted_exec(strategy_code)
+        # Compile user code with RestrictedPython (cached on disk by source hash)
+        code, errors = compile_strategy(strategy_code)
 
-        if byte_code.errors:
-            error_msg = "Code compilation errors:\n" + "\n".join(str(e) for e in byte_code.errors)
+        if errors:
+            error_msg = "Code compilation errors:\n" + "\n".join(errors)
             raise SyntaxError(error_msg)
 
         # Create restricted execution environment
         # Whitelist allowed modules and functions
+        write_guard, build_class = _sandbox_write_guard()
         safe_globals = {
-            "__builtins__": safe_builtins,
+            "__builtins__": {
+                **safe_builtins,
+                "__import__": _guarded_import,
+                "__build_class__": build_class,
+                **EXTRA_BUILTINS,
+            },
             "__name__": "__main__",
             "__metaclass__": type,
-            "_print_": lambda x: None,  # Disable print in user code
-            "_getattr_": getattr,
-            "_write_": lambda x: None,  # Disable writes
-            "_inplacebinary_": guarded_inplacebinary_op,
+            "_print_": PrintCollector,  # Collected and discarded - user code cannot write to stdout
+            "_getattr_": safer_getattr,
+            "_getitem_": lambda obj, key: obj[key],
+            "_getiter_": iter,
+            "_iter_unpack_sequence_": guarded_iter_unpack_sequence,
+            "_unpack_sequence_": guarded_unpack_sequence,
+            "_write_": write_guard,
+            "_inplacevar_": _inplacevar,
         }
 
         # Add allowed imports to safe globals
@@ -233,34 +1160,43 @@ def execute_user_code(strategy_code):
             import numpy as np
             import pandas as pd
             import talib
+            import backtest_indicators
+            from backtest_portfolio import PortfolioStrategy
 
             safe_globals.update({
                 'Strategy': Strategy,
+                'PortfolioStrategy': PortfolioStrategy,
                 'crossover': crossover,
                 'numpy': np,
                 'np': np,
                 'pandas': pd,
                 'pd': pd,
                 'talib': talib,
+                'indicators': backtest_indicators.namespace(),
             })
         except ImportError as e:
             raise ImportError(f"Failed to import backtesting dependencies: {e}")
 
         # Execute the code
-        exec(byte_code.code, safe_globals)
+        exec(code, safe_globals)
 
-        # Extract Strategy class from executed code
-        if 'Strategy' not in safe_globals or not isinstance(safe_globals['Strategy'], type):
-            raise ValueError("User code must define a 'Strategy' class that inherits from backtesting.Strategy")
+        # Extract the user's Strategy subclass from executed code (last one defined wins)
+        from backtesting import Strategy as BaseStrategy
+        base = PortfolioStrategy if portfolio else BaseStrategy
+        strategy_classes = [
+            value for value in safe_globals.values()
+            if isinstance(value, type) and issubclass(value, base) and value is not base
+        ]
 
-        strategy_class = safe_globals['Strategy']
+        if not strategy_classes:
+            if portfolio:
+                raise ValueError("Portfolio runs need a class that inherits from PortfolioStrategy")
+            raise ValueError("User code must define a class that inherits from backtesting.Strategy")
 
-        # Validate that Strategy inherits from backtesting.Strategy
-        from backtesting import Strategy as BaseStrategy
-        if not issubclass(strategy_class, BaseStrategy):
-            raise ValueError("Strategy class must inherit from backtesting.Strategy")
+        # Strategies with only signals() get the next() their signals stand for
+        strategy_class = with_signal_next(strategy_classes[-1])
 
-        logger.info("User strategy code executed and validated successfully")
+        logger.info(f"User strategy code executed and validated successfully ({strategy_class.__name__})")
         return strategy_class
 
     except SyntaxError as e:
@@ -270,19 +1206,25 @@ def execute_user_code(strategy_code):
         raise
 
 
+def _finite_or_none(value):
+    """Map NaN/inf to None so the result is valid JSON for the Node side"""
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+
 def extract_metrics(stats):
     """Extract key metrics from backtesting.py results"""
     try:
         metrics = {
-            "total_return": float(stats.get('Return [%]', 0)),
-            "sharpe_ratio": float(stats.get('Sharpe Ratio', 0)),
-            "max_drawdown": float(stats.get('Max. Drawdown [%]', 0)),
-            "win_rate": float(stats.get('Win Rate [%]', 0)),
+            "total_return": _finite_or_none(stats.get('Return [%]', 0)),
+            "sharpe_ratio": _finite_or_none(stats.get('Sharpe Ratio', 0)),
+            "max_drawdown": _finite_or_none(stats.get('Max. Drawdown [%]', 0)),
+            "win_rate": _finite_or_none(stats.get('Win Rate [%]', 0)),
             "total_trades": int(stats.get('# Trades', 0)),
-            "profit_factor": float(stats.get('Profit Factor', 0)),
-            "best_day": float(stats.get('Best Day [%]', 0)),
-            "worst_day": float(stats.get('Worst Day [%]', 0)),
-            "avg_trade": float(stats.get('Avg. Trade [%]', 0)),
+            "profit_factor": _finite_or_none(stats.get('Profit Factor', 0)),
+            "best_day": _finite_or_none(stats.get('Best Day [%]', 0)),
+            "worst_day": _finite_or_none(stats.get('Worst Day [%]', 0)),
+            "avg_trade": _finite_or_none(stats.get('Avg. Trade [%]', 0)),
         }
 
         logger.info(f"Extracted metrics: {json.dumps(metrics, indent=2)}")
@@ -292,20 +1234,22 @@ def extract_metrics(stats):
         logger.warning(f"Failed to extract some metrics: {e}")
         # Return basic metrics even if extraction is incomplete
         return {
-            "total_return": float(stats.get('Return [%]', 0)),
-            "sharpe_ratio": float(stats.get('Sharpe Ratio', 0)),
-            "max_drawdown": float(stats.get('Max. Drawdown [%]', 0)),
-            "win_rate": float(stats.get('Win Rate [%]', 0)),
+            "total_return": _finite_or_none(stats.get('Return [%]', 0)),
+            "sharpe_ratio": _finite_or_none(stats.get('Sharpe Ratio', 0)),
+            "max_drawdown": _finite_or_none(stats.get('Max. Drawdown [%]', 0)),
+            "win_rate": _finite_or_none(stats.get('Win Rate [%]', 0)),
             "total_trades": int(stats.get('# Trades', 0)),
         }
 
 
-def output_error(message):
-    """Output error as JSON to stderr"""
+def output_error(message, limit=None):
+    """Output error as JSON to stderr (with the exceeded budget for resource limit errors)"""
     error_output = {
         "error": message,
         "traceback": traceback.format_exc()
     }
+    if limit is not None:
+        error_output["limit"] = limit
     print(json.dumps(error_output), file=sys.stderr)
 
 
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_batch.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_batch.py   (or: python -m pytest scripts/test_backtest_batch.py)
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_batch import run_batch  # noqa: E402
+from run_backtest import run_backtest  # noqa: E402
+from test_run_backtest import RSI_STRATEGY, candle_list, encode_ohlcv_binary  # noqa: E402
+
+SMA_STRATEGY = '''
+from backtesting import Strategy
+import talib
+
+class SmaTrend(Strategy):
+    period = 20
+
+    def init(self):
+        self.sma = self.I(talib.SMA, self.data.Close, self.period)
+
+    def next(self):
+        if not self.position and self.data.Close[-1] > self.sma[-1]:
+            self.buy()
+        elif self.position and self.data.Close[-1] < self.sma[-1]:
+            self.position.close()
+'''
+
+CONFIG = {'initialCapital': 10_000_000, 'commission': 0.001, 'startDate': '2024-01-01', 'endDate': '2024-12-31'}
+
+
+class BatchTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base = self.tmp.name
+        for name, code in (('rsi', RSI_STRATEGY), ('sma', SMA_STRATEGY), ('broken', 'class Broken:\n    pass\n')):
+            with open(os.path.join(self.base, f'{name}.py'), 'w') as f:
+                f.write(code)
+        # One dataset handed over as ohlcv.bin, the other as ohlcv.json
+        os.makedirs(os.path.join(self.base, 'data', 'short'))
+        os.makedirs(os.path.join(self.base, 'data', 'long'))
+        with open(os.path.join(self.base, 'data', 'short', 'ohlcv.bin'), 'wb') as f:
+            f.write(encode_ohlcv_binary(candle_list(300)))
+        with open(os.path.join(self.base, 'data', 'long', 'ohlcv.json'), 'w') as f:
+            json.dump(candle_list(400), f)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def batch(self, **manifest):
+        manifest = {'config': CONFIG, 'strategies': {'rsi': 'rsi.py', 'sma': 'sma.py'},
+                    'datasets': {'short': 'data/short', 'long': 'data/long'}, **manifest}
+        manifest_path = os.path.join(self.base, 'manifest.json')
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        lines = []
+        summary = run_batch(manifest_path, lines.append)
+        return lines, summary
+
+    def single_run(self, strategy, dataset, **config):
+        job_dir = os.path.join(self.base, 'single')
+        shutil.rmtree(job_dir, ignore_errors=True)
+        shutil.copytree(os.path.join(self.base, 'data', dataset), job_dir)
+        with open(os.path.join(self.base, f'{strategy}.py')) as src, \
+                open(os.path.join(job_dir, 'strategy.py'), 'w') as dst:
+            dst.write(src.read())
+        with open(os.path.join(job_dir, 'config.json'), 'w') as f:
+            json.dump({**CONFIG, 'report': 'none', 'cache': False, **config}, f)
+        return run_backtest(job_dir)['metrics']
+
+    def test_every_pair_matches_a_single_run(self):
+        for workers in (1, 2):
+            lines, summary = self.batch(workers=workers)
+            jobs = sorted((line for line in lines if line['event'] == 'job'), key=lambda line: line['index'])
+            self.assertEqual([(j['strategy'], j['dataset']) for j in jobs],
+                             [('rsi', 'short'), ('rsi', 'long'), ('sma', 'short'), ('sma', 'long')])
+            for job in jobs:
+                self.assertEqual(job['metrics'], self.single_run(job['strategy'], job['dataset']))
+
+            self.assertEqual(lines[-1], summary)
+            self.assertEqual((summary['jobs'], summary['failed']), (4, 0))
+            self.assertEqual([row['total_return'] for row in summary['table']],
+                             [job['metrics']['total_return'] for job in jobs])
+            self.assertEqual({s['strategy']: s['datasets'] for s in summary['by_strategy']}, {'rsi': 2, 'sma': 2})
+
+    def test_explicit_jobs_with_config_overrides(self):
+        lines, summary = self.batch(jobs=[{'strategy': 'sma', 'dataset': 'long', 'config': {'commission': 0.01}}])
+        self.assertEqual(lines[0]['metrics'], self.single_run('sma', 'long', commission=0.01))
+        self.assertEqual(summary['jobs'], 1)
+
+    def test_a_broken_strategy_fails_only_its_jobs(self):
+        lines, summary = self.batch(strategies={'rsi': 'rsi.py', 'broken': 'broken.py'}, workers=1)
+        self.assertEqual(summary['failed'], 2)
+        for row in summary['table']:
+            self.assertEqual('error' in row, row['strategy'] == 'broken')
+        self.assertEqual([s['strategy'] for s in summary['by_strategy']][0], 'rsi')
+
+    def test_invalid_manifests_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "unknown strategy 'nope'"):
+            self.batch(jobs=[{'strategy': 'nope', 'dataset': 'short'}])
+        with self.assertRaisesRegex(ValueError, 'walkForward is not supported in batch runs'):
+            self.batch(config={**CONFIG, 'walkForward': {'train': 100, 'test': 50}})
+        with self.assertRaisesRegex(ValueError, "non-empty 'datasets'"):
+            self.batch(datasets={})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_cache.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_cache.py   (or: python -m pytest scripts/test_backtest_cache.py)
+"""
+
+import fnmatch
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_cache import REPORT_CACHE_SUFFIX, RUNTIME_SOURCES, DiskCache, bytecode_cache_key  # noqa: E402
+from run_backtest import BYTECODE_ENTRY_ERRORS, compile_strategy, run_backtest  # noqa: E402
+from test_run_backtest import RSI_STRATEGY, candle_list, write_job  # noqa: E402
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class DiskCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = DiskCache('results', root=self.tmp.name, max_bytes=300)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_get_returns_what_put_stored(self):
+        self.assertIsNone(self.cache.get('ab' * 20))
+        self.cache.put('ab' * 20, b'result')
+        self.assertEqual(self.cache.get('ab' * 20), b'result')
+
+    def test_eviction_drops_least_recently_used_entries(self):
+        for i, key in enumerate(('aa' * 20, 'bb' * 20)):
+            self.cache.put(key, b'x' * 100)
+            os.utime(self.cache._path(key), (1_000 + i, 1_000 + i))
+        self.cache.get('aa' * 20)  # Now more recently used than bb
+
+        self.cache.put('cc' * 20, b'x' * 150)
+        self.assertIsNotNone(self.cache.get('aa' * 20))
+        self.assertIsNone(self.cache.get('bb' * 20))
+        self.assertIsNotNone(self.cache.get('cc' * 20))
+
+    def test_environment_digest_ignores_tests_and_benchmarks(self):
+        def runtime(name):
+            return any(fnmatch.fnmatch(name, pattern) for pattern in RUNTIME_SOURCES)
+
+        self.assertTrue(all(map(runtime, ('run_backtest.py', 'backtest_cache.py', 'ohlcv_store.py'))))
+        self.assertFalse(runtime('test_backtest_cache.py'))
+        self.assertFalse(runtime('benchmark_backtest.py'))
+
+
+class PrivateDirectoryTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'cache')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def test_directories_are_created_private(self):
+        cache = DiskCache('results', root=self.root)
+        self.assertTrue(cache.enabled)
+        self.assertEqual(os.stat(self.root).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(cache.directory).st_mode & 0o777, 0o700)
+
+    def test_readable_directory_is_narrowed(self):
+        os.makedirs(self.root, mode=0o755)
+        os.chmod(self.root, 0o755)
+        self.assertTrue(DiskCache('results', root=self.root).enabled)
+        self.assertEqual(os.stat(self.root).st_mode & 0o777, 0o700)
+
+    def test_shared_or_foreign_directory_is_not_used(self):
+        os.makedirs(os.path.join(self.root, 'results', 'ab'))
+        with open(os.path.join(self.root, 'results', 'ab', 'ab' * 20), 'wb') as f:
+            f.write(b'planted')
+
+        os.chmod(self.root, 0o777)
+        cache = DiskCache('results', root=self.root)
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.get('ab' * 20))
+        cache.put('cd' * 20, b'result')
+        self.assertFalse(os.path.exists(cache._path('cd' * 20)))
+
+        os.chmod(self.root, 0o700)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertFalse(DiskCache('results', root=self.root).enabled)
+
+    def test_symlinked_directory_is_not_used(self):
+        os.makedirs(os.path.join(self.tmp.name, 'elsewhere'), mode=0o700)
+        os.symlink(os.path.join(self.tmp.name, 'elsewhere'), self.root)
+        self.assertFalse(DiskCache('results', root=self.root).enabled)
+
+
+class BytecodeCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'BACKTEST_CACHE_DIR': self.tmp.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def compile_cached(self, strategy_code):
+        """compile_strategy() with RestrictedPython unavailable, so only a cache hit can succeed"""
+        with mock.patch('RestrictedPython.compile_restricted_exec', side_effect=AssertionError('recompiled')):
+            return compile_strategy(strategy_code)
+
+    def test_compiled_code_is_reused(self):
+        code, errors = compile_strategy(RSI_STRATEGY)
+        self.assertEqual(errors, [])
+        cached_code, cached_errors = self.compile_cached(RSI_STRATEGY)
+        self.assertEqual(cached_errors, [])
+        self.assertEqual(cached_code, code)
+
+    def test_compile_errors_are_cached(self):
+        bad_code = 'value = object()._secret\n'
+        code, errors = compile_strategy(bad_code)
+        self.assertIsNone(code)
+        self.assertTrue(errors)
+        self.assertEqual(self.compile_cached(bad_code), (None, errors))
+        entry = DiskCache('bytecode').get(bytecode_cache_key(bad_code))
+        self.assertEqual(entry[:1], BYTECODE_ENTRY_ERRORS)
+
+    def test_edited_source_is_recompiled(self):
+        compile_strategy(RSI_STRATEGY)
+        with self.assertRaises(AssertionError):
+            self.compile_cached(RSI_STRATEGY + '\n# edited\n')
+
+    def test_corrupt_entry_is_recompiled_and_replaced(self):
+        cache = DiskCache('bytecode')
+        cache.put(bytecode_cache_key(RSI_STRATEGY), b'C' + b'not marshal data')
+        code, errors = compile_strategy(RSI_STRATEGY)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.compile_cached(RSI_STRATEGY), (code, []))
+
+    def test_foreign_cache_directory_is_not_read(self):
+        compile_strategy(RSI_STRATEGY)
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            with self.assertRaises(AssertionError):
+                self.compile_cached(RSI_STRATEGY)
+
+
+class ResultCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.job_dir = os.path.join(self.tmp.name, 'job')
+        os.makedirs(self.job_dir)
+        self.env = mock.patch.dict(os.environ, {'BACKTEST_CACHE_DIR': os.path.join(self.tmp.name, 'cache')})
+        self.env.start()
+        self.candles = candle_list(300)
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def run_job(self, **config):
+        write_job(self.job_dir, RSI_STRATEGY, self.candles, cache=True, **{'report': 'none', **config})
+        return run_backtest(self.job_dir)
+
+    def test_identical_rerun_is_a_hit(self):
+        first = self.run_job()
+        second = self.run_job()
+        self.assertEqual(first['cache']['status'], 'miss')
+        self.assertEqual(second['cache'], {'status': 'hit', 'key': first['cache']['key']})
+        self.assertEqual(second['metrics'], first['metrics'])
+
+    def test_changed_config_or_data_is_a_miss(self):
+        key = self.run_job()['cache']['key']
+        # Fields that do not change the result share the entry
+        self.assertEqual(self.run_job(limits={'cpuSeconds': 60})['cache'], {'status': 'hit', 'key': key})
+        self.assertEqual(self.run_job(commission=0.002)['cache']['status'], 'miss')
+        self.candles = candle_list(301)
+        self.assertEqual(self.run_job()['cache']['status'], 'miss')
+
+    def test_disabled_cache_is_not_read_or_written(self):
+        write_job(self.job_dir, RSI_STRATEGY, self.candles, cache=False, report='none')
+        self.assertEqual(run_backtest(self.job_dir)['cache'], {'status': 'disabled'})
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, 'cache', 'results')))
+
+    def test_deferred_hit_restores_report_data(self):
+        first_path = os.path.join(self.tmp.name, 'first.npz')
+        first = self.run_job(report='deferred', reportPath=first_path)
+
+        second_path = os.path.join(self.tmp.name, 'second.npz')
+        second = self.run_job(report='deferred', reportPath=second_path)
+        self.assertEqual(second['cache']['status'], 'hit')
+        self.assertEqual(second['report_path'], second_path)
+        with open(first_path, 'rb') as a, open(second_path, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+        # A hit whose report data was evicted recomputes the run
+        os.unlink(DiskCache('results')._path(first['cache']['key'] + REPORT_CACHE_SUFFIX))
+        self.assertEqual(self.run_job(report='deferred', reportPath=second_path)['cache']['status'], 'miss')
+
+    def test_one_shot_hit_skips_the_heavy_imports(self):
+        first = self.run_job()
+        probe = ('import runpy, sys\n'
+                 f'sys.argv = ["run_backtest.py", {self.job_dir!r}]\n'
+                 'try:\n'
+                 '    runpy.run_path("run_backtest.py", run_name="__main__")\n'
+                 'except SystemExit:\n'
+                 '    pass\n'
+                 'print(json.dumps(sorted(m for m in ("pandas", "talib", "RestrictedPython") if m in sys.modules)))\n')
+        out = subprocess.run([sys.executable, '-c', 'import json\n' + probe], cwd=SCRIPTS_DIR,
+                             capture_output=True, text=True, check=True).stdout.splitlines()
+        self.assertEqual(json.loads(out[0])['cache'], {'status': 'hit', 'key': first['cache']['key']})
+        self.assertEqual(json.loads(out[0])['metrics'], first['metrics'])
+        self.assertEqual(json.loads(out[1]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
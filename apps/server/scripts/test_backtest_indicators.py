@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_indicators.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_indicators.py   (or: python -m pytest scripts/test_backtest_indicators.py)
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+from backtesting.lib import crossover
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backtest_indicators as indicators  # noqa: E402
+from backtest_lookback import infer_lookback  # noqa: E402
+from backtest_vectorized import create_backtest  # noqa: E402
+from run_backtest import execute_user_code  # noqa: E402
+
+CONFIG = {'initialCapital': 10_000_000, 'commission': 0.002}
+
+EMA_CROSS = '''
+from backtesting import Strategy
+from backtesting.lib import crossover
+import talib
+
+class EmaCross(Strategy):
+    fast = 5
+    slow = 20
+
+    def init(self):
+        self.fast_ema = self.I({fast}, self.data.Close, self.fast)
+        self.slow_ema = self.I({slow}, self.data.Close, self.slow)
+
+    def next(self):
+        if crossover(self.fast_ema, self.slow_ema):
+            self.buy()
+        elif crossover(self.slow_ema, self.fast_ema):
+            self.position.close()
+'''
+
+
+def prices(length, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    spread = np.abs(rng.normal(0, 0.005, length)) * close
+    return close + spread, close - spread, close
+
+
+def ohlc_frame(length):
+    high, low, close = prices(length)
+    index = pd.date_range('2024-01-01', periods=length, freq='h')
+    return pd.DataFrame({'Open': np.r_[close[0], close[:-1]], 'High': high, 'Low': low, 'Close': close}, index=index)
+
+
+class TalibEquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        indicators.reset_cache()
+        self.high, self.low, self.close = prices(20_000)
+
+    def assert_matches(self, ours, theirs, **tolerance):
+        np.testing.assert_array_equal(np.isnan(ours), np.isnan(theirs))
+        np.testing.assert_allclose(ours, theirs, equal_nan=True, **tolerance)
+
+    def test_single_series_indicators(self):
+        cases = [(indicators.sma, talib.SMA, {'rtol': 1e-10}),
+                 # Both sum squares over windows: equal to the cancellation error at the price scale
+                 (indicators.stddev, talib.STDDEV, {'atol': 1e-7 * self.close.max()}),
+                 (indicators.ema, talib.EMA, {'rtol': 1e-12}),
+                 (indicators.rsi, talib.RSI, {'rtol': 1e-10}),
+                 (indicators.rolling_max, talib.MAX, {'rtol': 0}),
+                 (indicators.rolling_min, talib.MIN, {'rtol': 0})]
+        for ours, theirs, tolerance in cases:
+            for period in (2, 14, 50):
+                with self.subTest(function=ours.__name__, period=period):
+                    self.assert_matches(ours(self.close, period), theirs(self.close, period), **tolerance)
+
+    def test_atr(self):
+        for period in (1, 14):
+            with self.subTest(period=period):
+                self.assert_matches(indicators.atr(self.high, self.low, self.close, period),
+                                    talib.ATR(self.high, self.low, self.close, period), rtol=1e-12)
+
+    def test_indicators_of_indicators_skip_leading_nans(self):
+        self.assert_matches(indicators.ema(indicators.sma(self.close, 20), 10),
+                            talib.EMA(talib.SMA(self.close, 20), 10), rtol=1e-10)
+        self.assert_matches(indicators.rsi(indicators.sma(self.close, 5)),
+                            talib.RSI(talib.SMA(self.close, 5)), rtol=1e-8)
+
+    def test_short_series_and_invalid_periods(self):
+        self.assertTrue(np.isnan(indicators.rsi(self.close[:14], 14)).all())
+        self.assertTrue(np.isnan(indicators.sma(self.close[:4], 5)).all())
+        for period in (0, 2.5, True):
+            with self.subTest(period=period), self.assertRaises(ValueError):
+                indicators.sma(self.close, period)
+
+    def test_cross_up_and_down_match_crossover_on_every_bar(self):
+        fast, slow = indicators.ema(self.close, 5), indicators.sma(self.close, 20)
+        expected_up = [bool(crossover(fast[:i + 1], slow[:i + 1])) for i in range(1, 500)]
+        expected_down = [bool(crossover(slow[:i + 1], fast[:i + 1])) for i in range(1, 500)]
+        self.assertEqual(list(indicators.cross_up(fast, slow)[1:500]), expected_up)
+        self.assertEqual(list(indicators.cross_down(fast, slow)[1:500]), expected_down)
+
+        rsi = indicators.rsi(self.close)
+        expected = [bool(crossover(rsi[:i + 1], 70)) for i in range(1, 500)]
+        self.assertEqual(list(indicators.cross_up(rsi, 70)[1:500]), expected)
+
+
+class MemoTest(unittest.TestCase):
+
+    def setUp(self):
+        indicators.reset_cache()
+        _, _, self.close = prices(5_000)
+
+    def test_same_input_returns_cached_result(self):
+        first = indicators.sma(self.close, 20)
+        self.assertIs(indicators.sma(self.close, 20), first)
+        self.assertIs(indicators.sma(pd.Series(self.close, copy=False), period=20), first)
+        self.assertIs(indicators.rsi(self.close, 14), indicators.rsi(self.close))
+        self.assertIsNot(indicators.sma(self.close, 21), first)
+        self.assertIsNot(indicators.sma(self.close.copy(), 20), first)
+        self.assertIsNot(indicators.sma(self.close[1:], 20), first)
+
+        indicators.reset_cache()
+        self.assertIsNot(indicators.sma(self.close, 20), first)
+
+    def test_results_are_read_only(self):
+        result = indicators.ema(self.close, 10)
+        with self.assertRaises(ValueError):
+            result[0] = 1.0
+        copy = result.copy()
+        copy[0] = 1.0
+
+    def test_cache_is_bounded(self):
+        memo = indicators._Memo(budget=3 * self.close.nbytes)
+        indicators._memo = memo
+        results = [indicators.sma(self.close, period) for period in (2, 3, 4)]
+        self.assertLessEqual(memo.size, memo.budget)
+        self.assertIs(indicators.sma(self.close, 4), results[2])
+        self.assertIsNot(indicators.sma(self.close, 2), results[0])
+
+        # Temporary inputs are released with the last result keyed by them
+        for _ in range(5):
+            indicators.sma(self.close * 2, 2)
+        self.assertLessEqual(len(memo.owners), 3)
+
+
+class SandboxTest(unittest.TestCase):
+
+    def setUp(self):
+        indicators.reset_cache()
+
+    def test_strategy_matches_talib_strategy(self):
+        df = ohlc_frame(3_000)
+        ours = execute_user_code(EMA_CROSS.format(fast='indicators.ema', slow='indicators.sma'))
+        theirs = execute_user_code(EMA_CROSS.format(fast='talib.EMA', slow='talib.SMA'))
+
+        stats = create_backtest(df, ours, CONFIG).run()
+        expected = create_backtest(df, theirs, CONFIG).run()
+        self.assertGreater(stats['# Trades'], 0)
+        self.assertEqual(stats['# Trades'], expected['# Trades'])
+        self.assertAlmostEqual(stats['Return [%]'], expected['Return [%]'], places=6)
+
+    def test_sandbox_cannot_replace_indicators(self):
+        with self.assertRaises(TypeError):
+            execute_user_code(EMA_CROSS.format(fast='indicators.ema', slow='indicators.sma')
+                              + '\nindicators.ema = None\n')
+        self.assertIsNotNone(indicators.namespace().ema)
+
+    def test_lookback_is_exact(self):
+        lookback = infer_lookback(EMA_CROSS.format(fast='indicators.ema', slow='indicators.sma'))
+        self.assertTrue(lookback['exact'])
+        # EMA(5): 4 bars plus 10 periods to converge; SMA(20): 19
+        self.assertEqual([entry['bars'] for entry in lookback['indicators']], [54, 19])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_limits.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_limits.py   (or: python -m pytest scripts/test_backtest_limits.py)
+"""
+
+import fcntl
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_limits import (  # noqa: E402
+    ResourceLimitExceeded,
+    acquire_slot,
+    parse_limits,
+    release_slot,
+    run_limits,
+)
+from test_run_backtest import RSI_STRATEGY, candle_list, write_job  # noqa: E402
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def strategy(init_body='pass', next_body='pass'):
+    return f'''
+from backtesting import Strategy
+import numpy as np
+
+class Limited(Strategy):
+    def init(self):
+        {init_body}
+
+    def next(self):
+        {next_body}
+        if not self.position:
+            self.buy()
+'''
+
+
+class LimitsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_one_shot(self, strategy_code, **config):
+        """Run a one-shot process; returns (exit code, result or error JSON)"""
+        write_job(self.tmp.name, strategy_code, candle_list(300), report='none', engine='event', **config)
+        process = subprocess.run([sys.executable, 'run_backtest.py', self.tmp.name], cwd=SCRIPTS_DIR,
+                                 capture_output=True, text=True, timeout=120)
+        output = process.stdout if process.returncode == 0 else process.stderr
+        return process.returncode, json.loads(output.splitlines()[-1])
+
+    def test_limits_block_is_validated(self):
+        self.assertEqual(parse_limits(None), {})
+        self.assertEqual(parse_limits({'memoryMb': 512, 'cpuSeconds': None, 'barMs': 5}), {'memory': 512, 'bar': 5})
+        for spec, message in (([], 'limits must be an object'), ({'wallSeconds': 5}, r'Unknown limits\.wallSeconds'),
+                              ({'barMs': 0}, r'limits\.barMs must be a positive number'),
+                              ({'cpuSeconds': True}, r'limits\.cpuSeconds must be a positive number')):
+            with self.assertRaisesRegex(ValueError, message):
+                parse_limits(spec)
+
+    def test_run_within_its_budgets_succeeds(self):
+        code, result = self.run_one_shot(RSI_STRATEGY, limits={'memoryMb': 1024, 'cpuSeconds': 60, 'barMs': 1000})
+        self.assertEqual(code, 0)
+        self.assertIn('metrics', result)
+
+    def test_memory_budget(self):
+        code, error = self.run_one_shot(strategy(init_body='self.big = np.ones(2 ** 31)'),
+                                        limits={'memoryMb': 256})
+        self.assertEqual(code, 1)
+        self.assertEqual(error['limit'], {'name': 'memory', 'budget': 256})
+
+    def test_cpu_budget(self):
+        code, error = self.run_one_shot(strategy(next_body='while True:\n            pass'),
+                                        limits={'cpuSeconds': 1})
+        self.assertEqual(code, 1)
+        self.assertEqual(error['limit'], {'name': 'cpu', 'budget': 1})
+
+    def test_bar_budget_interrupts_a_runaway_next(self):
+        # Neither an endless loop nor one that swallows exceptions outlives the budget
+        for next_body in ('while True:\n            pass',
+                          'while True:\n            try:\n                pass\n'
+                          '            except Exception:\n                pass'):
+            code, error = self.run_one_shot(strategy(next_body=next_body), limits={'barMs': 50})
+            self.assertEqual(code, 1)
+            self.assertEqual(error['limit'], {'name': 'bar', 'budget': 50})
+            self.assertIn('per-bar budget', error['error'])
+
+    def test_limits_are_restored_after_the_run(self):
+        rlimits = {which: resource.getrlimit(which) for which in (resource.RLIMIT_AS, resource.RLIMIT_CPU)}
+        handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGXCPU, signal.SIGALRM)}
+        with run_limits({'memoryMb': 4096, 'cpuSeconds': 600, 'barMs': 10}):
+            self.assertNotEqual(resource.getrlimit(resource.RLIMIT_CPU), rlimits[resource.RLIMIT_CPU])
+            self.assertIsNot(signal.getsignal(signal.SIGALRM), handlers[signal.SIGALRM])
+        self.assertEqual({which: resource.getrlimit(which) for which in rlimits}, rlimits)
+        self.assertEqual({signum: signal.getsignal(signum) for signum in handlers}, handlers)
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'BACKTEST_MAX_CONCURRENT': '1', 'BACKTEST_ADMISSION_TIMEOUT': '0.3',
+                                                'BACKTEST_ADMISSION_DIR': self.tmp.name})
+        self.env.start()
+
+    def tearDown(self):
+        release_slot()
+        self.env.stop()
+        self.tmp.cleanup()
+
+    def test_slot_is_exclusive_across_processes(self):
+        acquire_slot()
+        holder = subprocess.run(
+            [sys.executable, '-c', 'from backtest_limits import acquire_slot\n'
+                                   'try:\n    acquire_slot()\nexcept Exception as e:\n    print(e.details())'],
+            cwd=SCRIPTS_DIR, capture_output=True, text=True, check=True)
+        self.assertEqual(holder.stdout.strip(), "{'name': 'admission', 'budget': 1}")
+
+        release_slot()
+        with open(os.path.join(self.tmp.name, 'slot-0.lock')) as slot_file:
+            fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)  # Free again
+
+    def test_waits_for_a_slot_up_to_the_timeout(self):
+        with open(os.path.join(self.tmp.name, 'slot-0.lock'), 'a') as other_run:
+            fcntl.flock(other_run, fcntl.LOCK_EX)
+            with self.assertRaises(ResourceLimitExceeded) as raised:
+                acquire_slot()
+            self.assertEqual(raised.exception.details(), {'name': 'admission', 'budget': 1})
+        acquire_slot()  # The other run's slot was freed with its file
+
+    def test_unlimited_without_max_concurrent(self):
+        with mock.patch.dict(os.environ, {'BACKTEST_MAX_CONCURRENT': ''}):
+            acquire_slot()
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_lookback.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_lookback.py   (or: python -m pytest scripts/test_backtest_lookback.py)
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_lookback import infer_lookback, resolve_lookback, trade_start_bar, window_bounds  # noqa: E402
+from backtest_vectorized import create_backtest  # noqa: E402
+from ohlcv_store import write_ohlcv_file  # noqa: E402
+from run_backtest import build_report_data, execute_user_code, load_ohlcv_dataframe  # noqa: E402
+
+HOUR_MS = 3_600_000
+DAY_MS = 24 * HOUR_MS
+
+RSI_STRATEGY = '''
+from backtesting import Strategy
+import talib
+
+class RsiStrategy(Strategy):
+    rsi_period = 14
+    rsi_lower = 30
+
+    def init(self):
+        self.rsi = self.I(talib.RSI, self.data.Close, self.rsi_period)
+        self.macd, self.signal, _ = self.I(talib.MACD, self.data.Close, fastperiod=12, slowperiod=26, signalperiod=9)
+
+    def next(self):
+        pass
+'''
+
+SMA_CROSSOVER = '''
+from backtesting import Strategy
+import numpy as np
+
+class SmaCrossover(Strategy):
+    n1 = 10
+    n2 = 20
+
+    def init(self):
+        self.sma1 = self.I(self.sma, self.data.Close, self.n1)
+        self.sma2 = self.I(self.sma, self.data.Close, self.n2 * 2)
+
+    def next(self):
+        pass
+
+    @staticmethod
+    def sma(data, n):
+        return data
+'''
+
+MULTI_TIMEFRAME = '''
+from backtesting import Strategy
+import pandas as pd
+import talib
+
+class DailyTrend(Strategy):
+    window = 24
+
+    def init(self):
+        self.trend = self.resample_apply('1d', talib.SMA, self.data.Close, 50)
+        self.mean = self.I(lambda c: pd.Series(c).rolling(self.window).mean(), self.data.Close)
+
+    def signals(self):
+        fast = talib.EMA(self.data.Close, 5)
+        return fast > self.trend, fast < self.trend
+'''
+
+
+class InferLookbackTest(unittest.TestCase):
+
+    def test_talib_lookbacks_with_convergence(self):
+        lookback = infer_lookback(RSI_STRATEGY)
+        self.assertEqual(lookback['class'], 'RsiStrategy')
+        self.assertTrue(lookback['exact'])
+        # RSI(14): 14 bars plus 10 periods to converge; MACD(12, 26, 9): 33
+        self.assertEqual([entry['bars'] for entry in lookback['indicators']], [154, 33])
+        self.assertEqual((lookback['bars'], lookback['duration_ms']), (154, 0))
+
+    def test_unknown_functions_fall_back_to_arguments_and_parameters(self):
+        lookback = infer_lookback(SMA_CROSSOVER)
+        self.assertFalse(lookback['exact'])
+        self.assertEqual(lookback['bars'], 40)
+        self.assertEqual(infer_lookback(SMA_CROSSOVER.replace('self.n2 * 2', 'self.n1'))['bars'], 20)
+
+    def test_optimize_uses_largest_swept_value(self):
+        config = {'optimize': {'params': {'rsi_period': {'min': 7, 'max': 28, 'step': 7}}}}
+        self.assertEqual(infer_lookback(RSI_STRATEGY, config)['bars'], 28 + 280)
+
+    def test_higher_timeframes_are_durations(self):
+        lookback = infer_lookback(MULTI_TIMEFRAME)
+        # SMA(50) on daily bars shows after its 50th day closes; EMA(5) and the rolling window are 1h bars
+        self.assertEqual(lookback['duration_ms'], 50 * DAY_MS)
+        self.assertEqual(lookback['bars'], 4 + 50)
+        self.assertLessEqual({'rolling', 'EMA'}, {entry['function'] for entry in lookback['indicators']})
+
+        hourly = infer_lookback(RSI_STRATEGY, {'timeframe': '1h'})
+        self.assertEqual((hourly['bars'], hourly['duration_ms']), (0, 155 * HOUR_MS))
+
+    def test_resolve_lookback(self):
+        self.assertIsNone(resolve_lookback(RSI_STRATEGY, {}))
+        self.assertEqual(resolve_lookback(RSI_STRATEGY, {'lookback': 10}), {'bars': 10, 'duration_ms': 0})
+        self.assertEqual(resolve_lookback(RSI_STRATEGY, {'lookback': 'auto'})['bars'], 154)
+
+    def test_code_without_strategy_class(self):
+        with self.assertRaises(ValueError):
+            infer_lookback('x = 1')
+
+
+class DataWindowTest(unittest.TestCase):
+
+    config = {'startDate': '2024-02-01', 'endDate': '2024-02-02'}
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        start = int(pd.Timestamp('2024-01-01').value // 10 ** 6)
+        self.timestamps = start + np.arange(60 * 24, dtype=np.int64) * HOUR_MS
+        write_ohlcv_file(os.path.join(self.tmp.name, 'ohlcv.bin'), self.timestamps,
+                         np.tile(np.arange(len(self.timestamps), dtype=np.float64), (4, 1)),
+                         ['Open', 'High', 'Low', 'Close'])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_window_bounds(self):
+        first, last = window_bounds(self.timestamps, 'ms', self.config, {'bars': 10, 'duration_ms': 0})
+        self.assertEqual((first, last), (31 * 24 - 10, 33 * 24))
+        first, _ = window_bounds(self.timestamps, 'ms', self.config, {'bars': 10, 'duration_ms': DAY_MS})
+        self.assertEqual(first, 30 * 24)
+        first, _ = window_bounds(self.timestamps, 'ms', self.config, {'bars': 5000, 'duration_ms': 0})
+        self.assertEqual(first, 0)
+
+        with self.assertRaises(ValueError):
+            window_bounds(self.timestamps, 'ms', {'startDate': '2025-01-01', 'endDate': '2025-01-02'},
+                          {'bars': 0, 'duration_ms': 0})
+
+    def test_binary_file_is_cut_before_building_the_dataframe(self):
+        df = load_ohlcv_dataframe(self.tmp.name, self.config, {'bars': 24, 'duration_ms': 0})
+        self.assertEqual(len(df), 3 * 24)
+        self.assertEqual(df.index[0], pd.Timestamp('2024-01-31'))
+        self.assertEqual(df.index[-1], pd.Timestamp('2024-02-02 23:00'))
+        self.assertEqual(len(load_ohlcv_dataframe(self.tmp.name, self.config)), len(self.timestamps))
+
+
+RSI_TRADER = '''
+from backtesting import Strategy
+import talib
+
+class RsiTrader(Strategy):
+    def init(self):
+        self.rsi = self.I(talib.RSI, self.data.Close, 14)
+
+    def next(self):
+        if not self.position and self.rsi[-1] < 45:
+            self.buy()
+        elif self.position and self.rsi[-1] > 55:
+            self.position.close()
+
+    def signals(self):
+        return self.rsi < 45, self.rsi > 55
+'''
+
+
+class TradeWindowTest(unittest.TestCase):
+
+    config = {'startDate': '2024-02-01', 'endDate': '2024-02-10', 'initialCapital': 10_000_000,
+              'commission': 0.001, 'lookback': 'auto'}
+
+    def load(self, tmp_dir, seed):
+        start = int(pd.Timestamp('2024-01-01').value // 10 ** 6)
+        timestamps = start + np.arange(60 * 24, dtype=np.int64) * HOUR_MS
+        close = 30_000 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, len(timestamps))))
+        write_ohlcv_file(os.path.join(tmp_dir, 'ohlcv.bin'), timestamps,
+                         np.vstack([close, close * 1.005, close * 0.995, close]), ['Open', 'High', 'Low', 'Close'])
+        return load_ohlcv_dataframe(tmp_dir, self.config, resolve_lookback(RSI_TRADER, self.config))
+
+    def test_warmup_bars_are_not_traded_or_measured(self):
+        strategy_class = execute_user_code(RSI_TRADER)
+        start = pd.Timestamp(self.config['startDate'])
+        for seed in range(8):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                df = self.load(tmp_dir, seed)
+            self.assertEqual(df.index[trade_start_bar(df, self.config)], start)
+            runs = {engine: create_backtest(df, strategy_class, self.config, engine).run()
+                    for engine in ('event', 'vectorized')}
+            for engine, stats in runs.items():
+                with self.subTest(seed=seed, engine=engine):
+                    self.assertGreater(stats['# Trades'], 0)
+                    self.assertTrue((stats['_trades']['EntryTime'] >= start).all())
+                    self.assertEqual(stats['Start'], start)
+                    self.assertEqual(stats['_equity_curve']['Equity'].iloc[0], self.config['initialCapital'])
+            self.assertEqual(runs['event']['# Trades'], runs['vectorized']['# Trades'])
+            self.assertAlmostEqual(runs['event']['Return [%]'], runs['vectorized']['Return [%]'], places=6)
+
+        # Without a lookback every loaded bar is traded
+        self.assertEqual(trade_start_bar(df, {**self.config, 'lookback': None}), 0)
+
+        # The report covers the same window as the statistics
+        bt = create_backtest(df, strategy_class, self.config)
+        report = build_report_data(bt, bt.run())
+        self.assertEqual(report['df'].index[0], start)
+        self.assertEqual(report['indicators'][0].shape, (len(report['df']),))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_memory.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_memory.py   (or: python -m pytest scripts/test_backtest_memory.py)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_memory import float32_keeps_order, read_ohlcv_json, with_float64_indicators  # noqa: E402
+from backtest_vectorized import create_backtest  # noqa: E402
+from ohlcv_store import write_ohlcv_file  # noqa: E402
+from run_backtest import convert_to_dataframe, execute_user_code, load_ohlcv_dataframe  # noqa: E402
+
+CONFIG = {'initialCapital': 10_000_000, 'commission': 0.002, 'startDate': '2024-01-01', 'endDate': '2024-02-01'}
+
+SMA_CROSS = '''
+from backtesting import Strategy
+from backtesting.lib import crossover
+import talib
+
+class SmaCross(Strategy):
+    def init(self):
+        self.fast = self.I(talib.SMA, self.data.Close, 10)
+        self.slow = self.I(talib.SMA, self.data.Close, 30)
+
+    def next(self):
+        if crossover(self.fast, self.slow):
+            self.buy()
+        elif crossover(self.slow, self.fast):
+            self.position.close()
+'''
+
+
+def candles(length, seed=0, volume=False):
+    rng = np.random.default_rng(seed)
+    close = np.round(30_000 * np.exp(np.cumsum(rng.normal(0, 0.005, length))), 2)
+    start = int(pd.Timestamp('2024-01-01').value // 10 ** 6)
+    rows = [{'timestamp': start + i * 3_600_000, 'open': float(close[max(i - 1, 0)]),
+             'high': round(float(close[i]) * 1.002, 2), 'low': round(float(close[i]) * 0.998, 2),
+             'close': float(close[i])} for i in range(length)]
+    if volume:
+        for i, row in enumerate(rows):
+            row['volume'] = float(i) if i % 3 else None
+    return rows
+
+
+class LoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_json(self, data):
+        with open(os.path.join(self.tmp.name, 'ohlcv.json'), 'w') as f:
+            json.dump(data, f)
+
+    def test_low_mode_matches_default_loader_without_absent_columns(self):
+        data = candles(500)
+        self.write_json(data)
+        low = load_ohlcv_dataframe(self.tmp.name, {**CONFIG, 'memory': 'low'})
+        default = convert_to_dataframe(data)
+
+        self.assertEqual(list(low.columns), ['Open', 'High', 'Low', 'Close'])
+        pd.testing.assert_frame_equal(low, default.drop(columns='Volume'))
+
+    def test_volume_is_kept_when_present(self):
+        data = candles(50, volume=True)
+        self.write_json(data)
+        low = load_ohlcv_dataframe(self.tmp.name, {**CONFIG, 'memory': 'low'})
+        pd.testing.assert_frame_equal(low, convert_to_dataframe(data))
+
+        # Volume first appearing mid-file is 0 for the candles before it
+        del data[0]['volume'], data[1]['volume']
+        self.write_json(data)
+        _, columns = read_ohlcv_json(os.path.join(self.tmp.name, 'ohlcv.json'))
+        np.testing.assert_array_equal(columns['Volume'][:4], [0, 0, 2, 0])
+
+    def test_float32_prices_where_precision_allows(self):
+        self.write_json(candles(500))
+        df = load_ohlcv_dataframe(self.tmp.name, {**CONFIG, 'memory': 'float32'})
+        self.assertEqual(set(df.dtypes), {np.dtype(np.float32)})
+
+        # Distinct prices float32 would merge keep float64
+        data = candles(500)
+        data[10]['close'], data[11]['close'] = 30_000.0001, 30_000.0002
+        self.write_json(data)
+        df = load_ohlcv_dataframe(self.tmp.name, {**CONFIG, 'memory': 'float32'})
+        self.assertEqual(df['Close'].dtype, np.float64)
+
+    def test_float32_binary_and_lookback_window(self):
+        data = candles(24 * 40)
+        timestamps = np.array([row['timestamp'] for row in data], dtype=np.int64)
+        values = np.array([[row[key] for row in data] for key in ('open', 'high', 'low', 'close')])
+        write_ohlcv_file(os.path.join(self.tmp.name, 'ohlcv.bin'), timestamps, values, ['Open', 'High', 'Low', 'Close'])
+        config = {**CONFIG, 'memory': 'float32', 'startDate': '2024-01-20', 'endDate': '2024-01-21'}
+
+        df = load_ohlcv_dataframe(self.tmp.name, config, {'bars': 24, 'duration_ms': 0})
+        self.assertEqual(len(df), 3 * 24)
+        self.assertEqual(df['Close'].dtype, np.float32)
+        np.testing.assert_array_equal(df['Close'], values[3, 18 * 24:21 * 24].astype(np.float32))
+
+    def test_invalid_json(self):
+        for data in ([], {'timestamp': 0}, [{'timestamp': 0, 'open': 1}], [1, 2]):
+            self.write_json(data)
+            with self.subTest(data=data), self.assertRaises(ValueError):
+                load_ohlcv_dataframe(self.tmp.name, {**CONFIG, 'memory': 'low'})
+
+
+class Float32Test(unittest.TestCase):
+
+    def test_float32_keeps_order(self):
+        self.assertTrue(float32_keeps_order(np.array([3.25, 1.0, 2.5, 1.0])))
+        self.assertFalse(float32_keeps_order(np.array([1.0, 1.0 + 1e-9])))
+        self.assertFalse(float32_keeps_order(np.array([1e39])))
+
+    def test_indicators_get_float64_and_match_float64_run(self):
+        df = convert_to_dataframe(candles(2000)).drop(columns='Volume')
+        narrowed = df.astype(np.float32)
+        strategy_class = execute_user_code(SMA_CROSS)
+
+        stats = create_backtest(df, strategy_class, CONFIG).run()
+        narrowed_stats = create_backtest(narrowed, strategy_class, CONFIG).run()
+        self.assertEqual(narrowed_stats['# Trades'], stats['# Trades'])
+        self.assertAlmostEqual(narrowed_stats['Return [%]'], stats['Return [%]'], places=2)
+        self.assertEqual(with_float64_indicators(strategy_class).__name__, 'SmaCross')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_optimizer.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_optimizer.py   (or: python -m pytest scripts/test_backtest_optimizer.py)
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_optimizer import expand_param_grid  # noqa: E402
+
+
+class ExpandParamGridTest(unittest.TestCase):
+
+    def test_ranges_are_inclusive_and_exact(self):
+        grid = expand_param_grid({
+            'period': {'min': 5, 'max': 30, 'step': 5},
+            'threshold': {'min': 0.1, 'max': 1.0, 'step': 0.1},
+            'offset': {'min': 0.05, 'max': 0.3, 'step': 0.1},
+            'ratio': {'min': 1, 'max': 2, 'step': 0.25},
+            'mode': ['fast', 'slow'],
+        })
+        self.assertEqual(grid['period'], [5, 10, 15, 20, 25, 30])
+        self.assertTrue(all(isinstance(value, int) for value in grid['period']))
+        self.assertEqual(grid['threshold'], [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+        self.assertEqual(grid['offset'], [0.05, 0.15, 0.25])
+        self.assertEqual(grid['ratio'], [1.0, 1.25, 1.5, 1.75, 2.0])
+        self.assertEqual(grid['mode'], ['fast', 'slow'])
+
+    def test_invalid_ranges(self):
+        for spec in ({'min': 1, 'max': 5, 'step': 0}, {'min': 5, 'max': 1}, [], {'max': 5}):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                expand_param_grid({'period': spec})
+
+
+if __name__ == '__main__':
+    unittest.main()
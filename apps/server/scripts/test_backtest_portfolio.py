@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_portfolio.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_portfolio.py   (or: python -m pytest scripts/test_backtest_portfolio.py)
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_portfolio import (PortfolioStrategy, align_assets, parse_portfolio, run_portfolio,  # noqa: E402
+                                simulate_portfolio)
+
+CONFIG = {'initialCapital': 100_000, 'commission': 0.0}
+HOUR_NS = 3600 * 10 ** 9
+
+
+def asset_series(prices, start=0, skip=()):
+    """(ns timestamps, columns) of hourly bars with Open == Close == prices, dropping bar numbers in skip"""
+    bars = [bar for bar in range(len(prices)) if bar not in skip]
+    values = np.asarray(prices, dtype=np.float64)[bars]
+    timestamps = (np.asarray(bars, dtype=np.int64) + start) * HOUR_NS
+    return timestamps, {name: values for name in ('Open', 'High', 'Low', 'Close')}
+
+
+def random_prices(assets, length, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (assets, length)), axis=1))
+    open_ = np.concatenate((close[:, :1], close[:, :-1]), axis=1)
+    return open_, close
+
+
+def reference_equity(open_, close, weights, cash, commission):
+    """Bar-by-bar simulation of the documented rebalancing rules"""
+    units = np.zeros(len(close))
+    equity = np.empty(close.shape[1])
+    for bar in range(close.shape[1]):
+        previous = weights[:, bar - 2] if bar > 1 else np.zeros(len(close))
+        if bar > 0 and (weights[:, bar - 1] != previous).any():
+            prices = np.nan_to_num(open_[:, bar])
+            value = cash + units @ prices
+            target = weights[:, bar - 1] * value
+            target *= 1 - commission * np.abs(target - units * prices).sum() / value
+            new_units = np.where(target > 0, target / np.where(prices > 0, prices, 1), 0.0)
+            traded = (new_units - units) * prices
+            cash -= traded.sum() + commission * np.abs(traded).sum()
+            units = new_units
+        equity[bar] = cash + units @ np.nan_to_num(close[:, bar])
+    return equity
+
+
+class AlignTest(unittest.TestCase):
+
+    def test_gaps_repeat_previous_close_and_late_listings_are_nan(self):
+        data = align_assets(['a', 'b'], [
+            asset_series([1, 2, 3, 4, 5], skip=(2,)),
+            asset_series([10, 20, 30], start=2),
+        ])
+        self.assertEqual(len(data), 5)
+        np.testing.assert_array_equal(data.Close[0], [1, 2, 2, 4, 5])
+        np.testing.assert_array_equal(data.Open[0], [1, 2, 2, 4, 5])
+        np.testing.assert_array_equal(data.Close[1], [np.nan, np.nan, 10, 20, 30])
+        np.testing.assert_array_equal(data.Volume, np.zeros((2, 5)))
+        self.assertFalse(data.Close.flags.writeable)
+
+    def test_missing_price_columns(self):
+        timestamps, columns = asset_series([1, 2])
+        del columns['Low']
+        with self.assertRaises(ValueError):
+            align_assets(['a'], [(timestamps, columns)])
+
+
+class SimulateTest(unittest.TestCase):
+
+    def test_matches_bar_by_bar_reference(self):
+        open_, close = random_prices(5, 2000)
+        open_[2, :300] = close[2, :300] = np.nan
+        rng = np.random.default_rng(1)
+        weights = rng.random(close.shape) * (rng.random(close.shape) > 0.4)
+        weights[np.isnan(close)] = 0.0
+        weights = (weights / np.maximum(weights.sum(axis=0), 1e-9) * 0.9)[:, np.arange(2000) // 7 * 7]
+
+        equity, trades, rebalances, _ = simulate_portfolio(open_, close, weights, 100_000, 0.002)
+        np.testing.assert_allclose(equity, reference_equity(open_, close, weights, 100_000, 0.002), rtol=1e-10)
+        self.assertEqual(rebalances, -(-2000 // 7))  # Every weekly block of weights
+        # Holding periods account for every change in equity
+        self.assertAlmostEqual((trades['proceeds'] - trades['cost']).sum(), equity[-1] - 100_000, places=6)
+
+    def test_equal_weight_hold(self):
+        open_, close = random_prices(4, 500)
+        weights = np.full(close.shape, 0.25)
+        equity, trades, rebalances, units = simulate_portfolio(open_, close, weights, 100_000, 0.0)
+
+        expected_units = 25_000 / open_[:, 1]
+        np.testing.assert_allclose(units, expected_units)
+        np.testing.assert_allclose(equity[1:], expected_units @ close[:, 1:])
+        self.assertEqual(equity[0], 100_000)
+        self.assertEqual(rebalances, 1)
+        np.testing.assert_array_equal(trades['entry_bar'], [1] * 4)
+        np.testing.assert_array_equal(trades['exit_bar'], [499] * 4)
+
+    def test_commission_is_paid_from_cash(self):
+        open_, close = random_prices(2, 10)
+        weights = np.zeros(close.shape)
+        weights[0, 2:5] = 1.0
+        equity, trades, _, _ = simulate_portfolio(open_, close, weights, 100_000, 0.01)
+
+        # Buy at bar 3's open with 1% kept for commission, sell at bar 6's open
+        bought = 100_000 * 0.99 / open_[0, 3]
+        proceeds = bought * open_[0, 6] * 0.99
+        self.assertAlmostEqual(trades['bought'][0], bought)
+        self.assertAlmostEqual(equity[-1], 100_000 - bought * open_[0, 3] * 1.01 + proceeds)
+        self.assertEqual((trades['entry_bar'][0], trades['exit_bar'][0]), (3, 6))
+
+
+class RunPortfolioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = align_assets(['a', 'b', 'c'], [
+            asset_series(100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, 300))))
+            for seed in range(3)
+        ])
+
+    def run_weights(self, weights):
+        class Fixed(PortfolioStrategy):
+            def weights(self):
+                return weights
+
+        return run_portfolio(self.data, Fixed, CONFIG)
+
+    def test_stats_and_summary(self):
+        weights = np.zeros((3, 300))
+        weights[:2, 100:] = 0.5
+        stats, summary = self.run_weights(weights)
+
+        self.assertEqual(summary['rebalances'], 1)
+        self.assertEqual([row['trades'] for row in summary['allocation']], [1, 1, 0])
+        self.assertEqual(list(stats['_trades']['Asset']), ['a', 'b'])
+        self.assertAlmostEqual(stats['_trades']['PnL'].sum(), stats['Equity Final [$]'] - CONFIG['initialCapital'])
+        self.assertAlmostEqual(sum(row['weight'] for row in summary['allocation']), 1.0)
+
+    def test_invalid_weights(self):
+        for weights in (np.full((3, 299), 0.1), np.full((3, 300), -0.1), np.full((3, 300), 0.5)):
+            with self.subTest(shape=weights.shape, value=weights[0, 0]), self.assertRaises(ValueError):
+                self.run_weights(weights)
+
+    def test_parse_portfolio(self):
+        self.assertEqual(parse_portfolio({'assets': ['bitcoin', 'ethereum']}), ['bitcoin', 'ethereum'])
+        for spec in (['bitcoin'], {'assets': []}, {'assets': ['../etc']}, {'assets': ['bitcoin', 'bitcoin']}):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_portfolio(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_profile.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_profile.py   (or: python -m pytest scripts/test_backtest_profile.py)
+"""
+
+import logging
+import os
+import signal
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run_backtest import run_backtest, validate_config  # noqa: E402
+from test_run_backtest import RSI_STRATEGY, candle_list, write_job  # noqa: E402
+
+HOT_STRATEGY = '''
+from backtesting import Strategy
+
+class Hot(Strategy):
+    def init(self):
+        pass
+
+    def next(self):
+        total = 0
+        for i in range(3000):
+            total += i * i
+        if not self.position:
+            self.buy()
+'''
+
+HOT_LINE = 'total += i * i'
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'BACKTEST_CACHE_DIR': os.path.join(self.tmp.name, 'cache')})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def run_job(self, strategy_code=RSI_STRATEGY, **config):
+        job_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        write_job(job_dir, strategy_code, candle_list(300), **{'report': 'none', 'engine': 'event', **config})
+        return run_backtest(job_dir)
+
+    def test_stage_profile(self):
+        result = self.run_job(profile=True)
+        self.assertEqual(result['metrics'], self.run_job()['metrics'])
+
+        profile = result['profile']
+        stages = [stage['stage'] for stage in profile['stages']]
+        for stage in ('load_data', 'compile', 'simulate', 'metrics'):
+            self.assertIn(stage, stages)
+        for stage in profile['stages']:
+            self.assertEqual(set(stage), {'stage', 'wall', 'cpu', 'peak_rss_mb'})
+            self.assertGreaterEqual(stage['wall'], 0)
+            self.assertGreater(stage['peak_rss_mb'], 0)
+        self.assertGreaterEqual(profile['total']['wall'], sum(stage['wall'] for stage in profile['stages']))
+        self.assertGreater(profile['total']['max_rss_mb'], 0)
+        self.assertNotIn('hotspots', profile)
+        self.assertNotIn('profile', self.run_job())
+
+    def test_deep_profile_charges_the_hot_strategy_line(self):
+        handler = signal.getsignal(signal.SIGPROF)
+        hotspots = self.run_job(HOT_STRATEGY, profile='deep')['profile']['hotspots']
+        self.assertEqual(signal.getsignal(signal.SIGPROF), handler)
+        self.assertEqual(signal.getitimer(signal.ITIMER_PROF), (0.0, 0.0))
+
+        self.assertGreater(hotspots['strategy_samples'], 0)
+        self.assertLessEqual(hotspots['strategy_samples'], hotspots['samples'])
+        # Sampling is statistical: the loop lines of next() lead, in either order
+        self.assertIn(HOT_LINE, [line['code'] for line in hotspots['lines'][:2]])
+        hot = next(line for line in hotspots['lines'] if line['code'] == HOT_LINE)
+        self.assertEqual(hot['function'], 'next')
+        self.assertEqual(hot['line'], [line.strip() for line in HOT_STRATEGY.splitlines()].index(HOT_LINE) + 1)
+        self.assertEqual(hot['percent'], round(hot['samples'] / hotspots['samples'] * 100, 1))
+
+    def test_cached_result_is_profiled_as_this_run(self):
+        fresh = self.run_job(cache=True)
+        cached = self.run_job(cache=True, profile=True)
+        self.assertEqual(cached['cache']['status'], 'hit')
+        self.assertEqual(cached['metrics'], fresh['metrics'])
+        self.assertEqual([stage['stage'] for stage in cached['profile']['stages']], ['cache_lookup'])
+
+    def test_invalid_profile_mode_is_rejected(self):
+        with self.assertRaisesRegex(ValueError, "Invalid profile 'full'"):
+            validate_config({'initialCapital': 1, 'commission': 0, 'startDate': '2024-01-01',
+                             'endDate': '2024-02-01', 'profile': 'full'})
+
+
+if __name__ == '__main__':
+    unittest.main()
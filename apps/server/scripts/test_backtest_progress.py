@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_progress.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_progress.py   (or: python -m pytest scripts/test_backtest_progress.py)
+"""
+
+import json
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_progress import ProgressReporter, reporter  # noqa: E402
+from run_backtest import run_backtest  # noqa: E402
+from test_run_backtest import RSI_STRATEGY, candle_list, write_job  # noqa: E402
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SMA_CROSS = '''
+from backtesting import Strategy
+import talib
+
+class SmaCross(Strategy):
+    fast = 5
+    slow = 20
+
+    def init(self):
+        self.fast_sma = self.I(talib.SMA, self.data.Close, self.fast)
+        self.slow_sma = self.I(talib.SMA, self.data.Close, self.slow)
+
+    def next(self):
+        if not self.position and self.fast_sma[-1] > self.slow_sma[-1]:
+            self.buy()
+        elif self.position and self.fast_sma[-1] < self.slow_sma[-1]:
+            self.position.close()
+'''
+
+# Milliseconds of work per bar, so a run is still simulating when it is cancelled
+SLOW_STRATEGY = '''
+from backtesting import Strategy
+
+class Slow(Strategy):
+    def init(self):
+        pass
+
+    def next(self):
+        total = 0
+        for i in range(100000):
+            total += i
+        if not self.position:
+            self.buy()
+'''
+
+
+class ProgressEventsTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.events = []
+
+    def tearDown(self):
+        reporter.configure(None)
+        self.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def run_job(self, strategy_code, candles, progress=True, **config):
+        job_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        write_job(job_dir, strategy_code, candles, report='none', engine='event', **config)
+        reporter.configure(self.events.append if progress else None)
+        return run_backtest(job_dir)
+
+    def test_stages_and_bars_are_reported(self):
+        candles = candle_list(300)
+        result = self.run_job(RSI_STRATEGY, candles)
+        self.assertEqual(result['metrics'], self.run_job(RSI_STRATEGY, candles, progress=False)['metrics'])
+
+        stages = [(e['stage'], e['status']) for e in self.events if e['event'] == 'stage']
+        for stage in ('load_data', 'compile', 'simulate', 'metrics'):
+            self.assertIn((stage, 'started'), stages)
+            self.assertIn((stage, 'finished'), stages)
+        self.assertLess(stages.index(('simulate', 'started')), stages.index(('simulate', 'finished')))
+
+        bars = [e for e in self.events if e['event'] == 'bars']
+        self.assertTrue(bars)
+        self.assertEqual((bars[-1]['completed'], bars[-1]['total']), (300, 300))
+        self.assertIn('equity', bars[-1])
+        self.assertEqual(bars[-1]['eta'], 0)
+
+    def test_sweep_reports_the_best_combination(self):
+        self.run_job(SMA_CROSS, candle_list(400), optimize={
+            'params': {'fast': [3, 5, 8], 'slow': [20, 30]}, 'maximize': 'total_return', 'workers': 1,
+        })
+        sweep = [e for e in self.events if e['event'] == 'sweep']
+        self.assertEqual((sweep[-1]['completed'], sweep[-1]['total'], sweep[-1]['failed']), (6, 6, 0))
+        self.assertEqual(set(sweep[-1]['best']['params']), {'fast', 'slow'})
+
+    def test_counter_events_are_throttled(self):
+        events = []
+        progress = ProgressReporter(interval=3600)
+        progress.configure(events.append)
+        counter = progress.counter('bars', 100)
+        for completed in range(1, 101):
+            counter.update(completed)
+        # The first update and the last of the loop
+        self.assertEqual([e['completed'] for e in events], [1, 100])
+        self.assertEqual(progress.cancelled_result('SIGTERM')['partial']['bars']['completed'], 100)
+
+
+class CancellationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def cancel_after(self, event, strategy_code, candles, **config):
+        """Start a one-shot --progress run, SIGTERM it at its first `event` line; returns its last line"""
+        write_job(self.tmp.name, strategy_code, candles, report='none', engine='event', **config)
+        process = subprocess.Popen([sys.executable, 'run_backtest.py', self.tmp.name, '--progress'],
+                                   cwd=SCRIPTS_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            for line in process.stdout:
+                if json.loads(line).get('event') == event:
+                    process.send_signal(signal.SIGTERM)
+                    break
+            lines = process.stdout.read().splitlines()
+            self.assertEqual(process.wait(timeout=60), 0)
+        finally:
+            process.kill()
+            process.stdout.close()
+        return json.loads(lines[-1])
+
+    def test_cancelled_simulation_returns_bar_progress(self):
+        result = self.cancel_after('bars', SLOW_STRATEGY, candle_list(3000))
+        self.assertEqual((result['cancelled'], result['reason'], result['stage']), (True, 'SIGTERM', 'simulate'))
+        bars = result['partial']['bars']
+        self.assertEqual(bars['total'], 3000)
+        self.assertLess(bars['completed'], bars['total'])
+
+    def test_cancelled_sweep_returns_the_best_so_far(self):
+        result = self.cancel_after('sweep', SMA_CROSS, candle_list(2000), optimize={
+            'params': {'fast': {'min': 2, 'max': 40, 'step': 1}, 'slow': {'min': 50, 'max': 150, 'step': 5}},
+            'maximize': 'total_return', 'workers': 2,
+        })
+        self.assertEqual((result['cancelled'], result['stage']), (True, 'optimize'))
+        sweep = result['partial']['sweep']
+        self.assertLess(sweep['completed'], sweep['total'])
+        self.assertEqual(set(sweep['best']['params']), {'fast', 'slow'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_robustness.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_robustness.py   (or: python -m pytest scripts/test_backtest_robustness.py)
+"""
+
+import logging
+import multiprocessing
+import os
+import sys
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import backtest_robustness  # noqa: E402
+from backtest_robustness import parse_robustness, path_statistics, run_robustness, trade_returns  # noqa: E402
+from run_backtest import unseeded_robustness  # noqa: E402
+
+
+def fake_stats(pnl, initial=10_000.0):
+    """Stats with back-to-back trades, each opened on the equity the previous one left"""
+    equity = initial + np.concatenate(([0.0], np.cumsum(pnl)))
+    bars = np.arange(1, len(pnl) + 1)
+    return pd.Series({
+        '_trades': pd.DataFrame({'EntryBar': bars, 'ExitBar': bars, 'PnL': pnl}),
+        '_equity_curve': pd.DataFrame({'Equity': equity}),
+    })
+
+
+class PathStatisticsTest(unittest.TestCase):
+
+    def test_compounding_and_drawdown(self):
+        total, drawdown = path_statistics(np.array([[0.1, -0.5, 0.2]]))
+        self.assertAlmostEqual(total[0], 1.1 * 0.5 * 1.2 - 1)
+        self.assertAlmostEqual(drawdown[0], -0.5)
+
+    def test_losses_from_start_count_against_initial_equity(self):
+        _, drawdown = path_statistics(np.array([[-0.2, 0.1]]))
+        self.assertAlmostEqual(drawdown[0], -0.2)
+
+    def test_total_loss_is_full_drawdown(self):
+        total, drawdown = path_statistics(np.array([[0.5, -1.0, 0.3]]))
+        self.assertEqual(total[0], -1.0)
+        self.assertEqual(drawdown[0], -1.0)
+
+    def test_trade_returns_are_on_entry_equity(self):
+        np.testing.assert_allclose(trade_returns(fake_stats(np.array([1000.0, -2200.0]))), [0.1, -0.2])
+
+
+class RunRobustnessTest(unittest.TestCase):
+
+    stats = fake_stats(np.random.default_rng(4).normal(50, 400, 80))
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def run_analysis(self, **spec):
+        return run_robustness(self.stats, {'robustness': {'workers': 1, **spec}})
+
+    def test_observed_matches_the_trades(self):
+        result = self.run_analysis(seed=1)
+        equity = self.stats['_equity_curve']['Equity']
+        self.assertAlmostEqual(result['total_return']['observed'], (equity.iloc[-1] / equity.iloc[0] - 1) * 100)
+        self.assertEqual(result['simulations'], 2000)
+        self.assertLessEqual(result['total_return']['lower'], result['total_return']['median'])
+        self.assertLessEqual(result['total_return']['median'], result['total_return']['upper'])
+
+    def test_seed_is_reproducible_across_workers(self):
+        # Small batches so the pool actually splits the work
+        with mock.patch.object(backtest_robustness, 'BATCH_ELEMENTS', 80 * 7):
+            sequential = self.run_analysis(seed=9, simulations=500)
+            pooled = self.run_analysis(seed=9, simulations=500, workers=3)
+        for key in ('total_return', 'max_drawdown', 'probability_of_loss', 'risk_of_ruin'):
+            self.assertEqual(sequential[key], pooled[key], key)
+
+    def test_runs_serially_in_a_daemonic_pool_process(self):
+        logging.disable(logging.NOTSET)  # For the warning
+        with mock.patch.object(backtest_robustness, 'BATCH_ELEMENTS', 80 * 7), \
+                mock.patch.dict(multiprocessing.current_process()._config, daemon=True), \
+                self.assertLogs('backtest_progress', 'WARNING'):
+            result = self.run_analysis(seed=9, simulations=500, workers=3)
+        self.assertEqual(result['workers'], 1)
+        self.assertEqual(result['simulations'], 500)
+
+    def test_shuffle_keeps_the_final_return(self):
+        result = self.run_analysis(method='shuffle', seed=2)
+        interval = result['total_return']
+        self.assertAlmostEqual(interval['lower'], interval['observed'])
+        self.assertAlmostEqual(interval['upper'], interval['observed'])
+
+    def test_time_budget_truncates(self):
+        with mock.patch.object(backtest_robustness, 'BATCH_ELEMENTS', 80):
+            result = self.run_analysis(simulations=1_000_000, timeBudget=0.05)
+        self.assertTrue(result['truncated'])
+        self.assertLess(result['simulations'], 1_000_000)
+        self.assertGreater(result['simulations'], 0)
+
+    def test_too_few_trades(self):
+        result = run_robustness(fake_stats(np.array([100.0])), {'robustness': True})
+        self.assertEqual(result['simulations'], 0)
+        self.assertIsNone(result['total_return'])
+
+    def test_invalid_spec(self):
+        for spec in ({'method': 'jackknife'}, {'simulations': 0}, {'confidence': 1}, {'ruin': 0}, {'seed': -1},
+                     {'workers': 0}, {'workers': '4'}, {'workers': 2.5}, {'workers': True}):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_robustness(spec)
+
+    def test_only_seeded_runs_are_cached(self):
+        self.assertFalse(unseeded_robustness({}))
+        self.assertFalse(unseeded_robustness({'robustness': {'seed': 0}}))
+        self.assertTrue(unseeded_robustness({'robustness': True}))
+        self.assertTrue(unseeded_robustness({'robustness': {'simulations': 500}}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_search.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_search.py   (or: python -m pytest scripts/test_backtest_search.py)
+"""
+
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_optimizer import objective_value, run_optimization  # noqa: E402
+from backtest_search import _Proposer, parse_search, prefix_lengths  # noqa: E402
+from run_backtest import execute_user_code, validate_config  # noqa: E402
+
+RSI_SIGNALS = '''
+from backtesting import Strategy
+
+class RsiReversion(Strategy):
+    period = 14
+    lower = 30
+    upper = 70
+
+    def init(self):
+        self.rsi = self.I(indicators.rsi, self.data.Close, self.period)
+
+    def signals(self):
+        return indicators.cross_up(self.rsi, self.lower), indicators.cross_down(self.rsi, self.upper)
+'''
+
+PARAMS = {
+    'period': {'min': 5, 'max': 30, 'step': 5},
+    'lower': {'min': 10, 'max': 40, 'step': 10},
+    'upper': {'min': 60, 'max': 90, 'step': 10},
+}
+
+
+def ohlc_frame(length, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.006, length)))
+    index = pd.date_range('2022-01-01', periods=length, freq='h')
+    return pd.DataFrame({'Open': np.r_[close[0], close[:-1]], 'High': close * 1.002, 'Low': close * 0.998,
+                         'Close': close}, index=index)
+
+
+def config(**optimize):
+    return {'initialCapital': 10_000_000, 'commission': 0.001,
+            'optimize': {'params': PARAMS, 'maximize': 'total_return', 'topK': 1000, 'workers': 1, **optimize}}
+
+
+class ParseSearchTest(unittest.TestCase):
+
+    def test_defaults_and_invalid_fields(self):
+        self.assertEqual(parse_search({})['method'], 'grid')
+        self.assertEqual(parse_search({'search': 'adaptive'})['proposal'], 'tpe')
+        for spec in ({'search': 'bayes'}, {'proposal': 'grid'}, {'budget': 0}, {'budget': True},
+                     {'timeBudget': -1}, {'eta': 1}, {'eta': 2.5}, {'minFraction': 0}, {'minFraction': 2}):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_search(spec)
+        with self.assertRaises(ValueError):
+            validate_config({'initialCapital': 1000, 'commission': 0, 'optimize': {'search': 'bayes'}})
+
+    def test_prefix_lengths(self):
+        self.assertEqual(prefix_lengths(9000, 3, 0.1), [1000, 3000, 9000])
+        self.assertEqual(prefix_lengths(9000, 2, 0.25), [2250, 4500, 9000])
+        self.assertEqual(prefix_lengths(9000, 3, 1), [9000])
+        # Rungs are never shorter than MIN_PREFIX_BARS, and shorter data has fewer rungs
+        self.assertEqual(prefix_lengths(900, 3, 0.1), [200, 300, 900])
+        self.assertEqual(prefix_lengths(150, 3, 0.1), [150])
+
+
+class ProposerTest(unittest.TestCase):
+
+    grid = {'a': [1, 2, 3, 4], 'b': [1, 2, 3, 4]}
+
+    def test_untried_combinations_until_the_grid_runs_out(self):
+        for method in ('random', 'tpe'):
+            proposer = _Proposer(self.grid, 'a < b', method, random.Random(0))
+            history = []
+            proposed = []
+            while True:
+                batch = proposer.propose(4, history)
+                if not batch:
+                    break
+                proposed += batch
+                history += [(indices, (0, float(sum(indices)))) for indices in batch]
+            with self.subTest(method=method):
+                self.assertEqual(len(proposed), len(set(proposed)))
+                self.assertEqual(sorted(proposer.params(indices)['a'] < proposer.params(indices)['b']
+                                        for indices in proposed), [True] * 6)
+
+    def test_tpe_favours_values_of_the_best_candidates(self):
+        grid = {'a': list(range(20)), 'b': list(range(20))}
+        proposer = _Proposer(grid, None, 'tpe', random.Random(0))
+        history = [(indices, (0, -abs(indices[0] - 15) - abs(indices[1] - 4)))
+                   for indices in proposer.propose(40, [])]
+        proposals = proposer.propose(20, history)
+        self.assertLess(np.mean([abs(a - 15) + abs(b - 4) for a, b in proposals]),
+                        np.mean([abs(a - 15) + abs(b - 4) for a, b in (indices for indices, _ in history)]))
+
+
+class AdaptiveSearchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.df = ohlc_frame(6000)
+        cls.strategy_class = execute_user_code(RSI_SIGNALS)
+        _, cls.grid = run_optimization(cls.df, RSI_SIGNALS, cls.strategy_class, config())
+
+    def search(self, **optimize):
+        return run_optimization(self.df, RSI_SIGNALS, self.strategy_class,
+                                config(search='adaptive', randomState=7, **optimize))
+
+    def test_finds_a_top_grid_result_within_budget(self):
+        params, summary = self.search(budget=20)
+        search = summary['search']
+        self.assertEqual(search['grid_size'], 96)
+        self.assertLessEqual(search['cost'], 20)
+        self.assertEqual(search['stopped'], 'budget')
+        self.assertEqual(summary['evaluated'], len(summary['trace']))
+
+        grid_values = sorted((r['metrics']['total_return'] for r in self.grid['top_results']), reverse=True)
+        self.assertEqual(summary['best_params'], params)
+        self.assertEqual(summary['top_results'][0]['bars'], len(self.df))
+        self.assertIn(summary['best_value'], grid_values[:10])
+
+    def test_halving_promotes_the_best_of_each_rung(self):
+        _, summary = self.search(budget=3, proposal='random')
+        by_rung = {}
+        for entry in summary['trace']:
+            by_rung.setdefault(entry['rung'], []).append(entry)
+        self.assertEqual([len(by_rung[rung]) for rung in sorted(by_rung)], [9, 3, 1])
+        self.assertEqual([by_rung[rung][0]['bars'] for rung in sorted(by_rung)], [667, 2000, 6000])
+
+        first = sorted(by_rung[0], key=lambda entry: objective_value(entry, 'value'), reverse=True)
+        self.assertEqual({str(entry['params']) for entry in first[:3]},
+                         {str(entry['params']) for entry in by_rung[1]})
+
+    def test_seeded_search_does_not_depend_on_workers(self):
+        _, single = self.search(budget=6)
+        _, pooled = self.search(budget=6, workers=3)
+        strip = [{key: entry[key] for key in ('params', 'bars', 'value')} for entry in single['trace']]
+        self.assertEqual(strip, [{key: entry[key] for key in ('params', 'bars', 'value')}
+                                 for entry in pooled['trace']])
+        self.assertEqual(single['best_params'], pooled['best_params'])
+
+    def test_exhausts_small_grids_and_time_budget(self):
+        _, summary = self.search(params={'period': [10, 20], 'lower': [30], 'upper': [70]}, budget=100)
+        self.assertEqual(summary['search']['stopped'], 'exhausted')
+        self.assertEqual(summary['search']['candidates'], 2)
+
+        _, summary = self.search(timeBudget=1e-6)
+        self.assertEqual(summary['search']['stopped'], 'time')
+        self.assertEqual(summary['evaluated'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_series.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_series.py   (or: python -m pytest scripts/test_backtest_series.py)
+"""
+
+import base64
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_series import _bucket_argmin, build_series, downsample_indices, parse_series  # noqa: E402
+
+
+def decode(data, dtype):
+    return np.frombuffer(base64.b64decode(data), dtype=dtype)
+
+
+def equity_stats(length, trades=0, seed=2):
+    rng = np.random.default_rng(seed)
+    equity = 10_000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    index = pd.date_range('2022-01-01', periods=length, freq='h', tz='UTC')
+    entry_bars = np.sort(rng.choice(length - 1, trades, replace=False))
+    return pd.Series({
+        '_equity_curve': pd.DataFrame({
+            'Equity': equity,
+            'DrawdownPct': 1 - equity / np.maximum.accumulate(equity),
+        }, index=index),
+        '_trades': pd.DataFrame({
+            'Size': np.ones(trades),
+            'EntryBar': entry_bars,
+            'ExitBar': entry_bars + 1,
+            'EntryPrice': equity[entry_bars],
+            'ExitPrice': equity[entry_bars + 1],
+            'ReturnPct': equity[entry_bars + 1] / equity[entry_bars] - 1,
+        }),
+    })
+
+
+class DownsampleTest(unittest.TestCase):
+
+    def test_bucket_argmin_matches_a_loop(self):
+        values = np.random.default_rng(1).integers(0, 5, 103).astype(float)
+        edges = np.array([0, 10, 11, 50, 103])
+        expected = [start + int(np.argmin(values[start:end])) for start, end in zip(edges[:-1], edges[1:])]
+        np.testing.assert_array_equal(_bucket_argmin(values, edges), expected)
+
+    def test_keeps_extremes_within_budget(self):
+        stats = equity_stats(50_000)
+        curve = stats['_equity_curve']
+        equity, drawdown = curve['Equity'].to_numpy(), curve['DrawdownPct'].to_numpy()
+        keep = downsample_indices(equity, drawdown, 200)
+        self.assertLessEqual(len(keep), 200)
+        self.assertEqual(keep[0], 0)
+        self.assertEqual(keep[-1], len(equity) - 1)
+        for bar in (np.argmin(equity), np.argmax(equity), np.argmax(drawdown)):
+            self.assertIn(bar, keep)
+
+    def test_short_runs_are_kept_whole(self):
+        np.testing.assert_array_equal(downsample_indices(np.ones(5), np.zeros(5), 10), np.arange(5))
+
+
+class BuildSeriesTest(unittest.TestCase):
+
+    def test_encoded_arrays(self):
+        stats = equity_stats(5000, trades=40)
+        series = build_series(stats, {'series': {'points': 100}})
+        curve = stats['_equity_curve']
+
+        timestamps = decode(series['timestamp'], '<f8')
+        self.assertEqual(series['bars'], 5000)
+        self.assertEqual(len(timestamps), series['points'])
+        self.assertEqual(timestamps[0], curve.index[0].timestamp() * 1000)
+        self.assertAlmostEqual(decode(series['drawdown'], '<f4').min(),
+                               -curve['DrawdownPct'].max() * 100, places=4)
+        np.testing.assert_allclose(decode(series['equity'], '<f4')[-1], curve['Equity'].iloc[-1], rtol=1e-6)
+
+    def test_trades_keep_the_largest_returns(self):
+        stats = equity_stats(5000, trades=40)
+        markers = build_series(stats, {'series': {'points': 10}})['trades']
+        returns = decode(markers['return_pct'], '<f4')
+        self.assertEqual((markers['count'], markers['total']), (10, 40))
+        largest = np.sort(np.abs(stats['_trades']['ReturnPct'].to_numpy()))[-10:] * 100
+        np.testing.assert_allclose(np.sort(np.abs(returns)), largest, rtol=1e-5)
+        self.assertTrue(np.all(np.diff(decode(markers['entry_time'], '<f8')) > 0))
+
+    def test_invalid_spec(self):
+        for spec in ({'points': 5}, {'points': 2.5}, 'all'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_series(spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
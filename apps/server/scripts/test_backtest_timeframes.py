@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_timeframes.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_timeframes.py   (or: python -m pytest scripts/test_backtest_timeframes.py)
+"""
+
+import os
+import sys
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_timeframes import ResamplePyramid, pyramid_for, resample_to_timeframe, timeframe_ns  # noqa: E402
+from backtest_vectorized import create_backtest  # noqa: E402
+
+CONFIG = {'initialCapital': 1_000_000, 'commission': 0.0}
+
+
+def minute_bars(length, start='2022-01-03 05:17', seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, length)))
+    return pd.DataFrame({
+        'Open': np.roll(close, 1),
+        'High': close * 1.001,
+        'Low': close * 0.999,
+        'Close': close,
+        'Volume': rng.random(length),
+    }, index=pd.date_range(start, periods=length, freq='min'))
+
+
+def pandas_resample(df, rule):
+    aggregations = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+    return df.resample(rule).agg(aggregations).dropna()
+
+
+class PyramidTest(unittest.TestCase):
+
+    df = minute_bars(20_000)
+
+    def test_matches_pandas_resample(self):
+        pyramid = ResamplePyramid(self.df)
+        for rule, pandas_rule in (('5m', '5min'), ('1h', '1h'), ('4h', '4h'), ('1d', '1D'), ('3d', '3D')):
+            with self.subTest(rule=rule):
+                pd.testing.assert_frame_equal(pyramid.frame(rule), pandas_resample(self.df, pandas_rule),
+                                              check_freq=False)
+
+    def test_levels_are_built_once_from_the_coarsest_divisor(self):
+        pyramid = ResamplePyramid(self.df)
+        pyramid.frame('1h')
+        hourly = pyramid.levels[timeframe_ns('1h')]
+        pyramid.frame('4h')
+        pyramid.frame('1h')
+        self.assertIs(pyramid.levels[timeframe_ns('1h')], hourly)
+        self.assertEqual(sorted(pyramid.levels), [timeframe_ns(rule) for rule in ('1m', '1h', '4h')])
+
+    def test_align_shows_closed_bars_only(self):
+        pyramid = ResamplePyramid(self.df)
+        aligned = pyramid.align('1h', pyramid.frame('1h')['Close'])
+        # 05:17 - 05:59 belong to the unfinished first hour; 06:00 sees its close
+        self.assertTrue(np.isnan(aligned[:43]).all())
+        self.assertEqual(aligned[43], self.df['Close'].iloc[42])
+        self.assertEqual(aligned[44], aligned[43])
+
+    def test_pyramid_is_shared_per_dataset(self):
+        self.assertIs(pyramid_for(self.df), pyramid_for(self.df))
+        hourly = resample_to_timeframe(self.df, {'timeframe': '1h'})
+        self.assertIs(resample_to_timeframe(self.df, {'timeframe': '1h'}), hourly)
+        self.assertIs(resample_to_timeframe(self.df, {'timeframe': '1m'}), self.df)
+        self.assertIs(resample_to_timeframe(self.df, {}), self.df)
+
+    def test_invalid_timeframes(self):
+        for rule in ('7m', '0h', '1w', 'daily', 5):
+            with self.subTest(rule=rule), self.assertRaises(ValueError):
+                timeframe_ns(rule)
+        with self.assertRaises(ValueError):
+            ResamplePyramid(resample_to_timeframe(self.df, {'timeframe': '1h'})).frame('30m')
+
+
+class StrategyMethodsTest(unittest.TestCase):
+
+    def test_resample_apply_matches_backtesting_lib(self):
+        import talib
+        from backtesting import Strategy
+        from backtesting.lib import resample_apply
+
+        arrays = {}
+
+        class MultiTimeframe(Strategy):
+            def init(self):
+                arrays['lib'] = np.asarray(resample_apply('4h', talib.SMA, self.data.Close, 10))
+                arrays['pyramid'] = np.asarray(self.resample_apply('4h', talib.SMA, self.data.Close, 10))
+                arrays['high'] = np.asarray(self.resample_apply('1d', None, 'High'))
+                arrays['frame'] = self.timeframe('1d')
+
+            def next(self):
+                pass
+
+        df = minute_bars(10_000)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            create_backtest(df, MultiTimeframe, CONFIG).run()
+
+        np.testing.assert_allclose(arrays['pyramid'], arrays['lib'], equal_nan=True)
+        self.assertFalse(np.isnan(arrays['pyramid']).all())
+        self.assertEqual(np.nanmax(arrays['high']), arrays['frame']['High'].iloc[:-1].max())
+
+    def test_resample_apply_rejects_other_series(self):
+        from backtesting import Strategy
+
+        class Derived(Strategy):
+            def init(self):
+                self.resample_apply('1h', None, self.data.Close * 2)
+
+            def next(self):
+                pass
+
+        with self.assertRaises(ValueError):
+            create_backtest(minute_bars(500), Derived, CONFIG).run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_validate.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_validate.py   (or: python -m pytest scripts/test_backtest_validate.py)
+"""
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from backtest_validate import validate_strategy  # noqa: E402
+
+TEMPLATES_DIR = os.path.join(SCRIPTS_DIR, '..', 'templates')
+
+SMA_CROSS = '''
+from backtesting import Strategy
+from backtesting.lib import crossover
+import talib
+
+class SmaCross(Strategy):
+    n1 = 10
+
+    def init(self):
+        # open() the position on a crossover
+        self.fast = self.I(talib.SMA, self.data.Close, self.n1)
+
+    def next(self):
+        print(self.fast[-1])
+'''
+
+
+def errors(code, portfolio=False):
+    return [(error['line'], error['type']) for error in validate_strategy(code, portfolio)['errors']]
+
+
+class ValidateStrategyTest(unittest.TestCase):
+
+    def test_valid_strategies_and_templates(self):
+        self.assertEqual(validate_strategy(SMA_CROSS), {"valid": True, "class": "SmaCross", "errors": []})
+        for name in ('strategy_sma_crossover.py', 'strategy_rsi.py'):
+            with self.subTest(template=name), open(os.path.join(TEMPLATES_DIR, name)) as f:
+                self.assertTrue(validate_strategy(f.read())['valid'])
+
+    def test_syntax_error_has_its_position(self):
+        result = validate_strategy(SMA_CROSS.replace('self.n1)', 'self.n1'))
+        self.assertFalse(result['valid'])
+        self.assertEqual([error['type'] for error in result['errors']], ['syntax'])
+        self.assertEqual(result['errors'][0]['line'], 11)
+
+    def test_imports_outside_the_whitelist(self):
+        code = 'import os\nimport numpy.linalg\nfrom sys import argv\nimport numpy as np, pandas\n' + SMA_CROSS
+        self.assertEqual(errors(code), [(1, 'import'), (2, 'import'), (3, 'import')])
+        self.assertIn("Import of 'os' is not allowed", validate_strategy(code)['errors'][0]['message'])
+
+    def test_sandbox_builtins_and_restricted_code(self):
+        code = SMA_CROSS.replace("        print(self.fast[-1])", "        open('/etc/passwd')\n"
+                                 "        eval('1 + 1')\n"
+                                 "        self._secret = 1\n"
+                                 "        return [round(x) for x in range(3)]")
+        self.assertEqual(errors(code), [(14, 'name'), (15, 'restricted'), (16, 'restricted')])
+        # A name the code defines itself is not the builtin
+        self.assertEqual(errors(code.replace('class SmaCross', 'def open(path):\n    pass\n\nclass SmaCross')),
+                         [(18, 'restricted'), (19, 'restricted')])
+
+    def test_strategy_class_and_methods(self):
+        self.assertEqual(errors('x = 1'), [(None, 'strategy')])
+        self.assertEqual(errors(SMA_CROSS.replace('def next', 'def other')), [(6, 'strategy')])
+
+        # signals() stands in for next(), and methods are inherited from earlier strategy classes
+        code = SMA_CROSS + '\nclass Signals(SmaCross):\n    def signals(self):\n        return None, None\n'
+        self.assertEqual(validate_strategy(code)['class'], 'Signals')
+        self.assertEqual(errors(code), [])
+        aliased = 'from backtesting import Strategy as Base\n\nclass S(Base):\n    def init(self):\n        pass\n'
+        self.assertEqual(validate_strategy(aliased)['errors'][0]['message'], "S must define next() or signals()")
+
+    def test_portfolio_strategies(self):
+        code = 'class Momentum(PortfolioStrategy):\n    def weights(self):\n        return None\n'
+        self.assertEqual(errors(code, portfolio=True), [])
+        self.assertEqual(errors(code), [(None, 'strategy')])
+        self.assertEqual(errors(code.replace('weights', 'init'), portfolio=True), [(1, 'strategy')])
+
+
+class CommandLineTest(unittest.TestCase):
+
+    def test_reads_stdin_without_importing_the_backtest_stack(self):
+        probe = ('import runpy, sys; sys.argv = ["backtest_validate.py", "-"]; '
+                 'runpy.run_path("backtest_validate.py", run_name="__main__"); '
+                 'heavy = {"numpy", "pandas", "backtesting", "talib"} & set(sys.modules); '
+                 'print(sorted(heavy), file=sys.stderr)')
+        completed = subprocess.run([sys.executable, '-c', probe], input=SMA_CROSS, capture_output=True, text=True,
+                                   cwd=SCRIPTS_DIR, check=True)
+        self.assertEqual(json.loads(completed.stdout)['class'], 'SmaCross')
+        self.assertEqual(completed.stderr.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Parity tests for backtest_vectorized.py against backtesting.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_vectorized.py   (or: python -m pytest scripts/test_backtest_vectorized.py)
+"""
+
+import logging
+import math
+import os
+import sys
+import unittest
+import warnings
+
+import numpy as np
+import pandas as pd
+from backtesting import Backtest, Strategy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_vectorized import (  # noqa: E402
+    VectorizedBacktest, is_signal_strategy, select_engine, with_signal_next,
+)
+from run_backtest import execute_user_code, extract_metrics  # noqa: E402
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+RSI_SIGNALS = """
+from backtesting import Strategy
+import talib
+
+class RsiSignals(Strategy):
+    rsi_period = 14
+    rsi_lower = 30
+    rsi_upper = 70
+
+    def init(self):
+        self.rsi = self.I(talib.RSI, self.data.Close, self.rsi_period)
+
+    def signals(self):
+        return self.rsi < self.rsi_lower, self.rsi > self.rsi_upper
+"""
+
+SMA_SIGNALS = """
+from backtesting import Strategy
+import numpy as np
+import talib
+
+class SmaSignals(Strategy):
+    n1 = 10
+    n2 = 20
+
+    def init(self):
+        self.sma1 = self.I(talib.SMA, self.data.Close, self.n1)
+        self.sma2 = self.I(talib.SMA, self.data.Close, self.n2)
+
+    def signals(self):
+        a, b = self.sma1, self.sma2
+        entries = np.concatenate(([False], (a[:-1] < b[:-1]) & (a[1:] > b[1:])))
+        exits = np.concatenate(([False], (b[:-1] < a[:-1]) & (b[1:] > a[1:])))
+        return entries, exits
+"""
+
+
+def ohlcv(length, freq='h', seed=11):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    open_ = np.concatenate(([close[0]], close[:-1])) * np.exp(rng.normal(0, 0.002, length))
+    spread = np.abs(rng.normal(0, 0.004, length))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * (1 + spread),
+        'Low': np.minimum(open_, close) * (1 - spread),
+        'Close': close,
+        'Volume': rng.uniform(1, 100, length),
+    }, index=pd.date_range('2021-01-01', periods=length, freq=freq))
+
+
+def scripted(entries, exits):
+    """A signals()-only strategy replaying fixed arrays"""
+    class Scripted(Strategy):
+        def init(self):
+            pass
+
+        def signals(self):
+            return entries, exits
+
+    return with_signal_next(Scripted)
+
+
+def read_template(name):
+    with open(os.path.join(TEMPLATES_DIR, name)) as f:
+        return f.read()
+
+
+class EngineParityTest(unittest.TestCase):
+    """VectorizedBacktest reports what backtesting.py reports for the same signals"""
+
+    def setUp(self):
+        warnings.simplefilter('ignore')
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def assert_same_stats(self, expected, actual):
+        for key, value in extract_metrics(expected).items():
+            other = extract_metrics(actual)[key]
+            if value is None or other is None:
+                self.assertEqual(value, other, key)
+            else:
+                self.assertTrue(math.isclose(value, other, rel_tol=1e-9, abs_tol=1e-9), f"{key}: {value} != {other}")
+        np.testing.assert_allclose(actual['_equity_curve']['Equity'].to_numpy(),
+                                   expected['_equity_curve']['Equity'].to_numpy(), rtol=1e-12)
+        for column in ('Size', 'EntryBar', 'ExitBar'):
+            np.testing.assert_array_equal(actual['_trades'][column].to_numpy(),
+                                          expected['_trades'][column].to_numpy(), column)
+        for column in ('EntryPrice', 'ExitPrice', 'PnL', 'ReturnPct'):
+            np.testing.assert_allclose(actual['_trades'][column].to_numpy(),
+                                       expected['_trades'][column].to_numpy(), rtol=1e-12, err_msg=column)
+
+    def assert_parity(self, df, strategy_class, reference_class=None, **backtest_args):
+        expected = Backtest(df, reference_class or strategy_class, **backtest_args).run()
+        actual = VectorizedBacktest(df, strategy_class, **backtest_args).run()
+        self.assertGreater(expected['# Trades'], 0)
+        self.assert_same_stats(expected, actual)
+
+    def test_rsi_template(self):
+        self.assert_parity(ohlcv(3000), execute_user_code(RSI_SIGNALS),
+                           execute_user_code(read_template('strategy_rsi.py')),
+                           cash=100_000, commission=0.002)
+
+    def test_sma_crossover_template(self):
+        self.assert_parity(ohlcv(3000), execute_user_code(SMA_SIGNALS),
+                           execute_user_code(read_template('strategy_sma_crossover.py')),
+                           cash=100_000, commission=0.002)
+
+    def test_synthesized_next_matches(self):
+        # The event engine runs the next() that with_signal_next() gave the signals
+        strategy_class = execute_user_code(SMA_SIGNALS)
+        for cash, commission in ((100_000, 0.0), (50_000, 0.01), (1e7, 0.001)):
+            with self.subTest(cash=cash, commission=commission):
+                self.assert_parity(ohlcv(2000, seed=3), strategy_class, cash=cash, commission=commission)
+
+    def test_orders_dropped_without_cash(self):
+        # Less cash than one unit costs after the first losing trades
+        self.assert_parity(ohlcv(2000, seed=5), execute_user_code(RSI_SIGNALS), cash=31_000, commission=0.002)
+
+    def test_entry_on_last_bar(self):
+        df = ohlcv(200)
+        entries, exits = np.zeros(len(df), bool), np.zeros(len(df), bool)
+        entries[[10, 199]] = True
+        exits[50] = True
+        strategy_class = scripted(entries, exits)
+        expected = Backtest(df, strategy_class, cash=100_000, commission=0.001).run()
+        actual = VectorizedBacktest(df, strategy_class, cash=100_000, commission=0.001).run()
+        self.assertEqual(expected['# Trades'], 1)
+        self.assert_same_stats(expected, actual)
+
+    def test_open_trade_closed_at_end(self):
+        df = ohlcv(200)
+        entries = np.zeros(len(df), bool)
+        entries[100] = True
+        strategy_class = scripted(entries, np.zeros(len(df), bool))
+        self.assert_parity(df, strategy_class, cash=100_000, commission=0.001)
+
+    def test_business_day_index(self):
+        self.assert_parity(ohlcv(1500, freq='B'), execute_user_code(RSI_SIGNALS),
+                           cash=100_000, commission=0.002)
+
+
+class EngineSelectionTest(unittest.TestCase):
+
+    def test_signals_only_strategy_runs_vectorized(self):
+        strategy_class = execute_user_code(RSI_SIGNALS)
+        self.assertTrue(is_signal_strategy(strategy_class))
+        self.assertEqual(select_engine(strategy_class, {}), 'vectorized')
+        self.assertEqual(select_engine(strategy_class, {'engine': 'event'}), 'event')
+        # The report is built from backtesting.py's Backtest
+        self.assertEqual(select_engine(strategy_class, {}, report=True), 'event')
+
+    def test_next_strategy_runs_event(self):
+        strategy_class = execute_user_code(read_template('strategy_rsi.py'))
+        self.assertFalse(is_signal_strategy(strategy_class))
+        self.assertEqual(select_engine(strategy_class, {}), 'event')
+        with self.assertRaises(ValueError):
+            select_engine(strategy_class, {'engine': 'vectorized'})
+
+    def test_invalid_signals(self):
+        class Short(Strategy):
+            def init(self):
+                pass
+
+            def signals(self):
+                return np.zeros(5, bool), np.zeros(5, bool)
+
+        with self.assertRaisesRegex(ValueError, 'one value per bar'):
+            VectorizedBacktest(ohlcv(50), with_signal_next(Short)).run()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Tests for backtest_walkforward.py
+
+Run this from apps/server/ directory:
+python scripts/test_backtest_walkforward.py   (or: python -m pytest scripts/test_backtest_walkforward.py)
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_vectorized import create_backtest  # noqa: E402
+from backtest_walkforward import run_walk_forward  # noqa: E402
+from run_backtest import execute_user_code, extract_metrics, validate_config  # noqa: E402
+
+SLOW_SMA = '''
+from backtesting import Strategy
+import talib
+
+class SlowSma(Strategy):
+    period = 100
+
+    def init(self):
+        self.sma = self.I(talib.SMA, self.data.Close, self.period)
+        self.entries = []
+
+    def next(self):
+        self.entries.append(len(self.data))
+        if not self.position and self.data.Close[-1] > self.sma[-1]:
+            self.buy()
+        elif self.position and self.data.Close[-1] < self.sma[-1]:
+            self.position.close()
+'''
+
+CONFIG = {'initialCapital': 10_000_000, 'commission': 0.001,
+          'startDate': '2024-01-05', 'endDate': '2024-01-31',
+          'walkForward': {'train': 120, 'test': 60, 'workers': 1}}
+
+
+def ohlc_frame(length, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    index = pd.date_range('2024-01-01', periods=length, freq='h')
+    return pd.DataFrame({'Open': np.r_[close[0], close[:-1]], 'High': close * 1.005,
+                         'Low': close * 0.995, 'Close': close}, index=index)
+
+
+class WalkForwardTest(unittest.TestCase):
+
+    def setUp(self):
+        self.df = ohlc_frame(24 * 31)
+        self.strategy_class = execute_user_code(SLOW_SMA)
+
+    def test_test_folds_start_warm_and_trade_only_in_their_window(self):
+        stitched, summary = run_walk_forward(self.df, SLOW_SMA, self.strategy_class, CONFIG)
+        self.assertEqual(summary['failed'], 0)
+        first_start = pd.Timestamp(summary['folds'][0]['test']['start'])
+        # Train needs 120 bars from startDate, so the first test opens well inside the range
+        self.assertEqual(first_start, pd.Timestamp(CONFIG['startDate']) + pd.Timedelta(hours=120))
+
+        traded = 0
+        for fold in summary['folds']:
+            start, end = pd.Timestamp(fold['test']['start']), pd.Timestamp(fold['test']['end'])
+            lo = self.df.index.get_loc(start)
+            # The SMA(100) is defined from the first test bar, which it is not on the test slice alone
+            warm = create_backtest(self.df.iloc[lo - 100:self.df.index.get_loc(end) + 1], self.strategy_class,
+                                   CONFIG, trade_start=100).run()
+            self.assertEqual(fold['test_metrics'], extract_metrics(warm))
+            self.assertTrue(all(entry >= start for entry in warm._trades['EntryTime']))
+            traded += fold['test_metrics']['total_trades']
+        self.assertGreater(traded, 0)
+        self.assertEqual(stitched['total_trades'], traded)
+
+    def test_stitched_metrics_match_single_run_fields(self):
+        stitched, _ = run_walk_forward(self.df, SLOW_SMA, self.strategy_class, CONFIG)
+        single = extract_metrics(create_backtest(self.df, self.strategy_class, CONFIG).run())
+        self.assertEqual(set(stitched), set(single))
+
+
+class WalkForwardConfigTest(unittest.TestCase):
+
+    def assertRejected(self, spec, message):
+        with self.assertRaisesRegex(ValueError, message):
+            validate_config({**CONFIG, 'walkForward': spec})
+
+    def test_windows_are_validated_with_the_config(self):
+        self.assertIs(validate_config(CONFIG), CONFIG)
+        validate_config({**CONFIG, 'walkForward': {'train': '5D', 'test': '2D', 'step': '3D', 'anchored': True}})
+        self.assertRejected([120, 60], 'walkForward must be an object')
+        self.assertRejected({'train': 120}, r'walkForward\.test is required')
+        self.assertRejected({'train': 0, 'test': 60}, r'walkForward\.train must be positive')
+        self.assertRejected({'train': 120, 'test': '2 fortnights'}, r'walkForward\.test is not a valid duration')
+        self.assertRejected({'train': 120, 'test': 60, 'step': True}, r'walkForward\.step must be a bar count')
+        self.assertRejected({'train': '5D', 'test': 60}, 'all be bar counts or all be durations')
+        self.assertRejected({'train': 120, 'test': 60, 'step': 30}, 'step must be at least test')
+        self.assertRejected({'train': 120, 'test': 60, 'workers': 0}, r'walkForward\.workers must be a positive integer')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Parity tests for indicator_engine.py against talib
+
+Run this from apps/server/ directory:
+python scripts/test_indicator_engine.py   (or: python -m pytest scripts/test_indicator_engine.py)
+"""
+
+import json
+import math
+import os
+import sys
+import unittest
+
+import numpy as np
+import talib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from indicator_engine import (EMA, SMA, IndicatorEngine, WilderRSI, evaluate, evaluate_monitors,  # noqa: E402
+                              history_points, warmup_points)
+
+HOUR_MS = 3600 * 1000
+
+
+def random_walk(length, seed=7):
+    rng = np.random.default_rng(seed)
+    return 30000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+
+
+def as_points(prices, start=0):
+    return [[(start + i) * HOUR_MS, float(price)] for i, price in enumerate(prices)]
+
+
+def last_finite(values):
+    value = float(values[-1])
+    return value if math.isfinite(value) else None
+
+
+class RollingIndicatorParityTest(unittest.TestCase):
+    """Each rolling indicator matches talib at every point of the series"""
+
+    prices = random_walk(500)
+
+    def assert_series_parity(self, state, expected):
+        for i, price in enumerate(self.prices):
+            # peek() must agree with update() + value() for the same point
+            peeked = state.peek(price)
+            state.update(price)
+            value = state.value()
+            if math.isnan(expected[i]):
+                self.assertIsNone(value, f"point {i}")
+                self.assertIsNone(peeked, f"point {i}")
+            else:
+                self.assertAlmostEqual(value, expected[i], delta=1e-9 * abs(expected[i]) + 1e-9, msg=f"point {i}")
+                self.assertAlmostEqual(peeked, value, delta=1e-9 * abs(value) + 1e-9, msg=f"point {i}")
+
+    def test_sma_matches_talib(self):
+        for period in (1, 2, 10, 50):
+            self.assert_series_parity(SMA(period), talib.SMA(self.prices, period))
+
+    def test_ema_matches_talib(self):
+        for period in (2, 12, 26):
+            self.assert_series_parity(EMA(period), talib.EMA(self.prices, period))
+
+    def test_rsi_matches_talib(self):
+        for period in (2, 14, 30):
+            self.assert_series_parity(WilderRSI(period), talib.RSI(self.prices, period))
+
+    def test_rsi_flat_series_is_zero_like_talib(self):
+        flat = np.full(30, 100.0)
+        state = WilderRSI(14)
+        for price in flat:
+            state.update(price)
+        self.assertEqual(state.value(), talib.RSI(flat, 14)[-1])
+
+
+class IndicatorEngineTest(unittest.TestCase):
+    """Incremental ticks give the same answers as talib over the full history"""
+
+    def setUp(self):
+        self.engine = IndicatorEngine()
+        self.prices = random_walk(2200)
+
+    def test_incremental_ticks_match_full_recompute(self):
+        specs = [{"type": "rsi", "period": 14}, {"type": "sma", "period": 20}, {"type": "ema", "period": 9}]
+        window = 2160  # 90 days of hourly points
+        for end in range(window, len(self.prices) + 1, 7):
+            start = end - window
+            points = as_points(self.prices[start:end], start)
+            rsi, sma, ema = self.engine.evaluate("bitcoin", points, specs)
+
+            history = self.prices[:end]
+            self.assertAlmostEqual(rsi["value"], last_finite(talib.RSI(history, 14)), places=6)
+            self.assertAlmostEqual(sma["value"], last_finite(talib.SMA(history, 20)), places=6)
+            self.assertAlmostEqual(ema["value"], last_finite(talib.EMA(history, 9)), places=6)
+            self.assertAlmostEqual(sma["previous"], float(talib.SMA(history, 20)[-2]), places=6)
+
+    def test_cross_matches_talib(self):
+        spec = {"type": "cross", "fast": 5, "slow": 20}
+        crosses = 0
+        for end in range(25, 400):
+            (result,) = self.engine.evaluate("eth", as_points(self.prices[:end]), [spec])
+            fast = talib.SMA(self.prices[:end], 5)
+            slow = talib.SMA(self.prices[:end], 20)
+            self.assertAlmostEqual(result["fast"], fast[-1], places=6)
+            self.assertAlmostEqual(result["previous_slow"], slow[-2], places=6)
+            self.assertEqual(result["cross_up"], bool(fast[-2] <= slow[-2] and fast[-1] > slow[-1]))
+            self.assertEqual(result["cross_down"], bool(fast[-2] >= slow[-2] and fast[-1] < slow[-1]))
+            crosses += result["cross_up"] + result["cross_down"]
+        self.assertGreater(crosses, 0)
+
+    def test_provisional_tip_is_replaced_not_committed(self):
+        points = as_points(self.prices[:100])
+        self.engine.evaluate("sol", points, [{"type": "sma", "period": 10}])
+
+        # The live point moves; the indicator must follow it rather than accumulate it
+        moved = points[:-1] + [[points[-1][0] + 1, points[-1][1] * 1.05]]
+        (result,) = self.engine.evaluate("sol", moved, [{"type": "sma", "period": 10}])
+        series = np.array([price for _, price in moved])
+        self.assertAlmostEqual(result["value"], talib.SMA(series, 10)[-1], places=6)
+
+    def test_indicator_added_later_is_seeded_from_history(self):
+        points = as_points(self.prices[:300])
+        self.engine.evaluate("ada", points, [{"type": "sma", "period": 10}])
+        (rsi,) = self.engine.evaluate("ada", points, [{"type": "rsi", "period": 14}])
+        self.assertAlmostEqual(rsi["value"], talib.RSI(self.prices[:300], 14)[-1], places=6)
+
+    def test_not_enough_data_returns_null(self):
+        (rsi,) = self.engine.evaluate("dot", as_points(self.prices[:10]), [{"type": "rsi", "period": 14}])
+        self.assertIsNone(rsi["value"])
+        self.assertIsNone(rsi["previous"])
+
+    def test_invalid_specs_are_rejected(self):
+        points = as_points(self.prices[:50])
+        for spec in ({"type": "macd"}, {"type": "rsi", "period": 0}, {"type": "cross", "fast": 5, "slow": 20, "ma": "wma"}):
+            with self.assertRaises(ValueError):
+                self.engine.evaluate("xrp", points, [spec])
+
+    def test_json_entry_point(self):
+        output = json.loads(evaluate("json-asset", json.dumps(as_points(self.prices[:50])),
+                                     json.dumps([{"type": "sma", "period": 60}])))
+        self.assertEqual(output, [{"value": None, "previous": None}])
+
+
+class MonitorBatchTest(unittest.TestCase):
+    """evaluate_monitors() agrees with checking each trade on its own with talib"""
+
+    def setUp(self):
+        self.engine = IndicatorEngine()
+        self.series = {"bitcoin": random_walk(400, seed=1), "ethereum": random_walk(400, seed=2)}
+        self.assets = {asset_id: {"points": as_points(prices), "current_price": float(prices[-1])}
+                       for asset_id, prices in self.series.items()}
+
+    def expected(self, monitor, now_ms):
+        """The per-trade checker logic, recomputed from scratch with talib"""
+        params = monitor['params']
+        kind = monitor['strategy_type']
+        if kind == 'timeLimit':
+            return (now_ms - monitor['created_at']) / 1000 >= params['duration_seconds']
+        prices = self.series[monitor['asset_id']]
+        if kind == 'positionMonitor':
+            return prices[-1] <= params['stopLoss'] or prices[-1] >= params['takeProfit']
+        if kind == 'rsi':
+            rsi = talib.RSI(prices, params['period'])[-1]
+            return bool(rsi >= params['overbought'] or rsi <= params['oversold'])
+        fast = talib.SMA(prices, params['fast_period'])
+        slow = talib.SMA(prices, params['slow_period'])
+        up = fast[-2] <= slow[-2] and fast[-1] > slow[-1]
+        down = fast[-2] >= slow[-2] and fast[-1] < slow[-1]
+        return bool((params['signal_type'] in ('cross_up', 'both') and up)
+                    or (params['signal_type'] in ('cross_down', 'both') and down))
+
+    def build_monitors(self, count):
+        rng = np.random.default_rng(3)
+        monitors = []
+        for trade_id in range(count):
+            asset_id = ("bitcoin", "ethereum")[trade_id % 2]
+            price = float(self.series[asset_id][-1])
+            kind = ("positionMonitor", "rsi", "smaCross", "timeLimit")[trade_id % 4]
+            params = {
+                "positionMonitor": {"stopLoss": price * rng.uniform(0.9, 1.01), "takeProfit": price * rng.uniform(0.99, 1.1)},
+                "rsi": {"period": int(rng.choice([7, 14, 21])), "overbought": float(rng.uniform(50, 80)), "oversold": float(rng.uniform(20, 50))},
+                "smaCross": {"fast_period": int(rng.choice([1, 2, 3])), "slow_period": int(rng.choice([4, 5, 30])),
+                             "signal_type": str(rng.choice(["cross_up", "cross_down", "both"]))},
+                "timeLimit": {"duration_seconds": int(rng.integers(1, 7200))},
+            }[kind]
+            monitors.append({"trade_action_id": trade_id, "strategy_type": kind, "params": {**params, "action": "close"},
+                             "asset_id": asset_id, "created_at": 1_700_000_000_000})
+        return monitors
+
+    def test_batch_matches_per_trade_checks(self):
+        now_ms = 1_700_000_000_000 + 3600 * 1000
+        monitors = self.build_monitors(200)
+        result = self.engine.evaluate_monitors(self.assets, monitors, now_ms)
+
+        expected = [i for i, monitor in enumerate(monitors) if self.expected(monitor, now_ms)]
+        self.assertEqual([entry["index"] for entry in result["triggered"]], expected)
+        self.assertEqual(result["skipped"], [])
+        self.assertGreater(len(expected), 0)
+        self.assertLess(len(expected), len(monitors))
+
+    def test_distinct_indicators_are_evaluated_once(self):
+        monitors = [m for m in self.build_monitors(200) if m['strategy_type'] == 'rsi']
+        calls = []
+        evaluate_spec = self.engine._evaluate_spec
+        self.engine._evaluate_spec = lambda asset, spec, tip: calls.append(spec) or evaluate_spec(asset, spec, tip)
+        self.engine.evaluate_monitors(self.assets, monitors, 0)
+        distinct = {(m['asset_id'], m['params']['period']) for m in monitors}
+        self.assertEqual(len(calls), len(distinct))
+
+    def test_unusable_monitors_are_skipped(self):
+        monitors = [
+            {"trade_action_id": 1, "strategy_type": "bollinger", "params": {}, "asset_id": "bitcoin"},
+            {"trade_action_id": 2, "strategy_type": "rsi", "params": {"period": 14, "overbought": 70, "oversold": 30},
+             "asset_id": "dogecoin"},
+            {"trade_action_id": 3, "strategy_type": "smaCross", "params": {"fast_period": 0, "slow_period": 20,
+             "signal_type": "both"}, "asset_id": "bitcoin"},
+            {"trade_action_id": 4, "strategy_type": "timeLimit", "params": {"duration_seconds": 1}, "created_at": 0},
+        ]
+        result = json.loads(evaluate_monitors(json.dumps(self.assets), json.dumps(monitors), 5000))
+        self.assertEqual([entry["trade_action_id"] for entry in result["skipped"]], [1, 2, 3])
+        self.assertEqual(result["triggered"], [{"index": 3, "trade_action_id": 4, "strategy_type": "timeLimit"}])
+
+
+class HistoryPointsTest(unittest.TestCase):
+
+    def test_warmup_history_matches_full_history(self):
+        prices = random_walk(5000, seed=4)
+        for spec, reference in (({"type": "rsi", "period": 14}, talib.RSI(prices, 14)[-1]),
+                                ({"type": "ema", "period": 20}, talib.EMA(prices, 20)[-1]),
+                                ({"type": "sma", "period": 50}, talib.SMA(prices, 50)[-1])):
+            with self.subTest(spec=spec):
+                recent = prices[-warmup_points(spec):]
+                [result] = IndicatorEngine().evaluate("asset", as_points(recent), [spec])
+                self.assertIsNotNone(result["previous"])
+                self.assertAlmostEqual(result["value"], reference, delta=abs(reference) * 1e-3)
+
+    def test_history_points_of_monitors(self):
+        monitors = [
+            {"strategy_type": "rsi", "params": {"period": 14, "overbought": 70, "oversold": 30}},
+            {"strategy_type": "smaCross", "params": {"fast_period": 10, "slow_period": 200, "signal_type": "both"}},
+            {"strategy_type": "timeLimit", "params": {"duration_seconds": 60}},
+            {"strategy_type": "rsi", "params": {"period": 0, "overbought": 70, "oversold": 30}},
+        ]
+        self.assertEqual(history_points(json.dumps(monitors)), 201)
+        self.assertEqual(history_points(json.dumps(monitors[:1])), 14 + 1 + 140 + 1)
+        self.assertEqual(history_points(json.dumps(monitors[2:])), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
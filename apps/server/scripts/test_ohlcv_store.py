@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for ohlcv_store.py
+
+Run this from apps/server/ directory:
+python scripts/test_ohlcv_store.py   (or: python -m pytest scripts/test_ohlcv_store.py)
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ohlcv_store import CandleStore, date_range_ms, map_ohlcv_file, write_ohlcv_file  # noqa: E402
+
+COLUMNS = ['Open', 'High', 'Low', 'Close']
+HOUR_MS = 3_600_000
+MINUTE_MS = 60_000
+
+
+def candles(start, count, step_ms, price=100.0):
+    """ms timestamps and (columns, rows) values with every price set to `price`"""
+    timestamps = int(pd.Timestamp(start).value // 10 ** 6) + np.arange(count, dtype=np.int64) * step_ms
+    return timestamps, np.full((len(COLUMNS), count), price)
+
+
+class CandleStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CandleStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_file_round_trip(self):
+        path = os.path.join(self.tmp.name, 'ohlcv.bin')
+        timestamps, values = candles('2024-01-01', 5, HOUR_MS)
+        write_ohlcv_file(path, timestamps, values, COLUMNS)
+        read_timestamps, read_values, columns, unit = map_ohlcv_file(path)
+        np.testing.assert_array_equal(read_timestamps, timestamps)
+        np.testing.assert_array_equal(read_values, values)
+        self.assertEqual((columns, unit), (COLUMNS, 'ms'))
+
+    def test_minute_bars_are_chunked_by_month(self):
+        result = self.store.append('bitcoin', '30m', *candles('2024-01-31 12:00', 48, 30 * MINUTE_MS), COLUMNS)
+        self.assertEqual(result, {'rows': 48, 'added': 48, 'updated': ['2024-01', '2024-02']})
+        result = self.store.append('bitcoin', '4h', *candles('2023-12-31', 12, 4 * HOUR_MS), COLUMNS)
+        self.assertEqual(result['updated'], ['2023', '2024'])
+
+    def test_overlapping_append_replaces_stored_candles(self):
+        self.store.append('bitcoin', '1h', *candles('2024-01-01', 10, HOUR_MS), COLUMNS)
+        timestamps, values = candles('2024-01-01 08:00', 4, HOUR_MS, price=200.0)
+        result = self.store.append('bitcoin', '1h', timestamps, values, COLUMNS)
+        self.assertEqual((result['rows'], result['added']), (12, 2))
+
+        frame = self.store.read('bitcoin', '1h')
+        self.assertTrue(frame.index.is_monotonic_increasing)
+        self.assertEqual(list(frame['Close']), [100.0] * 8 + [200.0] * 4)
+
+    def test_range_read_touches_only_overlapping_chunks(self):
+        self.store.append('bitcoin', '1m', *candles('2024-01-01', 3 * 31 * 1440, MINUTE_MS), COLUMNS)
+        start, end = date_range_ms({'startDate': '2024-02-10', 'endDate': '2024-02-11'})
+        _, chunks = self.store.chunks_between('bitcoin', '1m', start, end)
+        self.assertEqual([chunk['name'] for chunk in chunks], ['2024-02'])
+
+        frame = self.store.read('bitcoin', '1m', start, end)
+        self.assertEqual(len(frame), 2 * 1440)
+        self.assertEqual(frame.index[0], pd.Timestamp('2024-02-10'))
+        self.assertEqual(frame.index[-1], pd.Timestamp('2024-02-11 23:59'))
+
+    def test_digest_tracks_touched_chunks(self):
+        self.store.append('bitcoin', '1m', *candles('2024-01-01', 2 * 31 * 1440, MINUTE_MS), COLUMNS)
+        january = date_range_ms({'startDate': '2024-01-01', 'endDate': '2024-01-31'})
+        before = self.store.range_digest('bitcoin', '1m', *january)
+        self.store.append('bitcoin', '1m', *candles('2024-02-20', 10, MINUTE_MS, price=1.0), COLUMNS)
+        self.assertEqual(self.store.range_digest('bitcoin', '1m', *january), before)
+        self.store.append('bitcoin', '1m', *candles('2024-01-20', 10, MINUTE_MS, price=1.0), COLUMNS)
+        self.assertNotEqual(self.store.range_digest('bitcoin', '1m', *january), before)
+
+    def test_missing_series(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.read('bitcoin', '1h')
+        self.assertEqual(self.store.info('bitcoin', '1h')['rows'], 0)
+
+    def test_invalid_series(self):
+        for coin_id, resolution in (('../etc', '1h'), ('Bitcoin', '1h'), ('bitcoin', '1x')):
+            with self.subTest(coin_id=coin_id, resolution=resolution), self.assertRaises(ValueError):
+                self.store.series_dir(coin_id, resolution)
+
+    def test_mismatched_columns(self):
+        self.store.append('bitcoin', '1h', *candles('2024-01-01', 2, HOUR_MS), COLUMNS)
+        timestamps, values = candles('2024-01-02', 2, HOUR_MS)
+        with self.assertRaises(ValueError):
+            self.store.append('bitcoin', '1h', timestamps, values[:3], COLUMNS[:3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Tests for run_backtest.py
+
+Run this from apps/server/ directory:
+python scripts/test_run_backtest.py   (or: python -m pytest scripts/test_run_backtest.py)
+"""
+
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import talib
+from backtesting import Strategy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backtest_lookback import resolve_lookback  # noqa: E402
+from backtest_vectorized import create_backtest  # noqa: E402
+from run_backtest import (  # noqa: E402
+    execute_user_code, load_ohlcv_dataframe, load_report_data, render_report, run_backtest,
+)
+
+STRATEGY = '''
+from backtesting import Strategy
+import numpy as np
+
+class Helper:
+    pass
+
+class Trailing(Strategy):
+    def init(self):
+        self.levels = np.full(len(self.data.Close), np.nan)
+        self.levels[:10] = 0.0
+        self.helper = Helper()
+        self.helper.count = 0
+        self.seen = {}
+
+    def next(self):
+        self.helper.count = self.helper.count + 1
+        self.seen['bars'] = self.helper.count
+        if not self.position:
+            self.buy()
+        for trade in self.trades:
+            trade.sl = self.data.Close[-1] * 0.9
+'''
+
+
+def ohlc_frame(length):
+    rng = np.random.default_rng(0)
+    close = 30_000 * np.exp(np.cumsum(rng.normal(0, 0.01, length)))
+    index = pd.date_range('2024-01-01', periods=length, freq='h')
+    return pd.DataFrame({'Open': close, 'High': close * 1.01, 'Low': close * 0.99, 'Close': close}, index=index)
+
+
+def candle_list(length, start_ms=1_704_067_200_000):
+    df = ohlc_frame(length)
+    return [{'timestamp': start_ms + i * 3_600_000, 'open': o, 'high': h, 'low': low, 'close': c}
+            for i, (o, h, low, c) in enumerate(df[['Open', 'High', 'Low', 'Close']].itertuples(index=False))]
+
+
+def encode_ohlcv_binary(candles):
+    """ohlcv.bin bytes laid out the way python-executor-service's _encodeOHLCVBinary() writes them"""
+    columns, fields = ['Open', 'High', 'Low', 'Close'], ['open', 'high', 'low', 'close']
+    header_for = lambda offset: json.dumps({  # noqa: E731
+        'version': 1, 'rows': len(candles), 'columns': columns, 'timestamp_unit': 'ms', 'data_offset': offset,
+    }, separators=(',', ':')).encode()
+    header_length = len(header_for(0)) + 16
+    data_offset = -(-(12 + header_length) // 8) * 8
+    data = b'AGXOHLC1' + struct.pack('<I', header_length) + header_for(data_offset).ljust(header_length)
+    data = data.ljust(data_offset, b'\0')
+    data += struct.pack(f'<{len(candles)}q', *(c['timestamp'] for c in candles))
+    for field in fields:
+        data += struct.pack(f'<{len(candles)}d', *(c[field] for c in candles))
+    return data
+
+
+class BinaryOhlcvTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.candles = candle_list(500)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        with open(os.path.join(self.tmp.name, name), 'wb') as f:
+            f.write(data)
+
+    def test_binary_file_loads_like_json(self):
+        self.write('ohlcv.json', json.dumps(self.candles).encode())
+        from_json = load_ohlcv_dataframe(self.tmp.name)
+        self.write('ohlcv.bin', encode_ohlcv_binary(self.candles))
+        from_binary = load_ohlcv_dataframe(self.tmp.name)
+
+        columns = ['Open', 'High', 'Low', 'Close']
+        pd.testing.assert_frame_equal(from_binary[columns], from_json[columns])
+        self.assertEqual(from_binary.index[0], pd.Timestamp('2024-01-01'))
+        # The prices are a view of the memory-mapped file, not a copy
+        bases, array = [], from_binary['Close'].to_numpy()
+        while array is not None:
+            bases.append(array)
+            array = getattr(array, 'base', None)
+        self.assertTrue(any(isinstance(base, np.memmap) for base in bases))
+
+    def test_lookback_window_is_cut_from_the_file(self):
+        self.write('ohlcv.bin', encode_ohlcv_binary(self.candles))
+        config = {'startDate': '2024-01-10', 'endDate': '2024-01-12', 'lookback': 24}
+        df = load_ohlcv_dataframe(self.tmp.name, config, resolve_lookback('', config))
+        self.assertEqual(df.index[0], pd.Timestamp('2024-01-09'))
+        self.assertEqual(df.index[-1], pd.Timestamp('2024-01-12 23:00'))
+
+    def test_invalid_files_are_rejected(self):
+        self.write('ohlcv.bin', b'NOTOHLCV' + encode_ohlcv_binary(self.candles)[8:])
+        with self.assertRaisesRegex(ValueError, 'bad magic'):
+            load_ohlcv_dataframe(self.tmp.name)
+        self.write('ohlcv.bin', encode_ohlcv_binary([]))
+        with self.assertRaisesRegex(ValueError, 'non-empty'):
+            load_ohlcv_dataframe(self.tmp.name)
+
+
+RSI_STRATEGY = '''
+from backtesting import Strategy
+import talib
+
+class RsiReversal(Strategy):
+    def init(self):
+        self.rsi = self.I(talib.RSI, self.data.Close, 14, name='RSI14')
+
+    def next(self):
+        if not self.position and self.rsi[-1] < 40:
+            self.buy()
+        elif self.position and self.rsi[-1] > 60:
+            self.position.close()
+'''
+
+
+def write_job(tmp_dir, strategy_code, candles, **config):
+    with open(os.path.join(tmp_dir, 'strategy.py'), 'w') as f:
+        f.write(strategy_code)
+    with open(os.path.join(tmp_dir, 'config.json'), 'w') as f:
+        json.dump({'initialCapital': 10_000_000, 'commission': 0.001, 'startDate': '2024-01-01',
+                   'endDate': '2024-12-31', 'cache': False, **config}, f)
+    with open(os.path.join(tmp_dir, 'ohlcv.bin'), 'wb') as f:
+        f.write(encode_ohlcv_binary(candles))
+
+
+class ReportModesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.job_dir = os.path.join(self.tmp.name, 'job')
+        os.makedirs(self.job_dir)
+        self.candles = candle_list(300)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_job(self, **config):
+        write_job(self.job_dir, RSI_STRATEGY, self.candles, **config)
+        return run_backtest(self.job_dir)
+
+    def test_inline_report(self):
+        result = self.run_job(report='inline')
+        self.assertGreater(result['metrics']['total_trades'], 0)
+        self.assertIn('<html', result['html_report'])
+        self.assertIn('RSI14', result['html_report'])
+        self.assertNotIn('report_path', result)
+
+    def test_deferred_report_renders_later(self):
+        report_path = os.path.join(self.tmp.name, 'reports', 'report.npz')
+        result = self.run_job(report='deferred', reportPath=report_path)
+        self.assertIsNone(result['html_report'])
+        self.assertEqual(result['report_path'], report_path)
+        self.assertEqual(result['metrics'], self.run_job(report='none')['metrics'])
+
+        html = render_report(report_path)['html_report']
+        self.assertIn('<html', html)
+        self.assertIn('RSI14', html)
+        report_data = load_report_data(report_path)
+        self.assertEqual(len(report_data['results']['_trades']), result['metrics']['total_trades'])
+        self.assertEqual(len(report_data['df']), 300)
+
+    def test_metrics_only_run_has_no_report(self):
+        result = self.run_job(report='none')
+        self.assertIsNone(result['html_report'])
+        self.assertNotIn('report_path', result)
+
+    def test_report_data_is_never_unpickled(self):
+        report_path = os.path.join(self.tmp.name, 'report.npz')
+        np.savez(report_path, meta=np.array([{'code': 'anything'}], dtype=object))
+        with self.assertRaisesRegex(ValueError, 'Invalid report data'):
+            render_report(report_path)
+
+
+class SandboxWriteGuardTest(unittest.TestCase):
+
+    def test_writes_to_user_objects_trades_and_owned_arrays(self):
+        strategy_class = execute_user_code(STRATEGY)
+        strategy_class.custom = 1
+        stats = create_backtest(ohlc_frame(200), strategy_class, {'initialCapital': 10_000_000, 'commission': 0}).run()
+        self.assertEqual(stats._strategy.seen['bars'], stats._strategy.helper.count)
+        self.assertGreater(stats['# Trades'], 0)
+
+    def test_shared_modules_and_classes_are_read_only(self):
+        mean, rsi, indicator = np.mean, talib.RSI, Strategy.I
+        writes = ['np.mean = len', 'talib.RSI = None', 'Strategy.I = None', 'np.random.seed = None',
+                  'x = np.zeros(3)[1:]\nx[0] = 1', 'setattr(np, "mean", len)']
+        for write in writes:
+            with self.subTest(write=write), self.assertRaises(TypeError):
+                execute_user_code(STRATEGY + '\n' + write + '\n')
+        self.assertIs(np.mean, mean)
+        self.assertIs(talib.RSI, rsi)
+        self.assertIs(Strategy.I, indicator)
+
+
+class WorkerValidateTest(unittest.TestCase):
+
+    def test_validate_messages_are_answered_by_the_worker(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run_backtest.py')
+        messages = [{'id': 'v1', 'validate': 'import os\n' + STRATEGY},
+                    {'id': 'v2', 'validate': 'class P(PortfolioStrategy):\n    def weights(self): pass\n',
+                     'portfolio': True}]
+        output = subprocess.run([sys.executable, script, '--worker', '--pool-size', '1'],
+                                input=''.join(json.dumps(m) + '\n' for m in messages),
+                                capture_output=True, text=True, timeout=120).stdout
+        replies = {reply['id']: reply['result'] for reply in map(json.loads, output.splitlines()) if 'id' in reply}
+        self.assertFalse(replies['v1']['valid'])
+        self.assertEqual([error['type'] for error in replies['v1']['errors']], ['import'])
+        self.assertEqual(replies['v2'], {'valid': True, 'class': 'P', 'errors': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
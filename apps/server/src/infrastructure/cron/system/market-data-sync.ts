@@ -0,0 +1,59 @@
+import cron from "node-cron";
+
+import { pythonExecutorService } from "@/services/trading/python-executor-service";
+
+// CoinGecko OHLC candle size is set by the requested window, so each resolution has
+// a fixed one
+const SYNC_WINDOWS: { resolution: string; days: number }[] = [
+  { resolution: "30m", days: 1 },
+  { resolution: "4h", days: 30 },
+];
+
+const marketDataSync = {
+  start() {
+    console.log("[market-data-sync-cron] Starting candle store sync...");
+
+    cron.schedule("*/30 * * * *", () => {
+      this.syncAll().catch((err) => {
+        console.error("[market-data-sync-cron] Error during scheduled candle sync:", err);
+      });
+    });
+
+    // Initial run on startup
+    this.syncAll().catch((err) => {
+      console.error("[market-data-sync-cron] Error during initial candle sync:", err);
+    });
+  },
+
+  coins(): string[] {
+    return (process.env.MARKET_DATA_SYNC_COINS || "bitcoin,ethereum")
+      .split(",")
+      .map((coin) => coin.trim())
+      .filter(Boolean);
+  },
+
+  async syncAll() {
+    // Sequential to stay within market-data rate limits
+    for (const coinId of this.coins()) {
+      for (const { resolution, days } of SYNC_WINDOWS) {
+        try {
+          const result = await pythonExecutorService.syncCandleStore(
+            coinId,
+            resolution,
+            days
+          );
+          console.log(
+            `[market-data-sync-cron] ${coinId} ${resolution}: +${result.added} candles (${result.rows} stored)`
+          );
+        } catch (err) {
+          console.error(
+            `[market-data-sync-cron] Failed to sync ${coinId} ${resolution}:`,
+            err
+          );
+        }
+      }
+    }
+  },
+};
+
+export default marketDataSync;
@@ -3,6 +3,7 @@ import { ColumnType, Generated, JSONColumnType } from "kysely";
 import { JournalEntryContent, JournalEntryType } from "@/types/journal";
 import { ChainType } from "@/types/orb";
 import { PolicyDocument } from "@/types/policy";
+import { BacktestSeries } from "@/types/backtest";
 
 export interface UsersTable {
   id: Generated<number>;
@@ -143,6 +144,8 @@ export interface StrategiesTable {
         total_trades: number;
       } | null;
       html_report: string | null;
+      report_path?: string | null;
+      series?: BacktestSeries | null; // Compact chart data (config.series)
       error_message: string | null;
       started_at: string | null;
       completed_at: string | null;
@@ -27,6 +27,10 @@ export const strategyQueue = new Queue("strategy-monitor-queue", {
   },
 });
 
+// Single scheduler/job that evaluates every open trade's strategies per tick
+// (used instead of one "monitor-trade-<id>" scheduler per trade when STRATEGY_MONITOR_BATCH=true)
+export const MONITOR_ALL_TRADES_JOB = "monitor-all-trades";
+
 process.on("SIGINT", async () => {
   await userTradingQueue.close();
   await strategyQueue.close();
@@ -1,8 +1,13 @@
 import { SandboxedJob } from "bullmq";
 
-import { strategyQueue } from "@/infrastructure/queues/config";
+import { MONITOR_ALL_TRADES_JOB, strategyQueue } from "@/infrastructure/queues/config";
 import { sendTradeProposal } from "@/services/system/notification-service";
 import { tokenService } from "@/services/system/token-service";
+import {
+  indicatorService,
+  MonitorAssetData,
+  MonitorInput,
+} from "@/services/trading/indicator-service";
 import { marketDataService } from "@/services/trading/market-data-service";
 import * as positionMonitor from "@/services/trading/strategies/position-monitor";
 import * as rsiStrategy from "@/services/trading/strategies/rsi";
@@ -13,13 +18,25 @@ import { tradeActionService } from "@/services/trading/trade-action-service";
 import { PositionEnteredContent } from "@/types/journal";
 import { StrategyContext, StrategyParams } from "@/types/strategy";
 
+// CoinGecko market_chart returns hourly points for 2-90 day windows
+// (5-minute points for 1 day)
+const MIN_TA_HISTORY_DAYS = 2;
+const MAX_TA_HISTORY_DAYS = 90;
+const POINTS_PER_DAY = 24;
+
 /**
  * This is the sandboxed processor for the strategy queue.
  * It runs in a separate process to avoid blocking the main event loop.
  *
- * @param job The job from the strategy queue, containing the tradeActionId.
+ * @param job The job from the strategy queue: a single trade ({ tradeActionId })
+ * or the batched "monitor-all-trades" job that evaluates every open trade.
  */
 module.exports = async (job: SandboxedJob) => {
+  if (job.name === MONITOR_ALL_TRADES_JOB) {
+    await runMonitorBatch(job);
+    return;
+  }
+
   const { tradeActionId } = job.data;
   if (!tradeActionId) {
     console.error("[StrategyProcessor] Job is missing tradeActionId.", job.data);
@@ -45,18 +62,13 @@ module.exports = async (job: SandboxedJob) => {
       return;
     }
 
-    // --- Pre-fetch data for TA strategies ---
-    const needsHistoricalData = activeStrategies.some(
-      (s) => s.strategy_type === "rsi" || s.strategy_type === "smaCross"
-    );
-    if (needsHistoricalData) {
-      // Fetch the maximum period required by any strategy to be efficient
-      // For now, fetching a default of 90 days for TA.
-      // In future Agent should specify this to the tool.
+    // --- Pre-fetch data for TA strategies, as much as the longest one needs ---
+    const historyDays = await taHistoryDays(activeStrategies);
+    if (historyDays > 0) {
       context.historicalData = await marketDataService.getMarketChart(
         context.assetId,
         "usd",
-        90
+        historyDays
       );
     }
     // ---
@@ -73,28 +85,9 @@ module.exports = async (job: SandboxedJob) => {
       const conditionMet = await checker(params as any, context);
 
       if (conditionMet) {
-        console.log(
-          `[StrategyEngine] Strategy '${strategy.strategy_type}' condition met for trade ${tradeActionId}.`
-        );
-
-        const action = params.action;
-
-        if (action === "close") {
-          console.log(
-            `[StrategyEngine] Action is 'close' - triggering immediate exit for trade ${tradeActionId}.`
-          );
-          await sendTradeProposal(context.userId, tradeActionId, 0, "EXIT_POSITION");
-
-          await strategyService.closeAllStrategies(tradeActionId);
-          await strategyQueue.removeJobScheduler(`monitor-trade-${tradeActionId}`);
+        const closed = await handleConditionMet(strategy.strategy_type, params, context);
+        if (closed) {
           break;
-        } else if (action === "reassess") {
-          console.log(
-            `[StrategyEngine] Action is 'reassess' - notifying for manual evaluation on trade ${tradeActionId}.`
-          );
-          // TODO: Send notification for manual assessment instead of automatic exit
-          // For now, continue monitoring other strategies
-          continue;
         }
       }
     }
@@ -107,6 +100,153 @@ module.exports = async (job: SandboxedJob) => {
   }
 };
 
+/**
+ * Act on a strategy whose condition was met. Returns true if the trade was closed.
+ */
+async function handleConditionMet(
+  strategyType: string,
+  params: StrategyParams,
+  context: Pick<StrategyContext, "tradeActionId" | "userId">
+): Promise<boolean> {
+  const { tradeActionId } = context;
+  console.log(
+    `[StrategyEngine] Strategy '${strategyType}' condition met for trade ${tradeActionId}.`
+  );
+
+  const action = params.action;
+
+  if (action === "close") {
+    console.log(
+      `[StrategyEngine] Action is 'close' - triggering immediate exit for trade ${tradeActionId}.`
+    );
+    await sendTradeProposal(context.userId, tradeActionId, 0, "EXIT_POSITION");
+
+    await strategyService.closeAllStrategies(tradeActionId);
+    await strategyQueue.removeJobScheduler(`monitor-trade-${tradeActionId}`);
+    return true;
+  } else if (action === "reassess") {
+    console.log(
+      `[StrategyEngine] Action is 'reassess' - notifying for manual evaluation on trade ${tradeActionId}.`
+    );
+    // TODO: Send notification for manual assessment instead of automatic exit
+    // For now, continue monitoring other strategies
+  }
+  return false;
+}
+
+/**
+ * Evaluate every monitored trade in one pass
+ *
+ * Market data is fetched once per asset (not once per trade) and all
+ * conditions are evaluated by indicatorService.evaluateMonitors, which
+ * computes each distinct indicator once.
+ */
+async function runMonitorBatch(job: SandboxedJob): Promise<void> {
+  const strategies = await strategyService.getActiveMonitoredStrategies();
+  if (strategies.length === 0) {
+    return;
+  }
+
+  // Resolve each trade once
+  const trades = new Map<number, Omit<StrategyContext, "currentPrice"> | null>();
+  for (const strategy of strategies) {
+    if (!trades.has(strategy.trade_action_id)) {
+      trades.set(strategy.trade_action_id, await resolveTrade(strategy.trade_action_id));
+    }
+  }
+
+  // Fetch market data once per asset, with the history its longest TA monitor needs
+  const assets: Record<string, MonitorAssetData> = {};
+  const assetStrategies = new Map<string, typeof strategies>();
+  for (const strategy of strategies) {
+    const trade = trades.get(strategy.trade_action_id);
+    if (!trade) {
+      continue;
+    }
+    assets[trade.assetId] ??= {};
+    assetStrategies.set(trade.assetId, [
+      ...(assetStrategies.get(trade.assetId) ?? []),
+      strategy,
+    ]);
+  }
+  for (const assetId of Object.keys(assets)) {
+    try {
+      const marketData = await marketDataService.getMarketData(assetId);
+      assets[assetId].currentPrice = marketData.market_data?.current_price?.usd;
+      const historyDays = await taHistoryDays(assetStrategies.get(assetId)!);
+      if (historyDays > 0) {
+        assets[assetId].historicalData = await marketDataService.getMarketChart(
+          assetId,
+          "usd",
+          historyDays
+        );
+      }
+    } catch (error) {
+      // Monitors on this asset are reported as skipped for this tick
+      console.error(`[StrategyEngine] Failed to fetch market data for ${assetId}:`, error);
+      delete assets[assetId];
+    }
+  }
+
+  const monitored = strategies.filter((s) => trades.get(s.trade_action_id));
+  const monitors: MonitorInput[] = monitored.map((strategy) => {
+    const trade = trades.get(strategy.trade_action_id)!;
+    return {
+      trade_action_id: strategy.trade_action_id,
+      strategy_type: strategy.strategy_type,
+      params: strategy.strategy_params_json as StrategyParams,
+      asset_id: trade.assetId,
+      created_at: trade.tradeCreatedAt.getTime(),
+    };
+  });
+
+  const { triggered, skipped } = await indicatorService.evaluateMonitors(assets, monitors);
+  for (const entry of skipped) {
+    console.warn(
+      `[StrategyEngine] Skipped '${entry.strategy_type}' for trade ${entry.trade_action_id}: ${entry.reason}`
+    );
+  }
+
+  const closedTrades = new Set<number>();
+  for (const { index } of triggered) {
+    const monitor = monitors[index];
+    if (closedTrades.has(monitor.trade_action_id)) {
+      continue;
+    }
+    const trade = trades.get(monitor.trade_action_id)!;
+    if (await handleConditionMet(monitor.strategy_type, monitor.params, trade)) {
+      closedTrades.add(monitor.trade_action_id);
+    }
+  }
+
+  job.log(
+    `[StrategyProcessor] Evaluated ${monitors.length} monitors over ${trades.size} ` +
+      `trades and ${Object.keys(assets).length} assets; ${triggered.length} triggered`
+  );
+  await job.updateProgress(100);
+}
+
+/**
+ * Days of hourly market chart history covering the warm-up of the TA
+ * strategies (0 when none of them needs history)
+ */
+async function taHistoryDays(
+  strategies: { strategy_type: string; strategy_params_json: unknown }[]
+): Promise<number> {
+  const points = await indicatorService.historyPoints(
+    strategies.map((s) => ({
+      strategy_type: s.strategy_type,
+      params: s.strategy_params_json as StrategyParams,
+    }))
+  );
+  if (points === 0) {
+    return 0;
+  }
+  // One more day for the partial current day
+  const days = Math.ceil(points / POINTS_PER_DAY) + 1;
+  return Math.min(MAX_TA_HISTORY_DAYS, Math.max(MIN_TA_HISTORY_DAYS, days));
+}
+
 // A map to dynamically call the correct strategy checker
 const strategyCheckers = {
   positionMonitor: positionMonitor.check,
@@ -116,6 +256,39 @@ const strategyCheckers = {
 };
 
 async function getTradeContext(tradeActionId: number): Promise<StrategyContext | null> {
+  const trade = await resolveTrade(tradeActionId);
+  if (!trade) {
+    return null;
+  }
+
+  try {
+    // Get live market data for the base asset
+    const marketData = await marketDataService.getMarketData(trade.assetId);
+    const currentPrice = marketData.market_data?.current_price?.usd;
+
+    if (currentPrice === undefined) {
+      console.error(
+        `[StrategyEngine] Could not fetch price for trade ${tradeActionId} (${trade.assetId}).`
+      );
+      return null;
+    }
+
+    return { ...trade, currentPrice };
+  } catch (error) {
+    console.error(
+      `[StrategyEngine] Error building trade context for ${tradeActionId}:`,
+      error
+    );
+    return null;
+  }
+}
+
+/**
+ * Everything in the strategy context except the live price
+ */
+async function resolveTrade(
+  tradeActionId: number
+): Promise<Omit<StrategyContext, "currentPrice"> | null> {
   try {
     // Get trade action using service layer
     const tradeAction = await tradeActionService.getTradeAction(tradeActionId);
@@ -151,20 +324,10 @@ async function getTradeContext(tradeActionId: number): Promise<StrategyContext |
     const tradingPair = content.trading_pair;
     const assetId = tokenService.getBaseAssetId(tradingPair, "coingecko");
 
-    // Get live market data for the base asset
-    const marketData = await marketDataService.getMarketData(assetId);
-    const currentPrice = marketData.market_data?.current_price?.usd;
-
-    if (currentPrice === undefined) {
-      console.error(`[StrategyEngine] Could not fetch price for ${tradingPair} (${assetId}).`);
-      return null;
-    }
-
     return {
       assetId,
       userId: sector.user_id,
       sectorId: sector.id,
-      currentPrice,
       tradeActionId,
       tradeCreatedAt: new Date(tradeAction.created_at),
     };
@@ -1,7 +1,7 @@
 import { createTool } from "@mastra/core";
 import { z } from "zod";
 
-import { strategyQueue } from "@/infrastructure/queues/config";
+import { MONITOR_ALL_TRADES_JOB, strategyQueue } from "@/infrastructure/queues/config";
 import { tokenService } from "@/services/system/token-service";
 import { strategyService } from "@/services/trading/strategy-service";
 import { tradeActionService } from "@/services/trading/trade-action-service";
@@ -78,15 +78,27 @@ export const enterPositionTool = createTool({
       };
     }
 
-    const schedulerId = `monitor-trade-${tradeActionId}`;
-    await strategyQueue.upsertJobScheduler(
-      schedulerId,
-      { every: 20 * 1000 },
-      {
-        name: "monitor-trade",
-        data: { tradeActionId },
-      }
-    );
+    if (process.env.STRATEGY_MONITOR_BATCH === "true") {
+      // One scheduler evaluates every open trade, fetching market data once per asset
+      await strategyQueue.upsertJobScheduler(
+        MONITOR_ALL_TRADES_JOB,
+        { every: 20 * 1000 },
+        {
+          name: MONITOR_ALL_TRADES_JOB,
+          data: {},
+        }
+      );
+    } else {
+      const schedulerId = `monitor-trade-${tradeActionId}`;
+      await strategyQueue.upsertJobScheduler(
+        schedulerId,
+        { every: 20 * 1000 },
+        {
+          name: "monitor-trade",
+          data: { tradeActionId },
+        }
+      );
+    }
 
     await tradeActionService.updateTradeStatus(tradeActionId, "EXECUTING");
 
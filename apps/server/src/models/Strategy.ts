@@ -1,5 +1,6 @@
 import { Insertable, Selectable, Updateable } from "kysely";
 import { StrategiesTable } from "@/infrastructure/database/schema";
+import { BacktestSeries } from "@/types/backtest";
 
 export interface StrategyRevision {
   code: string;
@@ -13,6 +14,8 @@ export interface StrategyRevision {
       total_trades: number;
     } | null;
     html_report: string | null;
+    report_path?: string | null;
+    series?: BacktestSeries | null; // Compact chart data (config.series)
     error_message: string | null;
     started_at: string | null;
     completed_at: string | null;
@@ -2,6 +2,7 @@ import cors from "cors";
 import dotenv from "dotenv";
 import express from "express";
 
+import marketDataSync from "@/infrastructure/cron/system/market-data-sync";
 import threadCleanup from "@/infrastructure/cron/system/thread-cleanup";
 import tradeCycler from "@/infrastructure/cron/trading/trade-cycler";
 import { errorHandler } from "@/interfaces/api/middleware/errorHandler";
@@ -49,4 +50,5 @@ app.listen(BACKEND_PORT, () => {
   // Start crons
   tradeCycler.start();
   threadCleanup.start();
+  marketDataSync.start();
 });
@@ -1,5 +1,6 @@
 import { db } from "@/infrastructure/database/turso-connection";
 import { Strategy, StrategyRevision } from "@/models/Strategy";
+import { BacktestSeries } from "@/types/backtest";
 
 export const backtestService = {
   // ============ Strategy Code Operations ============
@@ -252,7 +253,9 @@ export const backtestService = {
         win_rate: number;
         total_trades: number;
       };
-      html_report: string;
+      html_report: string | null;
+      report_path?: string;
+      series?: BacktestSeries;
     }
   ): Promise<Strategy> {
     const strategy = await this.getStrategyById(strategyId, userId);
@@ -269,6 +272,8 @@ export const backtestService = {
     revision.results = {
       metrics: results.metrics,
       html_report: results.html_report,
+      report_path: results.report_path ?? null,
+      series: results.series ?? null,
       error_message: null,
       started_at: revision.results?.started_at || new Date().toISOString(),
       completed_at: new Date().toISOString(),
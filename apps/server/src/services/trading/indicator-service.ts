@@ -0,0 +1,139 @@
+import * as path from "path";
+import { python } from "pythonia";
+
+import { StrategyParams } from "@/types/strategy";
+
+export type IndicatorSpec =
+  | { type: "rsi"; period: number }
+  | { type: "sma"; period: number }
+  | { type: "ema"; period: number }
+  | { type: "cross"; fast: number; slow: number; ma?: "sma" | "ema" };
+
+export interface IndicatorValue {
+  value: number | null; // At the newest (live) point; null until enough data
+  previous: number | null; // At the point before it
+}
+
+export interface CrossValue {
+  fast: number | null;
+  slow: number | null;
+  previous_fast: number | null;
+  previous_slow: number | null;
+  cross_up: boolean; // Fast moved from <= slow to > slow on the newest point
+  cross_down: boolean; // Fast moved from >= slow to < slow on the newest point
+}
+
+export type IndicatorResult<S extends IndicatorSpec> = S extends { type: "cross" }
+  ? CrossValue
+  : IndicatorValue;
+
+export interface PricePoint {
+  timestamp: number; // Epoch milliseconds
+  price: number;
+}
+
+export interface MonitorInput {
+  trade_action_id: number;
+  strategy_type: string; // positionMonitor | rsi | smaCross | timeLimit
+  params: StrategyParams;
+  asset_id: string;
+  created_at: number; // Trade creation, epoch milliseconds (for timeLimit)
+}
+
+export interface MonitorAssetData {
+  historicalData?: PricePoint[]; // Needed for rsi / smaCross monitors on the asset
+  currentPrice?: number; // For positionMonitor; defaults to the newest historical point
+}
+
+export interface MonitorRef {
+  index: number; // Position in the monitors array
+  trade_action_id: number;
+  strategy_type: string;
+}
+
+export interface MonitorBatchResult {
+  triggered: MonitorRef[]; // In monitors order
+  // Unknown type, missing data or invalid params
+  skipped: (MonitorRef & { reason: string })[];
+}
+
+// Rolling indicator state lives in this module for the lifetime of the Python bridge
+const ENGINE_PATH = path.join(__dirname, "../../../scripts/indicator_engine.py");
+
+export const indicatorService = {
+  /**
+   * Evaluate indicators for an asset in one bridge call
+   *
+   * The Python engine keeps O(1)-update rolling state per asset and
+   * indicator, seeded once from history; later calls only process the points
+   * that are newer than the ones it has seen. The newest point is treated as
+   * the live price and is not committed, so it may move between calls.
+   */
+  async evaluate<const S extends readonly IndicatorSpec[]>(
+    assetId: string,
+    historicalData: PricePoint[],
+    specs: S
+  ): Promise<{ [K in keyof S]: IndicatorResult<S[K]> }> {
+    const engine = await python(ENGINE_PATH);
+    const points = historicalData.map((point) => [point.timestamp, point.price]);
+    const output = await engine.evaluate(
+      assetId,
+      JSON.stringify(points),
+      JSON.stringify(specs)
+    );
+    return JSON.parse(output);
+  },
+
+  /**
+   * Evaluate the strategy monitors of many trades in one bridge call
+   *
+   * Each distinct indicator (asset, type, period) is computed once and the
+   * conditions of all monitors are checked in one vectorized pass.
+   */
+  async evaluateMonitors(
+    assets: Record<string, MonitorAssetData>,
+    monitors: MonitorInput[],
+    now: Date = new Date()
+  ): Promise<MonitorBatchResult> {
+    const engine = await python(ENGINE_PATH);
+    const assetPayload = Object.fromEntries(
+      Object.entries(assets).map(([assetId, data]) => [
+        assetId,
+        {
+          points: (data.historicalData ?? []).map((point) => [
+            point.timestamp,
+            point.price,
+          ]),
+          current_price: data.currentPrice ?? null,
+        },
+      ])
+    );
+    const output = await engine.evaluate_monitors(
+      JSON.stringify(assetPayload),
+      JSON.stringify(monitors),
+      now.getTime()
+    );
+    return JSON.parse(output);
+  },
+
+  /**
+   * Price points of history the indicator monitors need, so callers fetch only that much
+   *
+   * Covers each monitor's current and previous value, with extra periods for
+   * recursive indicators (RSI) to converge; 0 when no monitor uses history.
+   */
+  async historyPoints(
+    monitors: Pick<MonitorInput, "strategy_type" | "params">[]
+  ): Promise<number> {
+    const engine = await python(ENGINE_PATH);
+    return await engine.history_points(JSON.stringify(monitors));
+  },
+
+  /**
+   * Drop the rolling state of one asset (or every asset), e.g. after a data gap
+   */
+  async reset(assetId?: string): Promise<void> {
+    const engine = await python(ENGINE_PATH);
+    await engine.reset(assetId ?? null);
+  },
+};
@@ -1,20 +1,289 @@
-import { spawn, spawnSync } from "child_process";
+import { ChildProcess, spawn, spawnSync } from "child_process";
 import * as fs from "fs/promises";
 import * as path from "path";
 import * as os from "os";
+import * as readline from "readline";
+import { BacktestSeries } from "@/types/backtest";
 import { marketDataService } from "./market-data-service";
 
+export interface BacktestMetrics {
+  total_return: number;
+  sharpe_ratio: number;
+  max_drawdown: number;
+  win_rate: number;
+  total_trades: number;
+}
+
+export interface OptimizationResult {
+  objective: string;
+  best_params: Record<string, number>;
+  best_value: number | null;
+  evaluated: number;
+  failed: number;
+  workers: number; // Processes the sweep ran on
+  top_results: {
+    params: Record<string, number>;
+    metrics: BacktestMetrics;
+    bars?: number; // Adaptive search only
+  }[];
+  heatmap: {
+    x_param: string;
+    y_param: string | null;
+    x_values: number[];
+    y_values: number[];
+    values: (number | null)[][];
+  };
+  search?: AdaptiveSearchSummary; // search: "adaptive" only
+  trace?: AdaptiveSearchRun[];
+}
+
+export interface AdaptiveSearchSummary {
+  method: "adaptive";
+  proposal: "tpe" | "random";
+  rungs: number[]; // Data prefix of each rung as a share of the bars
+  rounds: number;
+  candidates: number; // Parameter combinations tried
+  grid_size: number;
+  budget: number; // In full-length backtests
+  cost: number; // Full-length backtests' worth of runs made
+  stopped: "budget" | "time" | "exhausted";
+  elapsed: number;
+}
+
+export interface AdaptiveSearchRun {
+  round: number;
+  rung: number;
+  bars: number; // Length of the data prefix the run used
+  params: Record<string, number>;
+  value?: number | null; // Objective on the prefix
+  error?: string;
+}
+
+export interface WalkForwardWindow {
+  start: string; // ISO timestamp of the first bar
+  end: string; // ISO timestamp of the last bar
+  bars: number;
+}
+
+export interface WalkForwardFold {
+  index: number;
+  train: WalkForwardWindow;
+  test: WalkForwardWindow;
+  params?: Record<string, number>; // Chosen on the train slice ({} without optimize)
+  train_metrics?: BacktestMetrics; // In-sample
+  test_metrics?: BacktestMetrics; // Out-of-sample
+  error?: string;
+}
+
+export interface WalkForwardResult {
+  anchored: boolean;
+  folds: WalkForwardFold[];
+  failed: number;
+  workers: number; // Processes the folds ran on
+  stitched: BacktestMetrics; // Chained out-of-sample equity across all test windows
+}
+
+export function decodeSeriesArray(
+  data: string,
+  type: "float32" | "float64"
+): Float32Array | Float64Array {
+  // Copy into a fresh (aligned) buffer; Buffer.from may return a slice of a shared pool
+  const bytes = new Uint8Array(Buffer.from(data, "base64"));
+  return type === "float64"
+    ? new Float64Array(bytes.buffer)
+    : new Float32Array(bytes.buffer);
+}
+
+// Percentages like BacktestMetrics; null when the run had fewer than 2 closed trades
+export interface RobustnessInterval {
+  observed: number | null; // The actual trade sequence
+  median: number | null;
+  lower: number | null;
+  upper: number | null;
+}
+
+export interface RobustnessResult {
+  method: "bootstrap" | "shuffle";
+  simulations: number; // Completed, fewer than requested when the time budget ran out
+  requested: number;
+  trades: number;
+  confidence: number;
+  seed: number | null;
+  workers: number; // Processes the simulations ran on (0 when too few trades to run any)
+  truncated: boolean;
+  elapsed: number; // Seconds
+  total_return: RobustnessInterval | null;
+  // Between trades, so it can be shallower than metrics.max_drawdown
+  max_drawdown: RobustnessInterval | null;
+  probability_of_loss: number | null; // % of simulations ending below the initial capital
+  ruin_threshold: number;
+  risk_of_ruin: number | null; // % of simulations whose drawdown reached ruin_threshold
+}
+
+export interface PortfolioConfig {
+  assets: string[]; // CoinGecko coin IDs; the strategy must subclass PortfolioStrategy
+}
+
+export interface PortfolioAllocation {
+  asset: string;
+  weight: number; // Fraction of the final equity
+  pnl: number; // Realized plus open
+  trades: number; // Holding periods
+}
+
+export interface PortfolioResult {
+  assets: string[];
+  bars: number; // Union of the assets' candle timestamps
+  rebalances: number;
+  allocation: PortfolioAllocation[];
+}
+
+export type BacktestReportMode = "inline" | "deferred" | "none";
+
 export interface BacktestResult {
-  html_report: string;
-  metrics: {
-    total_return: number;
-    sharpe_ratio: number;
-    max_drawdown: number;
-    win_rate: number;
-    total_trades: number;
+  html_report: string | null; // Only set for report: "inline"
+  report_path?: string; // Report data for renderReport(), set for report: "deferred"
+  metrics: BacktestMetrics;
+  optimization?: OptimizationResult; // Present when config.optimize was set
+  // Present when config.walkForward was set; metrics are the stitched ones
+  walk_forward?: WalkForwardResult;
+  robustness?: RobustnessResult; // Present when config.robustness was set
+  series?: BacktestSeries; // Present when config.series was set
+  // Present when config.portfolio was set (html_report is then null)
+  portfolio?: PortfolioResult;
+  cache?: BacktestCacheInfo; // Whether the result came from the on-disk result cache
+  profile?: BacktestProfile; // Present when config.profile was set
+  memory?: BacktestMemory; // Present when config.memory was "low" or "float32"
+}
+
+// Loaded OHLCV frame and peak memory of a low-memory run (see backtest_memory.py)
+export interface BacktestMemory {
+  mode: "low" | "float32";
+  rows: number;
+  columns: string[]; // Only the columns the data has (no zero-filled Volume)
+  // float32 only where it keeps every price distinct and in order
+  price_dtype: "float32" | "float64";
+  data_mb: number;
+  peak_rss_mb: number;
+}
+
+// Per-stage cost of a run (see backtest_profile.py)
+export interface BacktestProfile {
+  stages: BacktestStageProfile[];
+  total: { wall: number; cpu: number; max_rss_mb: number };
+  hotspots?: {
+    // Only for profile: "deep"
+    interval_ms: number;
+    samples: number; // All CPU samples of the run
+    strategy_samples: number; // Samples with user strategy code on the stack
+    lines: BacktestHotspot[]; // Most sampled strategy lines first
   };
 }
 
+export interface BacktestStageProfile {
+  stage: string; // Same names as the progress "stage" events
+  wall: number; // Seconds
+  cpu: number; // Seconds, including sweep/fold pool workers
+  peak_rss_mb: number;
+}
+
+export interface BacktestHotspot {
+  line: number; // Line in the strategy code
+  function: string; // e.g. "init" or "next"
+  code: string | null;
+  samples: number;
+  percent: number; // Of all samples
+}
+
+export interface BacktestCacheInfo {
+  status: "hit" | "miss" | "disabled";
+  key?: string; // Content hash of strategy, config, OHLCV input and library versions
+}
+
+// Streamed while a run is in progress (see backtest_progress.py)
+export type BacktestProgressEvent =
+  | { event: "started"; pid: number } // Worker pool only: the process running the job
+  | { event: "stage"; stage: string; status: "started" | "finished"; elapsed?: number }
+  | (BacktestProgressCounter & { event: "bars"; equity: number })
+  | (BacktestProgressCounter & {
+      event: "sweep";
+      failed: number;
+      // Best combination so far
+      best: { params: Record<string, number>; value: number | null } | null;
+    })
+  | (BacktestProgressCounter & { event: "folds"; failed: number })
+  | (BacktestProgressCounter & { event: "simulations" });
+
+export interface BacktestProgressCounter {
+  completed: number;
+  total: number;
+  elapsed: number; // Seconds since the first update
+  eta: number | null; // Estimated seconds remaining
+}
+
+// Printed by run_backtest.py instead of the result when a run is cancelled
+interface CancelledRun {
+  cancelled: true;
+  reason: string; // Signal name, e.g. "SIGTERM"
+  stage: string | null;
+  partial: BacktestCancelledError["partial"];
+}
+
+export interface BacktestRunOptions {
+  onProgress?: (event: BacktestProgressEvent) => void;
+  signal?: AbortSignal; // Aborting cancels the run; it rejects with BacktestCancelledError
+}
+
+export interface OptimizeConfig {
+  // Explicit values or an inclusive {min, max, step} range per strategy attribute
+  params: Record<string, number[] | { min: number; max: number; step?: number }>;
+  constraint?: string; // Expression over param names, e.g. "n1 < n2"
+  maximize?: string; // Metric key from BacktestMetrics (default: sharpe_ratio)
+  maxTries?: number; // Randomly sample at most this many combinations
+  topK?: number; // Number of ranked results to return (default: 10)
+  randomState?: number;
+  workers?: number; // Process pool size (default: CPU count)
+  // Successive halving on growing data prefixes instead of the full grid
+  search?: "grid" | "adaptive";
+  proposal?: "tpe" | "random"; // adaptive: how combinations are proposed (default: tpe)
+  budget?: number; // adaptive: in full-length backtests (default: 10% of the grid)
+  timeBudget?: number; // adaptive: seconds
+  eta?: number; // adaptive: 1 in eta candidates is promoted to the next rung (default: 3)
+  // adaptive: shortest data prefix as a share of the bars (default: 0.1)
+  minFraction?: number;
+}
+
+export interface WalkForwardConfig {
+  // Bar counts, or durations such as "180D" (all windows must use the same unit)
+  train: number | string;
+  test: number | string;
+  step?: number | string; // Distance between folds, at least test (default: test)
+  anchored?: boolean; // Every train window starts at startDate (default: rolling)
+  workers?: number; // Process pool size for the folds (default: CPU count)
+}
+
+export interface RobustnessConfig {
+  simulations?: number; // Resampled trade sequences (default: 2000)
+  // With replacement, or reordering only (default: bootstrap)
+  method?: "bootstrap" | "shuffle";
+  confidence?: number; // Interval width (default: 0.95)
+  ruin?: number; // Drawdown % that counts as ruin (default: 50)
+  seed?: number; // Reproducible simulations
+  timeBudget?: number; // Seconds (default: 10); stops early with truncated: true
+  workers?: number; // Process pool size (default: CPU count)
+}
+
+export interface BacktestLimits {
+  memoryMb?: number; // Address space the run may add to the loaded interpreter
+  cpuSeconds?: number; // CPU time of each process of the run
+  barMs?: number; // Wall-clock budget of one Strategy.next() call
+}
+
+export type BacktestLimitName = "memory" | "cpu" | "bar" | "admission";
+
+// "event" runs backtesting.py bar by bar; "vectorized" needs a signals() strategy
+export type BacktestEngine = "auto" | "event" | "vectorized";
+
 export interface BacktestConfig {
   startDate: string;
   endDate: string;
@@ -22,6 +291,116 @@ export interface BacktestConfig {
   commission: number;
   coinId?: string; // CoinGecko coin ID for OHLCV data (e.g., "bitcoin", "ethereum")
   days?: number; // Number of days of historical data to fetch (default: 365)
+  // Read startDate..endDate from the local candle store (e.g. "30m", "4h")
+  // instead of fetching
+  resolution?: string;
+  // Run on coarser bars than the data (e.g. "1h", "1d"); a multiple of its bar size
+  timeframe?: string;
+  optimize?: OptimizeConfig; // Parameter sweep; the best combination is reported
+  // Out-of-sample folds within startDate..endDate; optimize runs per train slice
+  walkForward?: WalkForwardConfig;
+  // Compact chart series in result.series (default: 1000 points)
+  series?: boolean | { points?: number };
+  // Monte Carlo intervals over the final run's trades (not with walkForward)
+  robustness?: boolean | RobustnessConfig;
+  // Default "inline"; "deferred" renders on demand via renderReport()
+  report?: BacktestReportMode;
+  cache?: boolean; // Default true; false always re-runs the backtest
+  // Default from BACKTEST_MAX_MEMORY_MB, BACKTEST_MAX_CPU_SECONDS, BACKTEST_MAX_BAR_MS
+  limits?: BacktestLimits;
+  // Stage timings in result.profile; "deep" adds strategy line hotspots
+  profile?: boolean | "deep";
+  // Default "auto": vectorized for strategies that only define signals()
+  engine?: BacktestEngine;
+  // Shared-capital run across several assets (coinId is then unused)
+  portfolio?: PortfolioConfig;
+  // Load only the warm-up bars before startDate plus the range; "auto" infers them
+  lookback?: "auto" | number;
+  // Low-memory OHLCV loading for very long histories, optionally float32 prices
+  memory?: "default" | "low" | "float32";
+}
+
+// Warm-up inferred from a strategy's source (see backtest_lookback.py)
+export interface StrategyLookback {
+  class: string;
+  bars: number; // Bars of the strategy's own timeframe
+  duration_ms: number; // Higher-timeframe warm-up (resample_apply, config.timeframe)
+  exact: boolean; // False when an unknown indicator function made it a best guess
+  indicators: { function: string; bars: number; timeframe?: string }[];
+}
+
+export interface StrategyValidationIssue {
+  line: number | null; // 1-based; null when not tied to a line
+  column: number | null; // 0-based
+  type: "syntax" | "restricted" | "import" | "name" | "strategy";
+  message: string;
+}
+
+export interface StrategyValidationResult {
+  valid: boolean;
+  class: string | null; // Strategy class a run would use
+  errors: StrategyValidationIssue[];
+}
+
+export interface CandleStoreSyncResult {
+  coinId: string;
+  resolution: string;
+  rows: number; // Stored candles after the sync
+  added: number; // Candles that were not stored before
+  updated: string[]; // Chunks rewritten, e.g. ["2024-03"]
+  chunks: number;
+  start?: number; // ms since epoch of the first stored candle
+  end?: number; // ms since epoch of the last stored candle
+}
+
+export interface BatchBacktestJob {
+  strategy: string; // Key into the strategies map passed to runBacktestBatch
+  coinId: string;
+  config?: Partial<BacktestConfig>; // Per-job overrides of the shared config
+}
+
+export interface BatchJobResult {
+  event: "job";
+  index: number;
+  strategy: string;
+  dataset: string; // coinId
+  metrics?: BacktestMetrics;
+  best_params?: Record<string, number>; // When the job config had optimize
+  error?: string;
+}
+
+export interface BatchTableRow {
+  strategy: string;
+  dataset: string;
+  total_return?: number | null;
+  sharpe_ratio?: number | null;
+  max_drawdown?: number | null;
+  win_rate?: number | null;
+  total_trades?: number;
+  error?: string;
+}
+
+export interface BatchStrategySummary {
+  strategy: string;
+  datasets: number; // Datasets the strategy ran on without error
+  mean_return: number | null;
+  median_return: number | null;
+  mean_sharpe: number | null;
+  worst_drawdown: number | null;
+  profitable: number; // Datasets with a positive return
+}
+
+export interface BatchSummary {
+  event: "summary";
+  jobs: number;
+  failed: number;
+  table: BatchTableRow[];
+  by_strategy: BatchStrategySummary[]; // Sorted by mean_return, best first
+}
+
+export interface BatchBacktestResult {
+  jobs: BatchJobResult[];
+  summary: BatchSummary;
 }
 
 export interface OHLCVData {
@@ -43,6 +422,43 @@ export class PythonExecutorError extends Error {
   }
 }
 
+// A run exceeded a resource budget or waited too long for one of the
+// BACKTEST_MAX_CONCURRENT admission slots
+export class BacktestLimitError extends PythonExecutorError {
+  constructor(
+    message: string,
+    public readonly limit: BacktestLimitName,
+    public readonly budget: number,
+    stderr: string,
+    stdout: string
+  ) {
+    super(message, stderr, stdout);
+    this.name = "BacktestLimitError";
+  }
+}
+
+// Strategy code failed the static checks of backtest_validate.py
+export class StrategyValidationError extends Error {
+  constructor(message: string, public readonly errors: StrategyValidationIssue[]) {
+    super(message);
+    this.name = "StrategyValidationError";
+  }
+}
+
+export class BacktestCancelledError extends Error {
+  constructor(
+    message: string,
+    public readonly stage: string | null, // Pipeline stage that was running
+    // Latest counter states
+    public readonly partial: Partial<
+      Record<"bars" | "sweep" | "folds" | "simulations", BacktestProgressEvent>
+    >
+  ) {
+    super(message);
+    this.name = "BacktestCancelledError";
+  }
+}
+
 export class PythonEnvironmentError extends Error {
   constructor(message: string) {
     super(message);
@@ -50,6 +466,56 @@ export class PythonEnvironmentError extends Error {
   }
 }
 
+// CoinGecko OHLC windows and the candle size each returns
+// (1-2 days: 30m, 3-30: 4h, 31+: 4d)
+const DAY_MS = 24 * 60 * 60 * 1000;
+const OHLC_WINDOWS: { days: number; candleMs: number }[] = [
+  { days: 1, candleMs: 30 * 60 * 1000 },
+  { days: 7, candleMs: 4 * 60 * 60 * 1000 },
+  { days: 14, candleMs: 4 * 60 * 60 * 1000 },
+  { days: 30, candleMs: 4 * 60 * 60 * 1000 },
+  { days: 90, candleMs: 4 * DAY_MS },
+  { days: 180, candleMs: 4 * DAY_MS },
+  { days: 365, candleMs: 4 * DAY_MS },
+];
+const DEFAULT_OHLC_DAYS = 365;
+
+// Binary columnar OHLCV handoff, see load_ohlcv_binary() in run_backtest.py
+const OHLCV_BINARY_FILE = "ohlcv.bin";
+const OHLCV_BINARY_MAGIC = Buffer.from("AGXOHLC1", "ascii");
+
+interface PendingWorkerJob {
+  // BacktestResult, or StrategyValidationResult for a validate message
+  resolve: (result: any) => void;
+  reject: (error: Error) => void;
+  timeoutHandle: NodeJS.Timeout;
+  onProgress?: (event: BacktestProgressEvent) => void;
+  pid?: number; // Pool process running the job, reported by its "started" event
+  cancelRequested?: boolean;
+  timedOut?: boolean; // Rejected; the job is being stopped in its pool process
+}
+
+// --- Persistent worker pool state ---
+// A single long-lived `run_backtest.py --worker` process preloads the heavy
+// Python modules once and forks a pool of children that serve jobs.
+const WORKER_JOB_TIMEOUT = 5 * 60 * 1000; // 5 minutes
+const WORKER_KILL_GRACE = 10 * 1000; // SIGTERM to SIGKILL for timed-out jobs
+const WORKER_STDERR_TAIL = 4096;
+
+const workerPool: {
+  process: ChildProcess | null;
+  starting: Promise<ChildProcess> | null; // Shared by concurrent first callers
+  pending: Map<string, PendingWorkerJob>;
+  nextJobId: number;
+  stderrTail: string;
+} = {
+  process: null,
+  starting: null,
+  pending: new Map(),
+  nextJobId: 0,
+  stderrTail: "",
+};
+
 export const pythonExecutorService = {
   /**
    * Validate that Python environment is properly set up
@@ -98,38 +564,79 @@ export const pythonExecutorService = {
    * 3. Fetch OHLCV data from market-data service
    * 4. Create temp directory with strategy, config, and OHLCV data
    * 5. Execute Python script (python-executor wraps with Backtest instance)
-   * 6. Return results (html_report + metrics)
+   * 6. Return results (metrics + html_report or report_path, per config.report)
+   *
+   * options.onProgress receives stage/bar/sweep/fold events as they are
+   * streamed; aborting options.signal cancels the run, which rejects with a
+   * BacktestCancelledError carrying the partial progress (e.g. best sweep so far).
    */
   async runBacktest(
     strategyCode: string,
-    config: BacktestConfig
+    config: BacktestConfig,
+    options: BacktestRunOptions = {}
   ): Promise<BacktestResult> {
-    // Step 1: Validate environment
-    try {
-      await this.validateEnvironment();
-    } catch (error) {
-      if (error instanceof PythonEnvironmentError) {
-        throw error;
+    // Step 1: Validate environment (the worker pool validates once when it starts)
+    const inWorker = this._runsInWorkerPool(config);
+    if (!inWorker) {
+      try {
+        await this.validateEnvironment();
+      } catch (error) {
+        if (error instanceof PythonEnvironmentError) {
+          throw error;
+        }
+        throw new PythonEnvironmentError(`Environment validation failed: ${error}`);
       }
-      throw new PythonEnvironmentError(`Environment validation failed: ${error}`);
     }
 
-    // Step 2: Validate strategy code (stub - always passes)
+    // Step 2: Validate strategy code (static checks, in the worker pool when it is enabled)
     let validatedCode: string;
     try {
-      validatedCode = await this.validateStrategyCode(strategyCode);
+      validatedCode = await this.validateStrategyCode(
+        strategyCode,
+        Boolean(config.portfolio)
+      );
     } catch (error) {
+      if (error instanceof StrategyValidationError) {
+        throw error;
+      }
       throw new Error(`Strategy validation failed: ${error}`);
     }
 
-    // Step 3: Fetch OHLCV data
+    // Step 3: Fetch OHLCV data (runs on the local candle store read it in the runner).
+    // lookback "auto" without days fetches only the window covering the warm-up
+    // and startDate
     const coinId = config.coinId || "bitcoin";
-    const days = config.days || 365;
-    let ohlcvData: OHLCVData[];
-    try {
-      ohlcvData = await this.fetchOHLCVData(coinId, days);
-    } catch (error) {
-      throw new Error(`Failed to fetch market data: ${error}`);
+    let days = config.days || DEFAULT_OHLC_DAYS;
+    if (
+      config.lookback === "auto" &&
+      !config.days &&
+      !config.resolution &&
+      !config.portfolio
+    ) {
+      try {
+        days = this._ohlcWindowDays(
+          config.startDate,
+          await this.inferLookback(validatedCode, config)
+        );
+      } catch (error) {
+        console.warn(`Strategy lookback inference failed, fetching ${days} days: ${error}`);
+      }
+    }
+    let ohlcvData: OHLCVData[] | undefined;
+    const assetData: Record<string, OHLCVData[]> = {};
+    if (!config.resolution) {
+      try {
+        if (config.portfolio) {
+          // Sequential to stay within market-data rate limits
+          for (const asset of config.portfolio.assets) {
+            assetData[asset] = await this.fetchOHLCVData(asset, days);
+          }
+        } else {
+          ohlcvData = await this.fetchOHLCVData(coinId, days);
+        }
+      } catch (error) {
+        throw new Error(`Failed to fetch market data: ${error}`);
+      }
     }
 
     // Step 4: Setup temp directory with all files
@@ -140,34 +647,335 @@ export const pythonExecutorService = {
       const strategyPath = path.join(tmpDir, "strategy.py");
       await fs.writeFile(strategyPath, validatedCode, "utf-8");
 
-      // Write config to temp file
+      // Write config to temp file (deferred reports are stored outside the temp dir)
       const configPath = path.join(tmpDir, "config.json");
-      await fs.writeFile(configPath, JSON.stringify(config), "utf-8");
+      const runConfig: BacktestConfig & {
+        reportPath?: string;
+        candleStore?: { path: string; coinId: string; resolution: string };
+      } = {
+        ...config,
+        limits: config.limits ?? this._defaultLimits(),
+      };
+      if (config.report === "deferred") {
+        runConfig.reportPath = await this._createReportPath();
+      }
+      if (config.resolution) {
+        runConfig.candleStore = {
+          path: this._candleStoreDir(),
+          coinId,
+          resolution: config.resolution,
+        };
+      }
+      await fs.writeFile(configPath, JSON.stringify(runConfig), "utf-8");
 
       // Write OHLCV data to temp file
-      await this._writeOHLCVData(tmpDir, ohlcvData);
+      if (ohlcvData) {
+        await this._writeOHLCVData(tmpDir, ohlcvData);
+      }
+      // Portfolio assets are read from assets/<coinId>/ohlcv.bin
+      for (const [asset, data] of Object.entries(assetData)) {
+        const assetDir = path.join(tmpDir, "assets", asset);
+        await fs.mkdir(assetDir, { recursive: true });
+        await this._writeOHLCVData(assetDir, data);
+      }
 
-      // Step 5: Execute Python script
-      const scriptPath = path.join(__dirname, "../../../scripts/run_backtest.py");
-      const result = await this._executePython(scriptPath, [tmpDir]);
+      // Step 5: Execute Python script (persistent worker pool or one-shot process)
+      let result: BacktestResult | CancelledRun;
+      if (inWorker) {
+        result = await this._executeInWorker(tmpDir, options);
+      } else {
+        const scriptPath = path.join(__dirname, "../../../scripts/run_backtest.py");
+        const { onProgress, signal } = options;
+        const output = onProgress
+          ? await this._executePython(
+              scriptPath,
+              [tmpDir, "--progress"],
+              (line) => this._handleProgressLine(line, onProgress),
+              signal
+            )
+          : await this._executePython(scriptPath, [tmpDir], undefined, signal);
+
+        // Step 6: Parse the result (the last line, after any progress events)
+        const lines = output.trim().split("\n");
+        result = JSON.parse(lines[lines.length - 1]);
+      }
 
-      // Step 6: Parse and return result
-      return JSON.parse(result);
+      if ("cancelled" in result) {
+        throw new BacktestCancelledError(
+          `Backtest cancelled (${result.reason}) during ${result.stage ?? "setup"}`,
+          result.stage,
+          result.partial
+        );
+      }
+      return result;
     } finally {
       // Cleanup temp files
       await this._cleanupTempDirectory(tmpDir);
     }
   },
 
+  /**
+   * Run many strategies across many coins in one Python invocation
+   *
+   * Each coin's OHLCV is fetched and written once and each strategy compiled
+   * once; the runner executes the jobs (default: every strategy x coin) on a
+   * process pool. onJob is called as each job finishes.
+   */
+  async runBacktestBatch(
+    strategies: Record<string, string>,
+    coinIds: string[],
+    config: BacktestConfig,
+    options: {
+      jobs?: BatchBacktestJob[];
+      workers?: number;
+      onJob?: (result: BatchJobResult) => void;
+    } = {}
+  ): Promise<BatchBacktestResult> {
+    await this.validateEnvironment();
+
+    const validated: Record<string, string> = {};
+    for (const [id, code] of Object.entries(strategies)) {
+      try {
+        validated[id] = await this.validateStrategyCode(code);
+      } catch (error) {
+        if (error instanceof StrategyValidationError) {
+          throw error;
+        }
+        throw new Error(`Strategy validation failed for ${id}: ${error}`);
+      }
+    }
+
+    // Fetch sequentially to stay within market-data rate limits
+    const days = config.days || 365;
+    const ohlcvByCoin: Record<string, OHLCVData[]> = {};
+    for (const coinId of coinIds) {
+      try {
+        ohlcvByCoin[coinId] = await this.fetchOHLCVData(coinId, days);
+      } catch (error) {
+        throw new Error(`Failed to fetch market data for ${coinId}: ${error}`);
+      }
+    }
+
+    const tmpDir = await this._createTempDirectory();
+
+    try {
+      // Files are named by position so ids never have to be valid file names
+      const manifest = {
+        config: { ...config, report: "none" },
+        strategies: {} as Record<string, string>,
+        datasets: {} as Record<string, string>,
+        jobs: options.jobs?.map((job) => ({
+          strategy: job.strategy,
+          dataset: job.coinId,
+          config: job.config,
+        })),
+        workers: options.workers,
+      };
+
+      const strategyIds = Object.keys(validated);
+      for (const [i, id] of strategyIds.entries()) {
+        manifest.strategies[id] = `strategy-${i}.py`;
+        await fs.writeFile(
+          path.join(tmpDir, manifest.strategies[id]),
+          validated[id],
+          "utf-8"
+        );
+      }
+
+      for (const [i, coinId] of coinIds.entries()) {
+        manifest.datasets[coinId] = `dataset-${i}`;
+        const datasetDir = path.join(tmpDir, manifest.datasets[coinId]);
+        await fs.mkdir(datasetDir, { recursive: true });
+        await this._writeOHLCVData(datasetDir, ohlcvByCoin[coinId]);
+      }
+
+      const manifestPath = path.join(tmpDir, "manifest.json");
+      await fs.writeFile(manifestPath, JSON.stringify(manifest), "utf-8");
+
+      const jobs: BatchJobResult[] = [];
+      let summary: BatchSummary | undefined;
+      const scriptPath = path.join(__dirname, "../../../scripts/run_backtest.py");
+      await this._executePython(scriptPath, ["--batch", manifestPath], (line) => {
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch {
+          return; // Not a protocol line
+        }
+        if (message.event === "job") {
+          jobs.push(message);
+          options.onJob?.(message);
+        } else if (message.event === "summary") {
+          summary = message;
+        }
+      });
+
+      if (!summary) {
+        throw new PythonExecutorError("Batch run finished without a summary", "", "");
+      }
+      return { jobs: jobs.sort((a, b) => a.index - b.index), summary };
+    } finally {
+      await this._cleanupTempDirectory(tmpDir);
+    }
+  },
+
+  /**
+   * Render the HTML report for a run made with report: "deferred"
+   */
+  async renderReport(reportPath: string): Promise<string> {
+    const scriptPath = path.join(__dirname, "../../../scripts/run_backtest.py");
+    const result = await this._executePython(scriptPath, ["--render-report", reportPath]);
+    return JSON.parse(result).html_report;
+  },
+
+  /**
+   * Append recent CoinGecko candles to the local candle store (see ohlcv_store.py)
+   *
+   * CoinGecko picks the candle size from `days` (1-2: 30m, 3-30: 4h, 31+: 4d),
+   * so each resolution must always be synced with a matching window. Candles
+   * already stored are replaced, so overlapping windows are safe.
+   */
+  async syncCandleStore(
+    coinId: string,
+    resolution: string,
+    days: number
+  ): Promise<CandleStoreSyncResult> {
+    const ohlcvData = await this.fetchOHLCVData(coinId, days);
+    if (ohlcvData.length === 0) {
+      throw new Error(`No candles returned for ${coinId} (${days} days)`);
+    }
+
+    const tmpDir = await this._createTempDirectory();
+    try {
+      await this._writeOHLCVData(tmpDir, ohlcvData);
+      const scriptPath = path.join(__dirname, "../../../scripts/ohlcv_store.py");
+      const output = await this._executePython(scriptPath, [
+        "append",
+        this._candleStoreDir(),
+        coinId,
+        resolution,
+        path.join(tmpDir, OHLCV_BINARY_FILE),
+      ]);
+      return JSON.parse(output.trim().split("\n").pop()!);
+    } finally {
+      await this._cleanupTempDirectory(tmpDir);
+    }
+  },
+
+  /**
+   * Infer the warm-up a strategy needs before config.startDate from its source
+   *
+   * Runs backtest_lookback.py, which parses the code without executing it.
+   */
+  async inferLookback(
+    strategyCode: string,
+    config: BacktestConfig
+  ): Promise<StrategyLookback> {
+    const tmpDir = await this._createTempDirectory();
+    try {
+      await fs.writeFile(path.join(tmpDir, "strategy.py"), strategyCode, "utf-8");
+      await fs.writeFile(path.join(tmpDir, "config.json"), JSON.stringify(config), "utf-8");
+      const scriptPath = path.join(__dirname, "../../../scripts/backtest_lookback.py");
+      const output = await this._executePython(scriptPath, [tmpDir]);
+      return JSON.parse(output.trim().split("\n").pop()!);
+    } finally {
+      await this._cleanupTempDirectory(tmpDir);
+    }
+  },
+
+  /**
+   * Smallest CoinGecko OHLC window covering startDate, the strategy's warm-up
+   * at that window's candle size and the still-forming candle (the default
+   * 365 days when none does). Short ranges therefore also get finer candles.
+   */
+  _ohlcWindowDays(
+    startDate: string,
+    lookback: StrategyLookback,
+    now: number = Date.now()
+  ): number {
+    const rangeMs = now - new Date(startDate).getTime();
+    const window = OHLC_WINDOWS.find(
+      ({ days, candleMs }) =>
+        days * DAY_MS >=
+        rangeMs + Math.max(lookback.bars * candleMs, lookback.duration_ms) + candleMs
+    );
+    return window?.days ?? DEFAULT_OHLC_DAYS;
+  },
+
+  /**
+   * Root of the local candle store
+   * (BACKTEST_CANDLE_STORE_DIR, default <tmpdir>/agentix-candles)
+   */
+  _candleStoreDir(): string {
+    return (
+      process.env.BACKTEST_CANDLE_STORE_DIR || path.join(os.tmpdir(), "agentix-candles")
+    );
+  },
+
+  /**
+   * Per-run resource budgets from the environment (undefined when none are set)
+   */
+  _defaultLimits(): BacktestLimits | undefined {
+    const fromEnv = (name: string) =>
+      process.env[name] ? Number(process.env[name]) : undefined;
+    const limits: BacktestLimits = {
+      memoryMb: fromEnv("BACKTEST_MAX_MEMORY_MB"),
+      cpuSeconds: fromEnv("BACKTEST_MAX_CPU_SECONDS"),
+      barMs: fromEnv("BACKTEST_MAX_BAR_MS"),
+    };
+    return Object.values(limits).some((value) => value !== undefined) ? limits : undefined;
+  },
+
+  /**
+   * Allocate a file path for deferred report data
+   * (BACKTEST_REPORT_DIR, default <tmpdir>/agentix-backtest-reports)
+   */
+  async _createReportPath(): Promise<string> {
+    const reportDir =
+      process.env.BACKTEST_REPORT_DIR || path.join(os.tmpdir(), "agentix-backtest-reports");
+    await fs.mkdir(reportDir, { recursive: true });
+    return path.join(
+      reportDir,
+      `report-${Date.now()}-${Math.random().toString(36).substring(2, 11)}.npz`
+    );
+  },
+
+  /**
+   * Forward a progress event line from a --progress run (the result line is ignored)
+   */
+  _handleProgressLine(
+    line: string,
+    onProgress: (event: BacktestProgressEvent) => void
+  ): void {
+    let message;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      return; // Not a protocol line
+    }
+    if (message.event) {
+      onProgress(message);
+    }
+  },
+
   /**
    * Execute Python script with given arguments
-   * Returns stdout if successful, throws error with stderr on failure
+   * Returns stdout if successful, throws error with stderr on failure.
+   * onLine, when given, receives each complete stdout line as it arrives.
+   * Aborting signal sends SIGTERM; run_backtest.py then prints a cancelled
+   * result with its partial progress and exits normally.
    */
-  async _executePython(scriptPath: string, args: string[]): Promise<string> {
+  async _executePython(
+    scriptPath: string,
+    args: string[],
+    onLine?: (line: string) => void,
+    signal?: AbortSignal
+  ): Promise<string> {
     return new Promise((resolve, reject) => {
       const timeout = 5 * 60 * 1000; // 5 minutes
       let stdoutData = "";
       let stderrData = "";
+      let lineBuffer = "";
       let timedOut = false;
 
       const pythonProcess = spawn("python3", [scriptPath, ...args], {
@@ -184,9 +992,30 @@ export const pythonExecutorService = {
         pythonProcess.kill("SIGTERM");
       }, timeout);
 
+      const onAbort = () => {
+        pythonProcess.kill("SIGTERM");
+      };
+      if (signal?.aborted) {
+        onAbort();
+      } else {
+        signal?.addEventListener("abort", onAbort, { once: true });
+      }
+
       // Collect stdout
       pythonProcess.stdout?.on("data", (data: Buffer) => {
-        stdoutData += data.toString();
+        const chunk = data.toString();
+        stdoutData += chunk;
+
+        if (onLine) {
+          lineBuffer += chunk;
+          const lines = lineBuffer.split("\n");
+          lineBuffer = lines.pop() ?? "";
+          for (const line of lines) {
+            if (line.trim()) {
+              onLine(line);
+            }
+          }
+        }
       });
 
       // Collect stderr
@@ -197,6 +1026,7 @@ export const pythonExecutorService = {
       // Handle process exit
       pythonProcess.on("close", (code: number | null) => {
         clearTimeout(timeoutHandle);
+        signal?.removeEventListener("abort", onAbort);
 
         if (timedOut) {
           reject(
@@ -210,15 +1040,23 @@ export const pythonExecutorService = {
         }
 
         if (code !== 0) {
-          // Try to parse error JSON from stderr first
+          // Try to parse the error JSON (the last stderr line, after any log output) first
           try {
-            const errorObj = JSON.parse(stderrData);
+            const errorObj = JSON.parse(stderrData.trim().split("\n").pop() ?? "");
             reject(
-              new PythonExecutorError(
-                errorObj.error || "Python script failed",
-                stderrData,
-                stdoutData
-              )
+              errorObj.limit
+                ? new BacktestLimitError(
+                    errorObj.error,
+                    errorObj.limit.name,
+                    errorObj.limit.budget,
+                    stderrData,
+                    stdoutData
+                  )
+                : new PythonExecutorError(
+                    errorObj.error || "Python script failed",
+                    stderrData,
+                    stdoutData
+                  )
             );
           } catch {
             reject(
@@ -250,6 +1088,7 @@ export const pythonExecutorService = {
       // Handle process errors
       pythonProcess.on("error", (err: Error) => {
         clearTimeout(timeoutHandle);
+        signal?.removeEventListener("abort", onAbort);
         reject(
           new PythonExecutorError(
             `Failed to spawn Python process: ${err.message}`,
@@ -261,6 +1100,315 @@ export const pythonExecutorService = {
     });
   },
 
+  /**
+   * Whether backtests are dispatched to the persistent worker pool.
+   * Enabled with BACKTEST_WORKER_POOL=true; otherwise each run spawns python3.
+   */
+  _useWorkerPool(): boolean {
+    return process.env.BACKTEST_WORKER_POOL === "true";
+  },
+
+  /**
+   * Whether a run goes to the worker pool. Runs that fan out over a process
+   * pool of their own (optimize, walkForward, robustness) use a one-shot
+   * process instead: pool processes are daemonic and would run them serially.
+   */
+  _runsInWorkerPool(config: BacktestConfig): boolean {
+    return (
+      this._useWorkerPool() &&
+      !(config.optimize || config.walkForward || config.robustness)
+    );
+  },
+
+  /**
+   * Get the running worker process, starting it on first use
+   *
+   * Pool size defaults to the CPU count (BACKTEST_WORKER_POOL_SIZE overrides)
+   * and each forked child is recycled after BACKTEST_WORKER_MAX_JOBS jobs.
+   */
+  async _getWorker(): Promise<ChildProcess> {
+    if (workerPool.process) {
+      return workerPool.process;
+    }
+    if (!workerPool.starting) {
+      workerPool.starting = this._startWorker().finally(() => {
+        workerPool.starting = null;
+      });
+    }
+    return workerPool.starting;
+  },
+
+  /**
+   * Validate the environment and spawn the worker process (see _getWorker)
+   */
+  async _startWorker(): Promise<ChildProcess> {
+    await this.validateEnvironment();
+
+    const scriptPath = path.join(__dirname, "../../../scripts/run_backtest.py");
+    const args = [scriptPath, "--worker"];
+    if (process.env.BACKTEST_WORKER_POOL_SIZE) {
+      args.push("--pool-size", process.env.BACKTEST_WORKER_POOL_SIZE);
+    }
+    if (process.env.BACKTEST_WORKER_MAX_JOBS) {
+      args.push("--max-jobs-per-child", process.env.BACKTEST_WORKER_MAX_JOBS);
+    }
+
+    const worker = spawn("python3", args, {
+      env: {
+        ...process.env,
+        PYTHONUNBUFFERED: "1",
+      },
+    });
+    workerPool.process = worker;
+    workerPool.stderrTail = "";
+
+    readline.createInterface({ input: worker.stdout! }).on("line", (line: string) => {
+      this._handleWorkerMessage(line);
+    });
+
+    // Keep only the tail of stderr for error reporting
+    worker.stderr?.on("data", (data: Buffer) => {
+      workerPool.stderrTail = (workerPool.stderrTail + data.toString()).slice(
+        -WORKER_STDERR_TAIL
+      );
+    });
+
+    const onWorkerGone = (reason: string) => {
+      if (workerPool.process !== worker) {
+        return;
+      }
+      workerPool.process = null;
+      for (const [jobId, job] of workerPool.pending) {
+        clearTimeout(job.timeoutHandle);
+        job.reject(new PythonExecutorError(reason, workerPool.stderrTail, ""));
+        workerPool.pending.delete(jobId);
+      }
+    };
+
+    worker.on("exit", (code: number | null) => {
+      onWorkerGone(`Backtest worker exited with code ${code}`);
+    });
+    worker.on("error", (err: Error) => {
+      onWorkerGone(`Failed to spawn backtest worker: ${err.message}`);
+    });
+
+    console.log(`✓ Backtest worker pool started (pid ${worker.pid})`);
+    return worker;
+  },
+
+  /**
+   * Handle one JSON line written by the worker process
+   */
+  _handleWorkerMessage(line: string): void {
+    let message: any;
+    try {
+      message = JSON.parse(line);
+    } catch {
+      console.error(`[backtest-worker] Unparseable worker output: ${line.slice(0, 200)}`);
+      return;
+    }
+
+    if (message.event) {
+      const job = message.id ? workerPool.pending.get(message.id) : undefined;
+      if (!job) {
+        console.log(`[backtest-worker] ${message.event}`, message);
+        return;
+      }
+      const { id: _id, ...event } = message;
+      if (event.event === "started") {
+        job.pid = event.pid;
+        if (job.cancelRequested) {
+          this._cancelWorkerJob(job);
+        }
+        if (job.timedOut) {
+          this._killWorkerJobAfterGrace(message.id, job);
+        }
+      }
+      job.onProgress?.(event);
+      return;
+    }
+
+    const job = workerPool.pending.get(message.id);
+    if (!job) {
+      return; // Timed out or unknown job
+    }
+
+    workerPool.pending.delete(message.id);
+    clearTimeout(job.timeoutHandle);
+
+    if (message.error !== undefined) {
+      job.reject(
+        message.limit
+          ? new BacktestLimitError(
+              message.error,
+              message.limit.name,
+              message.limit.budget,
+              "",
+              line
+            )
+          : new PythonExecutorError(message.error, message.traceback || "", line)
+      );
+      return;
+    }
+
+    job.resolve(message.result);
+  },
+
+  /**
+   * Dispatch a prepared temp directory to the persistent worker pool
+   *
+   * With onProgress or signal the job streams its events; aborting signals
+   * the pool process running the job, which resolves with a cancelled result.
+   */
+  async _executeInWorker(
+    tmpDir: string,
+    options: BacktestRunOptions = {}
+  ): Promise<BacktestResult> {
+    const worker = await this._getWorker();
+    const jobId = `job-${++workerPool.nextJobId}`;
+    const { onProgress, signal } = options;
+    const progress = Boolean(onProgress || signal);
+
+    return new Promise((resolve, reject) => {
+      const onAbort = () => {
+        const job = workerPool.pending.get(jobId);
+        if (job) {
+          this._cancelWorkerJob(job);
+        }
+      };
+      const settle = <T>(callback: (value: T) => void) => (value: T) => {
+        signal?.removeEventListener("abort", onAbort);
+        callback(value);
+      };
+
+      const timeoutHandle = setTimeout(() => {
+        signal?.removeEventListener("abort", onAbort);
+        reject(
+          new PythonExecutorError(
+            "Python execution timed out after 5 minutes",
+            workerPool.stderrTail,
+            ""
+          )
+        );
+        const job = workerPool.pending.get(jobId);
+        if (job) {
+          this._stopTimedOutWorkerJob(jobId, job);
+        }
+      }, WORKER_JOB_TIMEOUT);
+
+      workerPool.pending.set(jobId, {
+        resolve: settle(resolve),
+        reject: settle(reject),
+        timeoutHandle,
+        onProgress,
+      });
+      worker.stdin?.write(
+        JSON.stringify(
+          progress
+            ? { id: jobId, tmp_dir: tmpDir, progress }
+            : { id: jobId, tmp_dir: tmpDir }
+        ) + "\n"
+      );
+
+      if (signal?.aborted) {
+        onAbort();
+      } else {
+        signal?.addEventListener("abort", onAbort, { once: true });
+      }
+    });
+  },
+
+  /**
+   * Run the static checks of strategy code in the persistent worker process
+   *
+   * The worker answers validate messages itself, without a pool process or a
+   * temp directory.
+   */
+  async _validateInWorker(
+    strategyCode: string,
+    portfolio: boolean
+  ): Promise<StrategyValidationResult> {
+    const worker = await this._getWorker();
+    const jobId = `validate-${++workerPool.nextJobId}`;
+
+    return new Promise((resolve, reject) => {
+      const timeoutHandle = setTimeout(() => {
+        workerPool.pending.delete(jobId);
+        reject(
+          new PythonExecutorError(
+            "Strategy validation timed out after 5 minutes",
+            workerPool.stderrTail,
+            ""
+          )
+        );
+      }, WORKER_JOB_TIMEOUT);
+
+      workerPool.pending.set(jobId, { resolve, reject, timeoutHandle });
+      const message = portfolio
+        ? { id: jobId, validate: strategyCode, portfolio }
+        : { id: jobId, validate: strategyCode };
+      worker.stdin?.write(JSON.stringify(message) + "\n");
+    });
+  },
+
+  /**
+   * SIGTERM the pool process running a job (once it has reported its pid)
+   */
+  _cancelWorkerJob(job: PendingWorkerJob): void {
+    job.cancelRequested = true;
+    if (job.pid === undefined) {
+      return; // Not started yet; cancelled when its "started" event arrives
+    }
+    try {
+      process.kill(job.pid, "SIGTERM");
+    } catch (error) {
+      console.error(`[backtest-worker] Failed to cancel job in process ${job.pid}:`, error);
+    }
+  },
+
+  /**
+   * Free the pool process of a job that has timed out
+   *
+   * The job is already rejected; it gets the cancel SIGTERM and, if it has not
+   * finished WORKER_KILL_GRACE later (e.g. stuck in native code), its pool
+   * process is SIGKILLed so it cannot hold the slot.
+   */
+  _stopTimedOutWorkerJob(jobId: string, job: PendingWorkerJob): void {
+    job.timedOut = true;
+    job.resolve = () => {};
+    job.reject = () => {};
+    this._cancelWorkerJob(job);
+    if (job.pid !== undefined) {
+      this._killWorkerJobAfterGrace(jobId, job);
+    }
+  },
+
+  /**
+   * SIGKILL a timed-out job's pool process unless the job finishes within the grace period
+   */
+  _killWorkerJobAfterGrace(jobId: string, job: PendingWorkerJob): void {
+    job.timeoutHandle = setTimeout(() => {
+      if (workerPool.pending.get(jobId) !== job) {
+        return;
+      }
+      workerPool.pending.delete(jobId);
+      try {
+        process.kill(job.pid!, "SIGKILL");
+      } catch (error) {
+        console.error(`[backtest-worker] Failed to kill process ${job.pid}:`, error);
+      }
+      // The pool replaces the process; tell the worker not to wait for the lost job
+      workerPool.process?.stdin?.write(JSON.stringify({ abandon: jobId }) + "\n");
+    }, WORKER_KILL_GRACE);
+  },
+
+  /**
+   * Stop the worker pool; in-flight jobs finish before the process exits
+   */
+  shutdownWorkerPool(): void {
+    workerPool.process?.stdin?.end();
+  },
+
   /**
    * Create temporary directory for strategy and config files
    */
@@ -280,18 +1428,11 @@ export const pythonExecutorService = {
   },
 
   /**
-   * Cleanup temporary directory and files
+   * Cleanup temporary directory, including per-dataset and per-asset subdirectories
    */
   async _cleanupTempDirectory(tmpDir: string): Promise<void> {
     try {
-      // Remove all files in directory
-      const files = await fs.readdir(tmpDir);
-      for (const file of files) {
-        await fs.unlink(path.join(tmpDir, file));
-      }
-
-      // Remove directory
-      await fs.rmdir(tmpDir);
+      await fs.rm(tmpDir, { recursive: true, force: true });
     } catch (error) {
       // Log but don't throw - cleanup failure shouldn't break the system
       console.error(`Failed to cleanup temp directory ${tmpDir}:`, error);
@@ -301,75 +1442,63 @@ export const pythonExecutorService = {
   /**
    * Validate strategy code before execution
    *
-   * Checks that user code:
-   * 1. Defines a Strategy class
-   * 2. Only uses whitelisted imports
-   * 3. Doesn't contain dangerous patterns
-   * 4. Can be compiled without syntax errors
-   *
-   * This is Option 2 validation: Users write Strategy class only,
-   * system handles Backtest instantiation + parameter control
+   * Runs the static checks of scripts/backtest_validate.py, which parses the
+   * code without importing the backtesting stack: syntax, RestrictedPython
+   * rules, whitelisted imports, sandbox builtins and a Strategy subclass
+   * (PortfolioStrategy for portfolio runs) with its required methods.
+   * Returns the code, or rejects with a StrategyValidationError listing
+   * every problem with its line.
    */
-  async validateStrategyCode(strategyCode: string): Promise<string> {
-    const whitelistedImports = [
-      "backtesting",
-      "numpy",
-      "np",
-      "pandas",
-      "pd",
-      "talib",
-    ];
-
-    const dangerousPatterns = [
-      /import\s+os\b/,
-      /import\s+sys\b/,
-      /import\s+socket\b/,
-      /import\s+subprocess\b/,
-      /import\s+urllib\b/,
-      /import\s+requests\b/,
-      /from\s+os\b/,
-      /from\s+sys\b/,
-      /open\s*\(/,
-      /exec\s*\(/,
-      /eval\s*\(/,
-      /__import__/,
-    ];
-
-    // Check for Strategy class definition
-    if (!/class\s+\w+\s*\(\s*Strategy\s*\)/m.test(strategyCode)) {
-      throw new Error(
-        'Strategy code must define a class that inherits from Strategy.\n' +
-        'Example: class MyStrategy(Strategy):'
+  async validateStrategyCode(
+    strategyCode: string,
+    portfolio: boolean = false
+  ): Promise<string> {
+    const result = await this.checkStrategyCode(strategyCode, portfolio);
+    if (!result.valid) {
+      const lines = result.errors.map((error) =>
+        error.line === null ? error.message : `Line ${error.line}: ${error.message}`
       );
+      throw new StrategyValidationError(lines.join("\n"), result.errors);
     }
+    return strategyCode;
+  },
 
-    // Check for dangerous patterns
-    for (const pattern of dangerousPatterns) {
-      if (pattern.test(strategyCode)) {
-        throw new Error(
-          `Dangerous pattern detected: ${pattern.source}\n` +
-          'For security, only these imports are allowed: backtesting, numpy, pandas, talib'
-        );
-      }
+  /**
+   * Static check results for strategy code (see validateStrategyCode)
+   *
+   * With the worker pool enabled the warm worker process runs the checks;
+   * otherwise backtest_validate.py is spawned for them.
+   */
+  async checkStrategyCode(
+    strategyCode: string,
+    portfolio: boolean = false
+  ): Promise<StrategyValidationResult> {
+    if (this._useWorkerPool()) {
+      return this._validateInWorker(strategyCode, portfolio);
     }
-
-    // Basic syntax check - try to compile with Python syntax rules
-    // (This is a simple JS-level check; Python will do the final validation)
-    if (strategyCode.match(/^\s*$/) || !strategyCode.includes('def ')) {
-      throw new Error(
-        'Strategy code appears incomplete. Must define init() and next() methods.'
+    const tmpDir = await this._createTempDirectory();
+    try {
+      const strategyPath = path.join(tmpDir, "strategy.py");
+      await fs.writeFile(strategyPath, strategyCode, "utf-8");
+      const scriptPath = path.join(__dirname, "../../../scripts/backtest_validate.py");
+      const output = await this._executePython(
+        scriptPath,
+        portfolio ? [strategyPath, "--portfolio"] : [strategyPath]
       );
+      return JSON.parse(output.trim().split("\n").pop()!);
+    } finally {
+      await this._cleanupTempDirectory(tmpDir);
     }
-
-    console.log("✓ Strategy code validation passed");
-    return strategyCode;
   },
 
   /**
    * Fetch OHLCV data from market-data service
    * Uses CoinGecko API via existing marketDataService
    */
-  async fetchOHLCVData(coinId: string = "bitcoin", days: number = 365): Promise<OHLCVData[]> {
+  async fetchOHLCVData(
+    coinId: string = "bitcoin",
+    days: number = 365
+  ): Promise<OHLCVData[]> {
     try {
       console.log(`Fetching OHLCV data for ${coinId} (${days} days)...`);
 
@@ -393,15 +1522,69 @@ export const pythonExecutorService = {
   },
 
   /**
-   * Write OHLCV data to temp directory as JSON
+   * Write OHLCV data to temp directory as a binary columnar file (ohlcv.bin)
+   *
+   * run_backtest.py memory-maps the columns straight into its DataFrame;
+   * ohlcv.json is still accepted there as a fallback.
    */
   async _writeOHLCVData(tmpDir: string, ohlcvData: OHLCVData[]): Promise<void> {
     try {
-      const ohlcvPath = path.join(tmpDir, "ohlcv.json");
-      await fs.writeFile(ohlcvPath, JSON.stringify(ohlcvData), "utf-8");
+      const ohlcvPath = path.join(tmpDir, OHLCV_BINARY_FILE);
+      await fs.writeFile(ohlcvPath, this._encodeOHLCVBinary(ohlcvData));
       console.log(`✓ OHLCV data written to ${ohlcvPath}`);
     } catch (error) {
       throw new Error(`Failed to write OHLCV data: ${error}`);
     }
   },
+
+  /**
+   * Encode candles in the columnar layout read by load_ohlcv_binary():
+   * magic, uint32 header length, JSON header, then (8-byte aligned) int64 ms
+   * timestamps followed by one float64 block per price column. Little-endian.
+   */
+  _encodeOHLCVBinary(ohlcvData: OHLCVData[]): Buffer {
+    const rows = ohlcvData.length;
+    const columns = ["Open", "High", "Low", "Close"];
+    const fields: (keyof OHLCVData)[] = ["open", "high", "low", "close"];
+
+    const headerFor = (dataOffset: number) =>
+      Buffer.from(
+        JSON.stringify({
+          version: 1,
+          rows,
+          columns,
+          timestamp_unit: "ms",
+          data_offset: dataOffset,
+        }),
+        "utf-8"
+      );
+    // The offset is part of the header, so size the header with a padded placeholder first
+    const prefixLength = OHLCV_BINARY_MAGIC.length + 4;
+    const headerLength = headerFor(0).length + 16;
+    const dataOffset = Math.ceil((prefixLength + headerLength) / 8) * 8;
+    const header = Buffer.alloc(headerLength, " ");
+    headerFor(dataOffset).copy(header);
+
+    const buffer = Buffer.alloc(dataOffset + rows * 8 * (1 + columns.length));
+    OHLCV_BINARY_MAGIC.copy(buffer, 0);
+    buffer.writeUInt32LE(headerLength, OHLCV_BINARY_MAGIC.length);
+    header.copy(buffer, prefixLength);
+
+    const view = new DataView(buffer.buffer, buffer.byteOffset, buffer.byteLength);
+    for (let i = 0; i < rows; i++) {
+      view.setBigInt64(
+        dataOffset + i * 8,
+        BigInt(Math.round(ohlcvData[i].timestamp)),
+        true
+      );
+    }
+    fields.forEach((field, column) => {
+      const columnOffset = dataOffset + rows * 8 * (1 + column);
+      for (let i = 0; i < rows; i++) {
+        view.setFloat64(columnOffset + i * 8, ohlcvData[i][field], true);
+      }
+    });
+
+    return buffer;
+  },
 };
@@ -1,9 +1,9 @@
+import { indicatorService } from "@/services/trading/indicator-service";
 import { RsiParams, StrategyContext } from "@/types/strategy";
-import { python } from "pythonia";
 
 /**
  * Checks if the Relative Strength Index (RSI) has crossed a certain level.
- * Uses ta-lib via pythonia for accurate RSI calculation.
+ * Uses the incremental Wilder RSI from indicatorService (talib-equivalent).
  *
  * @param params - The parameters for this strategy (period, overbought, oversold).
  * @param context - The shared context containing historical market data.
@@ -21,21 +21,12 @@ export async function check(
     return false;
   }
 
-  const np = await python("numpy");
-  const talib = await python("talib");
-  const json = await python("json");
+  const [{ value: currentRsi }] = await indicatorService.evaluate(
+    context.assetId,
+    historicalData,
+    [{ type: "rsi", period }]
+  );
 
-  const closingPrices = historicalData.map((data: any) => data.price);
-  
-  const rsi_output = await talib.RSI(await np.array(closingPrices, "float64"), period);
-  const rsi_list = await rsi_output.tolist();
-  
-  const rsi_json_string = await json.dumps(rsi_list);
-  const fixed_rsi_string = rsi_json_string.replace(/\bNaN\b/g, "null");
-  const rsi_js_array = JSON.parse(fixed_rsi_string);
-  
-  const currentRsi = rsi_js_array[rsi_js_array.length - 1];
-  
   if (currentRsi === null) {
     console.warn(`[RSI] RSI calculation returned null for trade ${tradeActionId}. Not enough data.`);
     return false;
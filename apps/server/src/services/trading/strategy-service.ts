@@ -136,6 +136,20 @@ export const strategyService = {
       .execute();
   },
 
+  /**
+   * Active strategies of every trade that is currently being monitored (EXECUTING)
+   */
+  async getActiveMonitoredStrategies(): Promise<Selectable<TradeStrategiesTable>[]> {
+    return await db
+      .selectFrom("trade_strategies")
+      .innerJoin("trade_actions", "trade_actions.id", "trade_strategies.trade_action_id")
+      .where("trade_strategies.is_active", "=", true)
+      .where("trade_actions.status", "=", "EXECUTING")
+      .selectAll("trade_strategies")
+      .orderBy("trade_strategies.id")
+      .execute();
+  },
+
   async updateStrategy(
     tradeActionId: number,
     currentStrategy: Strategy,
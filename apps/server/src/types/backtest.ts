@@ -0,0 +1,20 @@
+// Downsampled chart data (see backtest_series.py); arrays are base64 little-endian,
+// timestamps (ms since epoch) float64 and everything else float32. Decode them with
+// decodeSeriesArray() in services/trading/python-executor-service.ts.
+export interface BacktestSeries {
+  bars: number; // Bars simulated
+  points: number; // Bars kept
+  timestamp: string;
+  equity: string;
+  drawdown: string; // Percent, negative like max_drawdown
+  trades: {
+    count: number; // Markers kept, largest returns first
+    total: number; // Closed trades
+    entry_time: string;
+    exit_time: string;
+    entry_price: string;
+    exit_price: string;
+    size: string; // Negative for shorts
+    return_pct: string;
+  };
+}
@@ -12,7 +12,6 @@
 
 from backtesting import Strategy
 from backtesting.lib import crossover
-import numpy as np
 
 
 class SmaCrossover(Strategy):
@@ -29,10 +28,10 @@ class SmaCrossover(Strategy):
 
     def init(self):
         """Initialize indicators"""
-        # Calculate Moving Averages using the built-in I() function
+        # Calculate Moving Averages with the built-in indicators, wrapped in I()
         close = self.data.Close
-        self.sma1 = self.I(self._sma, close, self.n1)
-        self.sma2 = self.I(self._sma, close, self.n2)
+        self.sma1 = self.I(indicators.sma, close, self.n1)
+        self.sma2 = self.I(indicators.sma, close, self.n2)
 
     def next(self):
         """Define trading logic (called on each new bar)"""
@@ -47,8 +46,3 @@ class SmaCrossover(Strategy):
             # Sell when fast SMA crosses below slow SMA
             if crossover(self.sma2, self.sma1):
                 self.position.close()
-
-    @staticmethod
-    def _sma(data, n):
-        """Calculate Simple Moving Average"""
-        return np.convolve(data, np.ones(n) / n, mode='valid')[-len(data):]
\ No newline at end of file
@@ -1,12 +1,17 @@
 import { beforeEach, describe, expect, test, vi, Mock } from "vitest";
 import {
   pythonExecutorService,
+  BacktestCancelledError,
+  BacktestLimitError,
   PythonExecutorError,
   PythonEnvironmentError,
+  StrategyValidationError,
 } from "@/services/trading/python-executor-service";
 import { spawn, spawnSync } from "child_process";
+import { EventEmitter } from "events";
 import * as fs from "fs/promises";
 import * as path from "path";
+import { PassThrough } from "stream";
 
 // Mock child_process
 vi.mock("child_process");
@@ -102,176 +107,73 @@ describe("PythonExecutorService", () => {
   });
 
   describe("validateStrategyCode", () => {
-    test("should accept valid Strategy class definition", async () => {
-      const code = `
+    const code = `
 from backtesting import Strategy
-from backtesting.lib import crossover
 
 class MyStrategy(Strategy):
     def init(self):
-        pass
-
-    def next(self):
-        pass
-      `;
-
-      const result = await pythonExecutorService.validateStrategyCode(code);
-      expect(result).toBe(code);
-    });
-
-    test("should reject code without Strategy class", async () => {
-      const code = "x = 1";
-
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Strategy code must define a class that inherits from Strategy"
-      );
-    });
-
-    test("should reject code with dangerous os import", async () => {
-      const code = `
-import os
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    def init(self):
-        os.system('rm -rf /')
+        pass  # open() a position later
 
     def next(self):
         pass
       `;
 
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Dangerous pattern detected"
-      );
-    });
-
-    test("should reject code with dangerous sys import", async () => {
-      const code = `
-import sys
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    def init(self):
-        pass
-
-    def next(self):
-        pass
-      `;
-
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Dangerous pattern detected"
-      );
+    beforeEach(() => {
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-validate");
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
     });
 
-    test("should reject code with file operations", async () => {
-      const code = `
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    def init(self):
-        open('/etc/passwd', 'r')
+    test("should run the static checks on the code and return it when valid", async () => {
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ valid: true, class: "MyStrategy", errors: [] }));
 
-    def next(self):
-        pass
-      `;
+      const result = await pythonExecutorService.validateStrategyCode(code);
 
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Dangerous pattern detected"
-      );
+      expect(result).toBe(code);
+      expect(fs.writeFile).toHaveBeenCalledWith(path.join("/tmp/test-validate", "strategy.py"), code, "utf-8");
+      const [scriptPath, args] = mockExecutePython.mock.calls[0];
+      expect(scriptPath).toMatch(/backtest_validate\.py$/);
+      expect(args).toEqual([path.join("/tmp/test-validate", "strategy.py")]);
+      expect(pythonExecutorService._cleanupTempDirectory).toHaveBeenCalledWith("/tmp/test-validate");
     });
 
-    test("should reject code with eval()", async () => {
-      const code = `
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    def init(self):
-        eval('1 + 1')
+    test("should check portfolio strategies against PortfolioStrategy", async () => {
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ valid: true, class: "P", errors: [] }));
 
-    def next(self):
-        pass
-      `;
+      await pythonExecutorService.validateStrategyCode("class P(PortfolioStrategy): ...", true);
 
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Dangerous pattern detected"
-      );
+      expect(mockExecutePython.mock.calls[0][1]).toEqual([path.join("/tmp/test-validate", "strategy.py"), "--portfolio"]);
     });
 
-    test("should reject code with requests import", async () => {
-      const code = `
-import requests
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    def init(self):
-        pass
-
-    def next(self):
-        pass
-      `;
-
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Dangerous pattern detected"
+    test("should reject with every error and its line", async () => {
+      const errors = [
+        { line: 2, column: 0, type: "import", message: "Import of 'os' is not allowed" },
+        { line: null, column: null, type: "strategy", message: "Strategy code must define a class that inherits from Strategy" },
+      ];
+      vi.spyOn(pythonExecutorService, "_executePython").mockResolvedValue(
+        JSON.stringify({ valid: false, class: null, errors })
       );
-    });
 
-    test("should reject empty code", async () => {
-      const code = "";
+      const validation = pythonExecutorService.validateStrategyCode("import os\nx = 1");
 
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Strategy code must define a class that inherits from Strategy"
+      await expect(validation).rejects.toBeInstanceOf(StrategyValidationError);
+      await expect(validation).rejects.toThrow(
+        "Line 2: Import of 'os' is not allowed\nStrategy code must define a class that inherits from Strategy"
       );
+      await expect(validation).rejects.toMatchObject({ errors });
     });
 
-    test("should reject code without methods", async () => {
-      const code = `
-from backtesting import Strategy
-
-class MyStrategy(Strategy):
-    pass
-      `;
-
-      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(
-        "Strategy code appears incomplete"
+    test("should clean up when the check fails to run", async () => {
+      vi.spyOn(pythonExecutorService, "_executePython").mockRejectedValue(
+        new PythonExecutorError("Python script failed", "", "")
       );
-    });
-
-    test("should accept code with whitelisted imports", async () => {
-      const code = `
-from backtesting import Strategy
-from backtesting.lib import crossover
-import numpy as np
-import pandas as pd
-import talib
-
-class MyStrategy(Strategy):
-    def init(self):
-        self.sma = self.I(talib.SMA, self.data.Close, 20)
-
-    def next(self):
-        if self.sma[-1] > 100:
-            self.buy()
-      `;
-
-      const result = await pythonExecutorService.validateStrategyCode(code);
-      expect(result).toBe(code);
-    });
-
-    test("should accept code with numpy as alternate import", async () => {
-      const code = `
-from backtesting import Strategy
-import numpy
-
-class MyStrategy(Strategy):
-    def init(self):
-        self.values = numpy.array([1, 2, 3])
-
-    def next(self):
-        pass
-      `;
 
-      const result = await pythonExecutorService.validateStrategyCode(code);
-      expect(result).toBe(code);
+      await expect(pythonExecutorService.validateStrategyCode(code)).rejects.toThrow(PythonExecutorError);
+      expect(pythonExecutorService._cleanupTempDirectory).toHaveBeenCalledWith("/tmp/test-validate");
     });
   });
 
@@ -348,27 +250,20 @@ class MyStrategy(Strategy):
   });
 
   describe("_cleanupTempDirectory", () => {
-    test("should cleanup temporary directory and files", async () => {
-      const mockReaddir = fs.readdir as Mock;
-      const mockUnlink = fs.unlink as Mock;
-      const mockRmdir = fs.rmdir as Mock;
-
-      mockReaddir.mockResolvedValue(["file1.txt", "file2.json"]);
-      mockUnlink.mockResolvedValue(undefined);
-      mockRmdir.mockResolvedValue(undefined);
+    test("should remove the temporary directory recursively", async () => {
+      const mockRm = fs.rm as Mock;
+      mockRm.mockResolvedValue(undefined);
 
       await pythonExecutorService._cleanupTempDirectory("/tmp/test-backtest");
 
-      expect(mockReaddir).toHaveBeenCalledWith("/tmp/test-backtest");
-      expect(mockUnlink).toHaveBeenCalledTimes(2);
-      expect(mockRmdir).toHaveBeenCalledWith("/tmp/test-backtest");
+      expect(mockRm).toHaveBeenCalledWith("/tmp/test-backtest", { recursive: true, force: true });
     });
 
     test("should log error but not throw if cleanup fails", async () => {
-      const mockReaddir = fs.readdir as Mock;
+      const mockRm = fs.rm as Mock;
       const consoleSpy = vi.spyOn(console, "error");
 
-      mockReaddir.mockRejectedValue(new Error("Failed to read"));
+      mockRm.mockRejectedValue(new Error("Failed to remove"));
 
       await expect(
         pythonExecutorService._cleanupTempDirectory("/tmp/test-backtest")
@@ -379,7 +274,7 @@ class MyStrategy(Strategy):
   });
 
   describe("_writeOHLCVData", () => {
-    test("should write OHLCV data to JSON file", async () => {
+    test("should write OHLCV data to a binary columnar file", async () => {
       const mockWriteFile = fs.writeFile as Mock;
       mockWriteFile.mockResolvedValue(undefined);
 
@@ -388,12 +283,36 @@ class MyStrategy(Strategy):
       await pythonExecutorService._writeOHLCVData("/tmp/test", ohlcvData);
 
       expect(mockWriteFile).toHaveBeenCalledWith(
-        expect.stringContaining("ohlcv.json"),
-        JSON.stringify(ohlcvData),
-        "utf-8"
+        expect.stringContaining("ohlcv.bin"),
+        pythonExecutorService._encodeOHLCVBinary(ohlcvData)
       );
     });
 
+    test("should encode candles as aligned little-endian columns", () => {
+      const ohlcvData = [
+        { timestamp: 1609459200000, open: 29000, high: 30000, low: 28000, close: 29500 },
+        { timestamp: 1609545600000, open: 29500, high: 31000, low: 29000, close: 30500.25 },
+      ];
+
+      const buffer = pythonExecutorService._encodeOHLCVBinary(ohlcvData);
+
+      expect(buffer.subarray(0, 8).toString("ascii")).toBe("AGXOHLC1");
+      const headerLength = buffer.readUInt32LE(8);
+      const header = JSON.parse(buffer.subarray(12, 12 + headerLength).toString("utf-8"));
+      expect(header).toMatchObject({
+        rows: 2,
+        columns: ["Open", "High", "Low", "Close"],
+        timestamp_unit: "ms",
+      });
+      expect(header.data_offset % 8).toBe(0);
+      expect(buffer.length).toBe(header.data_offset + 2 * 8 * 5);
+
+      const offset = header.data_offset;
+      expect(buffer.readBigInt64LE(offset + 8)).toBe(1609545600000n);
+      // Close column is the 4th float64 block after the timestamps
+      expect(buffer.readDoubleLE(offset + 2 * 8 * 4 + 8)).toBe(30500.25);
+    });
+
     test("should throw error if write fails", async () => {
       const mockWriteFile = fs.writeFile as Mock;
       mockWriteFile.mockRejectedValue(new Error("Write failed"));
@@ -459,7 +378,7 @@ class MyStrategy(Strategy):
       const result = await pythonExecutorService.runBacktest(strategyCode, config);
 
       expect(mockValidateEnv).toHaveBeenCalled();
-      expect(mockValidateCode).toHaveBeenCalledWith(strategyCode);
+      expect(mockValidateCode).toHaveBeenCalledWith(strategyCode, false);
       expect(mockFetchOHLCV).toHaveBeenCalled();
       expect(mockCreateTemp).toHaveBeenCalled();
       expect(mockWriteOHLCV).toHaveBeenCalled();
@@ -480,10 +399,21 @@ class MyStrategy(Strategy):
       };
 
       const invalidCode = "x = 1"; // No Strategy class
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "checkStrategyCode").mockResolvedValue({
+        valid: false,
+        class: null,
+        errors: [
+          { line: null, column: null, type: "strategy", message: "Strategy code must define a class that inherits from Strategy" },
+        ],
+      });
 
-      await expect(pythonExecutorService.runBacktest(invalidCode, config)).rejects.toThrow(
-        "Strategy validation failed"
-      );
+      const run = pythonExecutorService.runBacktest(invalidCode, config);
+      await expect(run).rejects.toBeInstanceOf(StrategyValidationError);
+      await expect(run).rejects.toMatchObject({
+        message: "Strategy code must define a class that inherits from Strategy",
+        errors: [expect.objectContaining({ type: "strategy" })],
+      });
     });
 
     test("should cleanup on error", async () => {
@@ -516,6 +446,663 @@ class MyStrategy(Strategy):
     });
   });
 
+  describe("deferred reports", () => {
+    test("should pass a report path to the runner for deferred reports", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      vi.spyOn(pythonExecutorService, "fetchOHLCVData").mockResolvedValue([]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-backtest");
+      vi.spyOn(pythonExecutorService, "_writeOHLCVData").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_executePython").mockResolvedValue(
+        JSON.stringify({ html_report: null, report_path: "/reports/r.npz", metrics: {} })
+      );
+      (fs.mkdir as Mock).mockResolvedValue(undefined);
+      const mockWriteFile = fs.writeFile as Mock;
+      mockWriteFile.mockResolvedValue(undefined);
+
+      const result = await pythonExecutorService.runBacktest("class S(Strategy): ...", {
+        startDate: "2020-01-01",
+        endDate: "2021-01-01",
+        initialCapital: 10000,
+        commission: 0.002,
+        report: "deferred",
+      });
+
+      const configCall = mockWriteFile.mock.calls.find(([file]) =>
+        String(file).endsWith("config.json")
+      );
+      const writtenConfig = JSON.parse(configCall![1]);
+      expect(writtenConfig.report).toBe("deferred");
+      expect(writtenConfig.reportPath).toMatch(/agentix-backtest-reports.*report-\d+-.*\.npz$/);
+      expect(result.html_report).toBeNull();
+      expect(result.report_path).toBe("/reports/r.npz");
+    });
+
+    test("should render a deferred report via the render-report entry point", async () => {
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ html_report: "<html>Report</html>" }));
+
+      const html = await pythonExecutorService.renderReport("/reports/r.npz");
+
+      expect(html).toBe("<html>Report</html>");
+      expect(mockExecutePython).toHaveBeenCalledWith(
+        expect.stringContaining("run_backtest.py"),
+        ["--render-report", "/reports/r.npz"]
+      );
+    });
+  });
+
+  describe("candle store", () => {
+    test("should read candles from the store instead of fetching when a resolution is set", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      const mockFetchOHLCV = vi.spyOn(pythonExecutorService, "fetchOHLCVData");
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-backtest");
+      const mockWriteOHLCV = vi.spyOn(pythonExecutorService, "_writeOHLCVData");
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_executePython").mockResolvedValue(
+        JSON.stringify({ html_report: null, metrics: {} })
+      );
+      const mockWriteFile = fs.writeFile as Mock;
+      mockWriteFile.mockResolvedValue(undefined);
+
+      await pythonExecutorService.runBacktest("class S(Strategy): ...", {
+        startDate: "2024-01-01",
+        endDate: "2024-01-31",
+        initialCapital: 10000,
+        commission: 0.002,
+        coinId: "ethereum",
+        resolution: "30m",
+      });
+
+      expect(mockFetchOHLCV).not.toHaveBeenCalled();
+      expect(mockWriteOHLCV).not.toHaveBeenCalled();
+      const configCall = mockWriteFile.mock.calls.find(([file]) =>
+        String(file).endsWith("config.json")
+      );
+      expect(JSON.parse(configCall![1]).candleStore).toEqual({
+        path: expect.stringContaining("agentix-candles"),
+        coinId: "ethereum",
+        resolution: "30m",
+      });
+    });
+
+    test("should append fetched candles to the store", async () => {
+      vi.spyOn(pythonExecutorService, "fetchOHLCVData").mockResolvedValue([
+        { timestamp: 1000, open: 100, high: 110, low: 90, close: 105 },
+      ]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-sync");
+      const mockWriteOHLCV = vi
+        .spyOn(pythonExecutorService, "_writeOHLCVData")
+        .mockResolvedValue(undefined);
+      const mockCleanup = vi
+        .spyOn(pythonExecutorService, "_cleanupTempDirectory")
+        .mockResolvedValue(undefined);
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ rows: 10, added: 1, updated: ["2024"], chunks: 1 }));
+
+      const result = await pythonExecutorService.syncCandleStore("bitcoin", "4h", 30);
+
+      expect(mockWriteOHLCV).toHaveBeenCalledWith("/tmp/test-sync", expect.any(Array));
+      expect(mockExecutePython).toHaveBeenCalledWith(expect.stringContaining("ohlcv_store.py"), [
+        "append",
+        expect.stringContaining("agentix-candles"),
+        "bitcoin",
+        "4h",
+        path.join("/tmp/test-sync", "ohlcv.bin"),
+      ]);
+      expect(mockCleanup).toHaveBeenCalledWith("/tmp/test-sync");
+      expect(result.added).toBe(1);
+    });
+  });
+
+  describe("strategy lookback", () => {
+    const lookback = { class: "S", bars: 154, duration_ms: 0, exact: true, indicators: [] };
+
+    test("should pick the smallest OHLC window covering startDate and the warm-up", () => {
+      const now = new Date("2024-03-01").getTime();
+      // 3 days of range plus 154 4h candles (~26 days) fits 30 days
+      expect(pythonExecutorService._ohlcWindowDays("2024-02-27", lookback, now)).toBe(30);
+      // 50 candles are over a day at 30m and over a week at 4h
+      expect(pythonExecutorService._ohlcWindowDays("2024-03-01", { ...lookback, bars: 50 }, now)).toBe(14);
+      expect(pythonExecutorService._ohlcWindowDays("2024-03-01", { ...lookback, bars: 20 }, now)).toBe(1);
+      expect(
+        pythonExecutorService._ohlcWindowDays("2024-02-27", { ...lookback, duration_ms: 50 * 86400000 }, now)
+      ).toBe(90);
+      expect(pythonExecutorService._ohlcWindowDays("2022-01-01", lookback, now)).toBe(365);
+    });
+
+    test("should size the fetch from the inferred lookback when days is unset", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      const mockFetchOHLCV = vi
+        .spyOn(pythonExecutorService, "fetchOHLCVData")
+        .mockResolvedValue([{ timestamp: 1000, open: 100, high: 110, low: 90, close: 105 }]);
+      vi.spyOn(pythonExecutorService, "inferLookback").mockResolvedValue(lookback);
+      vi.spyOn(pythonExecutorService, "_ohlcWindowDays").mockReturnValue(30);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-backtest");
+      vi.spyOn(pythonExecutorService, "_writeOHLCVData").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_executePython").mockResolvedValue(
+        JSON.stringify({ html_report: null, metrics: {} })
+      );
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
+
+      await pythonExecutorService.runBacktest("class S(Strategy): ...", {
+        startDate: "2024-02-27",
+        endDate: "2024-03-01",
+        initialCapital: 10000,
+        commission: 0.002,
+        lookback: "auto",
+      });
+
+      expect(mockFetchOHLCV).toHaveBeenCalledWith("bitcoin", 30);
+    });
+  });
+
+  describe("portfolio backtests", () => {
+    test("should write each asset's candles under assets/<coinId>", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      const mockFetchOHLCV = vi
+        .spyOn(pythonExecutorService, "fetchOHLCVData")
+        .mockResolvedValue([{ timestamp: 1000, open: 100, high: 110, low: 90, close: 105 }]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-backtest");
+      const mockWriteOHLCV = vi
+        .spyOn(pythonExecutorService, "_writeOHLCVData")
+        .mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_executePython").mockResolvedValue(
+        JSON.stringify({ html_report: null, metrics: {}, portfolio: { assets: ["bitcoin", "ethereum"] } })
+      );
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
+      (fs.mkdir as Mock).mockResolvedValue(undefined);
+
+      const result = await pythonExecutorService.runBacktest("class P(PortfolioStrategy): ...", {
+        startDate: "2024-01-01",
+        endDate: "2024-01-31",
+        initialCapital: 10000,
+        commission: 0.002,
+        portfolio: { assets: ["bitcoin", "ethereum"] },
+      });
+
+      expect(mockFetchOHLCV.mock.calls.map(([coinId]) => coinId)).toEqual(["bitcoin", "ethereum"]);
+      expect(mockWriteOHLCV).toHaveBeenCalledTimes(2);
+      expect(mockWriteOHLCV).toHaveBeenCalledWith(
+        path.join("/tmp/test-backtest", "assets", "ethereum"),
+        expect.any(Array)
+      );
+      expect(result.portfolio?.assets).toEqual(["bitcoin", "ethereum"]);
+    });
+
+    test("should remove the temp directory with its asset subdirectories", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      vi.spyOn(pythonExecutorService, "fetchOHLCVData").mockResolvedValue([
+        { timestamp: 1000, open: 100, high: 110, low: 90, close: 105 },
+      ]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-backtest");
+      vi.spyOn(pythonExecutorService, "_writeOHLCVData").mockResolvedValue(undefined);
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValueOnce(JSON.stringify({ html_report: null, metrics: {}, portfolio: { assets: ["bitcoin"] } }))
+        .mockRejectedValueOnce(new Error("Python script failed"));
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
+      (fs.mkdir as Mock).mockResolvedValue(undefined);
+      const mockRm = fs.rm as Mock;
+      mockRm.mockResolvedValue(undefined);
+      const config = {
+        startDate: "2024-01-01",
+        endDate: "2024-01-31",
+        initialCapital: 10000,
+        commission: 0.002,
+        portfolio: { assets: ["bitcoin", "ethereum"] },
+      };
+
+      await pythonExecutorService.runBacktest("class P(PortfolioStrategy): ...", config);
+      await expect(pythonExecutorService.runBacktest("class P(PortfolioStrategy): ...", config)).rejects.toThrow();
+
+      expect(mockExecutePython).toHaveBeenCalledTimes(2);
+      expect(mockRm).toHaveBeenCalledTimes(2);
+      expect(mockRm).toHaveBeenNthCalledWith(1, "/tmp/test-backtest", { recursive: true, force: true });
+      expect(mockRm).toHaveBeenNthCalledWith(2, "/tmp/test-backtest", { recursive: true, force: true });
+    });
+  });
+
+  describe("progress and cancellation", () => {
+    const config = { startDate: "2020-01-01", endDate: "2021-01-01", initialCapital: 10000, commission: 0.002 };
+
+    beforeEach(() => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      vi.spyOn(pythonExecutorService, "fetchOHLCVData").mockResolvedValue([
+        { timestamp: 1000, open: 100, high: 110, low: 90, close: 105 },
+      ]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-progress");
+      vi.spyOn(pythonExecutorService, "_writeOHLCVData").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
+    });
+
+    test("should stream progress events and parse the final result line", async () => {
+      const events = [
+        { event: "stage", stage: "simulate", status: "started" },
+        { event: "bars", completed: 500, total: 1000, equity: 10100, elapsed: 0.5, eta: 0.5 },
+      ];
+      const metrics = { total_return: 3, sharpe_ratio: 0.4, max_drawdown: -2, win_rate: 50, total_trades: 4 };
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockImplementation(async (_script, _args, onLine) => {
+          const lines = [...events, { html_report: null, metrics }].map((line) => JSON.stringify(line));
+          lines.forEach((line) => onLine!(line));
+          return lines.join("\n") + "\n";
+        });
+
+      const onProgress = vi.fn();
+      const result = await pythonExecutorService.runBacktest("class S(Strategy): ...", config, { onProgress });
+
+      expect(mockExecutePython).toHaveBeenCalledWith(
+        expect.stringContaining("run_backtest.py"),
+        ["/tmp/test-progress", "--progress"],
+        expect.any(Function),
+        undefined
+      );
+      expect(onProgress.mock.calls.map(([event]) => event)).toEqual(events);
+      expect(result).toEqual({ html_report: null, metrics });
+    });
+
+    test("should reject with the partial progress when the run is cancelled", async () => {
+      const partial = {
+        sweep: { event: "sweep", completed: 40, total: 400, failed: 0, best: { params: { n1: 10 }, value: 1.2 }, elapsed: 4, eta: 36 },
+      };
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ cancelled: true, reason: "SIGTERM", stage: "optimize", partial }));
+
+      const controller = new AbortController();
+      const run = pythonExecutorService.runBacktest("class S(Strategy): ...", config, { signal: controller.signal });
+
+      const error = await run.catch((e) => e);
+      expect(error).toBeInstanceOf(BacktestCancelledError);
+      expect(error.stage).toBe("optimize");
+      expect(error.partial).toEqual(partial);
+      expect(mockExecutePython).toHaveBeenCalledWith(
+        expect.stringContaining("run_backtest.py"),
+        ["/tmp/test-progress"],
+        undefined,
+        controller.signal
+      );
+    });
+
+    test("should SIGTERM the Python process when the signal aborts", async () => {
+      const child: any = new EventEmitter();
+      child.stdout = new PassThrough();
+      child.stderr = new PassThrough();
+      child.kill = vi.fn(() => {
+        child.stdout.write(JSON.stringify({ cancelled: true, reason: "SIGTERM", stage: "simulate", partial: {} }) + "\n");
+        setImmediate(() => child.emit("close", 0));
+      });
+      (spawn as Mock).mockReturnValue(child);
+
+      const controller = new AbortController();
+      const pending = pythonExecutorService._executePython("run_backtest.py", ["/tmp/x"], undefined, controller.signal);
+      controller.abort();
+
+      const output = JSON.parse(await pending);
+      expect(child.kill).toHaveBeenCalledWith("SIGTERM");
+      expect(output.cancelled).toBe(true);
+    });
+  });
+
+  describe("resource limits", () => {
+    test("should read default per-run budgets from the environment", () => {
+      expect(pythonExecutorService._defaultLimits()).toBeUndefined();
+
+      vi.stubEnv("BACKTEST_MAX_MEMORY_MB", "1024");
+      vi.stubEnv("BACKTEST_MAX_BAR_MS", "50");
+      expect(pythonExecutorService._defaultLimits()).toEqual({
+        memoryMb: 1024,
+        cpuSeconds: undefined,
+        barMs: 50,
+      });
+
+      vi.unstubAllEnvs();
+    });
+
+    test("should reject with a BacktestLimitError when a budget is exceeded", async () => {
+      const child: any = new EventEmitter();
+      child.stdout = new PassThrough();
+      child.stderr = new PassThrough();
+      (spawn as Mock).mockReturnValue(child);
+
+      const pending = pythonExecutorService._executePython("run_backtest.py", ["/tmp/x"]);
+      child.stderr.write("2026-01-01 00:00:00,000 - INFO - Running backtest\n");
+      child.stderr.write(
+        JSON.stringify({ error: "CPU budget of 60 s exceeded", traceback: "", limit: { name: "cpu", budget: 60 } }) + "\n"
+      );
+      setImmediate(() => child.emit("close", 1));
+
+      const error = await pending.catch((e) => e);
+      expect(error).toBeInstanceOf(BacktestLimitError);
+      expect(error).toBeInstanceOf(PythonExecutorError);
+      expect(error.message).toBe("CPU budget of 60 s exceeded");
+      expect(error.limit).toBe("cpu");
+      expect(error.budget).toBe(60);
+    });
+  });
+
+  describe("batch backtests", () => {
+    test("should write a manifest and stream per-job results", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      const mockFetchOHLCV = vi
+        .spyOn(pythonExecutorService, "fetchOHLCVData")
+        .mockResolvedValue([{ timestamp: 1000, open: 100, high: 110, low: 90, close: 105 }]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-batch");
+      const mockWriteOHLCV = vi
+        .spyOn(pythonExecutorService, "_writeOHLCVData")
+        .mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      (fs.mkdir as Mock).mockResolvedValue(undefined);
+      const mockWriteFile = fs.writeFile as Mock;
+      mockWriteFile.mockResolvedValue(undefined);
+
+      const summary = { event: "summary", jobs: 2, failed: 1, table: [], by_strategy: [] };
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockImplementation(async (_script, _args, onLine) => {
+          onLine!(JSON.stringify({ event: "job", index: 1, strategy: "rev-1", dataset: "ethereum", error: "boom" }));
+          onLine!(JSON.stringify({ event: "job", index: 0, strategy: "rev-1", dataset: "bitcoin", metrics: { total_return: 5 } }));
+          onLine!(JSON.stringify(summary));
+          return "";
+        });
+
+      const onJob = vi.fn();
+      const result = await pythonExecutorService.runBacktestBatch(
+        { "rev-1": "class S(Strategy): ..." },
+        ["bitcoin", "ethereum"],
+        { startDate: "2020-01-01", endDate: "2021-01-01", initialCapital: 10000, commission: 0.002 },
+        { onJob }
+      );
+
+      expect(mockFetchOHLCV).toHaveBeenCalledTimes(2);
+      expect(mockWriteOHLCV).toHaveBeenCalledWith(path.join("/tmp/test-batch", "dataset-1"), expect.any(Array));
+      expect(mockExecutePython).toHaveBeenCalledWith(
+        expect.stringContaining("run_backtest.py"),
+        ["--batch", path.join("/tmp/test-batch", "manifest.json")],
+        expect.any(Function)
+      );
+
+      const manifestCall = mockWriteFile.mock.calls.find(([file]) =>
+        String(file).endsWith("manifest.json")
+      );
+      const manifest = JSON.parse(manifestCall![1]);
+      expect(manifest.strategies).toEqual({ "rev-1": "strategy-0.py" });
+      expect(manifest.datasets).toEqual({ bitcoin: "dataset-0", ethereum: "dataset-1" });
+      expect(manifest.config.report).toBe("none");
+
+      expect(onJob).toHaveBeenCalledTimes(2);
+      expect(result.jobs.map((job) => job.dataset)).toEqual(["bitcoin", "ethereum"]);
+      expect(result.summary).toEqual(summary);
+    });
+
+    test("should reject with the StrategyValidationError of an invalid strategy", async () => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+      const invalid = new StrategyValidationError("Line 1: Import of 'os' is not allowed", [
+        { line: 1, column: 0, type: "import", message: "Import of 'os' is not allowed" },
+      ]);
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockRejectedValue(invalid);
+
+      await expect(
+        pythonExecutorService.runBacktestBatch(
+          { "rev-1": "import os" },
+          ["bitcoin"],
+          { startDate: "2020-01-01", endDate: "2021-01-01", initialCapital: 10000, commission: 0.002 }
+        )
+      ).rejects.toBe(invalid);
+    });
+  });
+
+  describe("worker pool", () => {
+    const createFakeWorker = () => {
+      const worker: any = new EventEmitter();
+      worker.stdout = new PassThrough();
+      worker.stderr = new PassThrough();
+      worker.stdin = { write: vi.fn(), end: vi.fn() };
+      worker.pid = 4242;
+      return worker;
+    };
+
+    const lastJobId = (worker: any) => {
+      const calls = worker.stdin.write.mock.calls;
+      return JSON.parse(calls[calls.length - 1][0]).id;
+    };
+
+    beforeEach(() => {
+      vi.spyOn(pythonExecutorService, "validateEnvironment").mockResolvedValue(undefined);
+    });
+
+    test("should only use the worker pool when enabled", () => {
+      vi.stubEnv("BACKTEST_WORKER_POOL", "true");
+      expect(pythonExecutorService._useWorkerPool()).toBe(true);
+
+      vi.stubEnv("BACKTEST_WORKER_POOL", "");
+      expect(pythonExecutorService._useWorkerPool()).toBe(false);
+
+      vi.unstubAllEnvs();
+    });
+
+    test("should run sweeps as one-shot processes so they can fan out", async () => {
+      vi.stubEnv("BACKTEST_WORKER_POOL", "true");
+      vi.spyOn(pythonExecutorService, "validateStrategyCode").mockImplementation(async (code) => code);
+      vi.spyOn(pythonExecutorService, "fetchOHLCVData").mockResolvedValue([
+        { timestamp: 1000, open: 100, high: 110, low: 90, close: 105 },
+      ]);
+      vi.spyOn(pythonExecutorService, "_createTempDirectory").mockResolvedValue("/tmp/test-sweep");
+      vi.spyOn(pythonExecutorService, "_writeOHLCVData").mockResolvedValue(undefined);
+      vi.spyOn(pythonExecutorService, "_cleanupTempDirectory").mockResolvedValue(undefined);
+      (fs.writeFile as Mock).mockResolvedValue(undefined);
+      const mockExecuteInWorker = vi.spyOn(pythonExecutorService, "_executeInWorker");
+      const mockExecutePython = vi
+        .spyOn(pythonExecutorService, "_executePython")
+        .mockResolvedValue(JSON.stringify({ html_report: null, metrics: {} }));
+      const config = { startDate: "2020-01-01", endDate: "2021-01-01", initialCapital: 10000, commission: 0.002 };
+
+      await pythonExecutorService.runBacktest("class S(Strategy): ...", {
+        ...config,
+        optimize: { params: { n: [1, 2] } },
+      });
+      await pythonExecutorService.runBacktest("class S(Strategy): ...", { ...config, robustness: true });
+
+      expect(mockExecutePython).toHaveBeenCalledTimes(2);
+      expect(mockExecutePython.mock.calls[0][0]).toMatch(/run_backtest\.py$/);
+      expect(mockExecuteInWorker).not.toHaveBeenCalled();
+      expect(pythonExecutorService._runsInWorkerPool(config)).toBe(true);
+
+      vi.unstubAllEnvs();
+    });
+
+    test("should dispatch a job and resolve with the worker result", async () => {
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+
+      const metrics = { total_return: 12, sharpe_ratio: 1.1, max_drawdown: -4, win_rate: 55, total_trades: 9 };
+      const pending = pythonExecutorService._executeInWorker("/tmp/job-a");
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+
+      expect(spawn).toHaveBeenCalledWith(
+        "python3",
+        expect.arrayContaining(["--worker"]),
+        expect.any(Object)
+      );
+      const jobId = lastJobId(worker);
+      expect(JSON.parse(worker.stdin.write.mock.calls[0][0])).toEqual({
+        id: jobId,
+        tmp_dir: "/tmp/job-a",
+      });
+
+      worker.stdout.write(JSON.stringify({ id: jobId, result: { html_report: "", metrics } }) + "\n");
+
+      await expect(pending).resolves.toEqual({ html_report: "", metrics });
+
+      // The worker is reused for subsequent jobs
+      const second = pythonExecutorService._executeInWorker("/tmp/job-b");
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalledTimes(2));
+      expect(spawn).toHaveBeenCalledTimes(1);
+
+      worker.stdout.write(JSON.stringify({ id: lastJobId(worker), error: "boom", traceback: "tb" }) + "\n");
+      await expect(second).rejects.toThrow(PythonExecutorError);
+
+      worker.emit("exit", 0);
+    });
+
+    test("should run strategy validation in the worker", async () => {
+      vi.stubEnv("BACKTEST_WORKER_POOL", "true");
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+      const mockExecutePython = vi.spyOn(pythonExecutorService, "_executePython");
+      vi.spyOn(pythonExecutorService, "checkStrategyCode").mockRestore(); // Mocked by the runBacktest tests
+
+      const check = pythonExecutorService.checkStrategyCode("class P(PortfolioStrategy): ...", true);
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+
+      const jobId = lastJobId(worker);
+      expect(JSON.parse(worker.stdin.write.mock.calls[0][0])).toEqual({
+        id: jobId,
+        validate: "class P(PortfolioStrategy): ...",
+        portfolio: true,
+      });
+      worker.stdout.write(JSON.stringify({ id: jobId, result: { valid: true, class: "P", errors: [] } }) + "\n");
+
+      await expect(check).resolves.toEqual({ valid: true, class: "P", errors: [] });
+      expect(mockExecutePython).not.toHaveBeenCalled();
+
+      worker.emit("exit", 0);
+      vi.unstubAllEnvs();
+    });
+
+    test("should reject pending jobs and restart when the worker exits", async () => {
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+
+      const pending = pythonExecutorService._executeInWorker("/tmp/job-c");
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+
+      worker.emit("exit", 1);
+      await expect(pending).rejects.toThrow("Backtest worker exited with code 1");
+
+      const replacement = createFakeWorker();
+      (spawn as Mock).mockReturnValue(replacement);
+
+      const next = pythonExecutorService._executeInWorker("/tmp/job-d");
+      await vi.waitFor(() => expect(replacement.stdin.write).toHaveBeenCalled());
+      expect(spawn).toHaveBeenCalledTimes(2);
+
+      replacement.emit("exit", 0);
+      await expect(next).rejects.toThrow(PythonExecutorError);
+    });
+
+    test("should route job progress and signal the job's process on abort", async () => {
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+      const kill = vi.spyOn(process, "kill").mockImplementation(() => true);
+
+      const onProgress = vi.fn();
+      const controller = new AbortController();
+      const pending = pythonExecutorService._executeInWorker("/tmp/job-e", {
+        onProgress,
+        signal: controller.signal,
+      });
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+
+      const jobId = lastJobId(worker);
+      expect(JSON.parse(worker.stdin.write.mock.calls[0][0])).toEqual({
+        id: jobId,
+        tmp_dir: "/tmp/job-e",
+        progress: true,
+      });
+
+      // Cancelling before the job has started waits for its pid
+      controller.abort();
+      expect(kill).not.toHaveBeenCalled();
+
+      worker.stdout.write(JSON.stringify({ id: jobId, event: "started", pid: 5151 }) + "\n");
+      await vi.waitFor(() => expect(kill).toHaveBeenCalledWith(5151, "SIGTERM"));
+      expect(onProgress).toHaveBeenCalledWith({ event: "started", pid: 5151 });
+
+      const cancelled = { cancelled: true, reason: "SIGTERM", stage: "load_data", partial: {} };
+      worker.stdout.write(JSON.stringify({ id: jobId, result: cancelled }) + "\n");
+      await expect(pending).resolves.toEqual(cancelled);
+
+      kill.mockRestore();
+      worker.emit("exit", 0);
+    });
+
+    test("should start a single worker for concurrent first jobs", async () => {
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+
+      const workers = await Promise.all([pythonExecutorService._getWorker(), pythonExecutorService._getWorker()]);
+
+      expect(workers).toEqual([worker, worker]);
+      expect(spawn).toHaveBeenCalledTimes(1);
+
+      worker.emit("exit", 0);
+    });
+
+    test("should SIGTERM and then SIGKILL the process of a job that times out", async () => {
+      vi.useFakeTimers();
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+      const kill = vi.spyOn(process, "kill").mockImplementation(() => true);
+
+      const error = pythonExecutorService._executeInWorker("/tmp/job-g").catch((e) => e);
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+      const jobId = lastJobId(worker);
+      worker.stdout.write(JSON.stringify({ id: jobId, event: "started", pid: 6161 }) + "\n");
+
+      await vi.advanceTimersByTimeAsync(5 * 60 * 1000);
+      expect((await error).message).toBe("Python execution timed out after 5 minutes");
+      expect(kill).toHaveBeenCalledWith(6161, "SIGTERM");
+      expect(kill).not.toHaveBeenCalledWith(6161, "SIGKILL");
+
+      await vi.advanceTimersByTimeAsync(10 * 1000);
+      expect(kill).toHaveBeenCalledWith(6161, "SIGKILL");
+      expect(JSON.parse(worker.stdin.write.mock.calls[1][0])).toEqual({ abandon: jobId });
+
+      kill.mockRestore();
+      vi.useRealTimers();
+      worker.emit("exit", 0);
+    });
+
+    test("should reject jobs over a resource budget with a BacktestLimitError", async () => {
+      const worker = createFakeWorker();
+      (spawn as Mock).mockReturnValue(worker);
+
+      const pending = pythonExecutorService._executeInWorker("/tmp/job-f");
+      await vi.waitFor(() => expect(worker.stdin.write).toHaveBeenCalled());
+
+      worker.stdout.write(
+        JSON.stringify({
+          id: lastJobId(worker),
+          error: "Memory budget of 512 MB exceeded",
+          traceback: "",
+          limit: { name: "memory", budget: 512 },
+        }) + "\n"
+      );
+
+      const error = await pending.catch((e) => e);
+      expect(error).toBeInstanceOf(BacktestLimitError);
+      expect(error.limit).toBe("memory");
+      expect(error.budget).toBe(512);
+
+      worker.emit("exit", 0);
+    });
+  });
+
   describe("error classes", () => {
     test("PythonExecutorError should contain stderr and stdout", () => {
       const error = new PythonExecutorError("Test error", "stderr output", "stdout output");